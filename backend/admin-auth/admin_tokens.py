@@ -0,0 +1,126 @@
+"""
+Подписанные токены админ-сессии. admin-auth выдает токен после проверки пароля,
+clinic-api и glass-api проверяют его в заголовке X-Admin-Key без обращения к БД
+и к admin-auth: подпись HMAC-SHA256 сверяется за постоянное время, проверенные токены
+кэшируются в памяти теплого экземпляра до истечения срока. Модуль копируется в каждую функцию.
+
+Ключ подписи - ADMIN_TOKEN_SECRET, а если он не задан - производный от ADMIN_PASSWORD
+(смена пароля отзывает все выданные токены). Если не задано ни то, ни другое,
+админ-запросы отклоняются, а при загрузке модуля в лог пишется предупреждение.
+
+Служебные вызовы (планировщик, другие функции) передают заголовок X-Internal-Token
+со значением INTERNAL_API_TOKEN; без этой переменной служебные действия доступны только
+с токеном админа.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from typing import Any, Dict, Optional, Tuple
+
+TOKEN_VERSION = 'v1'
+TOKEN_TTL_SECONDS = int(os.environ.get('ADMIN_TOKEN_TTL_SECONDS', str(12 * 3600)))
+TOKEN_ROLES = ('admin', 'superadmin')
+VERIFIED_CACHE_SIZE = 1024
+ADMIN_HEADER = 'x-admin-key'
+INTERNAL_HEADER = 'x-internal-token'
+INTERNAL_TOKEN = os.environ.get('INTERNAL_API_TOKEN', '').strip()
+
+
+def load_secret() -> Optional[bytes]:
+    """Ключ подписи токенов; None - пароль админки не задан"""
+    secret = os.environ.get('ADMIN_TOKEN_SECRET', '').strip()
+    if secret:
+        return secret.encode()
+    password = os.environ.get('ADMIN_PASSWORD', '').strip()
+    if password:
+        return hashlib.sha256(f'admin-token:{password}'.encode()).digest()
+    return None
+
+
+SECRET = load_secret()
+if SECRET is None:
+    print("[WARN] admin_tokens: ADMIN_TOKEN_SECRET and ADMIN_PASSWORD are not set, admin requests are rejected")
+
+# токен -> (роль, истекает в); ограничен по размеру, при переполнении очищается целиком
+_verified: Dict[str, Tuple[str, int]] = {}
+
+
+def sign(payload: str) -> str:
+    digest = hmac.new(SECRET, payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+
+def issue_token(role: str = 'admin', ttl_seconds: int = TOKEN_TTL_SECONDS) -> Tuple[str, int]:
+    """Выдать токен: (токен, время истечения в unix-секундах)"""
+    expires_at = int(time.time()) + ttl_seconds
+    payload = f'{TOKEN_VERSION}.{role}.{expires_at}.{secrets.token_urlsafe(9)}'
+    return f'{payload}.{sign(payload)}', expires_at
+
+
+def verify_token(token: str) -> Optional[str]:
+    """Роль из действующего токена или None"""
+    if not token or SECRET is None:
+        return None
+
+    now = time.time()
+    cached = _verified.get(token)
+    if cached:
+        if cached[1] > now:
+            return cached[0]
+        _verified.pop(token, None)
+        return None
+
+    parts = token.split('.')
+    if len(parts) != 5 or parts[0] != TOKEN_VERSION or parts[1] not in TOKEN_ROLES or not parts[2].isdigit():
+        return None
+    if not hmac.compare_digest(sign(token.rsplit('.', 1)[0]).encode(), parts[4].encode()):
+        return None
+
+    expires_at = int(parts[2])
+    if expires_at <= now:
+        return None
+
+    if len(_verified) >= VERIFIED_CACHE_SIZE:
+        _verified.clear()
+    _verified[token] = (parts[1], expires_at)
+    return parts[1]
+
+
+def header_value(event: Dict[str, Any], name: str) -> str:
+    headers = event.get('headers') or {}
+    return next((value for key, value in headers.items() if key.lower() == name), '')
+
+
+def is_admin_request(event: Dict[str, Any]) -> bool:
+    """Есть ли в запросе действующий токен админа (заголовок X-Admin-Key); без ключа подписи - нет"""
+    return verify_token(header_value(event, ADMIN_HEADER)) is not None
+
+
+def is_internal_request(event: Dict[str, Any]) -> bool:
+    """Служебный вызов: X-Internal-Token совпадает с INTERNAL_API_TOKEN или есть действующий токен админа"""
+    token = header_value(event, INTERNAL_HEADER)
+    if INTERNAL_TOKEN and token and hmac.compare_digest(token.encode(), INTERNAL_TOKEN.encode()):
+        return True
+    return verify_token(header_value(event, ADMIN_HEADER)) is not None
+
+
+def unauthorized_response() -> Dict[str, Any]:
+    return {
+        'statusCode': 401,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'isBase64Encoded': False,
+        'body': '{"error": "Admin token required"}'
+    }
+
+
+def internal_only_response() -> Dict[str, Any]:
+    return {
+        'statusCode': 403,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'isBase64Encoded': False,
+        'body': '{"error": "Internal token required"}'
+    }
@@ -1,12 +1,18 @@
+import hmac
 import json
 import os
 from typing import Dict, Any
+from admin_tokens import issue_token
+from rate_limiter import Rule, client_ip, limiter, too_many_requests
+
+LOGIN_IP_RULE = Rule('login-ip', 10, 300)
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Business: Проверка пароля для доступа к админ-панели
-    Args: event с httpMethod, body содержащим password
-    Returns: JSON с результатом проверки
+    Business: Проверка пароля для доступа к админ-панели и выдача токена админ-сессии
+    Args: event с httpMethod, body содержащим password; роль определяется по паролю:
+          SUPERADMIN_PASSWORD - superadmin, ADMIN_PASSWORD - admin
+    Returns: JSON с результатом проверки и подписанным токеном для заголовка X-Admin-Key
     '''
     method: str = event.get('httpMethod', 'POST')
     
@@ -30,25 +36,39 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Method not allowed'})
         }
     
+    decision = limiter.check([(LOGIN_IP_RULE, client_ip(event))])
+    if not decision.allowed:
+        return too_many_requests(decision)
+    
     body_data = json.loads(event.get('body', '{}'))
     provided_password = body_data.get('password', '')
     
-    admin_password = os.environ.get('ADMIN_PASSWORD')
+    admin_password = os.environ.get('ADMIN_PASSWORD', '')
+    superadmin_password = os.environ.get('SUPERADMIN_PASSWORD', '')
     
-    if not admin_password or admin_password.strip() == '':
+    if not admin_password.strip():
+        print("[ERROR] ADMIN_PASSWORD is not set, admin login is disabled")
         return {
-            'statusCode': 200,
+            'statusCode': 503,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({'success': True, 'message': 'Authenticated (no password set)'})
+            'body': json.dumps({'error': 'Admin password is not configured'})
         }
     
-    if provided_password == admin_password:
+    provided = str(provided_password).encode()
+    role = None
+    if superadmin_password.strip() and hmac.compare_digest(provided, superadmin_password.encode()):
+        role = 'superadmin'
+    elif hmac.compare_digest(provided, admin_password.encode()):
+        role = 'admin'
+    
+    if role:
+        token, expires_at = issue_token(role)
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'isBase64Encoded': False,
-            'body': json.dumps({'success': True, 'message': 'Authenticated'})
+            'body': json.dumps({'success': True, 'message': 'Authenticated', 'token': token, 'expires_at': expires_at})
         }
     else:
         return {
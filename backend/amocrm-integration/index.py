@@ -1,16 +1,51 @@
 """
 Business: Интеграция с amoCRM для работы с виджетом
 Args: event - dict с httpMethod, body, queryStringParameters
-      context - object с request_id, function_name
+      (process_outbox и sync_catalog - служебные вызовы с X-Internal-Token)
+      context - object с request_id, function_name;
+      GET ?action=metrics - метрики в формате Prometheus (Authorization: Bearer METRICS_TOKEN)
 Returns: HTTP response dict
 """
 
+import hashlib
 import json
 import os
-from typing import Dict, Any, Optional
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional, Tuple
 import requests
 from datetime import datetime, timedelta
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+from admin_tokens import is_internal_request
+from integration_registry import registry, amocrm_url, normalize_domain
+import metrics
 
+DATABASE_URL = os.environ.get('DATABASE_URL', '')
+
+LEAD_CACHE_TTL_SECONDS = int(os.environ.get('LEAD_CACHE_TTL_SECONDS', '3600'))
+
+AMOCRM_TIMEOUT_SECONDS = 10
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '100'))
+OUTBOX_MAX_BATCH_SIZE = 1000
+# ключ операции в amocrm_outbox.idempotency_key (VARCHAR(128)): длиннее - хранится sha256 ключа
+OUTBOX_MAX_KEY_LENGTH = 64
+OUTBOX_CONCURRENCY = int(os.environ.get('OUTBOX_CONCURRENCY', '4'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8'))
+OUTBOX_BACKOFF_BASE_SECONDS = 30
+OUTBOX_BACKOFF_MAX_SECONDS = 3600
+OUTBOX_LOCK_TIMEOUT_MINUTES = 5
+
+CATALOG_BATCH_SIZE = 250
+CATALOG_SYNC_CONCURRENCY = int(os.environ.get('CATALOG_SYNC_CONCURRENCY', '3'))
+CATALOG_SYNC_RESERVE_MS = 5000
+CATALOG_SYNC_MAX_RETRIES = 3
+
+metrics.init('amocrm-integration')
+
+@metrics.instrumented_handler(['get_lead', 'outbox_status', 'save_calculation', 'process_outbox', 'sync_catalog',
+                               'save_connection'])
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -20,7 +55,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-Lead-Id, X-Account-Domain',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Lead-Id, X-Account-Domain, X-Idempotency-Key',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -29,9 +64,23 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     headers = event.get('headers', {})
     lead_id = headers.get('x-lead-id') or headers.get('X-Lead-Id')
     account_domain = headers.get('x-account-domain') or headers.get('X-Account-Domain')
+    idempotency_key = headers.get('x-idempotency-key') or headers.get('X-Idempotency-Key')
     
     if method == 'GET':
-        action = event.get('queryStringParameters', {}).get('action', 'get_lead')
+        params = event.get('queryStringParameters') or {}
+        action = params.get('action', 'get_lead')
+        metrics.set_route(action)
+        
+        if action == 'outbox_status' and params.get('key'):
+            result = get_outbox_status(params['key'])
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps(result)
+            }
         
         if action == 'get_lead' and lead_id and account_domain:
             lead_data = get_lead_data(account_domain, lead_id)
@@ -47,10 +96,44 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     if method == 'POST':
         body_data = json.loads(event.get('body', '{}'))
         action = body_data.get('action')
+        metrics.set_route(action)
+        
+        if action in ('process_outbox', 'sync_catalog') and not is_internal_request(event):
+            return {
+                'statusCode': 401,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': 'Internal token required'})
+            }
         
         if action == 'save_calculation' and lead_id and account_domain:
             calculation = body_data.get('calculation', {})
-            result = save_calculation_to_lead(account_domain, lead_id, calculation)
+            key = idempotency_key or body_data.get('idempotency_key')
+            result = save_calculation_to_lead(account_domain, lead_id, calculation, key)
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps(result)
+            }
+        
+        if action == 'process_outbox':
+            try:
+                batch_size = int(body_data.get('batch_size', OUTBOX_BATCH_SIZE))
+            except (TypeError, ValueError):
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': 'batch_size must be an integer'})
+                }
+            result = process_outbox(max(1, min(batch_size, OUTBOX_MAX_BATCH_SIZE)))
             return {
                 'statusCode': 200,
                 'headers': {
@@ -60,6 +143,19 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps(result)
             }
         
+        if action == 'sync_catalog':
+            domain = body_data.get('domain') or account_domain
+            if domain:
+                result = sync_catalog(domain, body_data.get('catalog_id'), bool(body_data.get('force')), context)
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps(result)
+                }
+        
         if action == 'save_connection':
             connection_data = body_data.get('connection', {})
             result = save_amocrm_connection(connection_data)
@@ -82,18 +178,35 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     }
 
 
+def amocrm_request(method: str, url: str, **kwargs: Any) -> requests.Response:
+    """Запрос к API amoCRM; время и исход пишутся в метрики upstream_request_duration_seconds"""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        response = requests.request(method, url, **kwargs)
+        outcome = 'ok' if response.status_code < 400 else f'http_{response.status_code // 100}xx'
+        return response
+    finally:
+        metrics.observe_upstream('amocrm', metrics.path_operation(method, url), time.perf_counter() - started, outcome)
+
+
 def get_lead_data(domain: str, lead_id: str) -> Dict[str, Any]:
-    """Получить данные о сделке из amoCRM"""
+    """Получить данные о сделке из amoCRM (с кэшем, который сбрасывается вебхуками)"""
+    cached = get_cached_lead(domain, lead_id)
+    metrics.observe_cache('amocrm_lead', cached is not None)
+    if cached:
+        return cached
+    
     access_token = get_access_token(domain)
     
     if not access_token:
         return {'error': 'Not authenticated'}
     
-    url = f'https://{domain}/api/v4/leads/{lead_id}'
+    url = amocrm_url(domain, f'/api/v4/leads/{lead_id}')
     headers = {'Authorization': f'Bearer {access_token}'}
     params = {'with': 'contacts'}
     
-    response = requests.get(url, headers=headers, params=params)
+    response = amocrm_request('GET', url, headers=headers, params=params)
     
     if response.status_code != 200:
         return {'error': 'Failed to fetch lead'}
@@ -101,12 +214,13 @@ def get_lead_data(domain: str, lead_id: str) -> Dict[str, Any]:
     lead = response.json()
     
     contact_data = {}
+    contact_id = None
     if lead.get('_embedded', {}).get('contacts'):
         contact = lead['_embedded']['contacts'][0]
         contact_id = contact['id']
         
-        contact_url = f'https://{domain}/api/v4/contacts/{contact_id}'
-        contact_response = requests.get(contact_url, headers=headers)
+        contact_url = amocrm_url(domain, f'/api/v4/contacts/{contact_id}')
+        contact_response = amocrm_request('GET', contact_url, headers=headers)
         
         if contact_response.status_code == 200:
             contact_full = contact_response.json()
@@ -116,11 +230,74 @@ def get_lead_data(domain: str, lead_id: str) -> Dict[str, Any]:
                 'email': get_contact_field(contact_full, 'email')
             }
     
-    return {
+    lead_data = {
         'id': lead.get('id'),
         'name': lead.get('name', ''),
         'contact': contact_data
     }
+    cache_lead(domain, lead_id, lead_data, contact_id)
+    
+    return lead_data
+
+
+def get_cached_lead(domain: str, lead_id: str) -> Optional[Dict[str, Any]]:
+    """Прочитать сделку из кэша amocrm_entity_cache (домен приводится к виду, которым кэш сбрасывает вебхук)"""
+    if not str(lead_id).isdigit():
+        return None
+    domain = normalize_domain(domain)
+    
+    conn = get_db_connection()
+    if not conn:
+        return None
+    
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(
+            """SELECT data FROM amocrm_entity_cache
+               WHERE account_domain = %s AND entity_type = 'leads' AND entity_id = %s
+                 AND fetched_at > CURRENT_TIMESTAMP - make_interval(secs => %s)""",
+            (domain, int(lead_id), LEAD_CACHE_TTL_SECONDS)
+        )
+        row = cursor.fetchone()
+        return row['data'] if row else None
+    
+    except psycopg2.Error as e:
+        # кэш не обязателен: при ошибке базы сделка читается из API
+        print(f"Lead cache read failed for {domain}/{lead_id}: {e}")
+        return None
+    
+    finally:
+        conn.close()
+
+
+def cache_lead(domain: str, lead_id: str, lead_data: Dict[str, Any], contact_id: Optional[int]) -> None:
+    """Сохранить сделку в кэш вместе с id основного контакта"""
+    if not str(lead_id).isdigit():
+        return
+    domain = normalize_domain(domain)
+    
+    conn = get_db_connection()
+    if not conn:
+        return
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """INSERT INTO amocrm_entity_cache (account_domain, entity_type, entity_id, linked_contact_id, data)
+               VALUES (%s, 'leads', %s, %s, %s)
+               ON CONFLICT (account_domain, entity_type, entity_id)
+               DO UPDATE SET linked_contact_id = EXCLUDED.linked_contact_id,
+                             data = EXCLUDED.data,
+                             fetched_at = CURRENT_TIMESTAMP""",
+            (domain, int(lead_id), contact_id, json.dumps(lead_data, ensure_ascii=False))
+        )
+        conn.commit()
+    
+    except psycopg2.Error as e:
+        print(f"Lead cache write failed for {domain}/{lead_id}: {e}")
+    
+    finally:
+        conn.close()
 
 
 def get_contact_field(contact: Dict[str, Any], field_type: str) -> Optional[str]:
@@ -134,37 +311,232 @@ def get_contact_field(contact: Dict[str, Any], field_type: str) -> Optional[str]
     return None
 
 
-def save_calculation_to_lead(domain: str, lead_id: str, calculation: Dict[str, Any]) -> Dict[str, Any]:
-    """Сохранить результат калькуляции в сделку"""
-    access_token = get_access_token(domain)
+def save_calculation_to_lead(domain: str, lead_id: str, calculation: Dict[str, Any],
+                             idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+    """Поставить запись расчета в сделку в очередь amocrm_outbox (доставляет process_outbox)"""
+    if not str(lead_id).isdigit():
+        return {'error': 'Invalid lead id'}
+    
+    note_text = format_calculation_note(calculation)
+    products = calculation.get('products') or []
+    if not isinstance(products, list):
+        products = []
+    # товар с нечисловым component_id/package_id не привязывается, но запись расчета не срывает
+    valid_products = [product for product in products if is_valid_product(product)]
+    skipped_products = len(products) - len(valid_products)
+    products = valid_products
+    
+    if not idempotency_key:
+        # отпечаток от исходного расчета, а не от текста записи: в тексте есть текущее время,
+        # и повтор виджета после смены минуты не должен создать вторую запись
+        fingerprint = json.dumps([normalize_domain(domain), str(lead_id), calculation],
+                                 sort_keys=True, ensure_ascii=False, default=str)
+        idempotency_key = hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+    
+    operations = [('note', {'text': note_text})]
+    if products:
+        operations.append(('link', {'products': products}))
+    
+    conn = get_db_connection()
+    if not conn:
+        return {'error': 'Database unavailable'}
+    
+    try:
+        cursor = conn.cursor()
+        if products:
+            operations[-1] = ('link', {'products': resolve_catalog_elements(cursor, domain, products)})
+        execute_values(
+            cursor,
+            """INSERT INTO amocrm_outbox (account_domain, lead_id, operation, payload, idempotency_key)
+               VALUES %s
+               ON CONFLICT (idempotency_key) DO NOTHING""",
+            [
+                (domain, int(lead_id), operation, json.dumps(payload, ensure_ascii=False), outbox_key(idempotency_key, operation))
+                for operation, payload in operations
+            ]
+        )
+        conn.commit()
+        
+        result = {
+            'success': True,
+            'queued': True,
+            'idempotency_key': idempotency_key
+        }
+        if skipped_products:
+            result['skipped_products'] = skipped_products
+        return result
+    
+    finally:
+        conn.close()
+
+
+def outbox_key(idempotency_key: str, operation: str) -> str:
+    """Ключ операции в очереди; ключ клиента длиннее OUTBOX_MAX_KEY_LENGTH заменяется его sha256"""
+    key = str(idempotency_key)
+    if len(key) > OUTBOX_MAX_KEY_LENGTH:
+        key = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return f"{key}:{operation}"
+
+
+def get_outbox_status(idempotency_key: str) -> Dict[str, Any]:
+    """Статус доставки операций, поставленных в очередь с данным ключом"""
+    conn = get_db_connection()
+    if not conn:
+        return {'error': 'Database unavailable'}
+    
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(
+            """SELECT operation, status, attempts, last_error FROM amocrm_outbox
+               WHERE idempotency_key IN (%s, %s)""",
+            (outbox_key(idempotency_key, 'note'), outbox_key(idempotency_key, 'link'))
+        )
+        operations = {row['operation']: dict(row) for row in cursor.fetchall()}
+        
+        return {
+            'idempotency_key': idempotency_key,
+            'note_added': operations.get('note', {}).get('status') == 'sent',
+            'operations': operations
+        }
+    
+    finally:
+        conn.close()
+
+
+def process_outbox(batch_size: int) -> Dict[str, Any]:
+    """Доставить очередную пачку операций из amocrm_outbox с ограниченным параллелизмом"""
+    conn = get_db_connection()
+    if not conn:
+        return {'success': False, 'error': 'Database connection failed'}
+    
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(
+            """UPDATE amocrm_outbox
+               SET status = 'processing', attempts = attempts + 1, locked_at = CURRENT_TIMESTAMP
+               WHERE id IN (
+                   SELECT id FROM amocrm_outbox
+                   WHERE (status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP)
+                      OR (status = 'processing' AND locked_at < CURRENT_TIMESTAMP - make_interval(mins => %s))
+                   ORDER BY next_attempt_at
+                   LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+               )
+               RETURNING id, account_domain, lead_id, operation, payload, idempotency_key, attempts""",
+            (OUTBOX_LOCK_TIMEOUT_MINUTES, batch_size)
+        )
+        items = cursor.fetchall()
+        conn.commit()
+        
+        if not items:
+            return {'success': True, 'processed': 0}
+        
+        tokens = {domain: get_access_token(domain) for domain in {item['account_domain'] for item in items}}
+        
+        with ThreadPoolExecutor(max_workers=max(1, OUTBOX_CONCURRENCY)) as pool:
+            outcomes = list(pool.map(lambda item: deliver_outbox_item(item, tokens[item['account_domain']]), items))
+        
+        updates = []
+        stats = {'sent': 0, 'retry': 0, 'dead': 0}
+        for item, (delivered, error, retryable) in zip(items, outcomes):
+            if delivered:
+                status, delay = 'sent', 0
+            elif retryable and item['attempts'] < OUTBOX_MAX_ATTEMPTS:
+                status, delay = 'pending', get_backoff_seconds(item['attempts'])
+            else:
+                status, delay = 'dead', 0
+            stats['retry' if status == 'pending' else status] += 1
+            updates.append((item['id'], status, delay, error))
+        
+        execute_values(
+            cursor,
+            """UPDATE amocrm_outbox AS o
+               SET status = v.status,
+                   next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => v.delay),
+                   last_error = v.error,
+                   sent_at = CASE WHEN v.status = 'sent' THEN CURRENT_TIMESTAMP ELSE o.sent_at END,
+                   locked_at = NULL
+               FROM (VALUES %s) AS v(id, status, delay, error)
+               WHERE o.id = v.id""",
+            updates,
+            template='(%s::bigint, %s, %s::float8, %s)'
+        )
+        conn.commit()
+        
+        return {'success': True, 'processed': len(items), **stats}
     
+    finally:
+        conn.close()
+
+
+def get_backoff_seconds(attempts: int) -> float:
+    """Экспоненциальная задержка перед повтором с джиттером"""
+    delay = min(OUTBOX_BACKOFF_MAX_SECONDS, OUTBOX_BACKOFF_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def deliver_outbox_item(item: Dict[str, Any], access_token: Optional[str]) -> Tuple[bool, Optional[str], bool]:
+    """Выполнить одну операцию из очереди. Возвращает (доставлено, ошибка, можно повторить)"""
     if not access_token:
-        return {'error': 'Not authenticated'}
+        return False, 'Not authenticated', True
+    
+    domain = item['account_domain']
+    lead_id = item['lead_id']
+    payload = item['payload']
+    
+    try:
+        if item['operation'] == 'note':
+            if item['attempts'] > 1 and note_exists(domain, lead_id, payload['text'], access_token):
+                return True, None, False
+            response = add_note_to_lead(domain, lead_id, payload['text'], item['idempotency_key'], access_token)
+        elif item['operation'] == 'link':
+            response = add_products_to_lead(domain, lead_id, payload.get('products', []), access_token)
+            if response is None:
+                return True, None, False
+        else:
+            return False, f"Unknown operation: {item['operation']}", False
+    
+    except requests.RequestException as e:
+        return False, str(e), True
+    
+    if response.status_code in (200, 201, 202, 204):
+        return True, None, False
+    
+    retryable = response.status_code in (401, 408, 429) or response.status_code >= 500
+    return False, f"HTTP {response.status_code}: {response.text[:500]}", retryable
+
+
+def note_exists(domain: str, lead_id: int, text: str, access_token: str) -> bool:
+    """Проверить, не создано ли примечание предыдущей попыткой (ответ мог не дойти)"""
+    url = amocrm_url(domain, f'/api/v4/leads/{lead_id}/notes')
+    headers = {'Authorization': f'Bearer {access_token}'}
+    params = {'filter[note_type]': 'common', 'order[id]': 'desc', 'limit': 50}
+    
+    response = amocrm_request('GET', url, headers=headers, params=params, timeout=AMOCRM_TIMEOUT_SECONDS)
+    if response.status_code != 200:
+        return False
     
+    notes = response.json().get('_embedded', {}).get('notes', [])
+    return any(note.get('params', {}).get('text') == text for note in notes)
+
+
+def add_note_to_lead(domain: str, lead_id: int, text: str, request_id: str, access_token: str) -> requests.Response:
+    """Добавить примечание в сделку"""
     headers = {
         'Authorization': f'Bearer {access_token}',
         'Content-Type': 'application/json'
     }
     
-    note_text = format_calculation_note(calculation)
-    note_url = f'https://{domain}/api/v4/leads/{lead_id}/notes'
+    url = amocrm_url(domain, f'/api/v4/leads/{lead_id}/notes')
     note_data = {
         'note_type': 'common',
+        'request_id': request_id,
         'params': {
-            'text': note_text
+            'text': text
         }
     }
     
-    note_response = requests.post(note_url, headers=headers, json=[note_data])
-    
-    products = calculation.get('products', [])
-    if products:
-        add_products_to_lead(domain, lead_id, products, access_token)
-    
-    return {
-        'success': True,
-        'note_added': note_response.status_code == 200
-    }
+    return amocrm_request('POST', url, headers=headers, json=[note_data], timeout=AMOCRM_TIMEOUT_SECONDS)
 
 
 def format_calculation_note(calculation: Dict[str, Any]) -> str:
@@ -194,17 +566,68 @@ def format_calculation_note(calculation: Dict[str, Any]) -> str:
     return note.strip()
 
 
-def add_products_to_lead(domain: str, lead_id: str, products: list, access_token: str) -> bool:
+def is_valid_product(product: Any) -> bool:
+    """Товар виджета - объект, а его component_id или package_id (если есть) - число"""
+    if not isinstance(product, dict):
+        return False
+    source_id = product.get('component_id') or product.get('package_id')
+    return not source_id or str(source_id).isdigit()
+
+
+def resolve_catalog_elements(cursor, domain: str, products: list) -> list:
+    """Подставить element_id/catalog_id из amocrm_catalog_map для товаров с component_id или package_id
+    (товары проверены is_valid_product)"""
+    lookups = [
+        ('component', product['component_id']) if product.get('component_id') else ('package', product['package_id'])
+        for product in products
+        if product.get('component_id') or product.get('package_id')
+    ]
+    if not lookups:
+        return products
+    
+    cursor.execute(
+        """SELECT source_type, source_id, catalog_id, element_id FROM amocrm_catalog_map
+           WHERE account_domain = %s AND (source_type, source_id) IN (SELECT * FROM unnest(%s::text[], %s::int[]))""",
+        (domain, [source_type for source_type, _ in lookups], [int(source_id) for _, source_id in lookups])
+    )
+    mapping = {(row[0], row[1]): (row[2], row[3]) for row in cursor.fetchall()}
+    
+    resolved = []
+    for product in products:
+        product = dict(product)
+        if product.get('component_id'):
+            key = ('component', int(product['component_id']))
+        elif product.get('package_id'):
+            key = ('package', int(product['package_id']))
+        else:
+            key = None
+        if key in mapping:
+            product['catalog_id'], product['element_id'] = mapping[key]
+        resolved.append(product)
+    return resolved
+
+
+def add_products_to_lead(domain: str, lead_id: int, products: list, access_token: str) -> Optional[requests.Response]:
     """Добавить товары в сделку"""
     headers = {
         'Authorization': f'Bearer {access_token}',
         'Content-Type': 'application/json'
     }
     
-    url = f'https://{domain}/api/v4/leads/{lead_id}/links'
+    url = amocrm_url(domain, f'/api/v4/leads/{lead_id}/links')
     
     catalog_elements = []
     for product in products:
+        if product.get('element_id'):
+            catalog_elements.append({
+                'to_entity_id': product['element_id'],
+                'to_entity_type': 'catalog_elements',
+                'metadata': {
+                    'quantity': product.get('quantity', 1),
+                    'catalog_id': product.get('catalog_id')
+                }
+            })
+            continue
         catalog_elements.append({
             'to_entity_id': product.get('catalog_id'),
             'to_entity_type': 'catalog_elements',
@@ -215,17 +638,234 @@ def add_products_to_lead(domain: str, lead_id: str, products: list, access_token
         })
     
     if catalog_elements:
-        response = requests.post(url, headers=headers, json=catalog_elements)
-        return response.status_code == 200
+        return amocrm_request('POST', url, headers=headers, json=catalog_elements, timeout=AMOCRM_TIMEOUT_SECONDS)
     
-    return False
+    return None
 
 
-def get_access_token(domain: str) -> Optional[str]:
-    """Получить access token для домена (заглушка - нужно хранить в БД)"""
+def sync_catalog(domain: str, catalog_id: Optional[int], force: bool, context: Any) -> Dict[str, Any]:
+    """
+    Выгрузить glass_components и glass_packages в каталог товаров amoCRM.
+    Отправляются только новые и изменившиеся элементы (по content_hash), пачками по 250.
+    Если время вызова заканчивается, синхронизация останавливается и продолжится при следующем вызове.
+    """
+    started = time.monotonic()
+    access_token = get_access_token(domain)
+    if not access_token:
+        return {'success': False, 'error': 'Not authenticated'}
+    
+    if not catalog_id:
+        catalog_id = get_products_catalog_id(domain, access_token)
+        if not catalog_id:
+            return {'success': False, 'error': 'Products catalog not found'}
+    
+    conn = get_db_connection()
+    if not conn:
+        return {'success': False, 'error': 'Database connection failed'}
+    
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        elements = load_catalog_source(cursor)
+        
+        cursor.execute(
+            "SELECT source_type, source_id, catalog_id, element_id, content_hash FROM amocrm_catalog_map WHERE account_domain = %s",
+            (domain,)
+        )
+        mapped = {(row['source_type'], row['source_id']): row for row in cursor.fetchall()}
+        
+        to_create = []
+        to_update = []
+        for key, element in elements.items():
+            content_hash = hashlib.sha256(
+                json.dumps([catalog_id, element], sort_keys=True, ensure_ascii=False).encode('utf-8')
+            ).hexdigest()
+            existing = mapped.get(key)
+            if existing and existing['catalog_id'] == catalog_id:
+                if force or existing['content_hash'] != content_hash:
+                    to_update.append((key, content_hash, dict(element, id=existing['element_id'])))
+            else:
+                to_create.append((key, content_hash, dict(element, request_id=f"{key[0]}:{key[1]}")))
+        
+        batches = [('post', to_create[i:i + CATALOG_BATCH_SIZE]) for i in range(0, len(to_create), CATALOG_BATCH_SIZE)]
+        batches += [('patch', to_update[i:i + CATALOG_BATCH_SIZE]) for i in range(0, len(to_update), CATALOG_BATCH_SIZE)]
+        
+        stats = {'created': 0, 'updated': 0, 'unchanged': len(elements) - len(to_create) - len(to_update), 'failed': 0}
+        errors = []
+        pending = list(batches)
+        
+        with ThreadPoolExecutor(max_workers=max(1, CATALOG_SYNC_CONCURRENCY)) as pool:
+            futures = {}
+            while pending or futures:
+                while pending and len(futures) < CATALOG_SYNC_CONCURRENCY and has_time_left(context, started):
+                    method, batch = pending.pop(0)
+                    futures[pool.submit(push_catalog_batch, domain, catalog_id, method, batch, access_token)] = (method, batch)
+                if not futures:
+                    break
+                
+                done = next(as_completed(futures))
+                method, batch = futures.pop(done)
+                element_ids, error = done.result()
+                
+                if error:
+                    stats['failed'] += len(batch)
+                    errors.append(error)
+                    continue
+                
+                rows = [
+                    (domain, key[0], key[1], catalog_id, element_ids[i], content_hash)
+                    for i, (key, content_hash, _) in enumerate(batch)
+                    if element_ids[i]
+                ]
+                save_catalog_map(cursor, rows)
+                conn.commit()
+                stats['created' if method == 'post' else 'updated'] += len(rows)
+                stats['failed'] += len(batch) - len(rows)
+        
+        return {
+            'success': not errors,
+            'catalog_id': catalog_id,
+            'complete': not pending,
+            'remaining_batches': len(pending),
+            'errors': errors[:10],
+            **stats
+        }
+    
+    finally:
+        conn.close()
+
+
+def has_time_left(context: Any, started: float) -> bool:
+    """Остается ли время вызова на еще одну пачку"""
+    get_remaining = getattr(context, 'get_remaining_time_in_millis', None)
+    if callable(get_remaining):
+        return get_remaining() > CATALOG_SYNC_RESERVE_MS
+    return (time.monotonic() - started) * 1000 < 60000 - CATALOG_SYNC_RESERVE_MS
+
+
+def load_catalog_source(cursor) -> Dict[Tuple[str, int], Dict[str, Any]]:
+    """Собрать элементы каталога amoCRM из активных компонентов и комплектов"""
+    elements = {}
+    
+    cursor.execute("""
+        SELECT component_id, component_name, component_type, article, characteristics, unit, price_per_unit
+        FROM t_p56372141_online_booking_integ.glass_components
+        WHERE is_active = true
+    """)
+    for row in cursor.fetchall():
+        elements[('component', row['component_id'])] = build_catalog_element(
+            row['component_name'], row['article'], row['price_per_unit'], row['characteristics'],
+            f"component-{row['component_id']}"
+        )
+    
+    cursor.execute("""
+        SELECT package_id, package_name, package_article, description
+        FROM t_p56372141_online_booking_integ.glass_packages
+        WHERE is_active = true
+    """)
+    for row in cursor.fetchall():
+        elements[('package', row['package_id'])] = build_catalog_element(
+            row['package_name'], row['package_article'], None, row['description'],
+            f"package-{row['package_id']}"
+        )
+    
+    return elements
+
+
+def build_catalog_element(name: str, sku: Optional[str], price: Any, description: Optional[str], external_id: str) -> Dict[str, Any]:
+    """Элемент каталога в формате API amoCRM v4"""
+    fields = [{'field_code': 'EXTERNAL_ID', 'values': [{'value': external_id}]}]
+    if sku:
+        fields.append({'field_code': 'SKU', 'values': [{'value': sku}]})
+    if price is not None:
+        fields.append({'field_code': 'PRICE', 'values': [{'value': float(price)}]})
+    if description:
+        fields.append({'field_code': 'DESCRIPTION', 'values': [{'value': description}]})
+    return {'name': name, 'custom_fields_values': fields}
+
+
+def get_products_catalog_id(domain: str, access_token: str) -> Optional[int]:
+    """Найти id каталога товаров аккаунта"""
+    url = amocrm_url(domain, '/api/v4/catalogs')
+    headers = {'Authorization': f'Bearer {access_token}'}
+    
+    response = amocrm_request('GET', url, headers=headers, timeout=AMOCRM_TIMEOUT_SECONDS)
+    if response.status_code != 200:
+        return None
+    
+    for catalog in response.json().get('_embedded', {}).get('catalogs', []):
+        if catalog.get('type') == 'products':
+            return catalog.get('id')
     return None
 
 
+def push_catalog_batch(domain: str, catalog_id: int, method: str, batch: list, access_token: str) -> Tuple[List[Optional[int]], Optional[str]]:
+    """
+    Отправить пачку элементов (POST - создание, PATCH - обновление).
+    Возвращает id элементов в порядке пачки и текст ошибки.
+    """
+    url = amocrm_url(domain, f'/api/v4/catalogs/{catalog_id}/elements')
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/json'
+    }
+    payload = [element for _, _, element in batch]
+    
+    for attempt in range(CATALOG_SYNC_MAX_RETRIES + 1):
+        try:
+            response = amocrm_request(method, url, headers=headers, json=payload, timeout=AMOCRM_TIMEOUT_SECONDS * 3)
+        except requests.RequestException as e:
+            error = str(e)
+        else:
+            if response.status_code == 200:
+                break
+            error = f"HTTP {response.status_code}: {response.text[:300]}"
+            if response.status_code != 429 and response.status_code < 500:
+                return [None] * len(batch), error
+        
+        if attempt < CATALOG_SYNC_MAX_RETRIES:
+            time.sleep(min(8, 2 ** attempt) * random.uniform(0.5, 1.0))
+    else:
+        return [None] * len(batch), error
+    
+    returned = response.json().get('_embedded', {}).get('elements', [])
+    if method == 'post':
+        by_request = {str(element.get('request_id')): element.get('id') for element in returned}
+        return [by_request.get(element['request_id']) for _, _, element in batch], None
+    
+    returned_ids = {element.get('id') for element in returned}
+    return [element['id'] if element['id'] in returned_ids else None for _, _, element in batch], None
+
+
+def save_catalog_map(cursor, rows: List[Tuple]) -> None:
+    """Сохранить соответствие source -> element_id одним запросом"""
+    if not rows:
+        return
+    execute_values(
+        cursor,
+        """INSERT INTO amocrm_catalog_map (account_domain, source_type, source_id, catalog_id, element_id, content_hash)
+           VALUES %s
+           ON CONFLICT (account_domain, source_type, source_id)
+           DO UPDATE SET catalog_id = EXCLUDED.catalog_id,
+                         element_id = EXCLUDED.element_id,
+                         content_hash = EXCLUDED.content_hash,
+                         synced_at = CURRENT_TIMESTAMP""",
+        rows
+    )
+
+
+def get_access_token(domain: str, widget_type: Optional[str] = None) -> Optional[str]:
+    """Получить access token для домена из реестра подключений (без обращения к БД на теплом экземпляре)"""
+    return registry.get_access_token(domain, widget_type)
+
+
+def get_db_connection():
+    """Получить подключение к БД"""
+    try:
+        return psycopg2.connect(DATABASE_URL)
+    except Exception as e:
+        return None
+
+
 def save_amocrm_connection(connection: Dict[str, Any]) -> Dict[str, Any]:
     """Сохранить данные подключения к amoCRM"""
     domain = connection.get('domain')
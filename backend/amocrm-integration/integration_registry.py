@@ -0,0 +1,236 @@
+"""
+Реестр подключений amoCRM: индекс (widget_type, domain) -> учетные данные в памяти экземпляра функции.
+Загружается один раз на теплый экземпляр и перечитывается, только когда меняется
+amocrm_integrations_version (проверка не чаще раза в REGISTRY_CHECK_INTERVAL_SECONDS).
+Одинаковая копия лежит в amocrm-oauth и amocrm-integration.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlparse
+import requests
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+DATABASE_URL = os.environ.get('DATABASE_URL', '')
+
+REGISTRY_CHECK_INTERVAL_SECONDS = int(os.environ.get('AMOCRM_REGISTRY_CHECK_INTERVAL', '30'))
+REGISTRY_MISS_RELOAD_SECONDS = 1
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+OAUTH_REDIRECT_URI = 'https://functions.poehali.dev/1ef24008-864d-4313-add9-5085c0faed3b'
+
+# Для нагрузочных тестов запросы к amoCRM можно направить на локальную заглушку (tools/fake_amocrm.py)
+AMOCRM_BASE_URL = os.environ.get('AMOCRM_BASE_URL', '').rstrip('/')
+
+
+def amocrm_url(domain: str, path: str) -> str:
+    """URL метода API amoCRM для аккаунта"""
+    if AMOCRM_BASE_URL:
+        return f"{AMOCRM_BASE_URL}{path}"
+    return f"https://{domain}{path}"
+
+
+def normalize_domain(domain: str) -> str:
+    """Привести домен к виду example.amocrm.ru (принимает example, https://example.amocrm.ru/ и т.п.)"""
+    domain = (domain or '').strip().lower()
+    if '://' in domain:
+        domain = urlparse(domain).netloc
+    domain = domain.split('/')[0]
+    if domain and '.' not in domain:
+        domain = f"{domain}.amocrm.ru"
+    return domain
+
+
+class IntegrationRegistry:
+    """Индекс активных подключений amoCRM"""
+
+    def __init__(self):
+        self._by_key: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._by_domain: Dict[str, List[Dict[str, Any]]] = {}
+        self._by_widget: Dict[str, List[Dict[str, Any]]] = {}
+        self._version: Optional[int] = None
+        self._checked_at = 0.0
+        self._miss_reload_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_locks: Dict[int, threading.Lock] = {}
+
+    def get(self, domain: str, widget_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Найти подключение по домену (и типу виджета, если он известен)"""
+        self._ensure_fresh()
+        entry = self._lookup(normalize_domain(domain), widget_type)
+        if entry is None and self._reload_on_miss():
+            entry = self._lookup(normalize_domain(domain), widget_type)
+        return entry
+
+    def get_only(self, widget_type: str) -> Optional[Dict[str, Any]]:
+        """Единственное подключение виджета (для старых вызовов без домена)"""
+        self._ensure_fresh()
+        entries = self._by_widget.get(widget_type, [])
+        return entries[0] if len(entries) == 1 else None
+
+    def get_widget_count(self, widget_type: str) -> int:
+        """Количество активных подключений виджета"""
+        self._ensure_fresh()
+        return len(self._by_widget.get(widget_type, []))
+
+    def reload(self) -> None:
+        """Перечитать подключения сразу (после изменений в этом же экземпляре)"""
+        self._load(force=True)
+
+    def invalidate(self) -> None:
+        """Перепроверить версию при следующем обращении"""
+        self._checked_at = 0.0
+
+    def get_access_token(self, domain: str, widget_type: Optional[str] = None) -> Optional[str]:
+        """Действующий access token подключения; истекающий токен обновляется"""
+        entry = self.get(domain, widget_type)
+        if not entry or not entry['access_token']:
+            return None
+
+        expires_at = entry['token_expires_at']
+        if expires_at and expires_at - timedelta(seconds=TOKEN_REFRESH_MARGIN_SECONDS) <= datetime.now():
+            result = self.refresh(entry)
+            if not result.get('success'):
+                return None
+            return result['access_token']
+
+        return entry['access_token']
+
+    def refresh(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Обновить токены подключения через refresh_token и сохранить их в БД и в индексе"""
+        stale_token = entry['access_token']
+        with self._lock:
+            refresh_lock = self._refresh_locks.setdefault(entry['id'], threading.Lock())
+
+        with refresh_lock:
+            current = self._by_key.get((entry['widget_type'], entry['domain']), entry)
+            if current['access_token'] != stale_token:
+                return {'success': True, 'access_token': current['access_token']}
+
+            if not current['refresh_token']:
+                return {'success': False, 'error': 'No refresh token found'}
+
+            try:
+                response = requests.post(amocrm_url(current['domain'], '/oauth2/access_token'), json={
+                    'client_id': current['client_id'],
+                    'client_secret': current['client_secret'],
+                    'grant_type': 'refresh_token',
+                    'refresh_token': current['refresh_token'],
+                    'redirect_uri': OAUTH_REDIRECT_URI
+                }, timeout=10)
+            except requests.RequestException as e:
+                return {'success': False, 'error': f'Token refresh failed: {e}'}
+
+            if response.status_code != 200:
+                self.invalidate()
+                return {'success': False, 'error': 'Token refresh failed'}
+
+            tokens = response.json()
+            if not self.store_tokens(current, tokens):
+                return {'success': False, 'error': 'Failed to save refreshed tokens'}
+            return {'success': True, 'access_token': current['access_token']}
+
+    def store_tokens(self, entry: Dict[str, Any], tokens: Dict[str, Any]) -> bool:
+        """
+        Записать новые токены в amocrm_integrations и в запись индекса. Прежний refresh_token
+        amoCRM уже отозвала, поэтому индекс обновляется и при ошибке базы; False - в БД токены не записаны.
+        """
+        expires_at = datetime.now() + timedelta(seconds=tokens.get('expires_in', 86400))
+        row = None
+        stored = False
+
+        try:
+            conn = psycopg2.connect(DATABASE_URL)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    """UPDATE amocrm_integrations
+                       SET access_token = %s, refresh_token = %s, token_expires_at = %s, updated_at = CURRENT_TIMESTAMP
+                       WHERE id = %s""",
+                    (tokens.get('access_token'), tokens.get('refresh_token'), expires_at, entry['id'])
+                )
+                cursor.execute("SELECT version FROM amocrm_integrations_version WHERE id = 1")
+                row = cursor.fetchone()
+                conn.commit()
+                stored = True
+            finally:
+                conn.close()
+        except psycopg2.Error as e:
+            print(f"Token store failed for {entry['widget_type']}/{entry['domain']}: {e}")
+
+        with self._lock:
+            entry['access_token'] = tokens.get('access_token')
+            entry['refresh_token'] = tokens.get('refresh_token')
+            entry['token_expires_at'] = expires_at
+            if row and self._version is not None and row[0] == self._version + 1:
+                self._version = row[0]
+        return stored
+
+    def _lookup(self, domain: str, widget_type: Optional[str]) -> Optional[Dict[str, Any]]:
+        if widget_type:
+            return self._by_key.get((widget_type, domain))
+        entries = self._by_domain.get(domain)
+        return entries[0] if entries else None
+
+    def _ensure_fresh(self) -> None:
+        if self._version is not None and time.monotonic() - self._checked_at < REGISTRY_CHECK_INTERVAL_SECONDS:
+            return
+        self._load(force=False)
+
+    def _reload_on_miss(self) -> bool:
+        now = time.monotonic()
+        if now - self._miss_reload_at < REGISTRY_MISS_RELOAD_SECONDS:
+            return False
+        self._miss_reload_at = now
+        return self._load(force=False)
+
+    def _load(self, force: bool) -> bool:
+        """Перечитать подключения, если изменилась версия. Возвращает True, если индекс обновлен"""
+        with self._lock:
+            try:
+                conn = psycopg2.connect(DATABASE_URL)
+            except Exception:
+                return False
+
+            try:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute("SELECT version FROM amocrm_integrations_version WHERE id = 1")
+                row = cursor.fetchone()
+                version = row['version'] if row else 0
+                self._checked_at = time.monotonic()
+
+                if not force and version == self._version:
+                    return False
+
+                cursor.execute(
+                    """SELECT id, widget_type, domain, client_id, client_secret,
+                              access_token, refresh_token, token_expires_at
+                       FROM amocrm_integrations
+                       WHERE is_active = true
+                       ORDER BY updated_at DESC"""
+                )
+                by_key: Dict[Tuple[str, str], Dict[str, Any]] = {}
+                by_domain: Dict[str, List[Dict[str, Any]]] = {}
+                by_widget: Dict[str, List[Dict[str, Any]]] = {}
+                for row in cursor.fetchall():
+                    entry = dict(row)
+                    entry['domain'] = normalize_domain(entry['domain'])
+                    key = (entry['widget_type'], entry['domain'])
+                    if key in by_key:
+                        continue
+                    by_key[key] = entry
+                    by_domain.setdefault(entry['domain'], []).append(entry)
+                    by_widget.setdefault(entry['widget_type'], []).append(entry)
+
+                self._by_key, self._by_domain, self._by_widget = by_key, by_domain, by_widget
+                self._version = version
+                return True
+
+            finally:
+                conn.close()
+
+
+registry = IntegrationRegistry()
@@ -10,12 +10,23 @@ import os
 from typing import Dict, Any, Optional
 from urllib.parse import quote
 import requests
-from datetime import datetime, timedelta
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from integration_registry import registry, normalize_domain, amocrm_url, OAUTH_REDIRECT_URI
+from db_trace import connect as traced_connect, traced_handler
 
 DATABASE_URL = os.environ.get('DATABASE_URL', '')
 
+def request_route(event: Dict[str, Any]) -> str:
+    """Имя маршрута для лога запросов к БД: метод и action из строки запроса или тела"""
+    method = event.get('httpMethod', 'GET')
+    action = (event.get('queryStringParameters') or {}).get('action', '')
+    if not action and method == 'POST':
+        try:
+            action = json.loads(event.get('body') or '{}').get('action', '')
+        except (ValueError, AttributeError):
+            action = ''
+    return f'{method} {action}'.rstrip()
+
+@traced_handler(request_route)
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     method: str = event.get('httpMethod', 'GET')
     
@@ -115,7 +126,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         elif action == 'refresh_token':
             widget_type = body_data.get('widget_type', '')
-            result = refresh_access_token(widget_type)
+            domain = body_data.get('domain', '')
+            result = refresh_access_token(widget_type, domain)
             return json_response(result)
     
     return error_response('Invalid request')
@@ -130,126 +142,37 @@ def get_base_url(event: Dict[str, Any]) -> str:
 
 def exchange_code_for_tokens_v2(code: str, widget_type: str, domain: str) -> Dict[str, Any]:
     """Обменять код авторизации на токены (новая версия с передачей домена)"""
-    conn = get_db_connection()
-    if not conn:
-        return {'success': False, 'error': 'Database connection failed'}
+    integration = registry.get(domain, widget_type)
+    
+    if not integration:
+        return {'success': False, 'error': 'Integration not found'}
     
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(
-            "SELECT client_id, client_secret FROM amocrm_integrations WHERE widget_type = %s AND is_active = true LIMIT 1",
-            (widget_type,)
-        )
-        integration = cursor.fetchone()
-        
-        if not integration:
-            return {'success': False, 'error': 'Integration not found'}
-        
-        client_id = integration['client_id']
-        client_secret = integration['client_secret']
-        
-        clean_domain = domain.replace('https://', '').replace('http://', '').strip()
-        if not clean_domain.endswith('.amocrm.ru'):
-            clean_domain = f"{clean_domain}.amocrm.ru"
-        
-        redirect_uri = "https://functions.poehali.dev/1ef24008-864d-4313-add9-5085c0faed3b"
-        
-        token_url = f"https://{clean_domain}/oauth2/access_token"
+        token_url = amocrm_url(integration['domain'], '/oauth2/access_token')
         response = requests.post(token_url, json={
-            'client_id': client_id,
-            'client_secret': client_secret,
+            'client_id': integration['client_id'],
+            'client_secret': integration['client_secret'],
             'grant_type': 'authorization_code',
             'code': code,
-            'redirect_uri': redirect_uri
-        })
+            'redirect_uri': OAUTH_REDIRECT_URI
+        }, timeout=10)
         
         if response.status_code != 200:
             return {'success': False, 'error': f'Token exchange failed: {response.text}'}
         
-        tokens = response.json()
-        access_token = tokens.get('access_token')
-        refresh_token = tokens.get('refresh_token')
-        expires_in = tokens.get('expires_in', 86400)
-        
-        expires_at = datetime.now() + timedelta(seconds=expires_in)
-        
-        cursor.execute(
-            """UPDATE amocrm_integrations 
-               SET access_token = %s, refresh_token = %s, token_expires_at = %s, updated_at = CURRENT_TIMESTAMP
-               WHERE widget_type = %s AND is_active = true""",
-            (access_token, refresh_token, expires_at, widget_type)
-        )
-        conn.commit()
+        if not registry.store_tokens(integration, response.json()):
+            return {'success': False, 'error': 'Failed to save tokens'}
         
         return {'success': True}
     
     except Exception as e:
         return {'success': False, 'error': str(e)}
-    
-    finally:
-        conn.close()
-
-
-def exchange_code_for_tokens(code: str, widget_type: str) -> Dict[str, Any]:
-    """Обменять код авторизации на токены"""
-    conn = get_db_connection()
-    if not conn:
-        return {'success': False, 'error': 'Database connection failed'}
-    
-    try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(
-            "SELECT domain, client_id, client_secret FROM amocrm_integrations WHERE widget_type = %s AND is_active = true LIMIT 1",
-            (widget_type,)
-        )
-        integration = cursor.fetchone()
-        
-        if not integration:
-            return {'success': False, 'error': 'Integration not found'}
-        
-        domain = integration['domain']
-        client_id = integration['client_id']
-        client_secret = integration['client_secret']
-        
-        redirect_uri = f"https://functions.poehali.dev/1ef24008-864d-4313-add9-5085c0faed3b?action=callback&widget_type={widget_type}"
-        
-        token_url = f"https://{domain}/oauth2/access_token"
-        response = requests.post(token_url, json={
-            'client_id': client_id,
-            'client_secret': client_secret,
-            'grant_type': 'authorization_code',
-            'code': code,
-            'redirect_uri': redirect_uri
-        })
-        
-        if response.status_code != 200:
-            return {'success': False, 'error': 'Token exchange failed'}
-        
-        tokens = response.json()
-        access_token = tokens.get('access_token')
-        refresh_token = tokens.get('refresh_token')
-        expires_in = tokens.get('expires_in', 86400)
-        
-        expires_at = datetime.now() + timedelta(seconds=expires_in)
-        
-        cursor.execute(
-            """UPDATE amocrm_integrations 
-               SET access_token = %s, refresh_token = %s, token_expires_at = %s, updated_at = CURRENT_TIMESTAMP
-               WHERE widget_type = %s AND domain = %s""",
-            (access_token, refresh_token, expires_at, widget_type, domain)
-        )
-        conn.commit()
-        
-        return {'success': True}
-    
-    finally:
-        conn.close()
 
 
 def save_integration(integration: Dict[str, Any]) -> Dict[str, Any]:
     """Сохранить данные интеграции"""
     widget_type = integration.get('widget_type', 'glass')
-    domain = integration.get('domain', '').replace('https://', '').replace('http://', '')
+    domain = normalize_domain(integration.get('domain', ''))
     client_id = integration.get('client_id', '')
     client_secret = integration.get('client_secret', '')
     
@@ -273,6 +196,7 @@ def save_integration(integration: Dict[str, Any]) -> Dict[str, Any]:
             (widget_type, domain, client_id, client_secret)
         )
         conn.commit()
+        registry.reload()
         
         return {
             'success': True,
@@ -286,17 +210,26 @@ def save_integration(integration: Dict[str, Any]) -> Dict[str, Any]:
 
 def disconnect_integration(widget_type: str, domain: str) -> Dict[str, Any]:
     """Отключить интеграцию"""
+    integration = registry.get(domain, widget_type)
+    
     conn = get_db_connection()
     if not conn:
         return {'success': False, 'error': 'Database connection failed'}
     
     try:
         cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE amocrm_integrations SET is_active = false WHERE widget_type = %s AND domain = %s",
-            (widget_type, domain)
-        )
+        if integration:
+            cursor.execute(
+                "UPDATE amocrm_integrations SET is_active = false, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+                (integration['id'],)
+            )
+        else:
+            cursor.execute(
+                "UPDATE amocrm_integrations SET is_active = false, updated_at = CURRENT_TIMESTAMP WHERE widget_type = %s AND domain = %s",
+                (widget_type, normalize_domain(domain))
+            )
         conn.commit()
+        registry.reload()
         
         return {'success': True, 'message': 'Integration disconnected'}
     
@@ -304,67 +237,25 @@ def disconnect_integration(widget_type: str, domain: str) -> Dict[str, Any]:
         conn.close()
 
 
-def refresh_access_token(widget_type: str) -> Dict[str, Any]:
+def refresh_access_token(widget_type: str, domain: str = '') -> Dict[str, Any]:
     """Обновить access token"""
-    conn = get_db_connection()
-    if not conn:
-        return {'success': False, 'error': 'Database connection failed'}
+    if domain:
+        integration = registry.get(domain, widget_type)
+    else:
+        integration = registry.get_only(widget_type)
+        if not integration and registry.get_widget_count(widget_type) > 1:
+            return {'success': False, 'error': 'Domain required: several accounts use this widget'}
     
-    try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        cursor.execute(
-            "SELECT * FROM amocrm_integrations WHERE widget_type = %s AND is_active = true LIMIT 1",
-            (widget_type,)
-        )
-        integration = cursor.fetchone()
-        
-        if not integration or not integration['refresh_token']:
-            return {'success': False, 'error': 'No refresh token found'}
-        
-        domain = integration['domain']
-        client_id = integration['client_id']
-        client_secret = integration['client_secret']
-        refresh_token = integration['refresh_token']
-        
-        redirect_uri = f"https://functions.poehali.dev/1ef24008-864d-4313-add9-5085c0faed3b?action=callback&widget_type={widget_type}"
-        
-        token_url = f"https://{domain}/oauth2/access_token"
-        response = requests.post(token_url, json={
-            'client_id': client_id,
-            'client_secret': client_secret,
-            'grant_type': 'refresh_token',
-            'refresh_token': refresh_token,
-            'redirect_uri': redirect_uri
-        })
-        
-        if response.status_code != 200:
-            return {'success': False, 'error': 'Token refresh failed'}
-        
-        tokens = response.json()
-        new_access_token = tokens.get('access_token')
-        new_refresh_token = tokens.get('refresh_token')
-        expires_in = tokens.get('expires_in', 86400)
-        
-        expires_at = datetime.now() + timedelta(seconds=expires_in)
-        
-        cursor.execute(
-            """UPDATE amocrm_integrations 
-               SET access_token = %s, refresh_token = %s, token_expires_at = %s, updated_at = CURRENT_TIMESTAMP
-               WHERE id = %s""",
-            (new_access_token, new_refresh_token, expires_at, integration['id'])
-        )
-        conn.commit()
-        
-        return {'success': True, 'access_token': new_access_token}
+    if not integration or not integration['refresh_token']:
+        return {'success': False, 'error': 'No refresh token found'}
     
-    finally:
-        conn.close()
+    return registry.refresh(integration)
 
 
 def get_db_connection():
     """Получить подключение к БД"""
     try:
-        return psycopg2.connect(DATABASE_URL)
+        return traced_connect(DATABASE_URL)
     except Exception as e:
         return None
 
@@ -0,0 +1,286 @@
+"""
+Business: Прием вебхуков amoCRM об изменениях сделок и контактов, пакетная обработка очереди
+Args: event - dict с httpMethod, body (application/x-www-form-urlencoded), queryStringParameters
+      (secret - секрет вебхука AMOCRM_WEBHOOK_SECRET; action=process - с заголовком X-Internal-Token)
+      context - object с request_id, function_name
+Returns: HTTP response dict
+"""
+
+import base64
+import hmac
+import json
+import os
+import re
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlparse
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+from admin_tokens import internal_only_response, is_internal_request
+
+DATABASE_URL = os.environ.get('DATABASE_URL', '')
+
+WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', '500'))
+WEBHOOK_MAX_BATCH_SIZE = 5000
+# amoCRM не подписывает вебхуки: секрет передается в URL вебхука (?secret=...)
+AMOCRM_WEBHOOK_SECRET = os.environ.get('AMOCRM_WEBHOOK_SECRET', '').strip()
+WEBHOOK_MAX_ATTEMPTS = 5
+WEBHOOK_LOCK_TIMEOUT_MINUTES = 5
+
+CACHED_ENTITIES = ('leads', 'contacts')
+
+_KEY_PART = re.compile(r'[^\[\]]+')
+
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    method: str = event.get('httpMethod', 'POST')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    params = event.get('queryStringParameters') or {}
+    action = params.get('action', '')
+
+    if action == 'process':
+        if not is_internal_request(event):
+            return internal_only_response()
+        try:
+            batch_size = int(params.get('batch_size', WEBHOOK_BATCH_SIZE))
+        except (TypeError, ValueError):
+            return error_response('batch_size must be an integer')
+        return json_response(process_pending_events(max(1, min(batch_size, WEBHOOK_MAX_BATCH_SIZE))))
+
+    if method != 'POST':
+        return error_response('Method not allowed', 405)
+
+    if not is_trusted_webhook(params):
+        return error_response('Invalid webhook secret', 403)
+
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('utf-8')
+
+    payload = parse_webhook_body(body)
+    events = extract_events(payload)
+
+    if not events:
+        return json_response({'status': 'ok', 'queued': 0})
+
+    queued = enqueue_events(events)
+    if queued is None:
+        return error_response('Database unavailable', 503)
+
+    return json_response({'status': 'ok', 'queued': queued})
+
+
+def is_trusted_webhook(params: Dict[str, str]) -> bool:
+    """Секрет из URL вебхука совпадает с AMOCRM_WEBHOOK_SECRET; без настроенного секрета вебхуки не принимаются"""
+    if not AMOCRM_WEBHOOK_SECRET:
+        print('AMOCRM_WEBHOOK_SECRET is not set: webhook rejected')
+        return False
+    return hmac.compare_digest(str(params.get('secret', '')).encode(), AMOCRM_WEBHOOK_SECRET.encode())
+
+
+def parse_webhook_body(body: str) -> Dict[str, Any]:
+    """Разобрать form-encoded тело вебхука вида leads[update][0][id]=1 во вложенный dict"""
+    result: Dict[str, Any] = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = _KEY_PART.findall(key)
+        if not parts:
+            continue
+        node = result
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                child = {}
+                node[part] = child
+            node = child
+        node[parts[-1]] = value
+    return result
+
+
+def get_account_domain(payload: Dict[str, Any]) -> str:
+    """Определить домен аккаунта amoCRM из блока account (в нижнем регистре, как ключ кэша сделок)"""
+    account = payload.get('account') or {}
+    self_link = (account.get('_links') or {}).get('self', '')
+    if self_link:
+        host = urlparse(self_link).netloc.lower()
+        if host:
+            return host
+    subdomain = str(account.get('subdomain', '')).strip().lower()
+    return f"{subdomain}.amocrm.ru" if subdomain else ''
+
+
+def extract_events(payload: Dict[str, Any]) -> List[Tuple[str, str, str, Optional[int], str]]:
+    """Развернуть вебхук в список событий (домен, сущность, тип события, id, данные)"""
+    domain = get_account_domain(payload)
+    if not domain:
+        return []
+
+    events = []
+    for entity_type, entity_events in payload.items():
+        if entity_type == 'account' or not isinstance(entity_events, dict):
+            continue
+        for event_type, items in entity_events.items():
+            if not isinstance(items, dict):
+                continue
+            for item in items.values():
+                if not isinstance(item, dict):
+                    continue
+                entity_id = item.get('id')
+                events.append((
+                    domain,
+                    entity_type,
+                    event_type,
+                    int(entity_id) if entity_id and str(entity_id).isdigit() else None,
+                    json.dumps(item, ensure_ascii=False)
+                ))
+    return events
+
+
+def enqueue_events(events: List[Tuple[str, str, str, Optional[int], str]]) -> Optional[int]:
+    """Записать события в очередь одним INSERT"""
+    conn = get_db_connection()
+    if not conn:
+        return None
+
+    try:
+        cursor = conn.cursor()
+        execute_values(
+            cursor,
+            """INSERT INTO amocrm_webhook_events (account_domain, entity_type, event_type, entity_id, payload)
+               VALUES %s""",
+            events,
+            page_size=1000
+        )
+        conn.commit()
+        return len(events)
+
+    finally:
+        conn.close()
+
+
+def process_pending_events(batch_size: int) -> Dict[str, Any]:
+    """Обработать очередную пачку событий: сбросить кэш сущностей и связанных сделок"""
+    conn = get_db_connection()
+    if not conn:
+        return {'success': False, 'error': 'Database connection failed'}
+
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(
+            """UPDATE amocrm_webhook_events
+               SET status = 'processing', attempts = attempts + 1, locked_at = CURRENT_TIMESTAMP
+               WHERE id IN (
+                   SELECT id FROM amocrm_webhook_events
+                   WHERE status = 'pending'
+                      OR (status = 'processing' AND locked_at < CURRENT_TIMESTAMP - make_interval(mins => %s))
+                   ORDER BY id
+                   LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+               )
+               RETURNING id, account_domain, entity_type, event_type, entity_id, attempts""",
+            (WEBHOOK_LOCK_TIMEOUT_MINUTES, batch_size)
+        )
+        claimed = cursor.fetchall()
+        conn.commit()
+
+        if not claimed:
+            return {'success': True, 'processed': 0}
+
+        event_ids = [row['id'] for row in claimed]
+
+        try:
+            invalidated = invalidate_cached_entities(cursor, claimed)
+            cursor.execute(
+                "UPDATE amocrm_webhook_events SET status = 'done', processed_at = CURRENT_TIMESTAMP, last_error = NULL WHERE id = ANY(%s)",
+                (event_ids,)
+            )
+            conn.commit()
+
+        except Exception as e:
+            conn.rollback()
+            cursor.execute(
+                """UPDATE amocrm_webhook_events
+                   SET status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END, last_error = %s
+                   WHERE id = ANY(%s)""",
+                (WEBHOOK_MAX_ATTEMPTS, str(e), event_ids)
+            )
+            conn.commit()
+            return {'success': False, 'error': str(e), 'claimed': len(event_ids)}
+
+        return {'success': True, 'processed': len(event_ids), 'invalidated': invalidated}
+
+    finally:
+        conn.close()
+
+
+def invalidate_cached_entities(cursor, events: List[Dict[str, Any]]) -> int:
+    """Удалить из кэша измененные сделки и контакты, а также сделки, ссылающиеся на измененные контакты"""
+    keys = {
+        (row['account_domain'], row['entity_type'], row['entity_id'])
+        for row in events
+        if row['entity_type'] in CACHED_ENTITIES and row['entity_id'] is not None
+    }
+    if not keys:
+        return 0
+
+    result = execute_values(
+        cursor,
+        """DELETE FROM amocrm_entity_cache c
+           USING (VALUES %s) AS v(account_domain, entity_type, entity_id)
+           WHERE c.account_domain = v.account_domain
+             AND (
+                 (c.entity_type = v.entity_type AND c.entity_id = v.entity_id)
+                 OR (v.entity_type = 'contacts' AND c.entity_type = 'leads' AND c.linked_contact_id = v.entity_id)
+             )
+           RETURNING 1""",
+        sorted(keys),
+        template='(%s, %s, %s::bigint)',
+        page_size=1000,
+        fetch=True
+    )
+    return len(result)
+
+
+def get_db_connection():
+    """Получить подключение к БД"""
+    try:
+        return psycopg2.connect(DATABASE_URL)
+    except Exception as e:
+        return None
+
+
+def json_response(data: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON ответ"""
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(data),
+        'isBase64Encoded': False
+    }
+
+
+def error_response(message: str, status_code: int = 400) -> Dict[str, Any]:
+    """Ответ с ошибкой"""
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'error': message}),
+        'isBase64Encoded': False
+    }
@@ -1,9 +1,12 @@
+import hashlib
 import json
 import os
+import http.client
+import time
+from urllib.parse import urlparse
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 import random
-from decimal import Decimal
 
 try:
     import psycopg2
@@ -12,24 +15,42 @@ try:
 except ImportError:
     DB_AVAILABLE = False
 
+from admin_tokens import INTERNAL_TOKEN, is_admin_request, unauthorized_response
+import db_trace
+import metrics
+from rate_limiter import Rule, limiter, too_many_requests
+import profiler
+from router import ANY_ACTION, Request, Router, error_response, json_response, text_response
+
+BOOKING_IP_RULE = Rule('booking-ip', 30, 600)
+BOOKING_PHONE_RULE = Rule('booking-phone', 5, 3600)
+MANAGE_IP_RULE = Rule('manage-ip', 30, 600)
+
+SEND_EMAIL_URL = os.environ.get('SEND_EMAIL_URL', 'https://functions.poehali.dev/96f87426-ceea-4c3f-8145-2924f5b55361')
+EMAIL_KICK_TIMEOUT_SECONDS = float(os.environ.get('EMAIL_KICK_TIMEOUT_SECONDS', '1'))
+
+SERVICES = [
+    {'id': '1', 'name': 'Терапевт', 'price': 2500, 'duration': 30},
+    {'id': '2', 'name': 'Кардиолог', 'price': 3500, 'duration': 45},
+    {'id': '3', 'name': 'УЗИ', 'price': 2000, 'duration': 30},
+    {'id': '4', 'name': 'Анализы крови', 'price': 1500, 'duration': 15},
+    {'id': '5', 'name': 'Эндокринолог', 'price': 3000, 'duration': 40}
+]
+
+DOCTORS = [
+    {'id': '1', 'name': 'Иванов Иван Иванович', 'specialization': 'Терапевт', 'experience': 15},
+    {'id': '2', 'name': 'Петрова Мария Сергеевна', 'specialization': 'Кардиолог', 'experience': 12},
+    {'id': '3', 'name': 'Сидоров Петр Александрович', 'specialization': 'Терапевт', 'experience': 8},
+    {'id': '4', 'name': 'Козлова Анна Дмитриевна', 'specialization': 'Эндокринолог', 'experience': 10}
+]
+
 def get_db_connection():
     if not DB_AVAILABLE:
         return None
     database_url = os.environ.get('DATABASE_URL')
     if not database_url:
         return None
-    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
-
-def convert_decimals(obj):
-    if isinstance(obj, list):
-        return [convert_decimals(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {key: convert_decimals(value) for key, value in obj.items()}
-    elif isinstance(obj, Decimal):
-        return float(obj)
-    elif isinstance(obj, datetime):
-        return obj.isoformat()
-    return obj
+    return db_trace.connect(database_url, cursor_factory=RealDictCursor)
 
 def log_action(conn, appointment_id: str, action: str, old_data: Optional[Dict] = None, new_data: Optional[Dict] = None, user_ip: str = ''):
     if not conn:
@@ -37,916 +58,668 @@ def log_action(conn, appointment_id: str, action: str, old_data: Optional[Dict]
     cursor = conn.cursor()
     cursor.execute(
         "INSERT INTO t_p56372141_online_booking_integ.appointment_logs (appointment_id, action, old_data, new_data, user_ip) VALUES (%s, %s, %s, %s, %s)",
-        (appointment_id, action, json.dumps(old_data) if old_data else None, json.dumps(new_data) if new_data else None, user_ip)
+        (appointment_id, action, json.dumps(old_data, default=str) if old_data else None, json.dumps(new_data, default=str) if new_data else None, user_ip)
     )
     conn.commit()
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    '''
-    Business: API для системы онлайн-записи в клинику с управлением записями
-    Args: event с httpMethod, queryStringParameters, body
-    Returns: JSON с данными услуг, врачей, слотов, записей или результатом операций
-    '''
-    method: str = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Admin-Key',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': ''
-        }
+def enqueue_email(conn, email_type: str, appointment: Dict[str, Any], version: str = '') -> bool:
+    recipient = appointment.get('patient_email')
+    if not recipient:
+        return False
+    payload = {
+        'appointment_id': appointment.get('appointment_id'),
+        'patient_name': appointment.get('patient_name'),
+        'patient_email': recipient,
+        'service_name': appointment.get('service_name'),
+        'service_price': appointment.get('service_price'),
+        'doctor_name': appointment.get('doctor_name'),
+        'appointment_date': str(appointment.get('appointment_date') or ''),
+        'appointment_time': str(appointment.get('appointment_time') or '')
+    }
+    dedupe_key = hashlib.sha256(
+        '|'.join([str(payload['appointment_id']), email_type, recipient.lower(), version]).encode('utf-8')
+    ).hexdigest()
+    cursor = conn.cursor()
+    cursor.execute(
+        """INSERT INTO t_p56372141_online_booking_integ.email_outbox (appointment_id, email_type, recipient, payload, dedupe_key)
+           VALUES (%s, %s, %s, %s, %s)
+           ON CONFLICT (dedupe_key) DO NOTHING""",
+        (payload['appointment_id'], email_type, recipient, json.dumps(payload, ensure_ascii=False), dedupe_key)
+    )
+    return cursor.rowcount > 0
+
+def kick_email_dispatch():
+    """Попросить send-email разобрать email_outbox сразу после коммита: запрос только отправляется,
+    ответ (время SMTP) не ждем. Ошибка не влияет на ответ - письмо остается в очереди до следующего dispatch"""
+    if not SEND_EMAIL_URL or not INTERNAL_TOKEN:
+        print("[WARN] SEND_EMAIL_URL or INTERNAL_API_TOKEN not set, email_outbox waits for scheduled dispatch")
+        return
+    url = urlparse(SEND_EMAIL_URL)
+    connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+    kick = connection_class(url.netloc, timeout=EMAIL_KICK_TIMEOUT_SECONDS)
+    started = time.perf_counter()
+    outcome = 'ok'
+    try:
+        kick.request(
+            'POST', url.path or '/', body=json.dumps({'action': 'dispatch'}),
+            headers={'Content-Type': 'application/json', 'X-Internal-Token': INTERNAL_TOKEN}
+        )
+    except (OSError, http.client.HTTPException) as e:
+        outcome = 'error'
+        print(f"[WARN] send-email dispatch kick failed: {e}")
+    finally:
+        kick.close()
+    metrics.observe_upstream('send-email', 'dispatch', time.perf_counter() - started, outcome)
+
+def require_admin(request: Request) -> Optional[Dict[str, Any]]:
+    if not is_admin_request(request.event):
+        return unauthorized_response()
+    return None
+
+def limit_booking(request: Request) -> Optional[Dict[str, Any]]:
+    decision = limiter.check([(BOOKING_IP_RULE, request.user_ip), (BOOKING_PHONE_RULE, request.body.get('patientPhone'))])
+    return None if decision.allowed else too_many_requests(decision)
+
+def limit_glass_order(request: Request) -> Optional[Dict[str, Any]]:
+    order = request.body.get('order') or {}
+    phone = order.get('customer_phone') if isinstance(order, dict) else None
+    decision = limiter.check([(BOOKING_IP_RULE, request.user_ip), (BOOKING_PHONE_RULE, phone)])
+    return None if decision.allowed else too_many_requests(decision)
+
+def limit_manage(request: Request) -> Optional[Dict[str, Any]]:
+    decision = limiter.check([(MANAGE_IP_RULE, request.user_ip)])
+    return None if decision.allowed else too_many_requests(decision)
+
+metrics.init('clinic-api')
+metrics.register_collector('rate_limiter_events_total', 'counter', 'Rate limiter decisions and shared counter errors',
+                           ('event',), lambda: {(name,): value for name, value in limiter.stats.items()})
+
+# запись, перенос и отмена приема не передают action: любой action без своего маршрута ведет на них
+router = Router(get_db_connection, can_profile=is_admin_request)
+
+@router.route('GET', 'services')
+def get_services(request: Request) -> Dict[str, Any]:
+    return json_response({'services': SERVICES})
+
+@router.route('GET', 'doctors')
+def get_doctors(request: Request) -> Dict[str, Any]:
+    return json_response({'doctors': DOCTORS})
+
+@router.route('GET', 'slots')
+def get_slots(request: Request) -> Dict[str, Any]:
+    doctor_id = request.params.get('doctorId', '')
+    date_str = request.params.get('date', '')
+    conn = request.optional_conn() if date_str else None
     
-    path = event.get('queryStringParameters', {}).get('action', '')
-    user_ip = event.get('requestContext', {}).get('identity', {}).get('sourceIp', '')
-    
-    conn = get_db_connection()
-    
-    if method == 'GET':
-        if path == 'services':
-            services = [
-                {'id': '1', 'name': 'Терапевт', 'price': 2500, 'duration': 30},
-                {'id': '2', 'name': 'Кардиолог', 'price': 3500, 'duration': 45},
-                {'id': '3', 'name': 'УЗИ', 'price': 2000, 'duration': 30},
-                {'id': '4', 'name': 'Анализы крови', 'price': 1500, 'duration': 15},
-                {'id': '5', 'name': 'Эндокринолог', 'price': 3000, 'duration': 40}
-            ]
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'services': services})
-            }
-        
-        elif path == 'doctors':
-            doctors = [
-                {'id': '1', 'name': 'Иванов Иван Иванович', 'specialization': 'Терапевт', 'experience': 15},
-                {'id': '2', 'name': 'Петрова Мария Сергеевна', 'specialization': 'Кардиолог', 'experience': 12},
-                {'id': '3', 'name': 'Сидоров Петр Александрович', 'specialization': 'Терапевт', 'experience': 8},
-                {'id': '4', 'name': 'Козлова Анна Дмитриевна', 'specialization': 'Эндокринолог', 'experience': 10}
-            ]
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'doctors': doctors})
-            }
-        
-        elif path == 'slots':
-            doctor_id = event.get('queryStringParameters', {}).get('doctorId', '')
-            date_str = event.get('queryStringParameters', {}).get('date', '')
-            
-            slots = []
-            for hour in range(9, 18):
-                for minute in [0, 30]:
-                    time_str = f"{hour:02d}:{minute:02d}"
-                    
-                    is_booked = False
-                    if conn and date_str:
-                        cursor = conn.cursor()
-                        cursor.execute(
-                            "SELECT COUNT(*) as cnt FROM t_p56372141_online_booking_integ.appointments WHERE doctor_id = %s AND appointment_date = %s AND appointment_time = %s AND status = 'active'",
-                            (doctor_id, date_str, time_str)
-                        )
-                        result = cursor.fetchone()
-                        is_booked = result['cnt'] > 0 if result else False
-                    
-                    is_available = not is_booked and random.choice([True, True, True, False])
-                    slots.append({
-                        'time': time_str,
-                        'available': is_available
-                    })
+    slots = []
+    for hour in range(9, 18):
+        for minute in [0, 30]:
+            time_str = f"{hour:02d}:{minute:02d}"
             
+            is_booked = False
             if conn:
-                conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'slots': slots})
-            }
-        
-        elif path == 'appointment':
-            appointment_id = event.get('queryStringParameters', {}).get('id', '')
-            
-            if not conn:
-                return {
-                    'statusCode': 503,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Database unavailable'})
-                }
-            
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT * FROM t_p56372141_online_booking_integ.appointments WHERE appointment_id = %s",
-                (appointment_id,)
-            )
-            appointment = cursor.fetchone()
-            conn.close()
-            
-            if not appointment:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Запись не найдена'})
-                }
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'appointment': dict(appointment)})
-            }
-        
-        elif path == 'stats':
-            if not conn:
-                return {
-                    'statusCode': 503,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Database unavailable'})
-                }
-            
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT COUNT(*) as total FROM t_p56372141_online_booking_integ.appointments WHERE status = 'active'")
-            active_count = cursor.fetchone()['total']
-            
-            cursor.execute("SELECT COUNT(*) as total FROM t_p56372141_online_booking_integ.appointments WHERE status = 'cancelled'")
-            cancelled_count = cursor.fetchone()['total']
-            
-            cursor.execute("SELECT COUNT(*) as total FROM t_p56372141_online_booking_integ.appointments WHERE status = 'completed'")
-            completed_count = cursor.fetchone()['total']
-            
-            cursor.execute("SELECT COUNT(*) as total FROM t_p56372141_online_booking_integ.appointments WHERE appointment_date = CURRENT_DATE AND status = 'active'")
-            today_count = cursor.fetchone()['total']
-            
-            cursor.execute("SELECT service_name, COUNT(*) as cnt FROM t_p56372141_online_booking_integ.appointments WHERE status = 'active' GROUP BY service_name ORDER BY cnt DESC LIMIT 5")
-            popular_services = [dict(row) for row in cursor.fetchall()]
-            
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({
-                    'stats': {
-                        'active': active_count,
-                        'cancelled': cancelled_count,
-                        'completed': completed_count,
-                        'today': today_count,
-                        'popular_services': popular_services
-                    }
-                })
-            }
-        
-        elif path == 'logs':
-            if not conn:
-                return {
-                    'statusCode': 503,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Database unavailable'})
-                }
-            
-            limit = int(event.get('queryStringParameters', {}).get('limit', '100'))
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT * FROM t_p56372141_online_booking_integ.appointment_logs ORDER BY created_at DESC LIMIT %s",
-                (limit,)
-            )
-            logs_raw = cursor.fetchall()
-            logs = []
-            for row in logs_raw:
-                log = dict(row)
-                if 'created_at' in log and log['created_at']:
-                    log['created_at'] = log['created_at'].isoformat()
-                logs.append(log)
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'logs': logs})
-            }
-        
-        elif path == 'appointments':
-            if not conn:
-                return {
-                    'statusCode': 503,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Database unavailable'})
-                }
-            
-            status = event.get('queryStringParameters', {}).get('status', 'active')
-            limit = int(event.get('queryStringParameters', {}).get('limit', '50'))
-            
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT * FROM t_p56372141_online_booking_integ.appointments WHERE status = %s ORDER BY appointment_date DESC, appointment_time DESC LIMIT %s",
-                (status, limit)
-            )
-            appointments_raw = cursor.fetchall()
-            appointments = []
-            for row in appointments_raw:
-                apt = dict(row)
-                if 'appointment_date' in apt and apt['appointment_date']:
-                    apt['appointment_date'] = apt['appointment_date'].isoformat()
-                if 'created_at' in apt and apt['created_at']:
-                    apt['created_at'] = apt['created_at'].isoformat()
-                if 'updated_at' in apt and apt['updated_at']:
-                    apt['updated_at'] = apt['updated_at'].isoformat()
-                appointments.append(apt)
-            conn.close()
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT COUNT(*) as cnt FROM t_p56372141_online_booking_integ.appointments WHERE doctor_id = %s AND appointment_date = %s AND appointment_time = %s AND status = 'active'",
+                    (doctor_id, date_str, time_str)
+                )
+                result = cursor.fetchone()
+                is_booked = result['cnt'] > 0 if result else False
             
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'appointments': appointments})
-            }
-    
-    elif method == 'POST':
-        body_data = json.loads(event.get('body', '{}'))
-        
-        if not conn:
-            return {
-                'statusCode': 503,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'error': 'Database unavailable'})
-            }
-        
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT COUNT(*) as cnt FROM t_p56372141_online_booking_integ.appointments WHERE doctor_id = %s AND appointment_date = %s AND appointment_time = %s AND status = 'active'",
-            (body_data.get('doctorId'), body_data.get('date'), body_data.get('time'))
-        )
-        result = cursor.fetchone()
-        
-        if result['cnt'] > 0:
-            conn.close()
-            return {
-                'statusCode': 409,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'error': 'Выбранное время уже занято'})
-            }
-        
-        appointment_id = f"APP{random.randint(10000, 99999)}"
-        
-        cursor.execute(
-            """INSERT INTO t_p56372141_online_booking_integ.appointments 
-            (appointment_id, service_id, service_name, service_price, doctor_id, doctor_name, 
-             appointment_date, appointment_time, patient_name, patient_phone, patient_email, status) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'active')""",
-            (appointment_id, body_data.get('serviceId'), body_data.get('serviceName', ''),
-             body_data.get('servicePrice', 0), body_data.get('doctorId'), body_data.get('doctorName', ''),
-             body_data.get('date'), body_data.get('time'), body_data.get('patientName'),
-             body_data.get('patientPhone'), body_data.get('patientEmail'))
-        )
-        conn.commit()
-        
-        log_action(conn, appointment_id, 'created', None, body_data, user_ip)
-        conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({
-                'success': True,
-                'appointmentId': appointment_id,
-                'message': 'Запись успешно создана'
+            is_available = not is_booked and random.choice([True, True, True, False])
+            slots.append({
+                'time': time_str,
+                'available': is_available
             })
-        }
     
-    elif method == 'PUT':
-        body_data = json.loads(event.get('body', '{}'))
-        appointment_id = body_data.get('appointmentId')
-        
-        if not conn:
-            return {
-                'statusCode': 503,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'error': 'Database unavailable'})
-            }
-        
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM t_p56372141_online_booking_integ.appointments WHERE appointment_id = %s", (appointment_id,))
-        old_appointment = cursor.fetchone()
-        
-        if not old_appointment:
-            conn.close()
-            return {
-                'statusCode': 404,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'error': 'Запись не найдена'})
-            }
-        
-        if body_data.get('newDate') and body_data.get('newTime'):
-            cursor.execute(
-                "SELECT COUNT(*) as cnt FROM t_p56372141_online_booking_integ.appointments WHERE doctor_id = %s AND appointment_date = %s AND appointment_time = %s AND status = 'active' AND appointment_id != %s",
-                (old_appointment['doctor_id'], body_data['newDate'], body_data['newTime'], appointment_id)
-            )
-            result = cursor.fetchone()
-            
-            if result['cnt'] > 0:
-                conn.close()
-                return {
-                    'statusCode': 409,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Новое время уже занято'})
-                }
-            
-            cursor.execute(
-                "UPDATE t_p56372141_online_booking_integ.appointments SET appointment_date = %s, appointment_time = %s, updated_at = CURRENT_TIMESTAMP WHERE appointment_id = %s",
-                (body_data['newDate'], body_data['newTime'], appointment_id)
-            )
-            conn.commit()
-            
-            log_action(conn, appointment_id, 'rescheduled', dict(old_appointment), body_data, user_ip)
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'success': True, 'message': 'Запись успешно перенесена'})
-            }
-        
-        conn.close()
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': 'Неверные параметры'})
-        }
+    return json_response({'slots': slots})
+
+@router.route('GET', 'appointment')
+def get_appointment(request: Request) -> Dict[str, Any]:
+    appointment_id = request.params.get('id', '')
     
-    elif method == 'DELETE':
-        appointment_id = event.get('queryStringParameters', {}).get('id', '')
-        
-        if not conn:
-            return {
-                'statusCode': 503,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'error': 'Database unavailable'})
-            }
-        
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM t_p56372141_online_booking_integ.appointments WHERE appointment_id = %s", (appointment_id,))
-        old_appointment = cursor.fetchone()
-        
-        if not old_appointment:
-            conn.close()
-            return {
-                'statusCode': 404,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'error': 'Запись не найдена'})
-            }
-        
-        cursor.execute(
-            "UPDATE t_p56372141_online_booking_integ.appointments SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP WHERE appointment_id = %s",
-            (appointment_id,)
-        )
-        conn.commit()
-        
-        log_action(conn, appointment_id, 'cancelled', dict(old_appointment), None, user_ip)
-        conn.close()
-        
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'success': True, 'message': 'Запись успешно отменена'})
+    cursor = request.conn.cursor()
+    cursor.execute(
+        "SELECT * FROM t_p56372141_online_booking_integ.appointments WHERE appointment_id = %s",
+        (appointment_id,)
+    )
+    appointment = cursor.fetchone()
+    
+    if not appointment:
+        return error_response(404, 'Запись не найдена')
+    
+    return json_response({'appointment': appointment})
+
+@router.route('GET', 'stats', require_admin)
+def get_stats(request: Request) -> Dict[str, Any]:
+    cursor = request.conn.cursor()
+    
+    cursor.execute("SELECT COUNT(*) as total FROM t_p56372141_online_booking_integ.appointments WHERE status = 'active'")
+    active_count = cursor.fetchone()['total']
+    
+    cursor.execute("SELECT COUNT(*) as total FROM t_p56372141_online_booking_integ.appointments WHERE status = 'cancelled'")
+    cancelled_count = cursor.fetchone()['total']
+    
+    cursor.execute("SELECT COUNT(*) as total FROM t_p56372141_online_booking_integ.appointments WHERE status = 'completed'")
+    completed_count = cursor.fetchone()['total']
+    
+    cursor.execute("SELECT COUNT(*) as total FROM t_p56372141_online_booking_integ.appointments WHERE appointment_date = CURRENT_DATE AND status = 'active'")
+    today_count = cursor.fetchone()['total']
+    
+    cursor.execute("SELECT service_name, COUNT(*) as cnt FROM t_p56372141_online_booking_integ.appointments WHERE status = 'active' GROUP BY service_name ORDER BY cnt DESC LIMIT 5")
+    popular_services = [dict(row) for row in cursor.fetchall()]
+    
+    return json_response({
+        'stats': {
+            'active': active_count,
+            'cancelled': cancelled_count,
+            'completed': completed_count,
+            'today': today_count,
+            'popular_services': popular_services
         }
+    })
+
+@router.route('GET', 'logs', require_admin)
+def get_logs(request: Request) -> Dict[str, Any]:
+    limit = int(request.params.get('limit', '100'))
+    cursor = request.conn.cursor()
+    cursor.execute(
+        "SELECT * FROM t_p56372141_online_booking_integ.appointment_logs ORDER BY created_at DESC LIMIT %s",
+        (limit,)
+    )
     
-    if path == 'glass_packages':
-        if method == 'GET':
-            if not conn:
-                return {
-                    'statusCode': 503,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Database unavailable'})
-                }
-            
-            active_only = event.get('queryStringParameters', {}).get('active_only', '') == 'true'
-            with_components = event.get('queryStringParameters', {}).get('with_components', '') == 'true'
-            cursor = conn.cursor()
-            
-            if active_only:
-                cursor.execute("SELECT * FROM t_p56372141_online_booking_integ.glass_packages WHERE is_active = true ORDER BY package_name")
-            else:
-                cursor.execute("SELECT * FROM t_p56372141_online_booking_integ.glass_packages ORDER BY package_name")
-            
-            packages = [dict(row) for row in cursor.fetchall()]
-            
-            if with_components:
-                for pkg in packages:
-                    cursor.execute("""
-                        SELECT c.*, pc.quantity, pc.is_required 
-                        FROM t_p56372141_online_booking_integ.glass_components c
-                        JOIN t_p56372141_online_booking_integ.package_components pc ON c.component_id = pc.component_id
-                        WHERE pc.package_id = %s AND c.is_active = true
-                        ORDER BY c.component_type, c.component_name
-                    """, (pkg['package_id'],))
-                    pkg['components'] = [dict(row) for row in cursor.fetchall()]
-            
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps(convert_decimals({'packages': packages}))
-            }
-    
-    if path == 'glass_package':
-        if method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            package = body_data.get('package', {})
-            
-            if not conn:
-                return {
-                    'statusCode': 503,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Database unavailable'})
-                }
-            
-            cursor = conn.cursor()
-            cursor.execute(
-                """INSERT INTO t_p56372141_online_booking_integ.glass_packages 
-                (package_name, package_article, product_type, glass_type, glass_thickness, glass_price_per_sqm, 
-                hardware_set, hardware_price, markup_percent, installation_price, description, sketch_image_url, is_active,
-                has_door, default_partition_height, default_partition_width, default_door_height, default_door_width, sketch_svg)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING package_id""",
-                (package.get('package_name'), package.get('package_article', ''),
-                 package.get('product_type'), package.get('glass_type'),
-                 package.get('glass_thickness'), package.get('glass_price_per_sqm'),
-                 package.get('hardware_set'), package.get('hardware_price'),
-                 package.get('markup_percent'), package.get('installation_price'),
-                 package.get('description'), package.get('sketch_image_url', ''),
-                 package.get('is_active', True),
-                 package.get('has_door', False), package.get('default_partition_height', 1900),
-                 package.get('default_partition_width', 1000), package.get('default_door_height', 1900),
-                 package.get('default_door_width', 800), package.get('sketch_svg', ''))
-            )
-            package_id = cursor.fetchone()['package_id']
-            conn.commit()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'success': True, 'package_id': package_id})
-            }
-        
-        elif method == 'PUT':
-            body_data = json.loads(event.get('body', '{}'))
-            package = body_data.get('package', {})
-            
-            if not conn:
-                return {
-                    'statusCode': 503,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Database unavailable'})
-                }
-            
-            cursor = conn.cursor()
-            cursor.execute(
-                """UPDATE t_p56372141_online_booking_integ.glass_packages 
-                SET package_name = %s, package_article = %s, product_type = %s, glass_type = %s, glass_thickness = %s,
-                glass_price_per_sqm = %s, hardware_set = %s, hardware_price = %s,
-                markup_percent = %s, installation_price = %s, description = %s, sketch_image_url = %s,
-                is_active = %s, has_door = %s, default_partition_height = %s, default_partition_width = %s,
-                default_door_height = %s, default_door_width = %s, sketch_svg = %s, updated_at = CURRENT_TIMESTAMP
-                WHERE package_id = %s""",
-                (package.get('package_name'), package.get('package_article', ''),
-                 package.get('product_type'), package.get('glass_type'),
-                 package.get('glass_thickness'), package.get('glass_price_per_sqm'),
-                 package.get('hardware_set'), package.get('hardware_price'),
-                 package.get('markup_percent'), package.get('installation_price'),
-                 package.get('description'), package.get('sketch_image_url', ''),
-                 package.get('is_active', True),
-                 package.get('has_door', False), package.get('default_partition_height', 1900),
-                 package.get('default_partition_width', 1000), package.get('default_door_height', 1900),
-                 package.get('default_door_width', 800), package.get('sketch_svg', ''),
-                 package.get('package_id'))
-            )
-            conn.commit()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'success': True})
-            }
-        
-        elif method == 'DELETE':
-            package_id = event.get('queryStringParameters', {}).get('id', '')
-            
-            if not conn:
-                return {
-                    'statusCode': 503,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Database unavailable'})
-                }
-            
-            cursor = conn.cursor()
-            cursor.execute(
-                "DELETE FROM t_p56372141_online_booking_integ.glass_packages WHERE package_id = %s",
-                (package_id,)
-            )
-            conn.commit()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'success': True})
-            }
-    
-    if path == 'package_components':
-        if method == 'GET':
-            package_id = event.get('queryStringParameters', {}).get('package_id', '')
-            
-            if not conn:
-                return {
-                    'statusCode': 503,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Database unavailable'})
-                }
-            
-            cursor = conn.cursor()
+    return json_response({'logs': cursor.fetchall()})
+
+@router.route('GET', 'profile', require_admin)
+def get_profile(request: Request) -> Dict[str, Any]:
+    route = request.params.get('route', '')
+    export = request.params.get('format', 'summary')
+    if export == 'collapsed':
+        return text_response(profiler.export_collapsed(route))
+    if export == 'speedscope':
+        return json_response(profiler.export_speedscope(route))
+    if export == 'pstats':
+        return text_response(profiler.export_pstats(route))
+    return json_response({
+        'mode': profiler.PROFILE_MODE,
+        'sample_rate': profiler.PROFILE_SAMPLE_RATE,
+        'routes': profiler.summary()
+    })
+
+@router.route('DELETE', 'profile', require_admin)
+def reset_profile(request: Request) -> Dict[str, Any]:
+    profiler.reset()
+    return json_response({'success': True})
+
+@router.route('GET', 'metrics')
+def get_metrics(request: Request) -> Dict[str, Any]:
+    # Prometheus ходит с METRICS_TOKEN, из админки - с токеном админа
+    return metrics.metrics_response(request.event, allowed=is_admin_request(request.event))
+
+@router.route('GET', 'appointments', require_admin)
+def get_appointments(request: Request) -> Dict[str, Any]:
+    status = request.params.get('status', 'active')
+    limit = int(request.params.get('limit', '50'))
+    
+    cursor = request.conn.cursor()
+    cursor.execute(
+        "SELECT * FROM t_p56372141_online_booking_integ.appointments WHERE status = %s ORDER BY appointment_date DESC, appointment_time DESC LIMIT %s",
+        (status, limit)
+    )
+    
+    return json_response({'appointments': cursor.fetchall()})
+
+@router.route('POST', ANY_ACTION, limit_booking)
+def create_appointment(request: Request) -> Dict[str, Any]:
+    body_data = request.body
+    conn = request.conn
+    
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT COUNT(*) as cnt FROM t_p56372141_online_booking_integ.appointments WHERE doctor_id = %s AND appointment_date = %s AND appointment_time = %s AND status = 'active'",
+        (body_data.get('doctorId'), body_data.get('date'), body_data.get('time'))
+    )
+    result = cursor.fetchone()
+    
+    if result['cnt'] > 0:
+        return error_response(409, 'Выбранное время уже занято')
+    
+    appointment_id = f"APP{random.randint(10000, 99999)}"
+    
+    cursor.execute(
+        """INSERT INTO t_p56372141_online_booking_integ.appointments
+        (appointment_id, service_id, service_name, service_price, doctor_id, doctor_name,
+         appointment_date, appointment_time, patient_name, patient_phone, patient_email, status)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'active')""",
+        (appointment_id, body_data.get('serviceId'), body_data.get('serviceName', ''),
+         body_data.get('servicePrice', 0), body_data.get('doctorId'), body_data.get('doctorName', ''),
+         body_data.get('date'), body_data.get('time'), body_data.get('patientName'),
+         body_data.get('patientPhone'), body_data.get('patientEmail'))
+    )
+    queued = enqueue_email(conn, 'created', {
+        'appointment_id': appointment_id,
+        'patient_name': body_data.get('patientName'),
+        'patient_email': body_data.get('patientEmail'),
+        'service_name': body_data.get('serviceName', ''),
+        'service_price': body_data.get('servicePrice', 0),
+        'doctor_name': body_data.get('doctorName', ''),
+        'appointment_date': body_data.get('date'),
+        'appointment_time': body_data.get('time')
+    })
+    conn.commit()
+    if queued:
+        kick_email_dispatch()
+    
+    log_action(conn, appointment_id, 'created', None, body_data, request.user_ip)
+    
+    return json_response({
+        'success': True,
+        'appointmentId': appointment_id,
+        'message': 'Запись успешно создана'
+    })
+
+@router.route('PUT', ANY_ACTION, limit_manage)
+def reschedule_appointment(request: Request) -> Dict[str, Any]:
+    body_data = request.body
+    appointment_id = body_data.get('appointmentId')
+    conn = request.conn
+    
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM t_p56372141_online_booking_integ.appointments WHERE appointment_id = %s", (appointment_id,))
+    old_appointment = cursor.fetchone()
+    
+    if not old_appointment:
+        return error_response(404, 'Запись не найдена')
+    
+    if not (body_data.get('newDate') and body_data.get('newTime')):
+        return error_response(400, 'Неверные параметры')
+    
+    cursor.execute(
+        "SELECT COUNT(*) as cnt FROM t_p56372141_online_booking_integ.appointments WHERE doctor_id = %s AND appointment_date = %s AND appointment_time = %s AND status = 'active' AND appointment_id != %s",
+        (old_appointment['doctor_id'], body_data['newDate'], body_data['newTime'], appointment_id)
+    )
+    result = cursor.fetchone()
+    
+    if result['cnt'] > 0:
+        return error_response(409, 'Новое время уже занято')
+    
+    cursor.execute(
+        "UPDATE t_p56372141_online_booking_integ.appointments SET appointment_date = %s, appointment_time = %s, reminder_queued_at = NULL, updated_at = CURRENT_TIMESTAMP WHERE appointment_id = %s",
+        (body_data['newDate'], body_data['newTime'], appointment_id)
+    )
+    queued = enqueue_email(
+        conn, 'rescheduled',
+        dict(old_appointment, appointment_date=body_data['newDate'], appointment_time=body_data['newTime']),
+        f"{body_data['newDate']} {body_data['newTime']}"
+    )
+    conn.commit()
+    if queued:
+        kick_email_dispatch()
+    
+    log_action(conn, appointment_id, 'rescheduled', dict(old_appointment), body_data, request.user_ip)
+    
+    return json_response({'success': True, 'message': 'Запись успешно перенесена'})
+
+@router.route('DELETE', ANY_ACTION, limit_manage)
+def cancel_appointment(request: Request) -> Dict[str, Any]:
+    appointment_id = request.params.get('id', '')
+    conn = request.conn
+    
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM t_p56372141_online_booking_integ.appointments WHERE appointment_id = %s", (appointment_id,))
+    old_appointment = cursor.fetchone()
+    
+    if not old_appointment:
+        return error_response(404, 'Запись не найдена')
+    
+    cursor.execute(
+        "UPDATE t_p56372141_online_booking_integ.appointments SET status = 'cancelled', updated_at = CURRENT_TIMESTAMP WHERE appointment_id = %s",
+        (appointment_id,)
+    )
+    queued = enqueue_email(conn, 'cancelled', dict(old_appointment))
+    conn.commit()
+    if queued:
+        kick_email_dispatch()
+    
+    log_action(conn, appointment_id, 'cancelled', dict(old_appointment), None, request.user_ip)
+    
+    return json_response({'success': True, 'message': 'Запись успешно отменена'})
+
+# каталог одинаков для всех посетителей: сжатые ответы маршрутов с cacheable=True запоминаются
+@router.route('GET', 'glass_packages', cacheable=True)
+def get_glass_packages(request: Request) -> Dict[str, Any]:
+    active_only = request.params.get('active_only', '') == 'true'
+    with_components = request.params.get('with_components', '') == 'true'
+    cursor = request.conn.cursor()
+    
+    if active_only:
+        cursor.execute("SELECT * FROM t_p56372141_online_booking_integ.glass_packages WHERE is_active = true ORDER BY package_name")
+    else:
+        cursor.execute("SELECT * FROM t_p56372141_online_booking_integ.glass_packages ORDER BY package_name")
+    
+    packages = [dict(row) for row in cursor.fetchall()]
+    
+    if with_components:
+        for pkg in packages:
             cursor.execute("""
-                SELECT 
-                    pc.id, 
-                    pc.package_id,
-                    pc.component_id,
-                    pc.quantity,
-                    pc.is_required,
-                    c.component_name,
-                    c.component_type,
-                    c.article,
-                    c.characteristics,
-                    c.unit,
-                    c.price_per_unit
-                FROM t_p56372141_online_booking_integ.package_components pc
-                JOIN t_p56372141_online_booking_integ.glass_components c ON pc.component_id = c.component_id
+                SELECT c.*, pc.quantity, pc.is_required
+                FROM t_p56372141_online_booking_integ.glass_components c
+                JOIN t_p56372141_online_booking_integ.package_components pc ON c.component_id = pc.component_id
                 WHERE pc.package_id = %s AND c.is_active = true
                 ORDER BY c.component_type, c.component_name
-            """, (package_id,))
-            
-            components_data = []
-            for row in cursor.fetchall():
-                comp_dict = dict(row)
-                comp_id = comp_dict['component_id']
-                
-                cursor.execute("""
-                    SELECT 
-                        c.component_id,
-                        c.component_name,
-                        c.component_type,
-                        c.article,
-                        c.characteristics,
-                        c.unit,
-                        c.price_per_unit
-                    FROM t_p56372141_online_booking_integ.component_alternatives ca
-                    JOIN t_p56372141_online_booking_integ.glass_components c ON ca.alternative_component_id = c.component_id
-                    WHERE ca.component_id = %s AND c.is_active = true
-                    ORDER BY ca.priority
-                """, (comp_id,))
-                
-                alternatives = [dict(alt_row) for alt_row in cursor.fetchall()]
-                comp_dict['alternatives'] = alternatives
-                components_data.append(comp_dict)
-            
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps(convert_decimals({'components': components_data}))
-            }
-    
-    if path == 'glass_components':
-        if method == 'GET':
-            if not conn:
-                return {
-                    'statusCode': 503,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Database unavailable'})
-                }
-            
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT 
-                    c.*,
-                    (SELECT COUNT(DISTINCT pc.package_id) 
-                     FROM t_p56372141_online_booking_integ.package_components pc 
-                     WHERE pc.component_id = c.component_id) +
-                    (SELECT COUNT(DISTINCT ca.component_id)
-                     FROM t_p56372141_online_booking_integ.component_alternatives ca
-                     WHERE ca.alternative_component_id = c.component_id) as packages_count
-                FROM t_p56372141_online_booking_integ.glass_components c 
-                WHERE c.is_active = true 
-                ORDER BY c.component_type, c.component_name
-            """)
-            components = [dict(row) for row in cursor.fetchall()]
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps(convert_decimals({'components': components}))
-            }
-        
-        elif method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            action_type = body_data.get('action_type', '')
-            
-            if not conn:
-                return {
-                    'statusCode': 503,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Database unavailable'})
-                }
-            
-            cursor = conn.cursor()
-            
-            if action_type == 'import':
-                components_data = body_data.get('components', [])
-                imported = 0
-                
-                for comp in components_data:
-                    cursor.execute(
-                        """INSERT INTO t_p56372141_online_booking_integ.glass_components 
-                        (component_name, component_type, article, characteristics, unit, price_per_unit, is_active)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)""",
-                        (comp.get('component_name'), comp.get('component_type'), 
-                         comp.get('article', ''), comp.get('characteristics', ''),
-                         comp.get('unit', 'шт'), comp.get('price_per_unit', 0), True)
-                    )
-                    imported += 1
-                
-                conn.commit()
-                conn.close()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'success': True, 'imported': imported})
-                }
-            
-            elif action_type == 'create':
-                component = body_data.get('component', {})
-                cursor.execute(
-                    """INSERT INTO t_p56372141_online_booking_integ.glass_components 
-                    (component_name, component_type, article, characteristics, unit, price_per_unit, is_active)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    RETURNING component_id""",
-                    (component.get('component_name'), component.get('component_type'),
-                     component.get('article', ''), component.get('characteristics', ''),
-                     component.get('unit', 'шт'), component.get('price_per_unit', 0),
-                     component.get('is_active', True))
-                )
-                component_id = cursor.fetchone()['component_id']
-                conn.commit()
-                conn.close()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'success': True, 'component_id': component_id})
-                }
-        
-        elif method == 'PUT':
-            body_data = json.loads(event.get('body', '{}'))
-            component = body_data.get('component', {})
-            
-            if not conn:
-                return {
-                    'statusCode': 503,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Database unavailable'})
-                }
-            
-            cursor = conn.cursor()
-            cursor.execute(
-                """UPDATE t_p56372141_online_booking_integ.glass_components 
-                SET component_name = %s, component_type = %s, article = %s, 
-                characteristics = %s, unit = %s, price_per_unit = %s, is_active = %s
-                WHERE component_id = %s""",
-                (component.get('component_name'), component.get('component_type'),
-                 component.get('article'), component.get('characteristics'),
-                 component.get('unit'), component.get('price_per_unit'),
-                 component.get('is_active'), component.get('component_id'))
-            )
-            conn.commit()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'success': True})
-            }
-        
-        elif method == 'DELETE':
-            component_id = event.get('queryStringParameters', {}).get('id', '')
-            
-            if not conn:
-                return {
-                    'statusCode': 503,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Database unavailable'})
-                }
-            
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE t_p56372141_online_booking_integ.glass_components SET is_active = false WHERE component_id = %s",
-                (component_id,)
-            )
-            conn.commit()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'success': True})
-            }
-    
-    if path == 'package_component':
-        if method == 'POST':
-            body_data = json.loads(event.get('body', '{}'))
-            action_type = body_data.get('action_type', '')
-            
-            if not conn:
-                return {
-                    'statusCode': 503,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Database unavailable'})
-                }
-            
-            cursor = conn.cursor()
-            
-            if action_type == 'add':
-                cursor.execute(
-                    """INSERT INTO t_p56372141_online_booking_integ.package_components 
-                    (package_id, component_id, quantity, is_required)
-                    VALUES (%s, %s, %s, %s)
-                    RETURNING id""",
-                    (body_data.get('package_id'), body_data.get('component_id'),
-                     body_data.get('quantity', 1), body_data.get('is_required', True))
-                )
-                pc_id = cursor.fetchone()['id']
-                conn.commit()
-                conn.close()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'success': True, 'id': pc_id})
-                }
+            """, (pkg['package_id'],))
+            pkg['components'] = [dict(row) for row in cursor.fetchall()]
+    
+    return json_response({'packages': packages})
+
+@router.route('POST', 'glass_package', require_admin)
+def create_glass_package(request: Request) -> Dict[str, Any]:
+    package = request.body.get('package', {})
+    conn = request.conn
+    
+    cursor = conn.cursor()
+    cursor.execute(
+        """INSERT INTO t_p56372141_online_booking_integ.glass_packages
+        (package_name, package_article, product_type, glass_type, glass_thickness, glass_price_per_sqm,
+        hardware_set, hardware_price, markup_percent, installation_price, description, sketch_image_url, is_active,
+        has_door, default_partition_height, default_partition_width, default_door_height, default_door_width, sketch_svg)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING package_id""",
+        (package.get('package_name'), package.get('package_article', ''),
+         package.get('product_type'), package.get('glass_type'),
+         package.get('glass_thickness'), package.get('glass_price_per_sqm'),
+         package.get('hardware_set'), package.get('hardware_price'),
+         package.get('markup_percent'), package.get('installation_price'),
+         package.get('description'), package.get('sketch_image_url', ''),
+         package.get('is_active', True),
+         package.get('has_door', False), package.get('default_partition_height', 1900),
+         package.get('default_partition_width', 1000), package.get('default_door_height', 1900),
+         package.get('default_door_width', 800), package.get('sketch_svg', ''))
+    )
+    package_id = cursor.fetchone()['package_id']
+    conn.commit()
+    
+    return json_response({'success': True, 'package_id': package_id})
+
+@router.route('PUT', 'glass_package', require_admin)
+def update_glass_package(request: Request) -> Dict[str, Any]:
+    package = request.body.get('package', {})
+    conn = request.conn
+    
+    cursor = conn.cursor()
+    cursor.execute(
+        """UPDATE t_p56372141_online_booking_integ.glass_packages
+        SET package_name = %s, package_article = %s, product_type = %s, glass_type = %s, glass_thickness = %s,
+        glass_price_per_sqm = %s, hardware_set = %s, hardware_price = %s,
+        markup_percent = %s, installation_price = %s, description = %s, sketch_image_url = %s,
+        is_active = %s, has_door = %s, default_partition_height = %s, default_partition_width = %s,
+        default_door_height = %s, default_door_width = %s, sketch_svg = %s, updated_at = CURRENT_TIMESTAMP
+        WHERE package_id = %s""",
+        (package.get('package_name'), package.get('package_article', ''),
+         package.get('product_type'), package.get('glass_type'),
+         package.get('glass_thickness'), package.get('glass_price_per_sqm'),
+         package.get('hardware_set'), package.get('hardware_price'),
+         package.get('markup_percent'), package.get('installation_price'),
+         package.get('description'), package.get('sketch_image_url', ''),
+         package.get('is_active', True),
+         package.get('has_door', False), package.get('default_partition_height', 1900),
+         package.get('default_partition_width', 1000), package.get('default_door_height', 1900),
+         package.get('default_door_width', 800), package.get('sketch_svg', ''),
+         package.get('package_id'))
+    )
+    conn.commit()
+    
+    return json_response({'success': True})
+
+@router.route('DELETE', 'glass_package', require_admin)
+def delete_glass_package(request: Request) -> Dict[str, Any]:
+    package_id = request.params.get('id', '')
+    conn = request.conn
+    
+    cursor = conn.cursor()
+    cursor.execute(
+        "DELETE FROM t_p56372141_online_booking_integ.glass_packages WHERE package_id = %s",
+        (package_id,)
+    )
+    conn.commit()
+    
+    return json_response({'success': True})
+
+@router.route('GET', 'package_components', cacheable=True)
+def get_package_components(request: Request) -> Dict[str, Any]:
+    package_id = request.params.get('package_id', '')
+    
+    cursor = request.conn.cursor()
+    cursor.execute("""
+        SELECT
+            pc.id,
+            pc.package_id,
+            pc.component_id,
+            pc.quantity,
+            pc.is_required,
+            c.component_name,
+            c.component_type,
+            c.article,
+            c.characteristics,
+            c.unit,
+            c.price_per_unit
+        FROM t_p56372141_online_booking_integ.package_components pc
+        JOIN t_p56372141_online_booking_integ.glass_components c ON pc.component_id = c.component_id
+        WHERE pc.package_id = %s AND c.is_active = true
+        ORDER BY c.component_type, c.component_name
+    """, (package_id,))
+    
+    components_data = []
+    for row in cursor.fetchall():
+        comp_dict = dict(row)
+        comp_id = comp_dict['component_id']
+        
+        cursor.execute("""
+            SELECT
+                c.component_id,
+                c.component_name,
+                c.component_type,
+                c.article,
+                c.characteristics,
+                c.unit,
+                c.price_per_unit
+            FROM t_p56372141_online_booking_integ.component_alternatives ca
+            JOIN t_p56372141_online_booking_integ.glass_components c ON ca.alternative_component_id = c.component_id
+            WHERE ca.component_id = %s AND c.is_active = true
+            ORDER BY ca.priority
+        """, (comp_id,))
+        
+        alternatives = [dict(alt_row) for alt_row in cursor.fetchall()]
+        comp_dict['alternatives'] = alternatives
+        components_data.append(comp_dict)
+    
+    return json_response({'components': components_data})
+
+@router.route('GET', 'glass_components', cacheable=True)
+def get_glass_components(request: Request) -> Dict[str, Any]:
+    cursor = request.conn.cursor()
+    cursor.execute("""
+        SELECT
+            c.*,
+            (SELECT COUNT(DISTINCT pc.package_id)
+             FROM t_p56372141_online_booking_integ.package_components pc
+             WHERE pc.component_id = c.component_id) +
+            (SELECT COUNT(DISTINCT ca.component_id)
+             FROM t_p56372141_online_booking_integ.component_alternatives ca
+             WHERE ca.alternative_component_id = c.component_id) as packages_count
+        FROM t_p56372141_online_booking_integ.glass_components c
+        WHERE c.is_active = true
+        ORDER BY c.component_type, c.component_name
+    """)
+    components = [dict(row) for row in cursor.fetchall()]
+    
+    return json_response({'components': components})
+
+@router.route('POST', 'glass_components', require_admin)
+def create_glass_components(request: Request) -> Dict[str, Any]:
+    body_data = request.body
+    action_type = body_data.get('action_type', '')
+    
+    if action_type == 'import':
+        conn = request.conn
+        cursor = conn.cursor()
+        imported = 0
         
-        elif method == 'DELETE':
-            pc_id = event.get('queryStringParameters', {}).get('id', '')
-            
-            if not conn:
-                return {
-                    'statusCode': 503,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'error': 'Database unavailable'})
-                }
-            
-            cursor = conn.cursor()
+        for comp in body_data.get('components', []):
             cursor.execute(
-                "DELETE FROM t_p56372141_online_booking_integ.package_components WHERE id = %s",
-                (pc_id,)
+                """INSERT INTO t_p56372141_online_booking_integ.glass_components
+                (component_name, component_type, article, characteristics, unit, price_per_unit, is_active)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+                (comp.get('component_name'), comp.get('component_type'),
+                 comp.get('article', ''), comp.get('characteristics', ''),
+                 comp.get('unit', 'шт'), comp.get('price_per_unit', 0), True)
             )
-            conn.commit()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'success': True})
-            }
-    
-    if path == 'component_alternative' and method == 'POST':
-        body_data = json.loads(event.get('body', '{}'))
-        
-        if not conn:
-            return {
-                'statusCode': 503,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'error': 'Database unavailable'})
-            }
+            imported += 1
         
-        cursor = conn.cursor()
-        cursor.execute(
-            """INSERT INTO t_p56372141_online_booking_integ.component_alternatives 
-            (component_id, alternative_component_id, priority)
-            VALUES (%s, %s, %s)
-            RETURNING id""",
-            (body_data.get('component_id'), body_data.get('alternative_component_id'),
-             body_data.get('priority', 1))
-        )
-        alt_id = cursor.fetchone()['id']
         conn.commit()
-        conn.close()
         
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'success': True, 'id': alt_id})
-        }
+        return json_response({'success': True, 'imported': imported})
     
-    if path == 'glass_order' and method == 'POST':
-        body_data = json.loads(event.get('body', '{}'))
-        order = body_data.get('order', {})
-        
-        if not conn:
-            return {
-                'statusCode': 503,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'isBase64Encoded': False,
-                'body': json.dumps({'error': 'Database unavailable'})
-            }
-        
+    elif action_type == 'create':
+        component = body_data.get('component', {})
+        conn = request.conn
         cursor = conn.cursor()
         cursor.execute(
-            """INSERT INTO t_p56372141_online_booking_integ.glass_orders
-            (package_id, customer_name, customer_phone, customer_email, 
-            partition_width, partition_height, door_width, door_height, has_door,
-            square_meters, glass_cost, hardware_cost, installation_cost, markup_amount,
-            total_price, notes, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING order_id""",
-            (order.get('package_id'), order.get('customer_name'), order.get('customer_phone'),
-             order.get('customer_email'), 
-             order.get('partition_width'), order.get('partition_height'),
-             order.get('door_width'), order.get('door_height'), order.get('has_door', False),
-             order.get('square_meters'), order.get('glass_cost'), order.get('hardware_cost'),
-             order.get('installation_cost'), order.get('markup_amount'), order.get('total_price'),
-             order.get('notes'), 'new')
+            """INSERT INTO t_p56372141_online_booking_integ.glass_components
+            (component_name, component_type, article, characteristics, unit, price_per_unit, is_active)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            RETURNING component_id""",
+            (component.get('component_name'), component.get('component_type'),
+             component.get('article', ''), component.get('characteristics', ''),
+             component.get('unit', 'шт'), component.get('price_per_unit', 0),
+             component.get('is_active', True))
         )
-        order_id = cursor.fetchone()['order_id']
+        component_id = cursor.fetchone()['component_id']
         conn.commit()
-        conn.close()
         
-        return {
-            'statusCode': 200,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'success': True, 'order_id': order_id})
-        }
+        return json_response({'success': True, 'component_id': component_id})
     
-    if conn:
-        conn.close()
+    return error_response(400, 'Неверные параметры')
+
+@router.route('PUT', 'glass_components', require_admin)
+def update_glass_component(request: Request) -> Dict[str, Any]:
+    component = request.body.get('component', {})
+    conn = request.conn
     
-    return {
-        'statusCode': 405,
-        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-        'isBase64Encoded': False,
-        'body': json.dumps({'error': 'Method not allowed'})
-    }
\ No newline at end of file
+    cursor = conn.cursor()
+    cursor.execute(
+        """UPDATE t_p56372141_online_booking_integ.glass_components
+        SET component_name = %s, component_type = %s, article = %s,
+        characteristics = %s, unit = %s, price_per_unit = %s, is_active = %s
+        WHERE component_id = %s""",
+        (component.get('component_name'), component.get('component_type'),
+         component.get('article'), component.get('characteristics'),
+         component.get('unit'), component.get('price_per_unit'),
+         component.get('is_active'), component.get('component_id'))
+    )
+    conn.commit()
+    
+    return json_response({'success': True})
+
+@router.route('DELETE', 'glass_components', require_admin)
+def delete_glass_component(request: Request) -> Dict[str, Any]:
+    component_id = request.params.get('id', '')
+    conn = request.conn
+    
+    cursor = conn.cursor()
+    cursor.execute(
+        "UPDATE t_p56372141_online_booking_integ.glass_components SET is_active = false WHERE component_id = %s",
+        (component_id,)
+    )
+    conn.commit()
+    
+    return json_response({'success': True})
+
+@router.route('POST', 'package_component', require_admin)
+def add_package_component(request: Request) -> Dict[str, Any]:
+    body_data = request.body
+    if body_data.get('action_type', '') != 'add':
+        return error_response(400, 'Неверные параметры')
+    conn = request.conn
+    
+    cursor = conn.cursor()
+    cursor.execute(
+        """INSERT INTO t_p56372141_online_booking_integ.package_components
+        (package_id, component_id, quantity, is_required)
+        VALUES (%s, %s, %s, %s)
+        RETURNING id""",
+        (body_data.get('package_id'), body_data.get('component_id'),
+         body_data.get('quantity', 1), body_data.get('is_required', True))
+    )
+    pc_id = cursor.fetchone()['id']
+    conn.commit()
+    
+    return json_response({'success': True, 'id': pc_id})
+
+@router.route('DELETE', 'package_component', require_admin)
+def delete_package_component(request: Request) -> Dict[str, Any]:
+    pc_id = request.params.get('id', '')
+    conn = request.conn
+    
+    cursor = conn.cursor()
+    cursor.execute(
+        "DELETE FROM t_p56372141_online_booking_integ.package_components WHERE id = %s",
+        (pc_id,)
+    )
+    conn.commit()
+    
+    return json_response({'success': True})
+
+@router.route('POST', 'component_alternative', require_admin)
+def add_component_alternative(request: Request) -> Dict[str, Any]:
+    body_data = request.body
+    conn = request.conn
+    
+    cursor = conn.cursor()
+    cursor.execute(
+        """INSERT INTO t_p56372141_online_booking_integ.component_alternatives
+        (component_id, alternative_component_id, priority)
+        VALUES (%s, %s, %s)
+        RETURNING id""",
+        (body_data.get('component_id'), body_data.get('alternative_component_id'),
+         body_data.get('priority', 1))
+    )
+    alt_id = cursor.fetchone()['id']
+    conn.commit()
+    
+    return json_response({'success': True, 'id': alt_id})
+
+@router.route('POST', 'glass_order', limit_glass_order)
+def create_glass_order(request: Request) -> Dict[str, Any]:
+    order = request.body.get('order', {})
+    conn = request.conn
+    
+    cursor = conn.cursor()
+    cursor.execute(
+        """INSERT INTO t_p56372141_online_booking_integ.glass_orders
+        (package_id, customer_name, customer_phone, customer_email,
+        partition_width, partition_height, door_width, door_height, has_door,
+        square_meters, glass_cost, hardware_cost, installation_cost, markup_amount,
+        total_price, notes, status)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING order_id""",
+        (order.get('package_id'), order.get('customer_name'), order.get('customer_phone'),
+         order.get('customer_email'),
+         order.get('partition_width'), order.get('partition_height'),
+         order.get('door_width'), order.get('door_height'), order.get('has_door', False),
+         order.get('square_meters'), order.get('glass_cost'), order.get('hardware_cost'),
+         order.get('installation_cost'), order.get('markup_amount'), order.get('total_price'),
+         order.get('notes'), 'new')
+    )
+    order_id = cursor.fetchone()['order_id']
+    conn.commit()
+    
+    return json_response({'success': True, 'order_id': order_id})
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: API для системы онлайн-записи в клинику с управлением записями
+    Args: event с httpMethod, queryStringParameters, body
+    Returns: JSON с данными услуг, врачей, слотов, записей или результатом операций
+    '''
+    return router.dispatch(event)
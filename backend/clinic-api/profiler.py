@@ -0,0 +1,253 @@
+"""
+Профилирование обработчиков по запросу: выключено, пока не задано PROFILE_SAMPLE_RATE (доля запросов,
+0..1) или админ не прислал заголовок X-Profile: 1 (проверку админа передает маршрутизатор).
+
+PROFILE_MODE=sample (по умолчанию) - фоновый поток раз в PROFILE_INTERVAL_MS снимает стек потока
+обработчика; вес стека - фактическое время между снимками, поэтому результат - это время по стекам,
+как на flamegraph. PROFILE_MODE=cprofile - cProfile на время запроса (точные числа вызовов,
+но заметно медленнее; одновременно профилируется только один запрос).
+
+Профили копятся по маршрутам (имя из таблицы маршрутов) в памяти теплого экземпляра и выгружаются
+маршрутом админки: collapsed-стеки (flamegraph.pl, speedscope), JSON speedscope или таблица pstats.
+Число разных стеков на маршрут ограничено PROFILE_MAX_STACKS. Модуль копируется в каждую функцию.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_MODE = os.environ.get('PROFILE_MODE', 'sample')
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '2'))
+PROFILE_MAX_STACKS = int(os.environ.get('PROFILE_MAX_STACKS', '5000'))
+PROFILE_HEADER = 'x-profile'
+
+TRUNCATED_STACK = ('(other stacks)',)
+
+Stack = Tuple[str, ...]
+
+
+class RouteProfile:
+    """Накопленный профиль одного маршрута"""
+
+    def __init__(self):
+        self.requests = 0
+        self.total_ms = 0.0
+        self.stacks: Dict[Stack, float] = {}
+        self.stats: Optional[pstats.Stats] = None
+
+    def add_stacks(self, stacks: Dict[Stack, float]) -> None:
+        for stack, weight in stacks.items():
+            if stack not in self.stacks and len(self.stacks) >= PROFILE_MAX_STACKS:
+                stack = TRUNCATED_STACK
+            self.stacks[stack] = self.stacks.get(stack, 0.0) + weight
+
+
+profiles: Dict[str, RouteProfile] = {}
+_profiles_lock = threading.Lock()
+# cProfile нельзя запускать в двух потоках одновременно
+_cprofile_lock = threading.Lock()
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def frame_depth(frame) -> int:
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+
+class Sampler(threading.Thread):
+    """Снимает стек потока обработчика до остановки; стеки от корня, без кадров выше точки старта"""
+
+    def __init__(self, thread_id: int, base_depth: int, interval_ms: float):
+        super().__init__(daemon=True, name='profile-sampler')
+        self.thread_id = thread_id
+        self.base_depth = base_depth
+        self.interval = interval_ms / 1000
+        self.stacks: Dict[Stack, float] = {}
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        last = time.perf_counter()
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            names: List[str] = []
+            while frame is not None:
+                names.append(frame_name(frame))
+                frame = frame.f_back
+            stack = tuple(reversed(names))[self.base_depth:]
+            if stack:
+                self.stacks[stack] = self.stacks.get(stack, 0.0) + (now - last) * 1000
+            last = now
+
+    def stop(self) -> Dict[Stack, float]:
+        self._done.set()
+        self.join()
+        return self.stacks
+
+
+class ActiveProfile:
+    """Профиль одного запроса: Sampler или cProfile"""
+
+    def __init__(self, mode: str, base_depth: int):
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.sampler: Optional[Sampler] = None
+        self.cprofile: Optional[cProfile.Profile] = None
+        if mode == 'cprofile':
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        else:
+            self.sampler = Sampler(threading.get_ident(), base_depth, PROFILE_INTERVAL_MS)
+            self.sampler.start()
+
+
+def should_profile(event: Dict[str, Any], header: Callable[[str], str],
+                   can_profile: Callable[[Dict[str, Any]], bool]) -> bool:
+    """Профилировать ли запрос: доля PROFILE_SAMPLE_RATE или заголовок X-Profile от админа"""
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return True
+    return header(PROFILE_HEADER) == '1' and can_profile(event)
+
+
+def start_profile(mode: Optional[str] = None) -> Optional[ActiveProfile]:
+    """Начать профиль запроса; кадр вызывающего и все выше него в стеки не попадают"""
+    mode = mode or PROFILE_MODE
+    if mode == 'cprofile' and not _cprofile_lock.acquire(blocking=False):
+        return None
+    return ActiveProfile(mode, frame_depth(sys._getframe(1)))
+
+
+def finish_profile(profile: Optional[ActiveProfile], route: str) -> None:
+    """Остановить профиль запроса и добавить его к профилю маршрута"""
+    if profile is None:
+        return
+    elapsed_ms = (time.perf_counter() - profile.started) * 1000
+    stacks: Dict[Stack, float] = {}
+    stats = None
+    if profile.cprofile is not None:
+        profile.cprofile.disable()
+        _cprofile_lock.release()
+        stats = pstats.Stats(profile.cprofile)
+    else:
+        stacks = profile.sampler.stop()
+
+    with _profiles_lock:
+        route_profile = profiles.get(route)
+        if route_profile is None:
+            route_profile = profiles[route] = RouteProfile()
+        route_profile.requests += 1
+        route_profile.total_ms += elapsed_ms
+        route_profile.add_stacks(stacks)
+        if stats is not None:
+            if route_profile.stats is None:
+                route_profile.stats = stats
+            else:
+                route_profile.stats.add(stats)
+
+
+def selected(route: str = '') -> Dict[str, RouteProfile]:
+    with _profiles_lock:
+        return {name: profile for name, profile in profiles.items() if not route or name == route}
+
+
+def snapshot(route: str = '') -> List[Tuple[str, int, float, Dict[Stack, float]]]:
+    """Копии профилей под блокировкой: (маршрут, запросы, мс, стеки) не меняются во время выгрузки"""
+    with _profiles_lock:
+        return [(name, profile.requests, profile.total_ms, dict(profile.stacks))
+                for name, profile in sorted(profiles.items()) if not route or name == route]
+
+
+def reset() -> None:
+    with _profiles_lock:
+        profiles.clear()
+
+
+def export_collapsed(route: str = '') -> str:
+    """Collapsed-стеки: 'маршрут;кадр;кадр вес_мкс' на строку (flamegraph.pl, speedscope)"""
+    lines = []
+    for name, _, _, stacks in snapshot(route):
+        for stack, weight_ms in sorted(stacks.items()):
+            lines.append(f"{';'.join((name,) + stack)} {int(weight_ms * 1000)}")
+    return '\n'.join(lines) + '\n' if lines else ''
+
+
+def export_speedscope(route: str = '') -> Dict[str, Any]:
+    """Файл speedscope: по профилю sampled на маршрут, веса в миллисекундах"""
+    frames: List[Dict[str, Any]] = []
+    frame_index: Dict[str, int] = {}
+    result_profiles = []
+    for name, requests, total_ms, stacks in snapshot(route):
+        samples, weights = [], []
+        for stack, weight_ms in stacks.items():
+            indexes = []
+            for frame in stack:
+                index = frame_index.get(frame)
+                if index is None:
+                    index = frame_index[frame] = len(frames)
+                    func, _, location = frame.partition(' (')
+                    file, _, line = location.rstrip(')').rpartition(':')
+                    frames.append({'name': func, 'file': file, 'line': int(line)} if line.isdigit() else {'name': frame})
+                indexes.append(index)
+            samples.append(indexes)
+            weights.append(round(weight_ms, 3))
+        result_profiles.append({
+            'type': 'sampled',
+            'name': f'{name} ({requests} requests, {total_ms:.0f}ms)',
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': round(sum(weights), 3),
+            'samples': samples,
+            'weights': weights
+        })
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': frames},
+        'profiles': result_profiles,
+        'name': route or 'all routes',
+        'activeProfileIndex': 0,
+        'exporter': 'profiler.py'
+    }
+
+
+def export_pstats(route: str = '', limit: int = 40) -> str:
+    """Таблица cProfile по накопленному времени (PROFILE_MODE=cprofile)"""
+    output = io.StringIO()
+    # Stats.add в finish_profile меняет таблицу - печать под той же блокировкой
+    with _profiles_lock:
+        for name, profile in sorted(profiles.items()):
+            if profile.stats is None or (route and name != route):
+                continue
+            output.write(f'== {name}: {profile.requests} requests, {profile.total_ms:.0f}ms\n')
+            profile.stats.stream = output
+            profile.stats.sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
+
+
+def summary() -> Dict[str, Any]:
+    """Маршруты с профилями: число запросов, время, число стеков"""
+    return {
+        name: {
+            'requests': profile.requests,
+            'total_ms': round(profile.total_ms, 1),
+            'avg_ms': round(profile.total_ms / profile.requests, 2) if profile.requests else 0.0,
+            'stacks': len(profile.stacks),
+            'cprofile': profile.stats is not None
+        }
+        for name, profile in sorted(selected().items())
+    }
@@ -0,0 +1,203 @@
+"""
+Ограничение частоты запросов к публичным точкам (запись, вход в админку, отправка писем)
+скользящим окном: оценка = hits_prev * (доля прошлого окна, попавшая в скользящее) + hits_curr.
+
+Сначала счетчик проверяется в памяти теплого экземпляра - если лимит уже превышен,
+запрос отклоняется без обращения к базе. Иначе удар учитывается в общей UNLOGGED-таблице
+rate_limits одним запросом по собственному соединению ограничителя, чтобы лимит действовал
+на все экземпляры функции. Если база недоступна, работает только локальный счетчик.
+Модуль копируется в каждую функцию, которой нужен ограничитель.
+"""
+
+import math
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() != 'false'
+LOCAL_MAX_KEYS = 10000
+CLEANUP_PROBABILITY = 0.01
+DB_RETRY_AFTER_FAILURE_SECONDS = 30
+
+
+class Rule(NamedTuple):
+    scope: str
+    limit: int
+    window_seconds: int
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    scope: str = ''
+    retry_after: int = 0
+
+
+ALLOWED = Decision(True)
+
+
+def sliding_estimate(previous: int, current: int, window_start: float, window_seconds: int, now: float) -> float:
+    """Оценка числа запросов в скользящем окне по счетчикам текущего и прошлого окна"""
+    overlap = 1.0 - (now - window_start) / window_seconds
+    return previous * max(overlap, 0.0) + current
+
+
+def retry_after(previous: int, current: int, limit: int, window_start: float, window_seconds: int, now: float) -> int:
+    """Через сколько секунд оценка опустится ниже лимита"""
+    if current >= limit or previous == 0:
+        return max(1, math.ceil(window_start + window_seconds - now))
+    # previous * (1 - t / w) + current < limit  =>  t > w * (1 - (limit - current) / previous)
+    wait_until = window_start + window_seconds * (1 - (limit - current) / previous)
+    return max(1, math.ceil(wait_until - now))
+
+
+class RateLimiter:
+    """Скользящее окно: локальный счетчик в памяти + общий счетчик в Postgres"""
+
+    def __init__(self, database_url: Optional[str] = None):
+        self.database_url = database_url if database_url is not None else os.environ.get('DATABASE_URL', '')
+        self._local: Dict[Tuple[str, str, int], List[int]] = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._db_failed_at = 0.0
+        self.stats = {'allowed': 0, 'rejected_local': 0, 'rejected_shared': 0, 'db_errors': 0}
+
+    def check(self, rules: List[Tuple[Any, ...]]) -> Decision:
+        """
+        Учесть запрос по всем правилам: (правило, ключ) или (правило, ключ, вес), где вес -
+        сколько запросов засчитать разом (пачка писем); первое нарушенное правило отклоняет запрос.
+        """
+        if not RATE_LIMIT_ENABLED:
+            return ALLOWED
+
+        now = time.time()
+        hits = [(entry[0], str(entry[1]), entry[2] if len(entry) > 2 else 1)
+                for entry in rules if entry[1] not in (None, '')]
+
+        for rule, key, cost in hits:
+            decision = self._hit_local(rule, key, now, cost)
+            if not decision.allowed:
+                self.stats['rejected_local'] += 1
+                return decision
+
+        for rule, key, cost in hits:
+            decision = self._hit_shared(rule, key, now, cost)
+            if not decision.allowed:
+                self.stats['rejected_shared'] += 1
+                return decision
+
+        self.stats['allowed'] += 1
+        return ALLOWED
+
+    def _hit_local(self, rule: Rule, key: str, now: float, cost: int = 1) -> Decision:
+        window = int(now // rule.window_seconds)
+        bucket = (rule.scope, key, rule.window_seconds)
+        with self._lock:
+            state = self._local.get(bucket)
+            if state is None:
+                if len(self._local) >= LOCAL_MAX_KEYS:
+                    self._evict(now)
+                state = self._local[bucket] = [window, 0, 0]
+            if state[0] != window:
+                state[2] = state[1] if state[0] == window - 1 else 0
+                state[0], state[1] = window, 0
+            state[1] += cost
+            current, previous = state[1], state[2]
+
+        window_start = window * rule.window_seconds
+        if sliding_estimate(previous, current, window_start, rule.window_seconds, now) > rule.limit:
+            return Decision(False, rule.scope, retry_after(previous, current, rule.limit, window_start, rule.window_seconds, now))
+        return ALLOWED
+
+    def _hit_shared(self, rule: Rule, key: str, now: float, cost: int = 1) -> Decision:
+        conn = self._connection(now)
+        if conn is None:
+            return ALLOWED
+
+        window = int(now // rule.window_seconds)
+        bucket_key = f'{rule.scope}:{rule.window_seconds}:{key}'
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """WITH hit AS (
+                           INSERT INTO t_p56372141_online_booking_integ.rate_limits (bucket_key, window_index, hits, expires_at)
+                           VALUES (%s, %s, %s, %s)
+                           ON CONFLICT (bucket_key, window_index) DO UPDATE SET hits = rate_limits.hits + EXCLUDED.hits
+                           RETURNING hits
+                       )
+                       SELECT hit.hits, COALESCE(prev.hits, 0)
+                       FROM hit
+                       LEFT JOIN t_p56372141_online_booking_integ.rate_limits prev
+                         ON prev.bucket_key = %s AND prev.window_index = %s""",
+                    (bucket_key, window, cost, int(now) + 2 * rule.window_seconds, bucket_key, window - 1)
+                )
+                current, previous = cursor.fetchone()
+                if random.random() < CLEANUP_PROBABILITY:
+                    cursor.execute(
+                        "DELETE FROM t_p56372141_online_booking_integ.rate_limits WHERE expires_at < %s",
+                        (int(now),)
+                    )
+        except Exception:
+            self.stats['db_errors'] += 1
+            self._drop_connection(now)
+            return ALLOWED
+
+        window_start = window * rule.window_seconds
+        if sliding_estimate(previous, current, window_start, rule.window_seconds, now) > rule.limit:
+            return Decision(False, rule.scope, retry_after(previous, current, rule.limit, window_start, rule.window_seconds, now))
+        return ALLOWED
+
+    def _connection(self, now: float):
+        if self._conn is not None and not self._conn.closed:
+            return self._conn
+        if psycopg2 is None or not self.database_url or now - self._db_failed_at < DB_RETRY_AFTER_FAILURE_SECONDS:
+            return None
+        try:
+            self._conn = psycopg2.connect(self.database_url, connect_timeout=2)
+            self._conn.autocommit = True
+        except Exception:
+            self.stats['db_errors'] += 1
+            self._drop_connection(now)
+        return self._conn
+
+    def _drop_connection(self, now: float) -> None:
+        self._db_failed_at = now
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
+
+    def _evict(self, now: float) -> None:
+        stale = [bucket for bucket, state in self._local.items() if (state[0] + 2) * bucket[2] < now]
+        for bucket in stale:
+            del self._local[bucket]
+        if len(self._local) >= LOCAL_MAX_KEYS:
+            self._local.clear()
+
+
+def client_ip(event: Dict[str, Any]) -> str:
+    return event.get('requestContext', {}).get('identity', {}).get('sourceIp', '')
+
+
+def too_many_requests(decision: Decision) -> Dict[str, Any]:
+    return {
+        'statusCode': 429,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Retry-After': str(decision.retry_after)
+        },
+        'isBase64Encoded': False,
+        'body': '{"error": "Too many requests, try again later"}'
+    }
+
+
+limiter = RateLimiter()
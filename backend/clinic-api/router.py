@@ -0,0 +1,235 @@
+"""
+Маршрутизация запросов функции по таблице (метод, action) -> обработчик вместо цепочки if/elif.
+
+Поиск маршрута - один-два обращения к словарю. Перед обработчиком выполняются проверки маршрута
+(токен админа, ограничение частоты); первая проверка, вернувшая ответ, прерывает запрос.
+Соединение с базой открывается лениво при первом обращении к request.conn и закрывается
+после ответа, так что маршруты без базы (справочники) соединение не открывают.
+Ответ обработчика сжимается по Accept-Encoding (compression.py); сжатые ответы маршрутов
+с cacheable=True запоминаются. Запросы к базе за время обработки учитываются
+трассой db_trace (строка sql_trace в лог); по запросу обработка профилируется (profiler.py).
+Каждый запрос записывается в метрики (metrics.py) под именем маршрута из таблицы - метка не зависит
+от присланного action. Здесь же общие построители ответов с CORS; тело ответа кодирует serialization.dumps.
+Модуль копируется в каждую функцию.
+"""
+
+import json
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from compression import compress_response, stats as compression_stats
+from db_trace import finish_trace, start_trace
+from metrics import observe_request, register_collector
+from profiler import finish_profile, should_profile, start_profile
+from serialization import dumps
+
+ANY_ACTION = '*'
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+PREFLIGHT_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Admin-Key, X-Profile',
+    'Access-Control-Max-Age': '86400'
+}
+
+
+register_collector(
+    'response_cache_requests_total', 'counter', 'Memoized compressed bodies of cacheable routes', ('result',),
+    lambda: {('hit',): compression_stats['memo_hits'], ('miss',): compression_stats['memo_misses']}
+)
+register_collector(
+    'response_compression_bytes_total', 'counter', 'Response body bytes before and after compression', ('stage',),
+    lambda: {('in',): compression_stats['bytes_in'], ('out',): compression_stats['bytes_out']}
+)
+
+
+class HttpError(Exception):
+    """Прервать обработку ответом с ошибкой"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def json_response(payload: Any, status: int = 200) -> Dict[str, Any]:
+    return {
+        'statusCode': status,
+        'headers': dict(JSON_HEADERS),
+        'isBase64Encoded': False,
+        'body': dumps(payload)
+    }
+
+
+def text_response(body: str, status: int = 200) -> Dict[str, Any]:
+    return {
+        'statusCode': status,
+        'headers': {'Content-Type': 'text/plain; charset=utf-8', 'Access-Control-Allow-Origin': '*'},
+        'isBase64Encoded': False,
+        'body': body
+    }
+
+
+def error_response(status: int, message: str) -> Dict[str, Any]:
+    return json_response({'error': message}, status)
+
+
+def cors_preflight() -> Dict[str, Any]:
+    return {
+        'statusCode': 200,
+        'headers': dict(PREFLIGHT_HEADERS),
+        'isBase64Encoded': False,
+        'body': ''
+    }
+
+
+class Request:
+    """Событие платформы с разобранными параметрами и ленивым соединением с базой"""
+
+    def __init__(self, event: Dict[str, Any], connect: Callable[[], Any]):
+        self.event = event
+        self.method: str = event.get('httpMethod', 'GET')
+        self.params: Dict[str, str] = event.get('queryStringParameters') or {}
+        self.user_ip: str = event.get('requestContext', {}).get('identity', {}).get('sourceIp', '')
+        self.action = ''
+        # имя маршрута из таблицы для метрик; не найденный маршрут - 'метод unmatched'
+        self.route = f'{self.method} unmatched'
+        self._connect = connect
+        self._conn = None
+        self._body: Optional[Dict[str, Any]] = None
+
+    @property
+    def body(self) -> Dict[str, Any]:
+        """Тело запроса как JSON-объект; разбирается один раз"""
+        if self._body is None:
+            try:
+                body = json.loads(self.event.get('body') or '{}')
+            except ValueError:
+                raise HttpError(400, 'Invalid JSON body')
+            if not isinstance(body, dict):
+                raise HttpError(400, 'Invalid JSON body')
+            self._body = body
+        return self._body
+
+    def header(self, name: str) -> str:
+        """Значение заголовка запроса без учета регистра имени"""
+        name = name.lower()
+        headers = self.event.get('headers') or {}
+        return next((value for key, value in headers.items() if key.lower() == name), '')
+
+    @property
+    def conn(self):
+        """Соединение с базой, открывается при первом обращении; без базы - 503"""
+        conn = self.optional_conn()
+        if conn is None:
+            raise HttpError(503, 'Database unavailable')
+        return conn
+
+    def optional_conn(self):
+        """Соединение с базой или None, если база не настроена"""
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+
+    @property
+    def connected(self) -> bool:
+        return self._conn is not None
+
+    def rollback(self) -> None:
+        if self._conn is not None and not self._conn.closed:
+            self._conn.rollback()
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+Guard = Callable[[Request], Optional[Dict[str, Any]]]
+
+
+class Route(NamedTuple):
+    endpoint: Callable[[Request], Dict[str, Any]]
+    guards: Tuple[Guard, ...]
+    cacheable: bool = False
+    name: str = ''
+
+
+def query_action(request: Request) -> str:
+    return request.params.get('action', '')
+
+
+def nobody(event: Dict[str, Any]) -> bool:
+    return False
+
+
+class Router:
+    """
+    Таблица маршрутов (метод, action); ANY_ACTION - маршрут метода по умолчанию.
+    can_profile(event) - может ли отправитель включить профилирование заголовком X-Profile.
+    """
+
+    def __init__(self, connect: Callable[[], Any], action: Callable[[Request], str] = query_action,
+                 not_found: Tuple[int, str] = (405, 'Method not allowed'), expose_errors: bool = False,
+                 can_profile: Callable[[Dict[str, Any]], bool] = nobody):
+        self.connect = connect
+        self.action = action
+        self.not_found = not_found
+        self.expose_errors = expose_errors
+        self.can_profile = can_profile
+        self.routes: Dict[Tuple[str, str], Route] = {}
+
+    def route(self, method: str, action: str, *guards: Guard, cacheable: bool = False):
+        """Декоратор: зарегистрировать обработчик маршрута с проверками; cacheable - ответ одинаков для всех"""
+        def register(endpoint: Callable[[Request], Dict[str, Any]]):
+            key = (method, action)
+            if key in self.routes:
+                raise ValueError(f'Route {method} {action} is already registered')
+            self.routes[key] = Route(endpoint, guards, cacheable, f'{method} {action}')
+            return endpoint
+        return register
+
+    def resolve(self, method: str, action: str) -> Optional[Route]:
+        return self.routes.get((method, action)) or self.routes.get((method, ANY_ACTION))
+
+    def dispatch(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        request = Request(event, self.connect)
+        if request.method == 'OPTIONS':
+            return cors_preflight()
+
+        started = time.perf_counter()
+        trace = start_trace()
+        profile = start_profile() if should_profile(event, request.header, self.can_profile) else None
+        response = None
+        try:
+            response = self.handle(request)
+            return response
+        finally:
+            request.close()
+            # имя из таблицы маршрутов, а не присланный action: число профилей и меток ограничено
+            finish_profile(profile, request.route)
+            finish_trace(trace, request.route, response)
+            status = response.get('statusCode', 200) if response is not None else 500
+            observe_request(request.route, status, time.perf_counter() - started, trace)
+
+    def handle(self, request: Request) -> Dict[str, Any]:
+        try:
+            request.action = self.action(request)
+            route = self.resolve(request.method, request.action)
+            if route is None:
+                return error_response(*self.not_found)
+            request.route = route.name
+            for guard in route.guards:
+                response = guard(request)
+                if response is not None:
+                    return response
+            return compress_response(route.endpoint(request), request.header('accept-encoding'), route.cacheable)
+        except HttpError as e:
+            request.rollback()
+            return error_response(e.status, e.message)
+        except Exception as e:
+            if not self.expose_errors:
+                raise
+            request.rollback()
+            return error_response(500, str(e))
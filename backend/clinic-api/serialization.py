@@ -0,0 +1,45 @@
+"""
+Сериализация ответов в JSON за один проход, без предварительного обхода и копирования строк.
+
+Decimal, date, datetime и time из строк psycopg2 кодируются прямо при записи JSON:
+Decimal - числом (float), даты и время - в ISO 8601. Если установлен orjson, используется он,
+иначе стандартный json с тем же результатом. Вывод компактный, кириллица пишется как есть, без \\uXXXX.
+Модуль копируется в каждую функцию, которой нужна сериализация.
+"""
+
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def encode_value(value: Any) -> Any:
+    """Значение, которое кодировщик JSON не знает, в совместимое с JSON"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).decode('utf-8', 'replace')
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+_encoder = json.JSONEncoder(default=encode_value, ensure_ascii=False, separators=(',', ':'))
+
+if ORJSON_AVAILABLE:
+    # ключи-не-строки (например, id из GROUP BY) stdlib приводит к строкам - orjson так же
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(payload: Any) -> str:
+        return orjson.dumps(payload, default=encode_value, option=_ORJSON_OPTIONS).decode('utf-8')
+else:
+    def dumps(payload: Any) -> str:
+        return _encoder.encode(payload)
@@ -0,0 +1,132 @@
+"""
+Сжатие тел ответов по Accept-Encoding: brotli (если установлен) или gzip.
+
+Сжимаются только тела от COMPRESS_MIN_BYTES - мелкие ответы дешевле отдать как есть.
+Платформа принимает двоичное тело только в base64, поэтому сжатый ответ уходит
+с isBase64Encoded: True и заголовком Content-Encoding.
+
+Ответы каталога одинаковы для всех посетителей, пока каталог не изменился, поэтому для маршрутов
+с cacheable=True сжатое тело запоминается по хешу исходного тела и кодировке и сжимается
+с более высоким уровнем: повторный запрос стоит хеширования вместо сжатия.
+Память под запомненные тела ограничена COMPRESS_MEMO_MAX_BYTES, вытесняются давно не использованные.
+Модуль копируется в каждую функцию, которой нужно сжатие.
+"""
+
+import base64
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+COMPRESS_MEMO_MAX_BYTES = int(os.environ.get('COMPRESS_MEMO_MAX_BYTES', str(32 * 1024 * 1024)))
+
+# уровни для ответов, которые сжимаются на каждый запрос, и для запоминаемых
+GZIP_LEVEL, GZIP_MEMO_LEVEL = 5, 9
+BROTLI_QUALITY, BROTLI_MEMO_QUALITY = 4, 9
+
+SUPPORTED_ENCODINGS = ('br', 'gzip') if BROTLI_AVAILABLE else ('gzip',)
+
+_memo: 'OrderedDict[Tuple[str, bytes], str]' = OrderedDict()
+_memo_bytes = 0
+_memo_lock = threading.Lock()
+
+stats = {'compressed': 0, 'memo_hits': 0, 'memo_misses': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Лучшая поддерживаемая кодировка из Accept-Encoding или None"""
+    if not accept_encoding:
+        return None
+
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.lower().split(','):
+        name, _, params = item.strip().partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip()] = weight
+
+    wildcard = weights.get('*', 0.0)
+    best, best_weight = None, 0.0
+    # при равных весах порядок SUPPORTED_ENCODINGS задает предпочтение
+    for encoding in SUPPORTED_ENCODINGS:
+        weight = weights.get(encoding, wildcard)
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(data: bytes, encoding: str, memoized: bool = False) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_MEMO_QUALITY if memoized else BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_MEMO_LEVEL if memoized else GZIP_LEVEL, mtime=0)
+
+
+def _memo_get(key: Tuple[str, bytes]) -> Optional[str]:
+    with _memo_lock:
+        body = _memo.get(key)
+        if body is not None:
+            _memo.move_to_end(key)
+        return body
+
+
+def _memo_put(key: Tuple[str, bytes], body: str) -> None:
+    global _memo_bytes
+    if len(body) > COMPRESS_MEMO_MAX_BYTES:
+        return
+    with _memo_lock:
+        if key in _memo:
+            return
+        _memo[key] = body
+        _memo_bytes += len(body)
+        while _memo_bytes > COMPRESS_MEMO_MAX_BYTES:
+            _, evicted = _memo.popitem(last=False)
+            _memo_bytes -= len(evicted)
+
+
+def compress_response(response: Dict[str, Any], accept_encoding: str, cacheable: bool = False) -> Dict[str, Any]:
+    """Сжать тело ответа, если клиент это принимает и тело достаточно большое"""
+    body = response.get('body')
+    if not isinstance(body, str) or response.get('isBase64Encoded') or len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    headers = response.setdefault('headers', {})
+    headers['Vary'] = 'Accept-Encoding'
+    encoding = negotiate(accept_encoding)
+    if encoding is None:
+        return response
+
+    data = body.encode('utf-8')
+    if cacheable:
+        key = (encoding, hashlib.sha1(data).digest())
+        encoded = _memo_get(key)
+        if encoded is not None:
+            stats['memo_hits'] += 1
+        else:
+            stats['memo_misses'] += 1
+            encoded = base64.b64encode(compress(data, encoding, memoized=True)).decode('ascii')
+            _memo_put(key, encoded)
+    else:
+        encoded = base64.b64encode(compress(data, encoding)).decode('ascii')
+
+    stats['compressed'] += 1
+    stats['bytes_in'] += len(data)
+    stats['bytes_out'] += len(encoded) * 3 // 4
+
+    headers['Content-Encoding'] = encoding
+    response['body'] = encoded
+    response['isBase64Encoded'] = True
+    return response
@@ -0,0 +1,232 @@
+"""
+Учет SQL-запросов в пределах одного запроса к функции: число запросов, время в базе,
+самые медленные выражения и повторы одного и того же выражения (признак N+1).
+
+Соединение открывается через connect() - курсоры такого соединения замеряют execute/executemany
+и commit/rollback и пишут в трассу текущего запроса (start_trace/finish_trace; вне трассы замеров нет).
+В сводку попадает нормализованный текст SQL: литералы и параметры заменены на ?, пробелы схлопнуты,
+префикс схемы убран - значения параметров (телефоны, e-mail) в лог не попадают.
+По завершении запроса, который ходил в базу, в stdout пишется одна JSON-строка sql_trace;
+выражения дольше SQL_SLOW_QUERY_MS пишутся сразу отдельной строкой slow_query.
+Выражение, повторенное в запросе SQL_REPEAT_THRESHOLD раз и больше, попадает в список repeated.
+С SQL_SERVER_TIMING=true сводка добавляется в заголовок ответа Server-Timing.
+Модуль копируется в каждую функцию, которой нужен учет запросов.
+"""
+
+import json
+import os
+import re
+import time
+from contextvars import ContextVar
+from functools import lru_cache, wraps
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+    PSYCOPG2_AVAILABLE = True
+except ImportError:
+    PSYCOPG2_AVAILABLE = False
+
+SQL_TRACE_ENABLED = os.environ.get('SQL_TRACE_ENABLED', 'true').lower() != 'false'
+SQL_SLOW_QUERY_MS = float(os.environ.get('SQL_SLOW_QUERY_MS', '100'))
+SQL_REPEAT_THRESHOLD = int(os.environ.get('SQL_REPEAT_THRESHOLD', '5'))
+SQL_SERVER_TIMING = os.environ.get('SQL_SERVER_TIMING', 'false').lower() == 'true'
+SLOWEST_STATEMENTS = 3
+MAX_SQL_LENGTH = 300
+
+SCHEMA_PREFIX = 't_p56372141_online_booking_integ.'
+
+_current: ContextVar[Optional['RequestTrace']] = ContextVar('sql_trace', default=None)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|%\(\w+\)s|%s|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACES = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(query: str) -> str:
+    """Текст выражения без литералов и параметров - ключ для группировки"""
+    sql = _SPACES.sub(' ', query.replace(SCHEMA_PREFIX, '')).strip()
+    sql = _IN_LISTS.sub('(?)', _LITERALS.sub('?', sql))
+    return sql if len(sql) <= MAX_SQL_LENGTH else sql[:MAX_SQL_LENGTH] + '...'
+
+
+class RequestTrace:
+    """Замеры SQL одного запроса к функции"""
+
+    __slots__ = ('started', 'queries', 'db_ms', 'connect_ms', 'statements', 'token')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.connect_ms = 0.0
+        # исходный текст -> [число выполнений, суммарно мс, максимум мс]
+        self.statements: Dict[str, List[float]] = {}
+        self.token = None
+
+    def record(self, query: Any, elapsed_ms: float) -> None:
+        self.queries += 1
+        self.db_ms += elapsed_ms
+        key = query if isinstance(query, str) else str(query)
+        entry = self.statements.get(key)
+        if entry is None:
+            self.statements[key] = [1, elapsed_ms, elapsed_ms]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed_ms
+            if elapsed_ms > entry[2]:
+                entry[2] = elapsed_ms
+        if elapsed_ms >= SQL_SLOW_QUERY_MS:
+            print(json.dumps({'event': 'slow_query', 'ms': round(elapsed_ms, 1), 'sql': normalize_sql(key)},
+                             ensure_ascii=False))
+
+    def grouped(self) -> Dict[str, List[float]]:
+        """Замеры по нормализованному тексту: одинаковые выражения с разными литералами вместе"""
+        groups: Dict[str, List[float]] = {}
+        for query, (count, total_ms, max_ms) in self.statements.items():
+            sql = normalize_sql(query)
+            group = groups.get(sql)
+            if group is None:
+                groups[sql] = [count, total_ms, max_ms]
+            else:
+                group[0] += count
+                group[1] += total_ms
+                group[2] = max(group[2], max_ms)
+        return groups
+
+    def summary(self, route: str, status: Optional[int]) -> Dict[str, Any]:
+        groups = self.grouped()
+        slowest = sorted(groups.items(), key=lambda item: item[1][2], reverse=True)[:SLOWEST_STATEMENTS]
+        return {
+            'event': 'sql_trace',
+            'route': route,
+            'status': status,
+            'request_ms': round((time.perf_counter() - self.started) * 1000, 1),
+            'queries': self.queries,
+            'db_ms': round(self.db_ms, 1),
+            'connect_ms': round(self.connect_ms, 1),
+            'slowest': [
+                {'sql': sql, 'max_ms': round(max_ms, 1), 'count': count}
+                for sql, (count, _, max_ms) in slowest
+            ],
+            'repeated': [
+                {'sql': sql, 'count': count, 'total_ms': round(total_ms, 1)}
+                for sql, (count, total_ms, _) in groups.items() if count >= SQL_REPEAT_THRESHOLD
+            ]
+        }
+
+
+class _TracedCursorMixin:
+    def execute(self, query, vars=None):
+        trace = _current.get()
+        if trace is None:
+            return super().execute(query, vars)
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            trace.record(query, (time.perf_counter() - started) * 1000)
+
+    def executemany(self, query, vars_list):
+        trace = _current.get()
+        if trace is None:
+            return super().executemany(query, vars_list)
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            trace.record(query, (time.perf_counter() - started) * 1000)
+
+
+_traced_cursor_classes: Dict[type, type] = {}
+
+
+def traced_cursor_class(cursor_class: type) -> type:
+    """Подкласс курсора с замерами (один на исходный класс)"""
+    traced = _traced_cursor_classes.get(cursor_class)
+    if traced is None:
+        traced = type('Traced' + cursor_class.__name__, (_TracedCursorMixin, cursor_class), {})
+        _traced_cursor_classes[cursor_class] = traced
+    return traced
+
+
+class TracedConnection(psycopg2.extensions.connection if PSYCOPG2_AVAILABLE else object):
+    """Соединение, курсоры которого (с любым cursor_factory) замеряют запросы"""
+
+    def cursor(self, *args, **kwargs):
+        cursor_class = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = traced_cursor_class(cursor_class)
+        return super().cursor(*args, **kwargs)
+
+    def commit(self):
+        self._timed('COMMIT', super().commit)
+
+    def rollback(self):
+        self._timed('ROLLBACK', super().rollback)
+
+    def _timed(self, statement: str, call: Callable[[], None]) -> None:
+        trace = _current.get()
+        if trace is None:
+            call()
+            return
+        started = time.perf_counter()
+        try:
+            call()
+        finally:
+            trace.record(statement, (time.perf_counter() - started) * 1000)
+
+
+def connect(dsn: str, **kwargs):
+    """psycopg2.connect с учетом запросов; время установки соединения - в connect_ms трассы"""
+    trace = _current.get()
+    started = time.perf_counter()
+    conn = psycopg2.connect(dsn, connection_factory=TracedConnection, **kwargs)
+    if trace is not None:
+        trace.connect_ms += (time.perf_counter() - started) * 1000
+    return conn
+
+
+def start_trace() -> Optional[RequestTrace]:
+    """Начать трассу запроса; None, если учет выключен"""
+    if not SQL_TRACE_ENABLED:
+        return None
+    trace = RequestTrace()
+    trace.token = _current.set(trace)
+    return trace
+
+
+def finish_trace(trace: Optional[RequestTrace], route: str, response: Optional[Dict[str, Any]]) -> None:
+    """Закончить трассу: строка sql_trace в лог и Server-Timing, если запрос ходил в базу"""
+    if trace is None:
+        return
+    _current.reset(trace.token)
+    if not trace.queries and not trace.connect_ms:
+        return
+
+    status = response.get('statusCode') if isinstance(response, dict) else None
+    print(json.dumps(trace.summary(route, status), ensure_ascii=False))
+
+    if SQL_SERVER_TIMING and isinstance(response, dict):
+        headers = response.setdefault('headers', {})
+        headers['Server-Timing'] = (
+            f'db;dur={trace.db_ms:.1f};desc="{trace.queries} queries", dbconn;dur={trace.connect_ms:.1f}'
+        )
+        headers['Timing-Allow-Origin'] = '*'
+
+
+def traced_handler(route: Callable[[Dict[str, Any]], str]):
+    """Декоратор handler функции без маршрутизатора: трасса на каждый вызов, route(event) - имя в логе"""
+    def decorate(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]):
+        @wraps(handler)
+        def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+            trace = start_trace()
+            response = None
+            try:
+                response = handler(event, context)
+                return response
+            finally:
+                finish_trace(trace, route(event), response)
+        return wrapper
+    return decorate
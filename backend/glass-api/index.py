@@ -1,8 +1,6 @@
 import json
 import os
 from typing import Dict, Any, Optional
-from decimal import Decimal
-from datetime import datetime, date
 
 try:
     import psycopg2
@@ -11,481 +9,419 @@ try:
 except ImportError:
     DB_AVAILABLE = False
 
+from admin_tokens import is_admin_request, unauthorized_response
+import db_trace
+import metrics
+import profiler
+from router import Request, Router, json_response, text_response
+
 def get_db_connection():
     if not DB_AVAILABLE:
         return None
     database_url = os.environ.get('DATABASE_URL')
     if not database_url:
         return None
-    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    return db_trace.connect(database_url, cursor_factory=RealDictCursor)
 
-def convert_decimals(obj):
-    if isinstance(obj, list):
-        return [convert_decimals(item) for item in obj]
-    elif isinstance(obj, dict):
-        return {key: convert_decimals(value) for key, value in obj.items()}
-    elif isinstance(obj, Decimal):
-        return float(obj)
-    elif isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    return obj
+def request_action(request: Request) -> str:
+    # чтение - action в строке запроса, запись - в теле
+    if request.method == 'GET':
+        return request.params.get('action', '')
+    return request.body.get('action', '')
 
-def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
-    '''
-    Business: API для управления комплектами стеклянных конструкций
-    Args: event с httpMethod, queryStringParameters, body
-    Returns: JSON с данными комплектов, компонентов или результатом операций
-    '''
-    method: str = event.get('httpMethod', 'GET')
+def require_admin(request: Request) -> Optional[Dict[str, Any]]:
+    if not is_admin_request(request.event):
+        return unauthorized_response()
+    return None
+
+metrics.init('glass-api')
+
+# записи в каталог - только с токеном админа: каждый маршрут записи регистрируется с require_admin
+router = Router(get_db_connection, action=request_action, not_found=(400, 'Invalid action'), expose_errors=True,
+                can_profile=is_admin_request)
+
+def fetch_alternatives(cursor, components) -> None:
+    for comp in components:
+        cursor.execute("""
+            SELECT gc.*
+            FROM t_p56372141_online_booking_integ.component_alternatives ca
+            JOIN t_p56372141_online_booking_integ.glass_components gc ON ca.alternative_component_id = gc.component_id
+            WHERE ca.component_id = %s
+        """, (comp['component_id'],))
+        alternatives = cursor.fetchall()
+        comp['alternatives'] = alternatives if alternatives else []
+
+# каталог одинаков для всех посетителей: сжатые ответы маршрутов с cacheable=True запоминаются
+@router.route('GET', 'glass_packages', cacheable=True)
+def get_glass_packages(request: Request) -> Dict[str, Any]:
+    active_only = request.params.get('active_only') == 'true'
+    with_components = request.params.get('with_components') == 'true'
+    cursor = request.conn.cursor()
     
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Admin-Key',
-                'Access-Control-Max-Age': '86400'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+    if active_only:
+        cursor.execute("SELECT * FROM t_p56372141_online_booking_integ.glass_packages WHERE is_active = true ORDER BY package_id DESC")
+    else:
+        cursor.execute("SELECT * FROM t_p56372141_online_booking_integ.glass_packages ORDER BY package_id DESC")
     
-    action = event.get('queryStringParameters', {}).get('action', '')
-    conn = get_db_connection()
+    packages = cursor.fetchall()
     
-    if not conn:
-        return {
-            'statusCode': 503,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': 'Database unavailable'})
-        }
+    if with_components:
+        for pkg in packages:
+            cursor.execute("""
+                SELECT pc.*, gc.*
+                FROM t_p56372141_online_booking_integ.package_components pc
+                JOIN t_p56372141_online_booking_integ.glass_components gc ON pc.component_id = gc.component_id
+                WHERE pc.package_id = %s
+                ORDER BY pc.id
+            """, (pkg['package_id'],))
+            components = cursor.fetchall()
+            fetch_alternatives(cursor, components)
+            pkg['components'] = components
     
-    try:
-        cursor = conn.cursor()
+    return json_response({'packages': packages})
+
+@router.route('GET', 'glass_components', cacheable=True)
+def get_glass_components(request: Request) -> Dict[str, Any]:
+    cursor = request.conn.cursor()
+    cursor.execute("SELECT * FROM t_p56372141_online_booking_integ.glass_components ORDER BY component_name")
+    components = cursor.fetchall()
+    return json_response({'components': components})
+
+@router.route('GET', 'package_components', cacheable=True)
+def get_package_components(request: Request) -> Dict[str, Any]:
+    package_id = request.params.get('package_id')
+    cursor = request.conn.cursor()
+    cursor.execute("""
+        SELECT pc.*, gc.*
+        FROM t_p56372141_online_booking_integ.package_components pc
+        JOIN t_p56372141_online_booking_integ.glass_components gc ON pc.component_id = gc.component_id
+        WHERE pc.package_id = %s
+        ORDER BY pc.id
+    """, (package_id,))
+    components = cursor.fetchall()
+    fetch_alternatives(cursor, components)
+    
+    return json_response({'components': components})
+
+@router.route('GET', 'profile', require_admin)
+def get_profile(request: Request) -> Dict[str, Any]:
+    route = request.params.get('route', '')
+    export = request.params.get('format', 'summary')
+    if export == 'collapsed':
+        return text_response(profiler.export_collapsed(route))
+    if export == 'speedscope':
+        return json_response(profiler.export_speedscope(route))
+    if export == 'pstats':
+        return text_response(profiler.export_pstats(route))
+    return json_response({
+        'mode': profiler.PROFILE_MODE,
+        'sample_rate': profiler.PROFILE_SAMPLE_RATE,
+        'routes': profiler.summary()
+    })
+
+@router.route('DELETE', 'profile', require_admin)
+def reset_profile(request: Request) -> Dict[str, Any]:
+    profiler.reset()
+    return json_response({'success': True})
+
+@router.route('GET', 'metrics')
+def get_metrics(request: Request) -> Dict[str, Any]:
+    # Prometheus ходит с METRICS_TOKEN, из админки - с токеном админа
+    return metrics.metrics_response(request.event, allowed=is_admin_request(request.event))
+
+@router.route('POST', 'glass_package', require_admin)
+def create_glass_package(request: Request) -> Dict[str, Any]:
+    pkg = request.body.get('package', {})
+    conn = request.conn
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO t_p56372141_online_booking_integ.glass_packages
+        (package_name, package_article, product_type, glass_type, glass_thickness,
+         glass_price_per_sqm, hardware_set, hardware_price, markup_percent,
+         installation_price, description, sketch_image_url, is_active,
+         has_door, default_partition_height, default_partition_width,
+         default_door_height, default_door_width, sketch_svg,
+         default_door_position, default_door_offset, default_door_panels,
+         glass_sections_count, has_left_wall, has_right_wall, has_back_wall)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING package_id
+    """, (
+        pkg.get('package_name'), pkg.get('package_article'), pkg.get('product_type'),
+        pkg.get('glass_type'), pkg.get('glass_thickness'), pkg.get('glass_price_per_sqm'),
+        pkg.get('hardware_set', ''), pkg.get('hardware_price', 0), pkg.get('markup_percent', 20),
+        pkg.get('installation_price', 3000), pkg.get('description', ''),
+        pkg.get('sketch_image_url', ''), pkg.get('is_active', True),
+        pkg.get('has_door', False), pkg.get('default_partition_height', 1900),
+        pkg.get('default_partition_width', 1000), pkg.get('default_door_height', 1900),
+        pkg.get('default_door_width', 800), pkg.get('sketch_svg', ''),
+        pkg.get('default_door_position', 'center'), pkg.get('default_door_offset', '0'),
+        pkg.get('default_door_panels', 1), pkg.get('glass_sections_count', 1),
+        pkg.get('has_left_wall', False), pkg.get('has_right_wall', False), pkg.get('has_back_wall', False)
+    ))
+    result = cursor.fetchone()
+    conn.commit()
+    return json_response({'package_id': result['package_id']})
+
+@router.route('POST', 'glass_component', require_admin)
+def create_glass_component(request: Request) -> Dict[str, Any]:
+    body = request.body
+    conn = request.conn
+    cursor = conn.cursor()
+    
+    if body.get('action_type', 'create') == 'import':
+        import_mode = body.get('import_mode', 'skip')
+        imported = 0
+        skipped = 0
+        updated = 0
         
-        if method == 'GET':
-            if action == 'glass_packages':
-                params = event.get('queryStringParameters', {})
-                active_only = params.get('active_only') == 'true'
-                with_components = params.get('with_components') == 'true'
-                
-                if active_only:
-                    cursor.execute("SELECT * FROM t_p56372141_online_booking_integ.glass_packages WHERE is_active = true ORDER BY package_id DESC")
-                else:
-                    cursor.execute("SELECT * FROM t_p56372141_online_booking_integ.glass_packages ORDER BY package_id DESC")
-                
-                packages = cursor.fetchall()
-                
-                if with_components:
-                    for pkg in packages:
-                        cursor.execute("""
-                            SELECT pc.*, gc.* 
-                            FROM t_p56372141_online_booking_integ.package_components pc
-                            JOIN t_p56372141_online_booking_integ.glass_components gc ON pc.component_id = gc.component_id
-                            WHERE pc.package_id = %s
-                            ORDER BY pc.id
-                        """, (pkg['package_id'],))
-                        components = cursor.fetchall()
-                        
-                        for comp in components:
-                            cursor.execute("""
-                                SELECT gc.*
-                                FROM t_p56372141_online_booking_integ.component_alternatives ca
-                                JOIN t_p56372141_online_booking_integ.glass_components gc ON ca.alternative_component_id = gc.component_id
-                                WHERE ca.component_id = %s
-                            """, (comp['component_id'],))
-                            alternatives = cursor.fetchall()
-                            comp['alternatives'] = alternatives if alternatives else []
-                        
-                        pkg['components'] = components
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'packages': convert_decimals(packages)})
-                }
-            
-            elif action == 'glass_components':
-                cursor.execute("SELECT * FROM t_p56372141_online_booking_integ.glass_components ORDER BY component_name")
-                components = cursor.fetchall()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'components': convert_decimals(components)})
-                }
+        for comp in body.get('components', []):
+            article = comp.get('article', '')
+            name = comp.get('component_name', '')
             
-            elif action == 'package_components':
-                package_id = event.get('queryStringParameters', {}).get('package_id')
+            if article:
                 cursor.execute("""
-                    SELECT pc.*, gc.* 
-                    FROM t_p56372141_online_booking_integ.package_components pc
-                    JOIN t_p56372141_online_booking_integ.glass_components gc ON pc.component_id = gc.component_id
-                    WHERE pc.package_id = %s
-                    ORDER BY pc.id
-                """, (package_id,))
-                components = cursor.fetchall()
-                
-                for comp in components:
-                    cursor.execute("""
-                        SELECT gc.*
-                        FROM t_p56372141_online_booking_integ.component_alternatives ca
-                        JOIN t_p56372141_online_booking_integ.glass_components gc ON ca.alternative_component_id = gc.component_id
-                        WHERE ca.component_id = %s
-                    """, (comp['component_id'],))
-                    alternatives = cursor.fetchall()
-                    comp['alternatives'] = alternatives if alternatives else []
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'components': convert_decimals(components)})
-                }
-        
-        elif method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            action = body.get('action', '')
-            
-            if action == 'glass_package':
-                pkg = body.get('package', {})
+                    SELECT component_id FROM t_p56372141_online_booking_integ.glass_components
+                    WHERE article = %s AND component_name = %s
+                """, (article, name))
+            else:
                 cursor.execute("""
-                    INSERT INTO t_p56372141_online_booking_integ.glass_packages 
-                    (package_name, package_article, product_type, glass_type, glass_thickness, 
-                     glass_price_per_sqm, hardware_set, hardware_price, markup_percent, 
-                     installation_price, description, sketch_image_url, is_active,
-                     has_door, default_partition_height, default_partition_width,
-                     default_door_height, default_door_width, sketch_svg,
-                     default_door_position, default_door_offset, default_door_panels,
-                     glass_sections_count, has_left_wall, has_right_wall, has_back_wall)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING package_id
-                """, (
-                    pkg.get('package_name'), pkg.get('package_article'), pkg.get('product_type'),
-                    pkg.get('glass_type'), pkg.get('glass_thickness'), pkg.get('glass_price_per_sqm'),
-                    pkg.get('hardware_set', ''), pkg.get('hardware_price', 0), pkg.get('markup_percent', 20),
-                    pkg.get('installation_price', 3000), pkg.get('description', ''),
-                    pkg.get('sketch_image_url', ''), pkg.get('is_active', True),
-                    pkg.get('has_door', False), pkg.get('default_partition_height', 1900),
-                    pkg.get('default_partition_width', 1000), pkg.get('default_door_height', 1900),
-                    pkg.get('default_door_width', 800), pkg.get('sketch_svg', ''),
-                    pkg.get('default_door_position', 'center'), pkg.get('default_door_offset', '0'),
-                    pkg.get('default_door_panels', 1), pkg.get('glass_sections_count', 1),
-                    pkg.get('has_left_wall', False), pkg.get('has_right_wall', False), pkg.get('has_back_wall', False)
-                ))
-                result = cursor.fetchone()
-                conn.commit()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'package_id': result['package_id']})
-                }
+                    SELECT component_id FROM t_p56372141_online_booking_integ.glass_components
+                    WHERE component_name = %s AND component_type = %s
+                """, (name, comp.get('component_type')))
+            
+            existing = cursor.fetchone()
             
-            elif action == 'glass_component':
-                action_type = body.get('action_type', 'create')
-                
-                if action_type == 'import':
-                    components = body.get('components', [])
-                    import_mode = body.get('import_mode', 'skip')
-                    imported = 0
-                    skipped = 0
-                    updated = 0
-                    
-                    for comp in components:
-                        article = comp.get('article', '')
-                        name = comp.get('component_name', '')
-                        
-                        if article:
-                            cursor.execute("""
-                                SELECT component_id FROM t_p56372141_online_booking_integ.glass_components 
-                                WHERE article = %s AND component_name = %s
-                            """, (article, name))
-                        else:
-                            cursor.execute("""
-                                SELECT component_id FROM t_p56372141_online_booking_integ.glass_components 
-                                WHERE component_name = %s AND component_type = %s
-                            """, (name, comp.get('component_type')))
-                        
-                        existing = cursor.fetchone()
-                        
-                        if existing:
-                            if import_mode == 'skip':
-                                skipped += 1
-                                continue
-                            else:
-                                cursor.execute("""
-                                    UPDATE t_p56372141_online_booking_integ.glass_components 
-                                    SET component_type = %s, article = %s, characteristics = %s, 
-                                        unit = %s, price_per_unit = %s, is_active = %s, image_url = %s
-                                    WHERE component_id = %s
-                                """, (
-                                    comp.get('component_type'), article, comp.get('characteristics', ''),
-                                    comp.get('unit', 'шт'), comp.get('price_per_unit', 0), 
-                                    comp.get('is_active', True), comp.get('image_url', ''),
-                                    existing[0]
-                                ))
-                                updated += 1
-                                continue
-                        
-                        cursor.execute("""
-                            INSERT INTO t_p56372141_online_booking_integ.glass_components 
-                            (component_name, component_type, article, characteristics, unit, price_per_unit, is_active, image_url)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                        """, (
-                            name, comp.get('component_type'), article,
-                            comp.get('characteristics', ''), comp.get('unit', 'шт'),
-                            comp.get('price_per_unit', 0), comp.get('is_active', True), comp.get('image_url', '')
-                        ))
-                        imported += 1
-                    conn.commit()
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'imported': imported, 'skipped': skipped, 'updated': updated})
-                    }
+            if existing:
+                if import_mode == 'skip':
+                    skipped += 1
+                    continue
                 else:
-                    comp = body.get('component', {})
                     cursor.execute("""
-                        INSERT INTO t_p56372141_online_booking_integ.glass_components 
-                        (component_name, component_type, article, characteristics, unit, price_per_unit, is_active, image_url)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                        RETURNING component_id
+                        UPDATE t_p56372141_online_booking_integ.glass_components
+                        SET component_type = %s, article = %s, characteristics = %s,
+                            unit = %s, price_per_unit = %s, is_active = %s, image_url = %s
+                        WHERE component_id = %s
                     """, (
-                        comp.get('component_name'), comp.get('component_type'), comp.get('article'),
-                        comp.get('characteristics', ''), comp.get('unit', 'шт'),
-                        comp.get('price_per_unit', 0), comp.get('is_active', True), comp.get('image_url', '')
+                        comp.get('component_type'), article, comp.get('characteristics', ''),
+                        comp.get('unit', 'шт'), comp.get('price_per_unit', 0),
+                        comp.get('is_active', True), comp.get('image_url', ''),
+                        existing['component_id']
                     ))
-                    result = cursor.fetchone()
-                    conn.commit()
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'isBase64Encoded': False,
-                        'body': json.dumps({'component_id': result['component_id']})
-                    }
-            
-            elif action == 'package_component':
-                package_id = body.get('package_id')
-                component_id = body.get('component_id')
-                quantity = body.get('quantity', 1)
-                is_required = body.get('is_required', True)
-                
-                cursor.execute("""
-                    SELECT id FROM t_p56372141_online_booking_integ.package_components 
-                    WHERE package_id = %s AND component_id = %s
-                """, (package_id, component_id))
-                existing = cursor.fetchone()
-                
-                if existing:
-                    cursor.execute("""
-                        UPDATE t_p56372141_online_booking_integ.package_components 
-                        SET quantity = %s, is_required = %s
-                        WHERE package_id = %s AND component_id = %s
-                    """, (quantity, is_required, package_id, component_id))
-                else:
-                    cursor.execute("""
-                        INSERT INTO t_p56372141_online_booking_integ.package_components 
-                        (package_id, component_id, quantity, is_required)
-                        VALUES (%s, %s, %s, %s)
-                    """, (package_id, component_id, quantity, is_required))
-                
-                conn.commit()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'success': True})
-                }
+                    updated += 1
+                    continue
             
-            elif action == 'component_alternative':
-                component_id = body.get('component_id')
-                alternative_id = body.get('alternative_component_id')
-                
-                cursor.execute("""
-                    SELECT id FROM t_p56372141_online_booking_integ.component_alternatives 
-                    WHERE component_id = %s AND alternative_component_id = %s
-                """, (component_id, alternative_id))
-                existing = cursor.fetchone()
-                
-                if not existing:
-                    cursor.execute("""
-                        INSERT INTO t_p56372141_online_booking_integ.component_alternatives 
-                        (component_id, alternative_component_id)
-                        VALUES (%s, %s)
-                    """, (component_id, alternative_id))
-                
-                conn.commit()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'success': True})
-                }
-            
-            elif action == 'swap_main_alternative':
-                package_id = body.get('package_id')
-                current_main_id = body.get('current_main_id')
-                new_main_id = body.get('new_main_id')
-                
-                cursor.execute("""
-                    SELECT quantity, is_required FROM t_p56372141_online_booking_integ.package_components 
-                    WHERE package_id = %s AND component_id = %s
-                """, (package_id, current_main_id))
-                main_data = cursor.fetchone()
-                
-                if main_data:
-                    cursor.execute("""
-                        DELETE FROM t_p56372141_online_booking_integ.component_alternatives 
-                        WHERE component_id = %s AND alternative_component_id = %s
-                    """, (current_main_id, new_main_id))
-                    
-                    cursor.execute("""
-                        UPDATE t_p56372141_online_booking_integ.package_components 
-                        SET component_id = %s
-                        WHERE package_id = %s AND component_id = %s
-                    """, (new_main_id, package_id, current_main_id))
-                    
-                    cursor.execute("""
-                        INSERT INTO t_p56372141_online_booking_integ.component_alternatives 
-                        (component_id, alternative_component_id)
-                        VALUES (%s, %s)
-                    """, (new_main_id, current_main_id))
-                    
-                    cursor.execute("""
-                        UPDATE t_p56372141_online_booking_integ.component_alternatives 
-                        SET component_id = %s
-                        WHERE component_id = %s
-                    """, (new_main_id, current_main_id))
-                
-                conn.commit()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'success': True})
-                }
+            cursor.execute("""
+                INSERT INTO t_p56372141_online_booking_integ.glass_components
+                (component_name, component_type, article, characteristics, unit, price_per_unit, is_active, image_url)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """, (
+                name, comp.get('component_type'), article,
+                comp.get('characteristics', ''), comp.get('unit', 'шт'),
+                comp.get('price_per_unit', 0), comp.get('is_active', True), comp.get('image_url', '')
+            ))
+            imported += 1
+        conn.commit()
+        return json_response({'imported': imported, 'skipped': skipped, 'updated': updated})
+    
+    comp = body.get('component', {})
+    cursor.execute("""
+        INSERT INTO t_p56372141_online_booking_integ.glass_components
+        (component_name, component_type, article, characteristics, unit, price_per_unit, is_active, image_url, image_variants)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING component_id
+    """, (
+        comp.get('component_name'), comp.get('component_type'), comp.get('article'),
+        comp.get('characteristics', ''), comp.get('unit', 'шт'),
+        comp.get('price_per_unit', 0), comp.get('is_active', True), comp.get('image_url', ''),
+        json.dumps(comp['image_variants']) if comp.get('image_variants') else None
+    ))
+    result = cursor.fetchone()
+    conn.commit()
+    return json_response({'component_id': result['component_id']})
+
+@router.route('POST', 'package_component', require_admin)
+def save_package_component(request: Request) -> Dict[str, Any]:
+    body = request.body
+    package_id = body.get('package_id')
+    component_id = body.get('component_id')
+    quantity = body.get('quantity', 1)
+    is_required = body.get('is_required', True)
+    conn = request.conn
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT id FROM t_p56372141_online_booking_integ.package_components
+        WHERE package_id = %s AND component_id = %s
+    """, (package_id, component_id))
+    existing = cursor.fetchone()
+    
+    if existing:
+        cursor.execute("""
+            UPDATE t_p56372141_online_booking_integ.package_components
+            SET quantity = %s, is_required = %s
+            WHERE package_id = %s AND component_id = %s
+        """, (quantity, is_required, package_id, component_id))
+    else:
+        cursor.execute("""
+            INSERT INTO t_p56372141_online_booking_integ.package_components
+            (package_id, component_id, quantity, is_required)
+            VALUES (%s, %s, %s, %s)
+        """, (package_id, component_id, quantity, is_required))
+    
+    conn.commit()
+    return json_response({'success': True})
+
+@router.route('POST', 'component_alternative', require_admin)
+def add_component_alternative(request: Request) -> Dict[str, Any]:
+    component_id = request.body.get('component_id')
+    alternative_id = request.body.get('alternative_component_id')
+    conn = request.conn
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT id FROM t_p56372141_online_booking_integ.component_alternatives
+        WHERE component_id = %s AND alternative_component_id = %s
+    """, (component_id, alternative_id))
+    existing = cursor.fetchone()
+    
+    if not existing:
+        cursor.execute("""
+            INSERT INTO t_p56372141_online_booking_integ.component_alternatives
+            (component_id, alternative_component_id)
+            VALUES (%s, %s)
+        """, (component_id, alternative_id))
+    
+    conn.commit()
+    return json_response({'success': True})
+
+@router.route('POST', 'swap_main_alternative', require_admin)
+def swap_main_alternative(request: Request) -> Dict[str, Any]:
+    package_id = request.body.get('package_id')
+    current_main_id = request.body.get('current_main_id')
+    new_main_id = request.body.get('new_main_id')
+    conn = request.conn
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        SELECT quantity, is_required FROM t_p56372141_online_booking_integ.package_components
+        WHERE package_id = %s AND component_id = %s
+    """, (package_id, current_main_id))
+    main_data = cursor.fetchone()
+    
+    if main_data:
+        cursor.execute("""
+            DELETE FROM t_p56372141_online_booking_integ.component_alternatives
+            WHERE component_id = %s AND alternative_component_id = %s
+        """, (current_main_id, new_main_id))
         
-        elif method == 'PUT':
-            body = json.loads(event.get('body', '{}'))
-            action = body.get('action', '')
-            
-            if action == 'glass_package':
-                pkg = body.get('package', {})
-                cursor.execute("""
-                    UPDATE t_p56372141_online_booking_integ.glass_packages 
-                    SET package_name=%s, package_article=%s, product_type=%s, glass_type=%s,
-                        glass_thickness=%s, glass_price_per_sqm=%s, hardware_set=%s, hardware_price=%s,
-                        markup_percent=%s, installation_price=%s, description=%s, sketch_image_url=%s, is_active=%s,
-                        has_door=%s, default_partition_height=%s, default_partition_width=%s,
-                        default_door_height=%s, default_door_width=%s, sketch_svg=%s,
-                        default_door_position=%s, default_door_offset=%s, default_door_panels=%s,
-                        glass_sections_count=%s, has_left_wall=%s, has_right_wall=%s, has_back_wall=%s
-                    WHERE package_id=%s
-                """, (
-                    pkg.get('package_name'), pkg.get('package_article'), pkg.get('product_type'),
-                    pkg.get('glass_type'), pkg.get('glass_thickness'), pkg.get('glass_price_per_sqm'),
-                    pkg.get('hardware_set', ''), pkg.get('hardware_price', 0), pkg.get('markup_percent', 20),
-                    pkg.get('installation_price', 3000), pkg.get('description', ''),
-                    pkg.get('sketch_image_url', ''), pkg.get('is_active', True),
-                    pkg.get('has_door', False), pkg.get('default_partition_height', 1900),
-                    pkg.get('default_partition_width', 1000), pkg.get('default_door_height', 1900),
-                    pkg.get('default_door_width', 800), pkg.get('sketch_svg', ''),
-                    pkg.get('default_door_position', 'center'), pkg.get('default_door_offset', '0'),
-                    pkg.get('default_door_panels', 1), pkg.get('glass_sections_count', 1),
-                    pkg.get('has_left_wall', False), pkg.get('has_right_wall', False), pkg.get('has_back_wall', False),
-                    pkg.get('package_id')
-                ))
-                conn.commit()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'success': True})
-                }
-            
-            elif action == 'glass_component':
-                comp = body.get('component', {})
-                cursor.execute("""
-                    UPDATE t_p56372141_online_booking_integ.glass_components 
-                    SET component_name=%s, component_type=%s, article=%s, characteristics=%s,
-                        unit=%s, price_per_unit=%s, is_active=%s, image_url=%s
-                    WHERE component_id=%s
-                """, (
-                    comp.get('component_name'), comp.get('component_type'), comp.get('article'),
-                    comp.get('characteristics', ''), comp.get('unit', 'шт'),
-                    comp.get('price_per_unit', 0), comp.get('is_active', True), comp.get('image_url', ''), comp.get('component_id')
-                ))
-                conn.commit()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'success': True})
-                }
+        cursor.execute("""
+            UPDATE t_p56372141_online_booking_integ.package_components
+            SET component_id = %s
+            WHERE package_id = %s AND component_id = %s
+        """, (new_main_id, package_id, current_main_id))
         
-        elif method == 'DELETE':
-            body = json.loads(event.get('body', '{}'))
-            action = body.get('action', '')
-            
-            if action == 'glass_package':
-                package_id = body.get('package_id')
-                cursor.execute("DELETE FROM t_p56372141_online_booking_integ.package_components WHERE package_id = %s", (package_id,))
-                cursor.execute("DELETE FROM t_p56372141_online_booking_integ.glass_packages WHERE package_id = %s", (package_id,))
-                conn.commit()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'success': True})
-                }
-            
-            elif action == 'glass_component':
-                component_id = body.get('component_id')
-                cursor.execute("DELETE FROM t_p56372141_online_booking_integ.glass_components WHERE component_id = %s", (component_id,))
-                conn.commit()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'success': True})
-                }
-            
-            elif action == 'component_alternative':
-                component_id = body.get('component_id')
-                alternative_id = body.get('alternative_component_id')
-                cursor.execute("""
-                    DELETE FROM t_p56372141_online_booking_integ.component_alternatives 
-                    WHERE component_id = %s AND alternative_component_id = %s
-                """, (component_id, alternative_id))
-                conn.commit()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'isBase64Encoded': False,
-                    'body': json.dumps({'success': True})
-                }
+        cursor.execute("""
+            INSERT INTO t_p56372141_online_booking_integ.component_alternatives
+            (component_id, alternative_component_id)
+            VALUES (%s, %s)
+        """, (new_main_id, current_main_id))
         
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': 'Invalid action'})
-        }
+        cursor.execute("""
+            UPDATE t_p56372141_online_booking_integ.component_alternatives
+            SET component_id = %s
+            WHERE component_id = %s
+        """, (new_main_id, current_main_id))
     
-    except Exception as e:
-        conn.rollback()
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'isBase64Encoded': False,
-            'body': json.dumps({'error': str(e)})
-        }
-    
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+    conn.commit()
+    return json_response({'success': True})
+
+@router.route('PUT', 'glass_package', require_admin)
+def update_glass_package(request: Request) -> Dict[str, Any]:
+    pkg = request.body.get('package', {})
+    conn = request.conn
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE t_p56372141_online_booking_integ.glass_packages
+        SET package_name=%s, package_article=%s, product_type=%s, glass_type=%s,
+            glass_thickness=%s, glass_price_per_sqm=%s, hardware_set=%s, hardware_price=%s,
+            markup_percent=%s, installation_price=%s, description=%s, sketch_image_url=%s, is_active=%s,
+            has_door=%s, default_partition_height=%s, default_partition_width=%s,
+            default_door_height=%s, default_door_width=%s, sketch_svg=%s,
+            default_door_position=%s, default_door_offset=%s, default_door_panels=%s,
+            glass_sections_count=%s, has_left_wall=%s, has_right_wall=%s, has_back_wall=%s
+        WHERE package_id=%s
+    """, (
+        pkg.get('package_name'), pkg.get('package_article'), pkg.get('product_type'),
+        pkg.get('glass_type'), pkg.get('glass_thickness'), pkg.get('glass_price_per_sqm'),
+        pkg.get('hardware_set', ''), pkg.get('hardware_price', 0), pkg.get('markup_percent', 20),
+        pkg.get('installation_price', 3000), pkg.get('description', ''),
+        pkg.get('sketch_image_url', ''), pkg.get('is_active', True),
+        pkg.get('has_door', False), pkg.get('default_partition_height', 1900),
+        pkg.get('default_partition_width', 1000), pkg.get('default_door_height', 1900),
+        pkg.get('default_door_width', 800), pkg.get('sketch_svg', ''),
+        pkg.get('default_door_position', 'center'), pkg.get('default_door_offset', '0'),
+        pkg.get('default_door_panels', 1), pkg.get('glass_sections_count', 1),
+        pkg.get('has_left_wall', False), pkg.get('has_right_wall', False), pkg.get('has_back_wall', False),
+        pkg.get('package_id')
+    ))
+    conn.commit()
+    return json_response({'success': True})
+
+@router.route('PUT', 'glass_component', require_admin)
+def update_glass_component(request: Request) -> Dict[str, Any]:
+    comp = request.body.get('component', {})
+    conn = request.conn
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE t_p56372141_online_booking_integ.glass_components
+        SET component_name=%s, component_type=%s, article=%s, characteristics=%s,
+            unit=%s, price_per_unit=%s, is_active=%s, image_url=%s, image_variants=%s
+        WHERE component_id=%s
+    """, (
+        comp.get('component_name'), comp.get('component_type'), comp.get('article'),
+        comp.get('characteristics', ''), comp.get('unit', 'шт'),
+        comp.get('price_per_unit', 0), comp.get('is_active', True), comp.get('image_url', ''),
+        json.dumps(comp['image_variants']) if comp.get('image_variants') else None, comp.get('component_id')
+    ))
+    conn.commit()
+    return json_response({'success': True})
+
+@router.route('DELETE', 'glass_package', require_admin)
+def delete_glass_package(request: Request) -> Dict[str, Any]:
+    package_id = request.body.get('package_id')
+    conn = request.conn
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM t_p56372141_online_booking_integ.package_components WHERE package_id = %s", (package_id,))
+    cursor.execute("DELETE FROM t_p56372141_online_booking_integ.glass_packages WHERE package_id = %s", (package_id,))
+    conn.commit()
+    return json_response({'success': True})
+
+@router.route('DELETE', 'glass_component', require_admin)
+def delete_glass_component(request: Request) -> Dict[str, Any]:
+    component_id = request.body.get('component_id')
+    conn = request.conn
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM t_p56372141_online_booking_integ.glass_components WHERE component_id = %s", (component_id,))
+    conn.commit()
+    return json_response({'success': True})
+
+@router.route('DELETE', 'component_alternative', require_admin)
+def delete_component_alternative(request: Request) -> Dict[str, Any]:
+    component_id = request.body.get('component_id')
+    alternative_id = request.body.get('alternative_component_id')
+    conn = request.conn
+    cursor = conn.cursor()
+    cursor.execute("""
+        DELETE FROM t_p56372141_online_booking_integ.component_alternatives
+        WHERE component_id = %s AND alternative_component_id = %s
+    """, (component_id, alternative_id))
+    conn.commit()
+    return json_response({'success': True})
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    '''
+    Business: API для управления комплектами стеклянных конструкций
+    Args: event с httpMethod, queryStringParameters, body
+    Returns: JSON с данными комплектов, компонентов или результатом операций
+    '''
+    return router.dispatch(event)
@@ -0,0 +1,76 @@
+"""
+Обработка изображений компонентов: из исходного файла нарезаются WebP-варианты
+стандартных размеров. Ключи в бакете строятся от SHA-256 содержимого, поэтому
+одинаковые файлы хранятся один раз и повторно не обрабатываются.
+"""
+
+import hashlib
+import io
+from typing import Dict, NamedTuple
+
+from PIL import Image, ImageOps
+
+IMAGE_VARIANTS = {
+    'full': 1200,
+    'card': 480,
+    'thumb': 160,
+}
+PRIMARY_VARIANT = 'card'
+WEBP_QUALITY = 80
+KEY_PREFIX = 'glass-components'
+SOURCE_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+# защита от «бомб» - файлов с огромными размерами при малом весе
+Image.MAX_IMAGE_PIXELS = 50_000_000
+
+
+class RenderedImage(NamedTuple):
+    content_type: str
+    variants: Dict[str, bytes]
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 содержимого файла"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def variant_key(digest: str, variant: str) -> str:
+    """Ключ WebP-варианта в бакете"""
+    return f'{KEY_PREFIX}/{digest}/{variant}.webp'
+
+
+def original_key(digest: str) -> str:
+    """Ключ исходного файла в бакете (тип содержимого хранится в метаданных объекта)"""
+    return f'{KEY_PREFIX}/{digest}/original'
+
+
+def render_variants(data: bytes) -> RenderedImage:
+    """
+    Нарезать WebP-варианты из исходного файла. Варианты считаются от большего к меньшему,
+    каждый следующий уменьшается из предыдущего; меньшие исходники не увеличиваются.
+    ValueError - если файл не является поддерживаемым изображением.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.format not in SOURCE_FORMATS:
+            raise ValueError(f'Unsupported image format: {image.format}')
+        image_format = image.format
+
+        largest = max(IMAGE_VARIANTS.values())
+        # JPEG можно сразу декодировать в уменьшенном масштабе
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError('File is not a valid image') from e
+
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    variants = {}
+    for variant, size in sorted(IMAGE_VARIANTS.items(), key=lambda item: -item[1]):
+        image.thumbnail((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+        variants[variant] = buffer.getvalue()
+
+    return RenderedImage(Image.MIME[image_format], variants)
@@ -1,17 +1,130 @@
 import json
 import os
 import base64
+import ipaddress
 import uuid
-import boto3
-from typing import Dict, Any
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+import requests
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from botocore.exceptions import ClientError
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+from typing import Dict, Any, List, Optional, Tuple
 
+from admin_tokens import is_admin_request, unauthorized_response
+from image_pipeline import IMAGE_VARIANTS, PRIMARY_VARIANT, content_hash, original_key, render_variants, variant_key
+import metrics
+from s3_storage import storage, timings
+
+PRESIGN_EXPIRES_SECONDS = 900
+MAX_UPLOAD_BYTES = int(os.environ.get('S3_MAX_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+ALLOWED_CONTENT_TYPES = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/webp': '.webp',
+}
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Составная загрузка эскизов и PDF-спецификаций комплектов: части идут в S3 напрямую
+# по подписанным ссылкам (или по одной через функцию), файл целиком нигде не буферизуется
+MULTIPART_CONTENT_TYPES = dict(ALLOWED_CONTENT_TYPES, **{'application/pdf': '.pdf'})
+MULTIPART_MAX_BYTES = int(os.environ.get('S3_MULTIPART_MAX_BYTES', str(500 * 1024 * 1024)))
+MULTIPART_MIN_PART_BYTES = 5 * 1024 * 1024
+MULTIPART_DEFAULT_PART_BYTES = 8 * 1024 * 1024
+MULTIPART_MAX_PARTS = 10000
+MULTIPART_PART_URLS_PER_REQUEST = 100
+
+# Массовая загрузка изображений по ссылкам из прайс-листов поставщиков
+INGEST_MAX_ITEMS = 500
+INGEST_MAX_WORKERS = int(os.environ.get('S3_INGEST_MAX_WORKERS', '8'))
+INGEST_CONNECT_TIMEOUT_SECONDS = 5
+INGEST_READ_TIMEOUT_SECONDS = 20
+INGEST_CHUNK_BYTES = 64 * 1024
+INGEST_MAX_REDIRECTS = 3
+# хосты, которым можно разрешаться во внутренние адреса (зеркало поставщика в своей сети, локальный прогон)
+INGEST_TRUSTED_HOSTS = frozenset(
+    host.strip().lower() for host in os.environ.get('S3_INGEST_TRUSTED_HOSTS', '').split(',') if host.strip()
+)
+
+
+def check_public_peer(host: str, address: str) -> None:
+    """
+    Адрес, к которому подключились, должен быть публичным: ссылка из прайс-листа не может вести
+    в сеть функции (метаданные облака, localhost, частные сети).
+    """
+    if host.lower() in INGEST_TRUSTED_HOSTS:
+        return
+    ip = ipaddress.ip_address(address)
+    if not ip.is_global or ip.is_multicast:
+        raise ValueError('source_url must point to a public address')
+
+
+class PublicPeerMixin:
+    """
+    Проверка адреса сразу после TCP-соединения: проверяется тот адрес, в который хост
+    действительно разрешился (повторное разрешение DNS ее не обходит), на каждом переходе.
+    """
+
+    def _new_conn(self):
+        sock = super()._new_conn()
+        try:
+            check_public_peer(self.host, sock.getpeername()[0])
+        except ValueError:
+            sock.close()
+            raise
+        return sock
+
+
+class PublicHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = type('PublicHTTPConnection', (PublicPeerMixin, HTTPConnection), {})
+
+
+class PublicHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = type('PublicHTTPSConnection', (PublicPeerMixin, HTTPSConnection), {})
+
+
+class PublicOnlyAdapter(requests.adapters.HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': PublicHTTPConnectionPool, 'https': PublicHTTPSConnectionPool}
+
+
+# соединения с серверами поставщиков переиспользуются потоками пула; прокси из окружения
+# не используются - иначе проверялся бы адрес прокси, а не поставщика
+http_session = requests.Session()
+http_session.trust_env = False
+http_session.mount('http://', PublicOnlyAdapter(pool_maxsize=INGEST_MAX_WORKERS))
+http_session.mount('https://', PublicOnlyAdapter(pool_maxsize=INGEST_MAX_WORKERS))
+
+metrics.init('s3-upload')
+
+@metrics.instrumented_handler(['upload', 'presign', 'complete', 'ingest', 'multipart_initiate', 'multipart_part',
+                               'multipart_list', 'multipart_complete', 'multipart_abort'])
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
-    Бизнес: Загрузка изображений в Beget S3 хранилище
-    Args: event - dict с httpMethod, body (base64 encoded image)
+    Бизнес: Загрузка изображений в Beget S3 хранилище с нарезкой WebP-вариантов (только с токеном админа в X-Admin-Key)
+    Args: event - dict с httpMethod, body (base64 encoded image, component_id)
+          или body.action: presign - подписанная ссылка для загрузки напрямую в S3,
+          complete - проверка загруженного объекта и нарезка вариантов,
+          multipart_initiate / multipart_part / multipart_list / multipart_complete / multipart_abort -
+          составная загрузка больших эскизов и документов,
+          ingest - загрузка изображений компонентов по ссылкам на публичные адреса (items: [{component_id, source_url}]);
+          GET ?action=metrics - метрики в формате Prometheus (Authorization: Bearer METRICS_TOKEN)
           context - объект с атрибутами request_id, function_name
-    Returns: HTTP response с URL загруженного изображения
+    Returns: HTTP response с URL основного варианта и всех вариантов изображения
     '''
+    timings.start()
+    response = handle_request(event)
+    response['headers']['Server-Timing'] = timings.server_timing()
+    print(f"s3-upload timing: {json.dumps(timings.summary())}")
+    return response
+
+
+def handle_request(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Разбор запроса и выбор действия"""
     method: str = event.get('httpMethod', 'POST')
     
     if method == 'OPTIONS':
@@ -20,7 +133,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Headers': 'Content-Type, X-Admin-Key',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -28,76 +141,619 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     if method != 'POST':
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Method not allowed'}),
-            'isBase64Encoded': False
-        }
+        return json_response(405, {'error': 'Method not allowed'})
     
-    access_key = os.environ.get('BEGET_S3_ACCESS_KEY')
-    secret_key = os.environ.get('BEGET_S3_SECRET_KEY')
-    bucket_name = os.environ.get('BEGET_S3_BUCKET_NAME')
+    # все действия пишут в каталог или в s3_uploads - только из админки
+    if not is_admin_request(event):
+        return unauthorized_response()
     
-    if not all([access_key, secret_key, bucket_name]):
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'S3 credentials not configured'}),
-            'isBase64Encoded': False
-        }
+    if not storage.configured:
+        return json_response(500, {'error': 'S3 credentials not configured'})
+    
+    bucket_name = storage.bucket
     
     body_data = json.loads(event.get('body', '{}'))
+    action = body_data.get('action')
+    metrics.set_route(action or 'upload')
+    
+    if action == 'presign':
+        return presign_upload(body_data, bucket_name)
+    
+    if action == 'complete':
+        return complete_upload(body_data.get('key', ''), bucket_name, body_data.get('component_id'))
+    
+    if action == 'ingest':
+        return ingest_remote_images(body_data.get('items') or [], bucket_name)
+    
+    if action in MULTIPART_ACTIONS:
+        return MULTIPART_ACTIONS[action](body_data, bucket_name)
+    
     image_base64 = body_data.get('image')
-    filename = body_data.get('filename', f'{uuid.uuid4()}.jpg')
+    component_id = body_data.get('component_id')
     
     if not image_base64:
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'No image provided'}),
-            'isBase64Encoded': False
-        }
+        return json_response(400, {'error': 'No image provided'})
     
     if ',' in image_base64:
         image_base64 = image_base64.split(',')[1]
     
     image_data = base64.b64decode(image_base64)
     
-    s3_client = boto3.client(
-        's3',
-        endpoint_url='https://s3.beget.com',
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        region_name='ru-1'
+    try:
+        image = store_image(storage.client, bucket_name, image_data)
+    except ValueError as e:
+        return json_response(422, {'error': str(e)})
+    
+    if component_id:
+        conn = get_db_connection()
+        if not conn:
+            return json_response(503, {'error': 'Database unavailable'})
+        try:
+            record_component_image(conn.cursor(), component_id, image['variants'])
+            conn.commit()
+        finally:
+            conn.close()
+    
+    return json_response(200, image)
+
+
+def store_image(s3_client, bucket_name: str, data: bytes) -> Dict[str, Any]:
+    """
+    Сохранить исходник и WebP-варианты под ключами от SHA-256 содержимого.
+    Основной вариант пишется последним и служит признаком готовности: если он уже есть,
+    эти байты уже обработаны и нарезка пропускается.
+    """
+    digest = content_hash(data)
+    marker_key = variant_key(digest, PRIMARY_VARIANT)
+    variants = {'original': storage.public_url(original_key(digest))}
+    
+    try:
+        s3_client.head_object(Bucket=bucket_name, Key=marker_key)
+        deduplicated = True
+    except ClientError:
+        deduplicated = False
+    
+    if not deduplicated:
+        with timings.measure('image'):
+            rendered = render_variants(data)
+        s3_client.put_object(Bucket=bucket_name, Key=original_key(digest), Body=data,
+                             ContentType=rendered.content_type, CacheControl=IMMUTABLE_CACHE_CONTROL)
+        ordered = sorted(rendered.variants, key=lambda name: name == PRIMARY_VARIANT)
+        for name in ordered:
+            s3_client.put_object(Bucket=bucket_name, Key=variant_key(digest, name), Body=rendered.variants[name],
+                                 ContentType='image/webp', CacheControl=IMMUTABLE_CACHE_CONTROL)
+    
+    for name in IMAGE_VARIANTS:
+        variants[name] = storage.public_url(variant_key(digest, name))
+    
+    return {
+        'url': variants[PRIMARY_VARIANT],
+        'variants': variants,
+        'hash': digest,
+        'deduplicated': deduplicated
+    }
+
+
+def record_component_image(cursor, component_id: int, variants: Dict[str, str]) -> None:
+    """Записать основной вариант и все варианты изображения в компонент"""
+    cursor.execute(
+        """UPDATE t_p56372141_online_booking_integ.glass_components
+           SET image_url = %s, image_variants = %s WHERE component_id = %s""",
+        (variants[PRIMARY_VARIANT], json.dumps(variants), component_id)
     )
+
+
+def presign_upload(body_data: Dict[str, Any], bucket_name: str) -> Dict[str, Any]:
+    """Выдать подписанную ссылку PUT или POST для загрузки файла напрямую в S3"""
+    content_type = body_data.get('content_type', '')
+    size = body_data.get('size')
+    upload_method = body_data.get('method', 'put').lower()
+    
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        return json_response(400, {'error': f"Unsupported content type, allowed: {', '.join(ALLOWED_CONTENT_TYPES)}"})
+    if not isinstance(size, int) or size <= 0 or size > MAX_UPLOAD_BYTES:
+        return json_response(400, {'error': f'File size must be between 1 and {MAX_UPLOAD_BYTES} bytes'})
+    if upload_method not in ('put', 'post'):
+        return json_response(400, {'error': 'Method must be put or post'})
+    
+    file_key = f'glass-components/uploads/{uuid.uuid4().hex}{ALLOWED_CONTENT_TYPES[content_type]}'
+    url = storage.public_url(file_key)
+    s3_client = storage.client
+    
+    if upload_method == 'put':
+        upload = {
+            'method': 'PUT',
+            'url': s3_client.generate_presigned_url(
+                'put_object',
+                Params={'Bucket': bucket_name, 'Key': file_key, 'ContentType': content_type, 'ContentLength': size},
+                ExpiresIn=PRESIGN_EXPIRES_SECONDS
+            ),
+            'headers': {'Content-Type': content_type}
+        }
+        max_size = size
+    else:
+        post = s3_client.generate_presigned_post(
+            Bucket=bucket_name,
+            Key=file_key,
+            Fields={'Content-Type': content_type},
+            Conditions=[{'Content-Type': content_type}, ['content-length-range', 1, MAX_UPLOAD_BYTES]],
+            ExpiresIn=PRESIGN_EXPIRES_SECONDS
+        )
+        upload = {'method': 'POST', 'url': post['url'], 'fields': post['fields']}
+        max_size = MAX_UPLOAD_BYTES
+    
+    conn = get_db_connection()
+    if not conn:
+        return json_response(503, {'error': 'Database unavailable'})
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """INSERT INTO t_p56372141_online_booking_integ.s3_uploads (object_key, content_type, max_size_bytes, url)
+               VALUES (%s, %s, %s, %s)""",
+            (file_key, content_type, max_size, url)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    
+    return json_response(200, {
+        'key': file_key,
+        'url': url,
+        'upload': upload,
+        'expires_in': PRESIGN_EXPIRES_SECONDS
+    })
+
+
+def complete_upload(file_key: str, bucket_name: str, component_id: Optional[int] = None) -> Dict[str, Any]:
+    """Проверить загруженный по ссылке объект, нарезать варианты и зарегистрировать его"""
+    conn = get_db_connection()
+    if not conn:
+        return json_response(503, {'error': 'Database unavailable'})
     
-    file_key = f'glass-components/{filename}'
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(
+            """SELECT object_key, content_type, max_size_bytes, size_bytes, url, status, content_hash, variants
+               FROM t_p56372141_online_booking_integ.s3_uploads WHERE object_key = %s""",
+            (file_key,)
+        )
+        upload = cursor.fetchone()
     
-    s3_client.put_object(
+        if not upload:
+            return json_response(404, {'error': 'Upload not found'})
+        if upload['status'] == 'complete':
+            if component_id:
+                record_component_image(cursor, component_id, upload['variants'])
+                conn.commit()
+            return json_response(200, {
+                'key': file_key,
+                'url': upload['url'],
+                'variants': upload['variants'],
+                'hash': upload['content_hash'],
+                'size': upload['size_bytes']
+            })
+        if upload['status'] == 'rejected':
+            return json_response(422, {'error': 'Upload was rejected'})
+    
+        s3_client = storage.client
+        try:
+            head = s3_client.head_object(Bucket=bucket_name, Key=file_key)
+        except ClientError:
+            return json_response(409, {'error': 'Object not uploaded yet'})
+    
+        size = head['ContentLength']
+        error = None
+        if size > upload['max_size_bytes'] or head.get('ContentType') != upload['content_type']:
+            error = 'Uploaded object does not match the signed constraints'
+        else:
+            data = s3_client.get_object(Bucket=bucket_name, Key=file_key)['Body'].read()
+            try:
+                image = store_image(s3_client, bucket_name, data)
+            except ValueError as e:
+                error = str(e)
+    
+        # исходник уже лежит под ключом от хэша (или отклонен) - временный объект не нужен
+        s3_client.delete_object(Bucket=bucket_name, Key=file_key)
+    
+        if error:
+            cursor.execute(
+                "UPDATE t_p56372141_online_booking_integ.s3_uploads SET status = 'rejected', size_bytes = %s WHERE object_key = %s",
+                (size, file_key)
+            )
+            conn.commit()
+            return json_response(422, {'error': error})
+    
+        cursor.execute(
+            """UPDATE t_p56372141_online_booking_integ.s3_uploads
+               SET status = 'complete', size_bytes = %s, etag = %s, url = %s, content_hash = %s, variants = %s,
+                   completed_at = CURRENT_TIMESTAMP
+               WHERE object_key = %s""",
+            (size, head.get('ETag', '').strip('"'), image['url'], image['hash'], json.dumps(image['variants']), file_key)
+        )
+        if component_id:
+            record_component_image(cursor, component_id, image['variants'])
+        conn.commit()
+    
+        return json_response(200, dict(image, key=file_key, size=size))
+    
+    finally:
+        conn.close()
+
+
+def ingest_remote_images(items: List[Dict[str, Any]], bucket_name: str) -> Dict[str, Any]:
+    """
+    Скачать изображения по ссылкам ограниченным пулом потоков, нарезать варианты и записать их
+    в компоненты одним UPDATE. Одна ссылка скачивается один раз, одинаковые файлы обрабатываются один раз.
+    """
+    if not isinstance(items, list) or not items:
+        return json_response(400, {'error': 'items must be a non-empty list of {component_id, source_url}'})
+    if len(items) > INGEST_MAX_ITEMS:
+        return json_response(400, {'error': f'At most {INGEST_MAX_ITEMS} items per request'})
+    
+    results = []
+    source_urls = []
+    for item in items:
+        component_id = item.get('component_id') if isinstance(item, dict) else None
+        source_url = item.get('source_url') if isinstance(item, dict) else None
+        result = {'component_id': component_id, 'source_url': source_url}
+        if not isinstance(component_id, int):
+            result['error'] = 'component_id must be an integer'
+        elif not isinstance(source_url, str) or urlparse(source_url).scheme not in ('http', 'https'):
+            result['error'] = 'source_url must be an http(s) URL'
+        elif source_url not in source_urls:
+            source_urls.append(source_url)
+        results.append(result)
+    
+    conn = get_db_connection()
+    if not conn:
+        return json_response(503, {'error': 'Database unavailable'})
+    
+    s3_client = storage.client
+    in_flight: Dict[str, Future] = {}
+    in_flight_lock = threading.Lock()
+    
+    def ingest_one(source_url: str) -> Dict[str, Any]:
+        data = download_image(source_url)
+        digest = content_hash(data)
+        with in_flight_lock:
+            future = in_flight.get(digest)
+            owner = future is None
+            if owner:
+                future = in_flight[digest] = Future()
+        if owner:
+            try:
+                future.set_result(store_image(s3_client, bucket_name, data))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+    
+    with ThreadPoolExecutor(max_workers=min(INGEST_MAX_WORKERS, len(source_urls) or 1)) as executor:
+        futures = {source_url: executor.submit(ingest_one, source_url) for source_url in source_urls}
+    
+    rows = {}
+    for result in results:
+        if 'error' in result:
+            continue
+        try:
+            image = futures[result['source_url']].result()
+        except Exception as e:
+            result['error'] = str(e) or type(e).__name__
+            continue
+        result.update(url=image['url'], hash=image['hash'], deduplicated=image['deduplicated'])
+        rows[result['component_id']] = (result['component_id'], image['url'], json.dumps(image['variants']))
+    
+    try:
+        cursor = conn.cursor()
+        updated_ids = set()
+        if rows:
+            updated = execute_values(
+                cursor,
+                """UPDATE t_p56372141_online_booking_integ.glass_components AS c
+                   SET image_url = v.url, image_variants = v.variants::jsonb
+                   FROM (VALUES %s) AS v(component_id, url, variants)
+                   WHERE c.component_id = v.component_id
+                   RETURNING c.component_id""",
+                list(rows.values()),
+                fetch=True
+            )
+            updated_ids = {row[0] for row in updated}
+        conn.commit()
+    finally:
+        conn.close()
+    
+    for result in results:
+        if 'error' not in result and result['component_id'] not in updated_ids:
+            result['error'] = 'Component not found'
+        result['status'] = 'error' if 'error' in result else 'ok'
+    
+    succeeded = sum(1 for result in results if result['status'] == 'ok')
+    return json_response(200, {
+        'total': len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'downloaded': len(source_urls),
+        'results': results
+    })
+
+
+def download_image(source_url: str) -> bytes:
+    """
+    Скачать файл потоком, прерывая загрузку сверх MAX_UPLOAD_BYTES. Редиректы проходятся вручную,
+    не больше INGEST_MAX_REDIRECTS, и каждый переход снова проверяется на схему и адрес.
+    """
+    for _ in range(INGEST_MAX_REDIRECTS + 1):
+        if urlparse(source_url).scheme not in ('http', 'https'):
+            raise ValueError('source_url must be an http(s) URL')
+        with http_session.get(source_url, stream=True, allow_redirects=False,
+                              timeout=(INGEST_CONNECT_TIMEOUT_SECONDS, INGEST_READ_TIMEOUT_SECONDS)) as response:
+            if response.is_redirect:
+                source_url = urljoin(source_url, response.headers['Location'])
+                continue
+            if response.status_code != 200:
+                raise ValueError(f'Download failed with HTTP {response.status_code}')
+            declared = response.headers.get('Content-Length')
+            if declared and declared.isdigit() and int(declared) > MAX_UPLOAD_BYTES:
+                raise ValueError(f'File is larger than {MAX_UPLOAD_BYTES} bytes')
+            
+            chunks = []
+            received = 0
+            for chunk in response.iter_content(INGEST_CHUNK_BYTES):
+                received += len(chunk)
+                if received > MAX_UPLOAD_BYTES:
+                    raise ValueError(f'File is larger than {MAX_UPLOAD_BYTES} bytes')
+                chunks.append(chunk)
+            return b''.join(chunks)
+    raise ValueError(f'More than {INGEST_MAX_REDIRECTS} redirects')
+
+
+def initiate_multipart(body_data: Dict[str, Any], bucket_name: str) -> Dict[str, Any]:
+    """Начать составную загрузку: размер части и число частей считаются от объявленного размера файла"""
+    content_type = body_data.get('content_type', '')
+    size = body_data.get('size')
+    part_size = body_data.get('part_size') or MULTIPART_DEFAULT_PART_BYTES
+    
+    if content_type not in MULTIPART_CONTENT_TYPES:
+        return json_response(400, {'error': f"Unsupported content type, allowed: {', '.join(MULTIPART_CONTENT_TYPES)}"})
+    if not isinstance(size, int) or size <= 0 or size > MULTIPART_MAX_BYTES:
+        return json_response(400, {'error': f'File size must be between 1 and {MULTIPART_MAX_BYTES} bytes'})
+    if not isinstance(part_size, int) or part_size < MULTIPART_MIN_PART_BYTES:
+        return json_response(400, {'error': f'Part size must be at least {MULTIPART_MIN_PART_BYTES} bytes'})
+    
+    # при огромном файле часть увеличивается, чтобы уложиться в лимит S3 на число частей
+    part_size = max(part_size, -(-size // MULTIPART_MAX_PARTS))
+    part_count = -(-size // part_size)
+    
+    file_key = f'glass-packages/uploads/{uuid.uuid4().hex}{MULTIPART_CONTENT_TYPES[content_type]}'
+    url = storage.public_url(file_key)
+    
+    conn = get_db_connection()
+    if not conn:
+        return json_response(503, {'error': 'Database unavailable'})
+    
+    try:
+        upload = storage.client.create_multipart_upload(Bucket=bucket_name, Key=file_key, ContentType=content_type)
+        cursor = conn.cursor()
+        cursor.execute(
+            """INSERT INTO t_p56372141_online_booking_integ.s3_uploads
+               (object_key, content_type, max_size_bytes, url, upload_id, part_size)
+               VALUES (%s, %s, %s, %s, %s, %s)""",
+            (file_key, content_type, size, url, upload['UploadId'], part_size)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    
+    return json_response(200, {
+        'key': file_key,
+        'upload_id': upload['UploadId'],
+        'part_size': part_size,
+        'part_count': part_count,
+        'url': url
+    })
+
+
+def upload_multipart_part(body_data: Dict[str, Any], bucket_name: str) -> Dict[str, Any]:
+    """
+    Подписанные ссылки на загрузку частей (part_numbers) - клиент грузит их параллельно напрямую в S3.
+    Если передано data (base64) с part_number, одна часть загружается через функцию.
+    """
+    upload, error = get_pending_multipart(body_data.get('key', ''))
+    if error:
+        return error
+    
+    part_count = multipart_part_count(upload)
+    s3_client = storage.client
+    
+    if body_data.get('data'):
+        part_number = body_data.get('part_number')
+        if not isinstance(part_number, int) or not 1 <= part_number <= part_count:
+            return json_response(400, {'error': f'Part number must be between 1 and {part_count}'})
+        part = s3_client.upload_part(
+            Bucket=bucket_name,
+            Key=upload['object_key'],
+            UploadId=upload['upload_id'],
+            PartNumber=part_number,
+            Body=base64.b64decode(body_data['data'])
+        )
+        return json_response(200, {'part_number': part_number, 'etag': part['ETag'].strip('"')})
+    
+    part_numbers = body_data.get('part_numbers') or list(range(1, part_count + 1))
+    if len(part_numbers) > MULTIPART_PART_URLS_PER_REQUEST:
+        return json_response(400, {'error': f'At most {MULTIPART_PART_URLS_PER_REQUEST} part URLs per request'})
+    if not all(isinstance(number, int) and 1 <= number <= part_count for number in part_numbers):
+        return json_response(400, {'error': f'Part numbers must be between 1 and {part_count}'})
+    
+    return json_response(200, {
+        'parts': [
+            {
+                'part_number': number,
+                'url': s3_client.generate_presigned_url(
+                    'upload_part',
+                    Params={'Bucket': bucket_name, 'Key': upload['object_key'],
+                            'UploadId': upload['upload_id'], 'PartNumber': number},
+                    ExpiresIn=PRESIGN_EXPIRES_SECONDS
+                )
+            }
+            for number in part_numbers
+        ],
+        'expires_in': PRESIGN_EXPIRES_SECONDS
+    })
+
+
+def list_multipart_parts(body_data: Dict[str, Any], bucket_name: str) -> Dict[str, Any]:
+    """Уже загруженные части - по ним клиент докачивает прерванную загрузку"""
+    upload, error = get_pending_multipart(body_data.get('key', ''))
+    if error:
+        return error
+    
+    parts = fetch_uploaded_parts(storage.client, bucket_name, upload)
+    return json_response(200, {
+        'key': upload['object_key'],
+        'part_size': upload['part_size'],
+        'part_count': multipart_part_count(upload),
+        'parts': [{'part_number': p['PartNumber'], 'etag': p['ETag'].strip('"'), 'size': p['Size']} for p in parts]
+    })
+
+
+def complete_multipart(body_data: Dict[str, Any], bucket_name: str) -> Dict[str, Any]:
+    """Собрать объект из частей; список частей берется из S3, так что клиенту не нужно хранить ETag"""
+    upload, error = get_pending_multipart(body_data.get('key', ''), allow_complete=True)
+    if error:
+        return error
+    if upload['status'] == 'complete':
+        return json_response(200, {'key': upload['object_key'], 'url': upload['url'], 'size': upload['size_bytes']})
+    
+    s3_client = storage.client
+    parts = fetch_uploaded_parts(s3_client, bucket_name, upload)
+    part_count = multipart_part_count(upload)
+    missing = sorted(set(range(1, part_count + 1)) - {p['PartNumber'] for p in parts})
+    if missing:
+        return json_response(409, {'error': 'Not all parts uploaded', 'missing_parts': missing[:MULTIPART_PART_URLS_PER_REQUEST]})
+    
+    size = sum(p['Size'] for p in parts)
+    if size != upload['max_size_bytes']:
+        s3_client.abort_multipart_upload(Bucket=bucket_name, Key=upload['object_key'], UploadId=upload['upload_id'])
+        set_upload_status(upload['object_key'], 'rejected', size)
+        return json_response(422, {'error': 'Uploaded parts do not match the declared file size'})
+    
+    result = s3_client.complete_multipart_upload(
         Bucket=bucket_name,
-        Key=file_key,
-        Body=image_data,
-        ContentType='image/jpeg'
+        Key=upload['object_key'],
+        UploadId=upload['upload_id'],
+        MultipartUpload={'Parts': [{'PartNumber': p['PartNumber'], 'ETag': p['ETag']} for p in parts]}
     )
+    set_upload_status(upload['object_key'], 'complete', size, result.get('ETag', '').strip('"'))
     
-    image_url = f'https://{bucket_name}.s3.beget.com/{file_key}'
+    return json_response(200, {'key': upload['object_key'], 'url': upload['url'], 'size': size})
+
+
+def abort_multipart(body_data: Dict[str, Any], bucket_name: str) -> Dict[str, Any]:
+    """Отменить составную загрузку и освободить загруженные части"""
+    upload, error = get_pending_multipart(body_data.get('key', ''))
+    if error:
+        return error
     
+    storage.client.abort_multipart_upload(Bucket=bucket_name, Key=upload['object_key'], UploadId=upload['upload_id'])
+    set_upload_status(upload['object_key'], 'aborted')
+    return json_response(200, {'key': upload['object_key'], 'status': 'aborted'})
+
+
+MULTIPART_ACTIONS = {
+    'multipart_initiate': initiate_multipart,
+    'multipart_part': upload_multipart_part,
+    'multipart_list': list_multipart_parts,
+    'multipart_complete': complete_multipart,
+    'multipart_abort': abort_multipart,
+}
+
+
+def get_pending_multipart(file_key: str, allow_complete: bool = False) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Незавершенная составная загрузка по ключу; (upload, None) или (None, ответ с ошибкой)"""
+    conn = get_db_connection()
+    if not conn:
+        return None, json_response(503, {'error': 'Database unavailable'})
+    
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(
+            """SELECT object_key, content_type, max_size_bytes, size_bytes, url, status, upload_id, part_size
+               FROM t_p56372141_online_booking_integ.s3_uploads
+               WHERE object_key = %s AND upload_id IS NOT NULL""",
+            (file_key,)
+        )
+        upload = cursor.fetchone()
+    finally:
+        conn.close()
+    
+    if not upload:
+        return None, json_response(404, {'error': 'Upload not found'})
+    if upload['status'] == 'complete' and allow_complete:
+        return upload, None
+    if upload['status'] != 'pending':
+        return None, json_response(409, {'error': f"Upload is already {upload['status']}", 'url': upload['url']})
+    return upload, None
+
+
+def fetch_uploaded_parts(s3_client, bucket_name: str, upload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Все загруженные части (ListParts отдает не больше 1000 за запрос)"""
+    parts = []
+    marker = 0
+    while True:
+        page = s3_client.list_parts(Bucket=bucket_name, Key=upload['object_key'],
+                                    UploadId=upload['upload_id'], PartNumberMarker=marker)
+        parts += page.get('Parts', [])
+        if not page.get('IsTruncated'):
+            return parts
+        marker = page['NextPartNumberMarker']
+
+
+def multipart_part_count(upload: Dict[str, Any]) -> int:
+    """Число частей: объявленный размер файла, деленный на размер части с округлением вверх"""
+    return -(-upload['max_size_bytes'] // upload['part_size'])
+
+
+def set_upload_status(file_key: str, status: str, size: Optional[int] = None, etag: Optional[str] = None) -> None:
+    """Обновить статус загрузки"""
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """UPDATE t_p56372141_online_booking_integ.s3_uploads
+               SET status = %s, size_bytes = COALESCE(%s, size_bytes), etag = COALESCE(%s, etag),
+                   completed_at = CURRENT_TIMESTAMP
+               WHERE object_key = %s""",
+            (status, size, etag, file_key)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_db_connection():
+    """Получить подключение к БД"""
+    try:
+        return psycopg2.connect(os.environ.get('DATABASE_URL', ''))
+    except Exception:
+        return None
+
+
+def json_response(status_code: int, data: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON ответ"""
     return {
-        'statusCode': 200,
+        'statusCode': status_code,
         'headers': {
             'Content-Type': 'application/json',
             'Access-Control-Allow-Origin': '*'
         },
-        'body': json.dumps({'url': image_url}),
+        'body': dumps_timed(data),
         'isBase64Encoded': False
-    }
\ No newline at end of file
+    }
+
+
+def dumps_timed(data: Dict[str, Any]) -> str:
+    """Сериализация тела ответа - отдельная фаза в Server-Timing"""
+    with timings.measure('response'):
+        return json.dumps(data)
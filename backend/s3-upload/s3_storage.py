@@ -0,0 +1,143 @@
+"""
+Общий клиент Beget S3 на теплый экземпляр функции. boto3 импортируется и клиент
+создается при первом обращении, дальше переиспользуются клиент, его пул соединений
+и разрешенные учетные данные. Модуль копируется в каждую функцию, которая работает с бакетом.
+
+Время запроса раскладывается по фазам (создание клиента, загрузка, прочие вызовы S3,
+сборка ответа) и отдается заголовком Server-Timing; каждый вызов S3 также записывается
+в метрики upstream_request_duration_seconds{upstream="s3"} (metrics.py).
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+from metrics import observe_upstream
+
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL', 'https://s3.beget.com')
+S3_REGION = 'ru-1'
+S3_MAX_POOL_CONNECTIONS = int(os.environ.get('S3_MAX_POOL_CONNECTIONS', '16'))
+S3_CONNECT_TIMEOUT_SECONDS = 5
+S3_READ_TIMEOUT_SECONDS = 60
+S3_MAX_ATTEMPTS = 4
+
+# вызовы, которые передают тело файла - отдельная фаза upload, остальные идут в s3
+UPLOAD_OPERATIONS = {'PutObject', 'UploadPart', 'CompleteMultipartUpload', 'CopyObject'}
+
+
+class RequestTimings:
+    """Суммарное время по фазам текущего запроса (потокобезопасно - для пулов потоков)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.start()
+
+    def start(self) -> None:
+        with self._lock:
+            self.started = time.perf_counter()
+            self.phases: Dict[str, float] = {}
+            self.counts: Dict[str, int] = {}
+
+    def add(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+            self.counts[phase] = self.counts.get(phase, 0) + 1
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - started)
+
+    def summary(self) -> Dict[str, Any]:
+        """Миллисекунды по фазам и общее время с начала запроса"""
+        with self._lock:
+            result = {phase: round(seconds * 1000, 2) for phase, seconds in self.phases.items()}
+            result['total'] = round((time.perf_counter() - self.started) * 1000, 2)
+            result['s3_calls'] = self.counts.get('s3', 0) + self.counts.get('upload', 0)
+        return result
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing"""
+        summary = self.summary()
+        summary.pop('s3_calls')
+        return ', '.join(f'{phase};dur={duration}' for phase, duration in summary.items())
+
+
+timings = RequestTimings()
+
+
+class S3Storage:
+    """Ленивый общий клиент S3 с настроенным пулом соединений и повторами"""
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return all(os.environ.get(name) for name in ('BEGET_S3_ACCESS_KEY', 'BEGET_S3_SECRET_KEY', 'BEGET_S3_BUCKET_NAME'))
+
+    @property
+    def bucket(self) -> str:
+        return os.environ.get('BEGET_S3_BUCKET_NAME', '')
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    with timings.measure('client_setup'):
+                        self._client = self._create_client()
+        return self._client
+
+    def public_url(self, file_key: str) -> str:
+        """Публичный URL объекта в бакете"""
+        return f'https://{self.bucket}.s3.beget.com/{file_key}'
+
+    def _create_client(self):
+        import boto3
+        from botocore.config import Config
+
+        # ключи передаются явно - boto3 не обходит цепочку поиска учетных данных (файлы, метаданные)
+        session = boto3.session.Session(
+            aws_access_key_id=os.environ.get('BEGET_S3_ACCESS_KEY'),
+            aws_secret_access_key=os.environ.get('BEGET_S3_SECRET_KEY'),
+            region_name=S3_REGION
+        )
+        client = session.client(
+            's3',
+            endpoint_url=S3_ENDPOINT_URL,
+            config=Config(
+                max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                connect_timeout=S3_CONNECT_TIMEOUT_SECONDS,
+                read_timeout=S3_READ_TIMEOUT_SECONDS,
+                retries={'max_attempts': S3_MAX_ATTEMPTS, 'mode': 'standard'},
+                tcp_keepalive=True
+            )
+        )
+        client.meta.events.register('before-call.s3', _start_call_timer)
+        client.meta.events.register('after-call.s3', _stop_call_timer)
+        client.meta.events.register('after-call-error.s3', _stop_call_timer)
+        return client
+
+
+def _start_call_timer(context: Dict[str, Any], **kwargs: Any) -> None:
+    context['timing_started'] = time.perf_counter()
+
+
+def _stop_call_timer(model: Any, context: Dict[str, Any], **kwargs: Any) -> None:
+    started = context.pop('timing_started', None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        timings.add('upload' if model.name in UPLOAD_OPERATIONS else 's3', elapsed)
+        http_response = kwargs.get('http_response')
+        failed = kwargs.get('exception') is not None or (http_response is not None and http_response.status_code >= 400)
+        observe_upstream('s3', model.name, elapsed, 'error' if failed else 'ok')
+
+
+storage = S3Storage()
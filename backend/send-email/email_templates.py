@@ -0,0 +1,147 @@
+"""
+Шаблоны писем пациентам. Шаблоны собираются в строки формата один раз при импорте
+(на теплый экземпляр), данные записи нормализуются один раз на письмо,
+письмо рендерится в HTML и текстовую часть.
+"""
+
+import html
+from typing import Any, Dict, NamedTuple, Optional
+
+FIELD_ALIASES = {
+    'appointment_id': ('appointmentId', 'appointment_id'),
+    'patient_name': ('patientName', 'patient_name'),
+    'patient_email': ('patientEmail', 'patient_email'),
+    'service_name': ('serviceName', 'service_name'),
+    'service_price': ('servicePrice', 'service_price'),
+    'doctor_name': ('doctorName', 'doctor_name'),
+    'date': ('newDate', 'date', 'appointment_date'),
+    'time': ('newTime', 'time', 'appointment_time'),
+}
+
+TEMPLATE_SPECS = {
+    'created': {
+        'subject': 'Запись в клинику подтверждена',
+        'heading': 'Ваша запись подтверждена!',
+        'intro': 'Ваша запись успешно создана. Детали записи:',
+        'rows': [
+            ('Номер записи', '{appointment_id}'),
+            ('Услуга', '{service_name}'),
+            ('Врач', '{doctor_name}'),
+            ('Дата', '{date}'),
+            ('Время', '{time}'),
+            ('Стоимость', '{service_price} ₽'),
+        ],
+        'outro': [
+            'Пожалуйста, приходите за 10 минут до назначенного времени.',
+            'Для отмены или переноса записи используйте номер записи на нашем сайте.',
+        ],
+    },
+    'rescheduled': {
+        'subject': 'Запись перенесена',
+        'heading': 'Ваша запись перенесена',
+        'intro': 'Ваша запись успешно перенесена на новое время:',
+        'rows': [
+            ('Номер записи', '{appointment_id}'),
+            ('Новая дата', '{date}'),
+            ('Новое время', '{time}'),
+            ('Услуга', '{service_name}'),
+            ('Врач', '{doctor_name}'),
+        ],
+        'outro': ['Ждем вас в указанное время!'],
+    },
+    'cancelled': {
+        'subject': 'Запись отменена',
+        'heading': 'Запись отменена',
+        'intro': 'Ваша запись была отменена:',
+        'rows': [
+            ('Номер записи', '{appointment_id}'),
+            ('Услуга', '{service_name}'),
+            ('Врач', '{doctor_name}'),
+        ],
+        'outro': ['Если вы хотите записаться снова, посетите наш сайт.'],
+    },
+    'reminder': {
+        'subject': 'Напоминание о записи в клинику',
+        'heading': 'Напоминаем о вашей записи',
+        'intro': 'Вы записаны на прием:',
+        'rows': [
+            ('Номер записи', '{appointment_id}'),
+            ('Услуга', '{service_name}'),
+            ('Врач', '{doctor_name}'),
+            ('Дата', '{date}'),
+            ('Время', '{time}'),
+        ],
+        'outro': [
+            'Пожалуйста, приходите за 10 минут до назначенного времени.',
+            'Если планы изменились, отмените или перенесите запись на нашем сайте по номеру записи.',
+        ],
+    },
+}
+
+
+class RenderedEmail(NamedTuple):
+    subject: str
+    html: str
+    text: str
+
+
+class CompiledTemplate(NamedTuple):
+    subject: str
+    html: str
+    text: str
+
+
+def compile_template(spec: Dict[str, Any]) -> CompiledTemplate:
+    """Собрать из описания шаблона строки формата для HTML и текстовой части"""
+    rows_html = ''.join(f'<p><strong>{label}:</strong> {value}</p>' for label, value in spec['rows'])
+    outro_html = ''.join(f'<p>{line}</p>' for line in spec['outro'])
+    html_source = (
+        '<html><body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">'
+        '<div style="max-width: 600px; margin: 0 auto; padding: 20px;">'
+        f'<h2 style="color: #0EA5E9;">{spec["heading"]}</h2>'
+        '<p>Здравствуйте, {patient_name}!</p>'
+        f'<p>{spec["intro"]}</p>'
+        f'<div style="background: #f5f5f5; padding: 15px; border-radius: 8px; margin: 20px 0;">{rows_html}</div>'
+        f'{outro_html}'
+        '<p style="color: #666; font-size: 12px; margin-top: 30px;">С уважением,<br>Команда клиники</p>'
+        '</div></body></html>'
+    )
+
+    text_lines = [spec['heading'], '', 'Здравствуйте, {patient_name}!', spec['intro'], '']
+    text_lines += [f'{label}: {value}' for label, value in spec['rows']]
+    text_lines += [''] + spec['outro'] + ['', 'С уважением,', 'Команда клиники']
+
+    compiled = CompiledTemplate(spec['subject'], html_source, '\n'.join(text_lines))
+    for source in compiled:
+        source.format_map({field: '' for field in FIELD_ALIASES})
+    return compiled
+
+
+TEMPLATES = {email_type: compile_template(spec) for email_type, spec in TEMPLATE_SPECS.items()}
+
+
+def normalize_appointment(data: Dict[str, Any]) -> Dict[str, str]:
+    """Привести данные записи (camelCase или snake_case) к единому набору полей-строк"""
+    normalized = {}
+    for field, aliases in FIELD_ALIASES.items():
+        value = None
+        for alias in aliases:
+            value = data.get(alias)
+            if value not in (None, ''):
+                break
+        normalized[field] = '' if value is None else str(value)
+    return normalized
+
+
+def render_email(email_type: str, appointment: Dict[str, str]) -> Optional[RenderedEmail]:
+    """Отрендерить письмо по нормализованным данным; None для неизвестного типа"""
+    template = TEMPLATES.get(email_type)
+    if not template:
+        return None
+
+    escaped = {field: html.escape(value) for field, value in appointment.items()}
+    return RenderedEmail(
+        template.subject.format_map(appointment),
+        template.html.format_map(escaped),
+        template.text.format_map(appointment)
+    )
@@ -1,46 +1,280 @@
+import hashlib
 import json
 import os
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Dict, Any
+import random
+import time
+from typing import Dict, Any, List, Optional, Tuple
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+import metrics
+from admin_tokens import internal_only_response, is_internal_request
+from mail_transport import transport
+from email_templates import normalize_appointment, render_email
+from rate_limiter import Rule, client_ip, limiter, too_many_requests
 
-def send_email(to_email: str, subject: str, html_body: str) -> bool:
-    smtp_host = os.environ.get('SMTP_HOST')
-    smtp_port = int(os.environ.get('SMTP_PORT', '587'))
-    smtp_user = os.environ.get('SMTP_USER')
-    smtp_password = os.environ.get('SMTP_PASSWORD')
-    
-    print(f"SMTP Config - Host: {smtp_host}, Port: {smtp_port}, User: {smtp_user}, To: {to_email}")
+OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', '50'))
+OUTBOX_MAX_BATCH_SIZE = 500
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', '6'))
+OUTBOX_BACKOFF_BASE_SECONDS = 60
+OUTBOX_BACKOFF_MAX_SECONDS = 6 * 3600
+OUTBOX_LOCK_TIMEOUT_MINUTES = 10
+REMINDER_LEAD_HOURS = int(os.environ.get('REMINDER_LEAD_HOURS', '24'))
+REMINDER_MAX_LEAD_HOURS = 7 * 24
+REMINDER_TIMEZONE = os.environ.get('REMINDER_TIMEZONE', 'Europe/Moscow')
+REMINDER_SELECT_LIMIT = 5000
+REMINDER_RESERVE_MS = 5000
+
+SEND_BATCH_MAX_MESSAGES = int(os.environ.get('SEND_BATCH_MAX_MESSAGES', '50'))
+
+SEND_IP_RULE = Rule('send-ip', 60, 600)
+SEND_RECIPIENT_RULE = Rule('send-recipient', 10, 3600)
+
+def get_db_connection():
+    try:
+        return psycopg2.connect(os.environ.get('DATABASE_URL', ''))
+    except Exception:
+        return None
+
+
+def send_email(to_email: str, subject: str, html_body: str, text_body: Optional[str] = None) -> bool:
+    print(f"SMTP Config - Host: {transport.host}, Port: {transport.port}, User: {transport.user}, To: {to_email}")
     
-    if not all([smtp_host, smtp_user, smtp_password]):
-        print(f"SMTP not configured: host={bool(smtp_host)}, user={bool(smtp_user)}, password={bool(smtp_password)}")
+    if not transport.configured:
+        print(f"SMTP not configured: host={bool(transport.host)}, user={bool(transport.user)}, password={bool(transport.password)}")
         return False
     
-    msg = MIMEMultipart('alternative')
-    msg['Subject'] = subject
-    msg['From'] = smtp_user
-    msg['To'] = to_email
+    return transport.send(to_email, subject, html_body, text_body)
+
+def send_batch(messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Отправить пачку уведомлений {type, appointmentData} за одну SMTP-сессию"""
+    results: List[Optional[Dict[str, Any]]] = [None] * len(messages)
+    outgoing = []
+    positions = []
     
-    html_part = MIMEText(html_body, 'html')
-    msg.attach(html_part)
+    for i, message in enumerate(messages):
+        appointment = normalize_appointment(message.get('appointmentData', {}))
+        to_email = appointment['patient_email']
+        email = render_email(message.get('type'), appointment)
+        if not to_email:
+            results[i] = {'to': None, 'success': False, 'error': 'Email not provided'}
+        elif not email:
+            results[i] = {'to': to_email, 'success': False, 'error': 'Unknown email type'}
+        else:
+            outgoing.append({'to': to_email, 'subject': email.subject, 'html': email.html, 'text': email.text})
+            positions.append(i)
     
-    if smtp_port == 465:
-        server = smtplib.SMTP_SSL(smtp_host, smtp_port, timeout=15)
+    if transport.configured:
+        sent_results = transport.send_batch(outgoing)
     else:
-        server = smtplib.SMTP(smtp_host, smtp_port, timeout=15)
-        server.starttls()
+        sent_results = [{'to': message['to'], 'success': True, 'skipped': True} for message in outgoing]
+    
+    for i, result in zip(positions, sent_results):
+        results[i] = result
+    
+    sent = sum(1 for r in results if r['success'] and not r.get('skipped'))
+    return {'success': True, 'sent': sent, 'failed': sum(1 for r in results if not r['success']), 'results': results}
+
+def batch_rate_limits(messages: List[Dict[str, Any]], ip: str) -> List[Tuple[Rule, str, int]]:
+    """Правила для пачки: IP платит за каждое письмо, каждый получатель - за свои письма"""
+    recipients: Dict[str, int] = {}
+    for message in messages:
+        appointment = message.get('appointmentData', {}) if isinstance(message, dict) else {}
+        to_email = normalize_appointment(appointment)['patient_email']
+        if to_email:
+            recipients[to_email.lower()] = recipients.get(to_email.lower(), 0) + 1
+    return [(SEND_IP_RULE, ip, len(messages))] + [(SEND_RECIPIENT_RULE, to, count) for to, count in recipients.items()]
+
+def dispatch_outbox(batch_size: int) -> Dict[str, Any]:
+    """Отправить очередную пачку писем из email_outbox; несколько вызовов могут разбирать очередь параллельно"""
+    if not transport.configured:
+        return {'success': False, 'error': 'SMTP not configured'}
     
-    server.login(smtp_user, smtp_password)
-    server.send_message(msg)
-    server.quit()
+    conn = get_db_connection()
+    if not conn:
+        return {'success': False, 'error': 'Database connection failed'}
     
-    return True
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(
+            """UPDATE t_p56372141_online_booking_integ.email_outbox
+               SET status = 'processing', attempts = attempts + 1, locked_at = CURRENT_TIMESTAMP
+               WHERE id IN (
+                   SELECT id FROM t_p56372141_online_booking_integ.email_outbox
+                   WHERE (status = 'pending' AND next_attempt_at <= CURRENT_TIMESTAMP)
+                      OR (status = 'processing' AND locked_at < CURRENT_TIMESTAMP - make_interval(mins => %s))
+                   ORDER BY next_attempt_at
+                   LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+               )
+               RETURNING id, email_type, recipient, payload, attempts""",
+            (OUTBOX_LOCK_TIMEOUT_MINUTES, batch_size)
+        )
+        items = cursor.fetchall()
+        conn.commit()
+        
+        if not items:
+            return {'success': True, 'processed': 0}
+        
+        outgoing = []
+        outcomes: Dict[int, Dict[str, Any]] = {}
+        for item in items:
+            email = render_email(item['email_type'], normalize_appointment(item['payload']))
+            if email:
+                outgoing.append((item['id'], {'to': item['recipient'], 'subject': email.subject, 'html': email.html, 'text': email.text}))
+            else:
+                outcomes[item['id']] = {'success': False, 'error': 'Unknown email type', 'permanent': True}
+        
+        results = transport.send_batch([message for _, message in outgoing])
+        for (item_id, _), result in zip(outgoing, results):
+            outcomes[item_id] = result
+        
+        updates = []
+        stats = {'sent': 0, 'retry': 0, 'dead': 0}
+        for item in items:
+            outcome = outcomes[item['id']]
+            if outcome['success']:
+                status, delay = 'sent', 0
+            elif not outcome.get('permanent') and item['attempts'] < OUTBOX_MAX_ATTEMPTS:
+                status, delay = 'pending', get_backoff_seconds(item['attempts'])
+            else:
+                status, delay = 'dead', 0
+            stats['retry' if status == 'pending' else status] += 1
+            updates.append((item['id'], status, delay, outcome.get('error')))
+        
+        execute_values(
+            cursor,
+            """UPDATE t_p56372141_online_booking_integ.email_outbox AS o
+               SET status = v.status,
+                   next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => v.delay),
+                   last_error = v.error,
+                   sent_at = CASE WHEN v.status = 'sent' THEN CURRENT_TIMESTAMP ELSE o.sent_at END,
+                   locked_at = NULL
+               FROM (VALUES %s) AS v(id, status, delay, error)
+               WHERE o.id = v.id""",
+            updates,
+            template='(%s::bigint, %s, %s::float8, %s)'
+        )
+        conn.commit()
+        
+        return {'success': True, 'processed': len(items), **stats}
+    
+    finally:
+        conn.close()
+
+def get_backoff_seconds(attempts: int) -> float:
+    """Экспоненциальная задержка перед повтором с джиттером"""
+    delay = min(OUTBOX_BACKOFF_MAX_SECONDS, OUTBOX_BACKOFF_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.5, 1.0)
+
+def queue_reminders(lead_hours: int, limit: int) -> int:
+    """Поставить в email_outbox напоминания о записях, начинающихся в ближайшие lead_hours часов"""
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(
+            """WITH bounds AS (
+                   SELECT (CURRENT_TIMESTAMP AT TIME ZONE %(tz)s) AS starts,
+                          (CURRENT_TIMESTAMP AT TIME ZONE %(tz)s) + make_interval(hours => %(hours)s) AS ends
+               )
+               UPDATE t_p56372141_online_booking_integ.appointments AS a
+               SET reminder_queued_at = CURRENT_TIMESTAMP
+               WHERE a.id IN (
+                   SELECT ap.id FROM t_p56372141_online_booking_integ.appointments ap, bounds b
+                   WHERE ap.status = 'active' AND ap.reminder_queued_at IS NULL
+                     AND ap.appointment_date BETWEEN b.starts::date AND b.ends::date
+                     AND ap.appointment_date + ap.appointment_time::time > b.starts
+                     AND ap.appointment_date + ap.appointment_time::time <= b.ends
+                     AND COALESCE(ap.patient_email, '') <> ''
+                   ORDER BY ap.appointment_date, ap.appointment_time
+                   LIMIT %(limit)s
+                   FOR UPDATE SKIP LOCKED
+               )
+               RETURNING a.appointment_id, a.patient_name, a.patient_email, a.service_name, a.service_price,
+                         a.doctor_name, a.appointment_date, a.appointment_time""",
+            {'tz': REMINDER_TIMEZONE, 'hours': lead_hours, 'limit': limit}
+        )
+        rows = []
+        for appointment in cursor.fetchall():
+            payload = {key: str(value) if value is not None else None for key, value in appointment.items()}
+            version = f"{payload['appointment_date']} {payload['appointment_time']}"
+            dedupe_key = hashlib.sha256(
+                '|'.join([payload['appointment_id'], 'reminder', payload['patient_email'].lower(), version]).encode('utf-8')
+            ).hexdigest()
+            rows.append((payload['appointment_id'], 'reminder', payload['patient_email'],
+                         json.dumps(payload, ensure_ascii=False), dedupe_key))
+        
+        if rows:
+            execute_values(
+                cursor,
+                """INSERT INTO t_p56372141_online_booking_integ.email_outbox (appointment_id, email_type, recipient, payload, dedupe_key)
+                   VALUES %s
+                   ON CONFLICT (dedupe_key) DO NOTHING""",
+                rows,
+                page_size=1000
+            )
+        conn.commit()
+        return len(rows)
+    
+    finally:
+        conn.close()
+
+def send_reminders(lead_hours: int, context: Any) -> Dict[str, Any]:
+    """Поставить напоминания в очередь и разбирать очередь пачками, пока есть время вызова"""
+    started = time.monotonic()
+    queued = queue_reminders(lead_hours, REMINDER_SELECT_LIMIT)
+    
+    totals = {'processed': 0, 'sent': 0, 'retry': 0, 'dead': 0}
+    while has_time_left(context, started):
+        result = dispatch_outbox(OUTBOX_BATCH_SIZE)
+        if not result.get('processed'):
+            if not result.get('success'):
+                totals['error'] = result.get('error')
+            break
+        for key in ('processed', 'sent', 'retry', 'dead'):
+            totals[key] += result[key]
+    
+    return {'success': True, 'queued': queued, **totals, 'elapsed_ms': int((time.monotonic() - started) * 1000)}
+
+def has_time_left(context: Any, started: float) -> bool:
+    """Остается ли время вызова на еще одну пачку"""
+    get_remaining = getattr(context, 'get_remaining_time_in_millis', None)
+    if callable(get_remaining):
+        return get_remaining() > REMINDER_RESERVE_MS
+    return (time.monotonic() - started) * 1000 < 60000 - REMINDER_RESERVE_MS
 
+def parse_int(value: Any, minimum: int, maximum: int) -> Optional[int]:
+    """Целое из тела запроса, прижатое к [minimum, maximum]; None, если это не число"""
+    try:
+        return max(minimum, min(int(value), maximum))
+    except (TypeError, ValueError):
+        return None
+
+def invalid_parameter_response(name: str) -> Dict[str, Any]:
+    return {
+        'statusCode': 400,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'isBase64Encoded': False,
+        'body': json.dumps({'error': f'{name} must be an integer'})
+    }
+
+metrics.init('send-email')
+metrics.register_collector('rate_limiter_events_total', 'counter', 'Rate limiter decisions and shared counter errors',
+                           ('event',), lambda: {(name,): value for name, value in limiter.stats.items()})
+metrics.register_collector('smtp_connection_events_total', 'counter', 'SMTP connections opened, reconnects and messages',
+                           ('event',), lambda: {(name,): value for name, value in transport.stats.items()})
+
+@metrics.instrumented_handler(['dispatch', 'reminders', 'batch', 'send'])
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Отправка email-уведомлений пациентам о записях
-    Args: event с httpMethod, body содержащим type, appointmentData
+    Args: event с httpMethod, body содержащим type, appointmentData;
+          messages - пачка писем (только служебный вызов с X-Internal-Token, до SEND_BATCH_MAX_MESSAGES),
+          action=dispatch - разбор очереди email_outbox (служебный вызов, его делает clinic-api после записи),
+          action=reminders - напоминания о ближайших записях (служебный вызов по расписанию);
+          GET ?action=metrics - метрики в формате Prometheus (Authorization: Bearer METRICS_TOKEN)
     Returns: JSON с результатом отправки
     '''
     method: str = event.get('httpMethod', 'POST')
@@ -66,10 +300,62 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         }
     
     body_data = json.loads(event.get('body', '{}'))
+    metrics.set_route(body_data.get('action') or ('batch' if isinstance(body_data.get('messages'), list) else 'send'))
+    
+    if body_data.get('action') in ('dispatch', 'reminders') and not is_internal_request(event):
+        return internal_only_response()
+    
+    if body_data.get('action') == 'dispatch':
+        batch_size = parse_int(body_data.get('batch_size', OUTBOX_BATCH_SIZE), 1, OUTBOX_MAX_BATCH_SIZE)
+        if batch_size is None:
+            return invalid_parameter_response('batch_size')
+        result = dispatch_outbox(batch_size)
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps(result)
+        }
+    
+    if body_data.get('action') == 'reminders':
+        lead_hours = parse_int(body_data.get('lead_hours', REMINDER_LEAD_HOURS), 1, REMINDER_MAX_LEAD_HOURS)
+        if lead_hours is None:
+            return invalid_parameter_response('lead_hours')
+        result = send_reminders(lead_hours, context)
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps(result)
+        }
+    
+    ip = client_ip(event)
+    
+    if isinstance(body_data.get('messages'), list):
+        if not is_internal_request(event):
+            return internal_only_response()
+        if len(body_data['messages']) > SEND_BATCH_MAX_MESSAGES:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'isBase64Encoded': False,
+                'body': json.dumps({'error': f'Too many messages, at most {SEND_BATCH_MAX_MESSAGES} per request'})
+            }
+        decision = limiter.check(batch_rate_limits(body_data['messages'], ip))
+        if not decision.allowed:
+            return too_many_requests(decision)
+        result = send_batch(body_data['messages'])
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': json.dumps(result)
+        }
+    
     email_type = body_data.get('type')
-    data = body_data.get('appointmentData', {})
+    appointment = normalize_appointment(body_data.get('appointmentData', {}))
     
-    to_email = data.get('patientEmail') or data.get('patient_email')
+    to_email = appointment['patient_email']
     
     if not to_email:
         return {
@@ -79,94 +365,13 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'Email not provided'})
         }
     
-    if email_type == 'created':
-        subject = 'Запись в клинику подтверждена'
-        html_body = f'''
-        <html>
-            <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                    <h2 style="color: #0EA5E9;">Ваша запись подтверждена!</h2>
-                    <p>Здравствуйте, {data.get('patientName') or data.get('patient_name')}!</p>
-                    <p>Ваша запись успешно создана. Детали записи:</p>
-                    
-                    <div style="background: #f5f5f5; padding: 15px; border-radius: 8px; margin: 20px 0;">
-                        <p><strong>Номер записи:</strong> {data.get('appointmentId') or data.get('appointment_id')}</p>
-                        <p><strong>Услуга:</strong> {data.get('serviceName') or data.get('service_name')}</p>
-                        <p><strong>Врач:</strong> {data.get('doctorName') or data.get('doctor_name')}</p>
-                        <p><strong>Дата:</strong> {data.get('date') or data.get('appointment_date')}</p>
-                        <p><strong>Время:</strong> {data.get('time') or data.get('appointment_time')}</p>
-                        <p><strong>Стоимость:</strong> {data.get('servicePrice') or data.get('service_price')} ₽</p>
-                    </div>
-                    
-                    <p>Пожалуйста, приходите за 10 минут до назначенного времени.</p>
-                    <p>Для отмены или переноса записи используйте номер записи на нашем сайте.</p>
-                    
-                    <p style="color: #666; font-size: 12px; margin-top: 30px;">
-                        С уважением,<br>
-                        Команда клиники
-                    </p>
-                </div>
-            </body>
-        </html>
-        '''
-    
-    elif email_type == 'rescheduled':
-        subject = 'Запись перенесена'
-        html_body = f'''
-        <html>
-            <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                    <h2 style="color: #0EA5E9;">Ваша запись перенесена</h2>
-                    <p>Здравствуйте, {data.get('patientName') or data.get('patient_name')}!</p>
-                    <p>Ваша запись успешно перенесена на новое время:</p>
-                    
-                    <div style="background: #f5f5f5; padding: 15px; border-radius: 8px; margin: 20px 0;">
-                        <p><strong>Номер записи:</strong> {data.get('appointmentId') or data.get('appointment_id')}</p>
-                        <p><strong>Новая дата:</strong> {data.get('newDate') or data.get('appointment_date')}</p>
-                        <p><strong>Новое время:</strong> {data.get('newTime') or data.get('appointment_time')}</p>
-                        <p><strong>Услуга:</strong> {data.get('serviceName') or data.get('service_name')}</p>
-                        <p><strong>Врач:</strong> {data.get('doctorName') or data.get('doctor_name')}</p>
-                    </div>
-                    
-                    <p>Ждем вас в указанное время!</p>
-                    
-                    <p style="color: #666; font-size: 12px; margin-top: 30px;">
-                        С уважением,<br>
-                        Команда клиники
-                    </p>
-                </div>
-            </body>
-        </html>
-        '''
-    
-    elif email_type == 'cancelled':
-        subject = 'Запись отменена'
-        html_body = f'''
-        <html>
-            <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-                <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                    <h2 style="color: #0EA5E9;">Запись отменена</h2>
-                    <p>Здравствуйте, {data.get('patientName') or data.get('patient_name')}!</p>
-                    <p>Ваша запись была отменена:</p>
-                    
-                    <div style="background: #f5f5f5; padding: 15px; border-radius: 8px; margin: 20px 0;">
-                        <p><strong>Номер записи:</strong> {data.get('appointmentId') or data.get('appointment_id')}</p>
-                        <p><strong>Услуга:</strong> {data.get('serviceName') or data.get('service_name')}</p>
-                        <p><strong>Врач:</strong> {data.get('doctorName') or data.get('doctor_name')}</p>
-                    </div>
-                    
-                    <p>Если вы хотите записаться снова, посетите наш сайт.</p>
-                    
-                    <p style="color: #666; font-size: 12px; margin-top: 30px;">
-                        С уважением,<br>
-                        Команда клиники
-                    </p>
-                </div>
-            </body>
-        </html>
-        '''
+    decision = limiter.check([(SEND_IP_RULE, ip), (SEND_RECIPIENT_RULE, to_email.lower())])
+    if not decision.allowed:
+        return too_many_requests(decision)
     
-    else:
+    email = render_email(email_type, appointment)
+    
+    if not email:
         return {
             'statusCode': 400,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -186,7 +391,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     try:
         print(f"Attempting to send email to {to_email}, type: {email_type}")
-        success = send_email(to_email, subject, html_body)
+        success = send_email(to_email, email.subject, email.html, email.text)
         
         if success:
             print(f"Email sent successfully to {to_email}")
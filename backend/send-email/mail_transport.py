@@ -0,0 +1,188 @@
+"""
+Почтовый транспорт: одно авторизованное SMTP-соединение на теплый экземпляр функции.
+Соединение переиспользуется между вызовами, проверяется NOOP после простоя
+и прозрачно переоткрывается, если сервер его закрыл. Время установки соединения и отправки
+каждого письма пишется в метрики upstream_request_duration_seconds{upstream="smtp"} (metrics.py).
+"""
+
+import os
+import smtplib
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Dict, List, Optional
+
+from metrics import observe_upstream
+
+SMTP_TIMEOUT_SECONDS = int(os.environ.get('SMTP_TIMEOUT', '15'))
+SMTP_IDLE_CHECK_SECONDS = 30
+SMTP_MAX_IDLE_SECONDS = 240
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.environ.get('SMTP_MAX_MESSAGES_PER_CONNECTION', '100'))
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', 'true').lower() != 'false'
+
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError, OSError)
+
+
+def get_smtp_code(error: smtplib.SMTPException) -> int:
+    """Код ответа сервера из исключения smtplib (для отказа по адресатам - первый код)"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused) and error.recipients:
+        return next(iter(error.recipients.values()))[0]
+    return getattr(error, 'smtp_code', 0) or 0
+
+
+def build_message(from_email: str, to_email: str, subject: str, html_body: str,
+                  text_body: Optional[str] = None) -> MIMEMultipart:
+    """Собрать письмо multipart/alternative"""
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = from_email
+    msg['To'] = to_email
+
+    if text_body:
+        msg.attach(MIMEText(text_body, 'plain', 'utf-8'))
+    msg.attach(MIMEText(html_body, 'html', 'utf-8'))
+    return msg
+
+
+class SMTPTransport:
+    """Переиспользуемое SMTP-соединение с пакетной отправкой"""
+
+    def __init__(self):
+        self.host = os.environ.get('SMTP_HOST')
+        self.port = int(os.environ.get('SMTP_PORT', '587'))
+        self.user = os.environ.get('SMTP_USER')
+        self.password = os.environ.get('SMTP_PASSWORD')
+        self._server: Optional[smtplib.SMTP] = None
+        self._used_at = 0.0
+        self._sent_on_connection = 0
+        self._lock = threading.Lock()
+        self.stats = {'connects': 0, 'reconnects': 0, 'sent': 0, 'failed': 0}
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.host and self.user and self.password)
+
+    def send(self, to_email: str, subject: str, html_body: str, text_body: Optional[str] = None) -> bool:
+        """Отправить одно письмо через общее соединение"""
+        result = self.send_batch([{'to': to_email, 'subject': subject, 'html': html_body, 'text': text_body}])[0]
+        if not result['success']:
+            raise smtplib.SMTPException(result['error'])
+        return True
+
+    def send_batch(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Отправить пачку писем {to, subject, html, text} за одну SMTP-сессию.
+        Отказ по одному адресату не прерывает пачку; при обрыве соединения письмо
+        повторяется один раз на новом соединении.
+        """
+        if not self.configured:
+            return [{'to': m.get('to'), 'success': False, 'error': 'SMTP not configured'} for m in messages]
+
+        results = []
+        with self._lock:
+            for message in messages:
+                msg = build_message(self.user, message['to'], message['subject'], message['html'], message.get('text'))
+                results.append(self._send_locked(message['to'], msg))
+            self._used_at = time.monotonic()
+        return results
+
+    def close(self) -> None:
+        """Закрыть соединение (QUIT)"""
+        with self._lock:
+            self._disconnect()
+
+    def _send_locked(self, to_email: str, msg: MIMEMultipart) -> Dict[str, Any]:
+        for attempt in range(2):
+            try:
+                server = self._ensure_connection()
+                self._deliver(server, msg)
+                self._sent_on_connection += 1
+                self.stats['sent'] += 1
+                return {'to': to_email, 'success': True}
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+                if get_smtp_code(e) == 421 and attempt == 0:
+                    self._disconnect()
+                    continue
+                self._reset_session()
+                self.stats['failed'] += 1
+                return {'to': to_email, 'success': False, 'error': str(e), 'permanent': get_smtp_code(e) >= 500}
+            except RECONNECT_ERRORS as e:
+                self._disconnect()
+                if attempt == 0:
+                    self.stats['reconnects'] += 1
+                    continue
+                self.stats['failed'] += 1
+                return {'to': to_email, 'success': False, 'error': str(e)}
+
+        self.stats['failed'] += 1
+        return {'to': to_email, 'success': False, 'error': 'Server closed connection'}
+
+    def _deliver(self, server: smtplib.SMTP, msg: MIMEMultipart) -> None:
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            server.send_message(msg)
+            outcome = 'ok'
+        finally:
+            observe_upstream('smtp', 'send', time.perf_counter() - started, outcome)
+
+    def _ensure_connection(self) -> smtplib.SMTP:
+        if self._server is not None:
+            idle = time.monotonic() - self._used_at
+            if self._sent_on_connection >= SMTP_MAX_MESSAGES_PER_CONNECTION or idle > SMTP_MAX_IDLE_SECONDS:
+                self._disconnect()
+            elif idle > SMTP_IDLE_CHECK_SECONDS and not self._is_alive():
+                self._disconnect()
+
+        if self._server is None:
+            self._server = self._connect()
+            self._sent_on_connection = 0
+            self._used_at = time.monotonic()
+        return self._server
+
+    def _connect(self) -> smtplib.SMTP:
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            if self.port == 465:
+                server = smtplib.SMTP_SSL(self.host, self.port, timeout=SMTP_TIMEOUT_SECONDS)
+            else:
+                server = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT_SECONDS)
+                if SMTP_STARTTLS:
+                    server.starttls()
+
+            if self.user and self.password:
+                server.login(self.user, self.password)
+            outcome = 'ok'
+        finally:
+            observe_upstream('smtp', 'connect', time.perf_counter() - started, outcome)
+        self.stats['connects'] += 1
+        return server
+
+    def _is_alive(self) -> bool:
+        try:
+            return self._server.noop()[0] == 250
+        except RECONNECT_ERRORS:
+            return False
+
+    def _reset_session(self) -> None:
+        try:
+            self._server.rset()
+        except Exception:
+            self._disconnect()
+
+    def _disconnect(self) -> None:
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except Exception:
+            try:
+                self._server.close()
+            except Exception:
+                pass
+        self._server = None
+
+
+transport = SMTPTransport()
@@ -0,0 +1,263 @@
+"""
+Метрики функции в текстовом формате Prometheus: запросы, ошибки и гистограммы задержек по маршрутам,
+время в базе и на соединение, обращения к внешним сервисам (amoCRM, SMTP, S3), попадания в кэши.
+
+Значения копятся в памяти теплого экземпляра: у каждого ряда есть метки function и instance
+(случайный id экземпляра), счетчики начинаются с нуля при холодном старте - в запросах Prometheus
+их нужно складывать по instance через rate()/increase(). Запись запроса - одно взятие блокировки
+и несколько операций со словарями; счетчики других модулей (сжатие, ограничитель частоты)
+читаются только при выгрузке через register_collector.
+
+Выгрузка - GET ?action=metrics с заголовком Authorization: Bearer <METRICS_TOKEN>
+(в clinic-api и glass-api также с токеном админа); без METRICS_TOKEN доступ только админу.
+Модуль копируется в каждую функцию.
+"""
+
+import hmac
+import os
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500, 1000)
+
+INSTANCE = uuid.uuid4().hex[:8]
+STARTED_AT = time.time()
+
+_lock = threading.Lock()
+_route = threading.local()
+_function_name = ''
+
+Labels = Tuple[str, ...]
+
+
+def init(function_name: str) -> None:
+    """Имя функции для метки function"""
+    global _function_name
+    _function_name = function_name
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Labels, extra: str = '') -> str:
+    pairs = [f'function="{_escape(_function_name)}"', f'instance="{INSTANCE}"']
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_number(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        with _lock:
+            self._inc(labels, amount)
+
+    def _inc(self, labels: Labels, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def clear(self) -> None:
+        self.values.clear()
+
+    def render(self, lines: List[str]) -> None:
+        lines.append(f'# HELP {self.name} {self.help}')
+        lines.append(f'# TYPE {self.name} counter')
+        for labels, value in sorted(self.values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}')
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # метки -> число наблюдений по корзинам (последняя - +Inf), затем сумма
+        self.series: Dict[Labels, List[float]] = {}
+
+    def observe(self, labels: Labels, value: float) -> None:
+        with _lock:
+            self._observe(labels, value)
+
+    def _observe(self, labels: Labels, value: float) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def clear(self) -> None:
+        self.series.clear()
+
+    def render(self, lines: List[str]) -> None:
+        lines.append(f'# HELP {self.name} {self.help}')
+        lines.append(f'# TYPE {self.name} histogram')
+        for labels, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else _format_number(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {_format_number(series[-1])}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+
+
+REQUESTS = Counter('http_requests_total', 'Requests handled, by route and status code', ('route', 'status'))
+ERRORS = Counter('http_request_errors_total', 'Requests that ended with 5xx or an unhandled exception', ('route',))
+LATENCY = Histogram('http_request_duration_seconds', 'Handler time per request', ('route',))
+DB_QUERIES = Histogram('db_queries_per_request', 'SQL statements per request (sql_trace)', ('route',), QUERY_BUCKETS)
+DB_TIME = Histogram('db_duration_seconds', 'Time spent in SQL statements per request', ('route',))
+DB_CONNECT = Histogram('db_connect_duration_seconds', 'Time to open a database connection (count = connections opened)')
+CACHE = Counter('cache_requests_total', 'Cache lookups by cache and result', ('cache', 'result'))
+UPSTREAM = Histogram('upstream_request_duration_seconds', 'Calls to external services',
+                     ('upstream', 'operation', 'outcome'))
+
+METRICS = [REQUESTS, ERRORS, LATENCY, DB_QUERIES, DB_TIME, DB_CONNECT, CACHE, UPSTREAM]
+
+# (имя, тип, описание, имена меток, функция -> {метки: значение})
+_collectors: List[Tuple[str, str, str, Tuple[str, ...], Callable[[], Dict[Labels, float]]]] = []
+
+
+def register_collector(name: str, kind: str, help_text: str, labelnames: Tuple[str, ...],
+                       collect: Callable[[], Dict[Labels, float]]) -> None:
+    """Метрика, значения которой читаются только при выгрузке (счетчики других модулей)"""
+    _collectors.append((name, kind, help_text, labelnames, collect))
+
+
+def observe_request(route: str, status: int, seconds: float, trace: Any = None) -> None:
+    """Записать запрос; trace - RequestTrace из db_trace.py (число запросов и время в базе)"""
+    with _lock:
+        REQUESTS._inc((route, str(status)))
+        if status >= 500:
+            ERRORS._inc((route,))
+        LATENCY._observe((route,), seconds)
+        if trace is not None and (trace.queries or trace.connect_ms):
+            DB_QUERIES._observe((route,), trace.queries)
+            DB_TIME._observe((route,), trace.db_ms / 1000)
+            if trace.connect_ms:
+                DB_CONNECT._observe((), trace.connect_ms / 1000)
+
+
+def observe_upstream(upstream: str, operation: str, seconds: float, outcome: str = 'ok') -> None:
+    UPSTREAM.observe((upstream, operation, outcome), seconds)
+
+
+def observe_cache(cache: str, hit: bool) -> None:
+    CACHE.inc((cache, 'hit' if hit else 'miss'))
+
+
+_PATH_IDS = re.compile(r'/\d+(?=/|$)')
+
+
+def path_operation(method: str, url: str) -> str:
+    """Операция для метки: метод и путь без хоста, строки запроса и числовых id"""
+    path = re.sub(r'^[a-z]+://[^/]+', '', url).split('?', 1)[0]
+    return f'{method.upper()} {_PATH_IDS.sub("/:id", path) or "/"}'
+
+
+def reset() -> None:
+    """Обнулить накопленные ряды (значения register_collector принадлежат своим модулям)"""
+    with _lock:
+        for metric in METRICS:
+            metric.clear()
+
+
+def render() -> str:
+    lines: List[str] = []
+    with _lock:
+        for metric in METRICS:
+            metric.render(lines)
+    for name, kind, help_text, labelnames, collect in _collectors:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(collect().items()):
+            lines.append(f'{name}{_format_labels(labelnames, labels)} {_format_number(value)}')
+    lines.append('# HELP function_instance_start_time_seconds Cold start time of this warm instance')
+    lines.append('# TYPE function_instance_start_time_seconds gauge')
+    lines.append(f'function_instance_start_time_seconds{_format_labels((), ())} {STARTED_AT:.3f}')
+    return '\n'.join(lines) + '\n'
+
+
+def authorized(event: Dict[str, Any]) -> bool:
+    """Заголовок Authorization: Bearer <METRICS_TOKEN>"""
+    if not METRICS_TOKEN:
+        return False
+    headers = event.get('headers') or {}
+    value = next((v for k, v in headers.items() if k.lower() == 'authorization'), '')
+    return hmac.compare_digest(value.encode(), f'Bearer {METRICS_TOKEN}'.encode())
+
+
+def metrics_response(event: Dict[str, Any], allowed: bool = False) -> Dict[str, Any]:
+    """Ответ на action=metrics; allowed - доступ уже подтвержден иначе (токен админа)"""
+    if not (allowed or authorized(event)):
+        return {
+            'statusCode': 401,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'isBase64Encoded': False,
+            'body': '{"error": "Unauthorized"}'
+        }
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': CONTENT_TYPE},
+        'isBase64Encoded': False,
+        'body': render()
+    }
+
+
+def set_route(action: Optional[str]) -> None:
+    """Action текущего запроса для instrumented_handler (когда action приходит в теле)"""
+    _route.action = action or ''
+
+
+def instrumented_handler(actions: Iterable[str]):
+    """
+    Декоратор handler функции без маршрутизатора: GET ?action=metrics отдает метрики,
+    остальные запросы записываются с маршрутом 'метод action'; action не из actions - 'other'.
+    """
+    known = frozenset(actions)
+
+    def decorate(handler: Callable[[Dict[str, Any], Any], Dict[str, Any]]):
+        @wraps(handler)
+        def wrapper(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+            method = event.get('httpMethod', 'GET')
+            params = event.get('queryStringParameters') or {}
+            if method == 'GET' and params.get('action') == 'metrics':
+                return metrics_response(event)
+
+            _route.action = ''
+            started = time.perf_counter()
+            response = None
+            try:
+                response = handler(event, context)
+                return response
+            finally:
+                action = _route.action or params.get('action', '')
+                route = f'{method} {action if action in known else "other"}' if action else method
+                status = response.get('statusCode', 200) if isinstance(response, dict) else 500
+                observe_request(route, status, time.perf_counter() - started)
+        return wrapper
+    return decorate
@@ -0,0 +1,37 @@
+-- Очередь входящих вебхуков amoCRM и кэш сделок/контактов
+CREATE TABLE IF NOT EXISTS amocrm_webhook_events (
+  id BIGSERIAL PRIMARY KEY,
+  account_domain VARCHAR(255) NOT NULL,
+  entity_type VARCHAR(50) NOT NULL,
+  event_type VARCHAR(50) NOT NULL,
+  entity_id BIGINT,
+  payload JSONB,
+  status VARCHAR(20) DEFAULT 'pending',
+  attempts INTEGER DEFAULT 0,
+  last_error TEXT,
+  locked_at TIMESTAMP,
+  received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  processed_at TIMESTAMP
+);
+
+-- Выборка очередной пачки идет только по необработанным событиям
+CREATE INDEX IF NOT EXISTS idx_amocrm_webhook_events_pending
+  ON amocrm_webhook_events(id) WHERE status IN ('pending', 'processing');
+
+CREATE TABLE IF NOT EXISTS amocrm_entity_cache (
+  account_domain VARCHAR(255) NOT NULL,
+  entity_type VARCHAR(50) NOT NULL,
+  entity_id BIGINT NOT NULL,
+  linked_contact_id BIGINT,
+  data JSONB NOT NULL,
+  fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (account_domain, entity_type, entity_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_amocrm_entity_cache_contact
+  ON amocrm_entity_cache(account_domain, linked_contact_id) WHERE linked_contact_id IS NOT NULL;
+
+COMMENT ON TABLE amocrm_webhook_events IS 'Входящие вебхуки amoCRM, ожидающие пакетной обработки';
+COMMENT ON COLUMN amocrm_webhook_events.status IS 'Статус: pending, processing, done, failed';
+COMMENT ON TABLE amocrm_entity_cache IS 'Кэш данных сделок и контактов amoCRM, сбрасывается вебхуками';
+COMMENT ON COLUMN amocrm_entity_cache.linked_contact_id IS 'Основной контакт сделки (для сброса кэша при изменении контакта)';
@@ -0,0 +1,24 @@
+-- Исходящая очередь операций записи в amoCRM (примечания и товары сделки)
+CREATE TABLE IF NOT EXISTS amocrm_outbox (
+  id BIGSERIAL PRIMARY KEY,
+  account_domain VARCHAR(255) NOT NULL,
+  lead_id BIGINT NOT NULL,
+  operation VARCHAR(20) NOT NULL,
+  payload JSONB NOT NULL,
+  idempotency_key VARCHAR(128) NOT NULL UNIQUE,
+  status VARCHAR(20) DEFAULT 'pending',
+  attempts INTEGER DEFAULT 0,
+  next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  locked_at TIMESTAMP,
+  last_error TEXT,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_amocrm_outbox_due
+  ON amocrm_outbox(next_attempt_at) WHERE status IN ('pending', 'processing');
+
+COMMENT ON TABLE amocrm_outbox IS 'Операции записи в amoCRM, доставляемые воркером с повторами';
+COMMENT ON COLUMN amocrm_outbox.operation IS 'Тип операции: note, link';
+COMMENT ON COLUMN amocrm_outbox.idempotency_key IS 'Ключ идемпотентности: повторный запрос не создает дубль';
+COMMENT ON COLUMN amocrm_outbox.status IS 'Статус: pending, processing, sent, dead';
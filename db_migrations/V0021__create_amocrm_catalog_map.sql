@@ -0,0 +1,16 @@
+-- Соответствие компонентов и комплектов элементам каталога товаров amoCRM
+CREATE TABLE IF NOT EXISTS amocrm_catalog_map (
+  id SERIAL PRIMARY KEY,
+  account_domain VARCHAR(255) NOT NULL,
+  source_type VARCHAR(20) NOT NULL,
+  source_id INTEGER NOT NULL,
+  catalog_id BIGINT NOT NULL,
+  element_id BIGINT NOT NULL,
+  content_hash CHAR(64) NOT NULL,
+  synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE(account_domain, source_type, source_id)
+);
+
+COMMENT ON TABLE amocrm_catalog_map IS 'Связь glass_components/glass_packages с элементами каталога amoCRM';
+COMMENT ON COLUMN amocrm_catalog_map.source_type IS 'Тип источника: component, package';
+COMMENT ON COLUMN amocrm_catalog_map.content_hash IS 'SHA-256 отправленного содержимого: элемент не отправляется повторно, пока не изменится';
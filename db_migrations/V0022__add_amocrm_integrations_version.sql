@@ -0,0 +1,25 @@
+-- Версия набора подключений amoCRM: функции держат индекс подключений в памяти
+-- и перечитывают его только при изменении версии
+CREATE TABLE IF NOT EXISTS amocrm_integrations_version (
+  id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  version BIGINT NOT NULL DEFAULT 1,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO amocrm_integrations_version (id, version) VALUES (1, 1) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_amocrm_integrations_version() RETURNS trigger AS $$
+BEGIN
+  UPDATE amocrm_integrations_version
+  SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+  WHERE id = 1;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_amocrm_integrations_version ON amocrm_integrations;
+CREATE TRIGGER trg_amocrm_integrations_version
+AFTER INSERT OR UPDATE OR DELETE ON amocrm_integrations
+FOR EACH STATEMENT EXECUTE FUNCTION bump_amocrm_integrations_version();
+
+COMMENT ON TABLE amocrm_integrations_version IS 'Счетчик изменений amocrm_integrations для перезагрузки кэша подключений';
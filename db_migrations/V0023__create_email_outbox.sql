@@ -0,0 +1,27 @@
+-- Исходящая очередь писем пациентам: записи ставят письмо в очередь,
+-- send-email (action=dispatch) отправляет его пачками с повторами
+CREATE TABLE IF NOT EXISTS email_outbox (
+  id BIGSERIAL PRIMARY KEY,
+  appointment_id VARCHAR(50) NOT NULL,
+  email_type VARCHAR(20) NOT NULL,
+  recipient VARCHAR(255) NOT NULL,
+  payload JSONB NOT NULL,
+  dedupe_key CHAR(64) NOT NULL UNIQUE,
+  status VARCHAR(20) DEFAULT 'pending',
+  attempts INTEGER DEFAULT 0,
+  next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  locked_at TIMESTAMP,
+  last_error TEXT,
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_email_outbox_due
+  ON email_outbox(next_attempt_at) WHERE status IN ('pending', 'processing');
+CREATE INDEX IF NOT EXISTS idx_email_outbox_appointment ON email_outbox(appointment_id);
+
+COMMENT ON TABLE email_outbox IS 'Письма пациентам, доставляемые диспетчером send-email с повторами';
+COMMENT ON COLUMN email_outbox.email_type IS 'Тип письма: created, rescheduled, cancelled';
+COMMENT ON COLUMN email_outbox.payload IS 'Данные записи для шаблона письма';
+COMMENT ON COLUMN email_outbox.dedupe_key IS 'SHA-256 от (appointment_id, тип, получатель, версия): повтор не создает второе письмо';
+COMMENT ON COLUMN email_outbox.status IS 'Статус: pending, processing, sent, dead';
@@ -0,0 +1,9 @@
+-- Напоминания о записях: send-email (action=reminders) выбирает ближайшие активные записи
+-- одним запросом по диапазону дат и ставит напоминания в email_outbox
+ALTER TABLE appointments ADD COLUMN IF NOT EXISTS reminder_queued_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_appointments_reminder_due
+  ON appointments(appointment_date, appointment_time)
+  WHERE status = 'active' AND reminder_queued_at IS NULL;
+
+COMMENT ON COLUMN appointments.reminder_queued_at IS 'Когда напоминание поставлено в email_outbox; сбрасывается при переносе записи';
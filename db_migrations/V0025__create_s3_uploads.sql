@@ -0,0 +1,20 @@
+-- Прямые загрузки в S3 по presigned URL: s3-upload выдает ссылку (action=presign)
+-- и регистрирует объект после загрузки (action=complete)
+CREATE TABLE IF NOT EXISTS s3_uploads (
+  id BIGSERIAL PRIMARY KEY,
+  object_key VARCHAR(512) NOT NULL UNIQUE,
+  content_type VARCHAR(100) NOT NULL,
+  max_size_bytes BIGINT NOT NULL,
+  size_bytes BIGINT,
+  etag VARCHAR(100),
+  url TEXT NOT NULL,
+  status VARCHAR(20) DEFAULT 'pending',
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  completed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_s3_uploads_pending ON s3_uploads(created_at) WHERE status = 'pending';
+
+COMMENT ON TABLE s3_uploads IS 'Объекты, загруженные в S3 напрямую из браузера по presigned URL';
+COMMENT ON COLUMN s3_uploads.max_size_bytes IS 'Ограничение размера, заложенное в подпись';
+COMMENT ON COLUMN s3_uploads.status IS 'Статус: pending (ссылка выдана), complete (объект проверен), rejected (не прошел проверку)';
@@ -0,0 +1,11 @@
+-- Варианты изображений компонентов: s3-upload нарезает WebP нескольких размеров
+-- и хранит их по SHA-256 содержимого (glass-components/{hash}/{variant}.webp)
+ALTER TABLE glass_components ADD COLUMN IF NOT EXISTS image_variants JSONB;
+
+ALTER TABLE s3_uploads ADD COLUMN IF NOT EXISTS content_hash CHAR(64);
+ALTER TABLE s3_uploads ADD COLUMN IF NOT EXISTS variants JSONB;
+
+COMMENT ON COLUMN glass_components.image_url IS 'URL основного варианта изображения (card.webp)';
+COMMENT ON COLUMN glass_components.image_variants IS 'URL всех вариантов изображения: original, thumb, card, full';
+COMMENT ON COLUMN s3_uploads.content_hash IS 'SHA-256 загруженного файла - ключ вариантов в бакете';
+COMMENT ON COLUMN s3_uploads.variants IS 'URL вариантов, нарезанных из загруженного файла';
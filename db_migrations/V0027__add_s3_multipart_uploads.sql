@@ -0,0 +1,8 @@
+-- Составные загрузки (эскизы и PDF-спецификации комплектов): s3-upload хранит
+-- UploadId и размер части, чтобы клиент мог докачать прерванную загрузку
+ALTER TABLE s3_uploads ADD COLUMN IF NOT EXISTS upload_id VARCHAR(1024);
+ALTER TABLE s3_uploads ADD COLUMN IF NOT EXISTS part_size BIGINT;
+
+COMMENT ON COLUMN s3_uploads.upload_id IS 'UploadId составной загрузки S3; NULL для загрузки одним запросом';
+COMMENT ON COLUMN s3_uploads.part_size IS 'Размер части составной загрузки (последняя часть может быть меньше)';
+COMMENT ON COLUMN s3_uploads.status IS 'Статус: pending (ссылка выдана), complete (объект проверен), rejected (не прошел проверку), aborted (составная загрузка отменена)';
@@ -0,0 +1,16 @@
+-- Счетчики ограничителя частоты запросов (rate_limiter.py): по строке на ключ и окно.
+-- UNLOGGED - счетчики не нужны после сбоя базы, а запись без WAL заметно дешевле
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limits (
+  bucket_key VARCHAR(300) NOT NULL,
+  window_index BIGINT NOT NULL,
+  hits INTEGER NOT NULL DEFAULT 0,
+  expires_at BIGINT NOT NULL,
+  PRIMARY KEY (bucket_key, window_index)
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limits_expires ON rate_limits(expires_at);
+
+COMMENT ON TABLE rate_limits IS 'Общие счетчики скользящего окна для публичных точек: запись, вход в админку, отправка писем';
+COMMENT ON COLUMN rate_limits.bucket_key IS 'Правило, длина окна и ключ (IP, телефон, email): scope:window:key';
+COMMENT ON COLUMN rate_limits.window_index IS 'Номер окна: unix-время, деленное на длину окна';
+COMMENT ON COLUMN rate_limits.expires_at IS 'Когда строку можно удалить (unix-время): через два окна';
@@ -15,6 +15,7 @@ import Icon from '@/components/ui/icon';
 import { GlassComponent, componentTypes, units, S3_UPLOAD_URL } from './types';
 import { useState, useRef } from 'react';
 import { useToast } from '@/hooks/use-toast';
+import { adminFetch } from '@/lib/adminAuth';
 
 interface ComponentEditDialogProps {
   open: boolean;
@@ -63,30 +64,42 @@ export default function ComponentEditDialog({
 
     setUploading(true);
     try {
-      const reader = new FileReader();
-      reader.onload = async (event) => {
-        const base64 = event.target?.result as string;
-        const response = await fetch(S3_UPLOAD_URL, {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({
-            image: base64,
-            filename: `${Date.now()}-${file.name}`
-          })
-        });
+      const presignResponse = await adminFetch(S3_UPLOAD_URL, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          action: 'presign',
+          content_type: file.type === 'image/jpg' ? 'image/jpeg' : file.type,
+          size: file.size
+        })
+      });
+      if (!presignResponse.ok) throw new Error('Presign failed');
+      const presign = await presignResponse.json();
+
+      const uploadResponse = await fetch(presign.upload.url, {
+        method: presign.upload.method,
+        headers: presign.upload.headers,
+        body: file
+      });
+      if (!uploadResponse.ok) throw new Error('Upload failed');
 
-        if (response.ok) {
-          const data = await response.json();
-          setEditingComponent({ ...editingComponent, image_url: data.url });
-          toast({
-            title: 'Успешно',
-            description: 'Изображение загружено'
-          });
-        } else {
-          throw new Error('Upload failed');
-        }
-      };
-      reader.readAsDataURL(file);
+      const completeResponse = await adminFetch(S3_UPLOAD_URL, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          action: 'complete',
+          key: presign.key,
+          component_id: editingComponent.component_id
+        })
+      });
+      if (!completeResponse.ok) throw new Error('Upload verification failed');
+      const data = await completeResponse.json();
+
+      setEditingComponent({ ...editingComponent, image_url: data.url, image_variants: data.variants });
+      toast({
+        title: 'Успешно',
+        description: 'Изображение загружено'
+      });
     } catch (error) {
       toast({
         title: 'Ошибка',
@@ -206,7 +219,7 @@ export default function ComponentEditDialog({
                     type="button"
                     variant="ghost"
                     size="sm"
-                    onClick={() => setEditingComponent({ ...editingComponent, image_url: undefined })}
+                    onClick={() => setEditingComponent({ ...editingComponent, image_url: undefined, image_variants: undefined })}
                   >
                     <Icon name="Trash2" size={16} className="mr-2" />
                     Удалить
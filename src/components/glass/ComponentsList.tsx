@@ -136,7 +136,7 @@ export default function ComponentsList({
                     />
                     {comp.image_url && (
                       <img
-                        src={comp.image_url}
+                        src={comp.image_variants?.thumb || comp.image_url}
                         alt={comp.component_name}
                         className="w-12 h-12 object-cover rounded border"
                       />
@@ -9,6 +9,7 @@ export interface GlassComponent {
   quantity: number;
   is_required: boolean;
   image_url?: string;
+  image_variants?: { thumb?: string; card?: string; full?: string; original?: string };
   alternatives?: GlassComponent[];
 }
 
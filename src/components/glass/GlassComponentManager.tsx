@@ -17,6 +17,7 @@ import {
   AlertDialogHeader,
   AlertDialogTitle,
 } from '@/components/ui/alert-dialog';
+import { adminFetch } from '@/lib/adminAuth';
 
 export default function GlassComponentManager() {
   const [components, setComponents] = useState<GlassComponent[]>([]);
@@ -47,7 +48,7 @@ export default function GlassComponentManager() {
   const fetchComponents = async () => {
     setLoading(true);
     try {
-      const response = await fetch(`${API_URL}?action=glass_components`);
+      const response = await adminFetch(`${API_URL}?action=glass_components`);
       const data = await response.json();
       setComponents(data.components || []);
     } catch (error) {
@@ -96,7 +97,7 @@ export default function GlassComponentManager() {
         ? { component: editingComponent }
         : { action_type: 'create', component: editingComponent };
 
-      const response = await fetch(API_URL, {
+      const response = await adminFetch(API_URL, {
         method,
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ action: 'glass_component', ...body })
@@ -134,7 +135,7 @@ export default function GlassComponentManager() {
     try {
       await Promise.all(
         idsToDelete.map(id =>
-          fetch(`${API_URL}?action=glass_components&id=${id}`, {
+          adminFetch(`${API_URL}?action=glass_components&id=${id}`, {
             method: 'DELETE'
           })
         )
@@ -199,7 +200,7 @@ export default function GlassComponentManager() {
       }
 
       setLoading(true);
-      const response = await fetch(API_URL, {
+      const response = await adminFetch(API_URL, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -8,6 +8,7 @@ import PackageComponentsEditDialog from './PackageComponentsEditDialog';
 import PackageEditDialog from './PackageEditDialog';
 import PackageCard from './PackageCard';
 import { useExcelImport } from './useExcelImport';
+import { adminFetch } from '@/lib/adminAuth';
 
 export default function GlassPackageManager() {
   const [packages, setPackages] = useState<GlassPackage[]>([]);
@@ -34,7 +35,7 @@ export default function GlassPackageManager() {
   async function fetchPackages() {
     setLoading(true);
     try {
-      const response = await fetch(`${API_URL}?action=glass_packages`);
+      const response = await adminFetch(`${API_URL}?action=glass_packages`);
       const data = await response.json();
       setPackages(data.packages || []);
     } catch (error) {
@@ -60,7 +61,7 @@ export default function GlassPackageManager() {
 
     try {
       const method = editingPackage.package_id ? 'PUT' : 'POST';
-      const response = await fetch(API_URL, {
+      const response = await adminFetch(API_URL, {
         method,
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -91,7 +92,7 @@ export default function GlassPackageManager() {
     if (!confirm('Удалить комплект?')) return;
 
     try {
-      const response = await fetch(API_URL, {
+      const response = await adminFetch(API_URL, {
         method: 'DELETE',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -119,7 +120,7 @@ export default function GlassPackageManager() {
 
     try {
       const deletePromises = Array.from(selectedPackages).map(id =>
-        fetch(API_URL, {
+        adminFetch(API_URL, {
           method: 'DELETE',
           headers: { 'Content-Type': 'application/json' },
           body: JSON.stringify({
@@ -5,6 +5,7 @@ import { useToast } from '@/hooks/use-toast';
 import Icon from '@/components/ui/icon';
 import { GlassComponent, PackageComponent, API_URL } from './types';
 import ComponentTab from './package-components/ComponentTab';
+import { adminFetch } from '@/lib/adminAuth';
 
 interface PackageComponentsEditDialogProps {
   open?: boolean;
@@ -41,8 +42,8 @@ export default function PackageComponentsEditDialog({
     setLoading(true);
     try {
       const [componentsRes, allComponentsRes] = await Promise.all([
-        fetch(`${API_URL}?action=package_components&package_id=${packageId}`),
-        fetch(`${API_URL}?action=glass_components`)
+        adminFetch(`${API_URL}?action=package_components&package_id=${packageId}`),
+        adminFetch(`${API_URL}?action=glass_components`)
       ]);
 
       const componentsData = await componentsRes.json();
@@ -72,7 +73,7 @@ export default function PackageComponentsEditDialog({
     }
 
     try {
-      const response = await fetch(API_URL, {
+      const response = await adminFetch(API_URL, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -103,7 +104,7 @@ export default function PackageComponentsEditDialog({
 
   const handleRemoveComponent = async (id: number) => {
     try {
-      const response = await fetch(`${API_URL}?action=package_component&id=${id}`, {
+      const response = await adminFetch(`${API_URL}?action=package_component&id=${id}`, {
         method: 'DELETE'
       });
 
@@ -122,7 +123,7 @@ export default function PackageComponentsEditDialog({
 
   const handleAddAlternative = async (componentId: number, alternativeId: number) => {
     try {
-      const response = await fetch(API_URL, {
+      const response = await adminFetch(API_URL, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -7,6 +7,7 @@ import { useToast } from '@/hooks/use-toast';
 import Icon from '@/components/ui/icon';
 import { Input } from '@/components/ui/input';
 import { PackageComponent, GlassComponent, API_URL } from './types';
+import { adminFetch } from '@/lib/adminAuth';
 
 interface PackageComponentsTableDialogProps {
   open: boolean;
@@ -43,7 +44,7 @@ export default function PackageComponentsTableDialog({
   const fetchPackageComponents = async () => {
     setLoading(true);
     try {
-      const response = await fetch(`${API_URL}?action=package_components&package_id=${packageId}`);
+      const response = await adminFetch(`${API_URL}?action=package_components&package_id=${packageId}`);
       const data = await response.json();
       setComponents(data.components || []);
     } catch (error) {
@@ -59,7 +60,7 @@ export default function PackageComponentsTableDialog({
 
   const fetchAllComponents = async () => {
     try {
-      const response = await fetch(`${API_URL}?action=glass_components`);
+      const response = await adminFetch(`${API_URL}?action=glass_components`);
       const data = await response.json();
       setAllComponents(data.components || []);
     } catch (error) {
@@ -69,7 +70,7 @@ export default function PackageComponentsTableDialog({
 
   const handleAddAlternative = async (mainComponentId: number, alternativeComponentId: number) => {
     try {
-      const response = await fetch(API_URL, {
+      const response = await adminFetch(API_URL, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -101,7 +102,7 @@ export default function PackageComponentsTableDialog({
 
   const handleDeleteAlternative = async (mainComponentId: number, alternativeComponentId: number) => {
     try {
-      const response = await fetch(API_URL, {
+      const response = await adminFetch(API_URL, {
         method: 'DELETE',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -131,7 +132,7 @@ export default function PackageComponentsTableDialog({
 
   const handleSwapMainAlternative = async (currentMainId: number, newMainId: number) => {
     try {
-      const response = await fetch(API_URL, {
+      const response = await adminFetch(API_URL, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
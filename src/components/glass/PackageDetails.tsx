@@ -76,7 +76,7 @@ export default function PackageDetails({
                     {activeComponent.image_url && (
                       <div className="shrink-0 w-12 h-12 rounded-lg overflow-hidden bg-muted">
                         <img 
-                          src={activeComponent.image_url} 
+                          src={activeComponent.image_variants?.thumb || activeComponent.image_url} 
                           alt={activeComponent.component_name}
                           className="w-full h-full object-cover"
                         />
@@ -135,7 +135,7 @@ export default function PackageDetails({
                               {comp.image_url && (
                                 <div className="shrink-0 w-14 h-14 rounded-lg overflow-hidden bg-muted">
                                   <img 
-                                    src={comp.image_url} 
+                                    src={comp.image_variants?.thumb || comp.image_url} 
                                     alt={comp.component_name}
                                     className="w-full h-full object-cover"
                                   />
@@ -173,7 +173,7 @@ export default function PackageDetails({
                                   {alt.image_url && (
                                     <div className="shrink-0 w-14 h-14 rounded-lg overflow-hidden bg-muted">
                                       <img 
-                                        src={alt.image_url} 
+                                        src={alt.image_variants?.thumb || alt.image_url} 
                                         alt={alt.component_name}
                                         className="w-full h-full object-cover"
                                       />
@@ -236,7 +236,7 @@ export default function PackageDetails({
                     {activeComponent.image_url && (
                       <div className="shrink-0 w-12 h-12 rounded-lg overflow-hidden bg-muted">
                         <img 
-                          src={activeComponent.image_url} 
+                          src={activeComponent.image_variants?.thumb || activeComponent.image_url} 
                           alt={activeComponent.component_name}
                           className="w-full h-full object-cover"
                         />
@@ -295,7 +295,7 @@ export default function PackageDetails({
                               {comp.image_url && (
                                 <div className="shrink-0 w-14 h-14 rounded-lg overflow-hidden bg-muted">
                                   <img 
-                                    src={comp.image_url} 
+                                    src={comp.image_variants?.thumb || comp.image_url} 
                                     alt={comp.component_name}
                                     className="w-full h-full object-cover"
                                   />
@@ -333,7 +333,7 @@ export default function PackageDetails({
                                   {alt.image_url && (
                                     <div className="shrink-0 w-14 h-14 rounded-lg overflow-hidden bg-muted">
                                       <img 
-                                        src={alt.image_url} 
+                                        src={alt.image_variants?.thumb || alt.image_url} 
                                         alt={alt.component_name}
                                         className="w-full h-full object-cover"
                                       />
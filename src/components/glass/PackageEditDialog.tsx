@@ -1,4 +1,4 @@
-import { useState } from 'react';
+import { useRef, useState } from 'react';
 import { Button } from '@/components/ui/button';
 import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle } from '@/components/ui/dialog';
 import { Input } from '@/components/ui/input';
@@ -10,6 +10,8 @@ import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import Icon from '@/components/ui/icon';
 import { GlassPackage } from './types';
 import PackageComponentsEditDialog from './PackageComponentsEditDialog';
+import { uploadMultipart } from './multipartUpload';
+import { useToast } from '@/hooks/use-toast';
 
 const PRODUCT_TYPES = [
   { value: 'shower_cabin', label: 'Душевая кабина прямая' },
@@ -41,6 +43,29 @@ export default function PackageEditDialog({
   onSave
 }: PackageEditDialogProps) {
   const [activeTab, setActiveTab] = useState('basic');
+  const [sketchProgress, setSketchProgress] = useState<number | null>(null);
+  const sketchInputRef = useRef<HTMLInputElement>(null);
+  const { toast } = useToast();
+
+  const handleSketchUpload = async (e: React.ChangeEvent<HTMLInputElement>) => {
+    const file = e.target.files?.[0];
+    e.target.value = '';
+    if (!file) return;
+
+    setSketchProgress(0);
+    try {
+      const url = await uploadMultipart(file, (done, total) => setSketchProgress(Math.round((done / total) * 100)));
+      setEditingPackage({ ...editingPackage, sketch_image_url: url });
+    } catch (error) {
+      toast({
+        title: 'Ошибка',
+        description: 'Не удалось загрузить файл. Повторная загрузка того же файла продолжится с места обрыва',
+        variant: 'destructive'
+      });
+    } finally {
+      setSketchProgress(null);
+    }
+  };
 
   return (
     <Dialog open={open} onOpenChange={onOpenChange}>
@@ -301,14 +326,41 @@ export default function PackageEditDialog({
 
             <TabsContent value="sketch" className="space-y-4 mt-0">
               <div className="grid gap-2">
-                <Label htmlFor="sketch_image_url">Эскиз изделия (URL изображения)</Label>
-                <Input
-                  id="sketch_image_url"
-                  value={editingPackage?.sketch_image_url || ''}
-                  onChange={(e) => setEditingPackage({ ...editingPackage, sketch_image_url: e.target.value })}
-                  placeholder="https://example.com/sketch.png"
-                />
-                {editingPackage?.sketch_image_url && (
+                <Label htmlFor="sketch_image_url">Эскиз изделия (URL изображения или PDF)</Label>
+                <div className="flex gap-2">
+                  <Input
+                    id="sketch_image_url"
+                    value={editingPackage?.sketch_image_url || ''}
+                    onChange={(e) => setEditingPackage({ ...editingPackage, sketch_image_url: e.target.value })}
+                    placeholder="https://example.com/sketch.png"
+                  />
+                  <input
+                    ref={sketchInputRef}
+                    type="file"
+                    accept="image/png,image/jpeg,image/webp,application/pdf"
+                    onChange={handleSketchUpload}
+                    className="hidden"
+                  />
+                  <Button
+                    type="button"
+                    variant="outline"
+                    onClick={() => sketchInputRef.current?.click()}
+                    disabled={sketchProgress !== null}
+                  >
+                    <Icon name={sketchProgress !== null ? 'Loader2' : 'Upload'} size={16} className={sketchProgress !== null ? 'mr-2 animate-spin' : 'mr-2'} />
+                    {sketchProgress !== null ? `${sketchProgress}%` : 'Загрузить'}
+                  </Button>
+                </div>
+                {editingPackage?.sketch_image_url?.toLowerCase().endsWith('.pdf') ? (
+                  <a
+                    href={editingPackage.sketch_image_url}
+                    target="_blank"
+                    rel="noreferrer"
+                    className="text-sm text-primary underline"
+                  >
+                    Открыть PDF-спецификацию
+                  </a>
+                ) : editingPackage?.sketch_image_url && (
                   <div className="border rounded-lg p-4 bg-muted/30">
                     <img
                       src={editingPackage.sketch_image_url}
@@ -0,0 +1,88 @@
+import { adminFetch } from '@/lib/adminAuth';
+import { S3_UPLOAD_URL } from './types';
+
+const PARALLEL_PARTS = 4;
+const RESUME_PREFIX = 's3-multipart:';
+
+interface MultipartSession {
+  key: string;
+  part_size: number;
+  part_count: number;
+  url: string;
+}
+
+const callS3Upload = async (body: Record<string, unknown>) => {
+  const response = await adminFetch(S3_UPLOAD_URL, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body)
+  });
+  const data = await response.json();
+  if (!response.ok) throw new Error(data.error || 'Upload request failed');
+  return data;
+};
+
+const resumeKey = (file: File) => `${RESUME_PREFIX}${file.name}:${file.size}:${file.lastModified}`;
+
+const startOrResume = async (file: File): Promise<{ session: MultipartSession; uploaded: Set<number> }> => {
+  const saved = localStorage.getItem(resumeKey(file));
+  if (saved) {
+    try {
+      const session: MultipartSession = JSON.parse(saved);
+      const listed = await callS3Upload({ action: 'multipart_list', key: session.key });
+      return {
+        session,
+        uploaded: new Set(listed.parts.map((part: { part_number: number }) => part.part_number))
+      };
+    } catch {
+      localStorage.removeItem(resumeKey(file));
+    }
+  }
+
+  const session: MultipartSession = await callS3Upload({
+    action: 'multipart_initiate',
+    content_type: file.type,
+    size: file.size
+  });
+  localStorage.setItem(resumeKey(file), JSON.stringify(session));
+  return { session, uploaded: new Set() };
+};
+
+/**
+ * Составная загрузка большого файла (эскиз, PDF) напрямую в S3: части грузятся параллельно
+ * по подписанным ссылкам, прерванная загрузка того же файла продолжается с недостающих частей.
+ */
+export const uploadMultipart = async (
+  file: File,
+  onProgress?: (uploadedParts: number, totalParts: number) => void
+): Promise<string> => {
+  const { session, uploaded } = await startOrResume(file);
+  const pending = [];
+  for (let part = 1; part <= session.part_count; part++) {
+    if (!uploaded.has(part)) pending.push(part);
+  }
+  onProgress?.(uploaded.size, session.part_count);
+
+  const { parts } = pending.length
+    ? await callS3Upload({ action: 'multipart_part', key: session.key, part_numbers: pending })
+    : { parts: [] };
+
+  const queue: { part_number: number; url: string }[] = [...parts];
+  const worker = async () => {
+    for (let next = queue.shift(); next; next = queue.shift()) {
+      const start = (next.part_number - 1) * session.part_size;
+      const response = await fetch(next.url, {
+        method: 'PUT',
+        body: file.slice(start, start + session.part_size)
+      });
+      if (!response.ok) throw new Error(`Part ${next.part_number} upload failed`);
+      uploaded.add(next.part_number);
+      onProgress?.(uploaded.size, session.part_count);
+    }
+  };
+  await Promise.all(Array.from({ length: PARALLEL_PARTS }, worker));
+
+  const result = await callS3Upload({ action: 'multipart_complete', key: session.key });
+  localStorage.removeItem(resumeKey(file));
+  return result.url;
+};
@@ -9,6 +9,14 @@ export interface GlassComponent {
   is_active: boolean;
   packages_count?: number;
   image_url?: string;
+  image_variants?: ImageVariants;
+}
+
+export interface ImageVariants {
+  original?: string;
+  full?: string;
+  card?: string;
+  thumb?: string;
 }
 
 export interface GlassPackage {
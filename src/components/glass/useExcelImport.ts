@@ -2,6 +2,7 @@ import { useRef } from 'react';
 import * as XLSX from 'xlsx';
 import { useToast } from '@/hooks/use-toast';
 import { GlassPackage, API_URL } from './types';
+import { adminFetch } from '@/lib/adminAuth';
 
 export function useExcelImport(packages: GlassPackage[], fetchPackages: () => void) {
   const fileInputRef = useRef<HTMLInputElement>(null);
@@ -12,7 +13,7 @@ export function useExcelImport(packages: GlassPackage[], fetchPackages: () => vo
   const fetchWithRetry = async (url: string, options: RequestInit, retries = 3): Promise<Response> => {
     for (let i = 0; i < retries; i++) {
       try {
-        const response = await fetch(url, options);
+        const response = await adminFetch(url, options);
         if (response.ok) return response;
         if (i < retries - 1) await delay(1000 * (i + 1));
       } catch (error) {
@@ -54,7 +55,7 @@ export function useExcelImport(packages: GlassPackage[], fetchPackages: () => vo
 
       if (hasChanges) {
         const componentType = detectComponentType(comp.name);
-        await fetch(API_URL, {
+        await adminFetch(API_URL, {
           method: 'PUT',
           headers: { 'Content-Type': 'application/json' },
           body: JSON.stringify({
@@ -81,7 +82,7 @@ export function useExcelImport(packages: GlassPackage[], fetchPackages: () => vo
 
     const componentType = detectComponentType(comp.name);
     
-    const createResponse = await fetch(API_URL, {
+    const createResponse = await adminFetch(API_URL, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({
@@ -240,7 +241,7 @@ export function useExcelImport(packages: GlassPackage[], fetchPackages: () => vo
           description: `Обновляю состав комплекта ${packageArticle}`
         });
       } else {
-        const newPackageResponse = await fetch(API_URL, {
+        const newPackageResponse = await adminFetch(API_URL, {
           method: 'POST',
           headers: { 'Content-Type': 'application/json' },
           body: JSON.stringify({
@@ -275,7 +276,7 @@ export function useExcelImport(packages: GlassPackage[], fetchPackages: () => vo
         });
       }
 
-      const componentsResponse = await fetch(`${API_URL}?action=glass_components`);
+      const componentsResponse = await adminFetch(`${API_URL}?action=glass_components`);
       const componentsData = await componentsResponse.json();
       const allComponents = componentsData.components || [];
 
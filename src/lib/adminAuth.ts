@@ -0,0 +1,30 @@
+const ADMIN_TOKEN_KEY = 'admin_token';
+const SESSION_FLAGS = ['user_authenticated', 'super_admin_authenticated'];
+
+export const getAdminToken = () => sessionStorage.getItem(ADMIN_TOKEN_KEY);
+
+export const setAdminToken = (token?: string | null) => {
+  if (token) {
+    sessionStorage.setItem(ADMIN_TOKEN_KEY, token);
+  } else {
+    sessionStorage.removeItem(ADMIN_TOKEN_KEY);
+  }
+};
+
+/**
+ * fetch для админских запросов: добавляет токен сессии в X-Admin-Key.
+ * Если токен истек или отозван (401), сессия сбрасывается и страница возвращается ко входу.
+ */
+export const adminFetch = async (url: string, init: RequestInit = {}): Promise<Response> => {
+  const headers = new Headers(init.headers);
+  const token = getAdminToken();
+  if (token) headers.set('X-Admin-Key', token);
+
+  const response = await fetch(url, { ...init, headers });
+  if (response.status === 401) {
+    setAdminToken(null);
+    SESSION_FLAGS.forEach((flag) => sessionStorage.removeItem(flag));
+    window.location.reload();
+  }
+  return response;
+};
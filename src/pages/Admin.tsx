@@ -11,6 +11,7 @@ import UsersManagement from '@/components/admin/UsersManagement';
 import TemplatesStats from '@/components/admin/TemplatesStats';
 import AdminStats from '@/components/admin/AdminStats';
 import AdminAppointments from '@/components/admin/AdminAppointments';
+import { adminFetch, setAdminToken } from '@/lib/adminAuth';
 
 const API_URL = 'https://functions.poehali.dev/da819482-69ab-4b27-954a-cd7ac2026f30';
 const SUPER_AUTH_URL = 'https://functions.poehali.dev/bb129e10-b955-455d-8c79-c982ac1ba88f';
@@ -49,7 +50,7 @@ export default function Admin() {
   const fetchStats = async () => {
     setLoading(true);
     try {
-      const response = await fetch(`${API_URL}?action=stats`);
+      const response = await adminFetch(`${API_URL}?action=stats`);
       const data = await response.json();
       setStats(data.stats);
     } catch (error) {
@@ -66,7 +67,7 @@ export default function Admin() {
   const fetchAppointments = async (status = 'active') => {
     setLoading(true);
     try {
-      const response = await fetch(`${API_URL}?action=appointments&status=${status}`);
+      const response = await adminFetch(`${API_URL}?action=appointments&status=${status}`);
       const data = await response.json();
       setAppointments(data.appointments || []);
     } catch (error) {
@@ -86,10 +87,12 @@ export default function Admin() {
       const response = await fetch(SUPER_AUTH_URL, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ password, role: 'superadmin' })
+        body: JSON.stringify({ password })
       });
 
       if (response.ok) {
+        const data = await response.json();
+        setAdminToken(data.token);
         setIsAuthenticated(true);
         sessionStorage.setItem('super_admin_authenticated', 'true');
         toast({
@@ -117,6 +120,7 @@ export default function Admin() {
   const handleLogout = () => {
     setIsAuthenticated(false);
     sessionStorage.removeItem('super_admin_authenticated');
+    setAdminToken(null);
     setPassword('');
     navigate('/');
   };
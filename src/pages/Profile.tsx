@@ -13,6 +13,7 @@ import AdminLogs from '@/components/admin/AdminLogs';
 import CRMIntegration from '@/components/admin/CRMIntegration';
 import GlassDashboard from '@/components/dashboards/GlassDashboard';
 import CountertopDashboard from '@/components/dashboards/CountertopDashboard';
+import { adminFetch, setAdminToken } from '@/lib/adminAuth';
 
 const API_URL = 'https://functions.poehali.dev/da819482-69ab-4b27-954a-cd7ac2026f30';
 const AUTH_URL = 'https://functions.poehali.dev/bb129e10-b955-455d-8c79-c982ac1ba88f';
@@ -62,7 +63,7 @@ export default function Profile() {
   const fetchStats = async () => {
     setLoading(true);
     try {
-      const response = await fetch(`${API_URL}?action=stats`);
+      const response = await adminFetch(`${API_URL}?action=stats`);
       const data = await response.json();
       setStats(data.stats);
     } catch (error) {
@@ -79,7 +80,7 @@ export default function Profile() {
   const fetchAppointments = async (status = 'active') => {
     setLoading(true);
     try {
-      const response = await fetch(`${API_URL}?action=appointments&status=${status}`);
+      const response = await adminFetch(`${API_URL}?action=appointments&status=${status}`);
       const data = await response.json();
       setAppointments(data.appointments || []);
     } catch (error) {
@@ -96,7 +97,7 @@ export default function Profile() {
   const fetchLogs = async () => {
     setLoading(true);
     try {
-      const response = await fetch(`${API_URL}?action=logs&limit=100`);
+      const response = await adminFetch(`${API_URL}?action=logs&limit=100`);
       const data = await response.json();
       setLogs(data.logs || []);
     } catch (error) {
@@ -120,6 +121,8 @@ export default function Profile() {
       });
 
       if (response.ok) {
+        const data = await response.json();
+        setAdminToken(data.token);
         setIsAuthenticated(true);
         sessionStorage.setItem('user_authenticated', 'true');
         toast({
@@ -147,6 +150,7 @@ export default function Profile() {
   const handleLogout = () => {
     setIsAuthenticated(false);
     sessionStorage.removeItem('user_authenticated');
+    setAdminToken(null);
     setPassword('');
     navigate('/');
   };
@@ -0,0 +1,174 @@
+"""
+Воспроизведение записанных вебхуков amoCRM для нагрузочного тестирования amocrm-webhook.
+
+Файл с записями: одна строка = одно form-encoded тело вебхука (как его присылает amoCRM).
+Цель: либо URL развернутой/локальной функции (--url), либо обработчик в текущем процессе (--local,
+нужен DATABASE_URL). Секрет вебхука и служебный токен для action=process берутся
+из AMOCRM_WEBHOOK_SECRET и INTERNAL_API_TOKEN (для --local задаются сами, если не заданы).
+
+Примеры:
+  python tools/amocrm_webhook_replay.py --generate 1000 --output payloads.txt
+  python tools/amocrm_webhook_replay.py --file payloads.txt --url http://localhost:8000/amocrm-webhook -c 32
+  python tools/amocrm_webhook_replay.py --file payloads.txt --local --repeat 5 --process
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import urllib.request
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from benchlib import FakeContext, format_report, load_handler, run_load
+
+os.environ.setdefault('AMOCRM_WEBHOOK_SECRET', 'webhook-replay')
+os.environ.setdefault('INTERNAL_API_TOKEN', 'webhook-replay')
+WEBHOOK_SECRET = os.environ['AMOCRM_WEBHOOK_SECRET']
+INTERNAL_HEADERS = {'X-Internal-Token': os.environ['INTERNAL_API_TOKEN']}
+
+
+def generate_payloads(count: int, accounts: int, events_per_payload: int) -> List[str]:
+    """Сгенерировать вебхуки изменения сделок и контактов в формате amoCRM"""
+    payloads = []
+    for _ in range(count):
+        subdomain = f"account{random.randint(1, accounts)}"
+        fields = [
+            ('account[subdomain]', subdomain),
+            ('account[id]', str(random.randint(10000000, 99999999))),
+            ('account[_links][self]', f"https://{subdomain}.amocrm.ru"),
+        ]
+        for i in range(events_per_payload):
+            if random.random() < 0.7:
+                prefix = f"leads[{random.choice(['update', 'status', 'add'])}][{i}]"
+                fields += [
+                    (f"{prefix}[id]", str(random.randint(1, 50000))),
+                    (f"{prefix}[name]", f"Сделка {i}"),
+                    (f"{prefix}[status_id]", str(random.randint(100, 120))),
+                    (f"{prefix}[price]", str(random.randint(1000, 500000))),
+                ]
+            else:
+                prefix = f"contacts[update][{i}]"
+                fields += [
+                    (f"{prefix}[id]", str(random.randint(1, 20000))),
+                    (f"{prefix}[name]", f"Контакт {i}"),
+                    (f"{prefix}[type]", 'contact'),
+                ]
+        payloads.append(urlencode(fields))
+    return payloads
+
+
+def http_sender(url: str) -> Callable[[str], bool]:
+    """Отправка тела вебхука по HTTP"""
+    separator = '&' if '?' in url else '?'
+    webhook_url = f"{url}{separator}{urlencode({'secret': WEBHOOK_SECRET})}"
+
+    def send(body: str) -> bool:
+        request = urllib.request.Request(
+            webhook_url,
+            data=body.encode('utf-8'),
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status == 200
+    return send
+
+
+def local_sender() -> Callable[[str], bool]:
+    """Вызов обработчика amocrm-webhook в текущем процессе"""
+    handler = load_handler('amocrm-webhook')
+    context = FakeContext('amocrm-webhook')
+
+    def send(body: str) -> bool:
+        event = {
+            'httpMethod': 'POST',
+            'headers': {'Content-Type': 'application/x-www-form-urlencoded'},
+            'queryStringParameters': {'secret': WEBHOOK_SECRET},
+            'body': body,
+            'isBase64Encoded': False
+        }
+        return handler(event, context)['statusCode'] == 200
+    return send
+
+
+def drain_queue(url: Optional[str]) -> Tuple[int, int, float]:
+    """Разбирать очередь (action=process), пока она не опустеет"""
+    if url:
+        separator = '&' if '?' in url else '?'
+        drain_url = f"{url}{separator}action=process"
+
+        def process_batch() -> Dict[str, Any]:
+            request = urllib.request.Request(drain_url, data=b'', headers=INTERNAL_HEADERS, method='POST')
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return json.loads(response.read())
+    else:
+        handler = load_handler('amocrm-webhook')
+
+        def process_batch() -> Dict[str, Any]:
+            event = {'httpMethod': 'POST', 'headers': INTERNAL_HEADERS, 'queryStringParameters': {'action': 'process'},
+                     'body': ''}
+            return json.loads(handler(event, FakeContext('amocrm-webhook'))['body'])
+
+    drained = 0
+    batches = 0
+    started = time.perf_counter()
+    while True:
+        result = process_batch()
+        if not result.get('success') or not result.get('processed'):
+            break
+        drained += result['processed']
+        batches += 1
+    return drained, batches, time.perf_counter() - started
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Replay amoCRM webhooks')
+    parser.add_argument('--file', help='файл с записанными вебхуками')
+    parser.add_argument('--generate', type=int, default=0, help='сгенерировать N вебхуков')
+    parser.add_argument('--accounts', type=int, default=3)
+    parser.add_argument('--events-per-payload', type=int, default=3)
+    parser.add_argument('--output', help='сохранить сгенерированные вебхуки в файл и выйти')
+    parser.add_argument('--url', help='URL функции amocrm-webhook')
+    parser.add_argument('--local', action='store_true', help='вызывать обработчик в процессе')
+    parser.add_argument('-c', '--concurrency', type=int, default=16)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--process', action='store_true', help='после отправки разобрать очередь (action=process)')
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding='utf-8') as f:
+            payloads = [line.strip() for line in f if line.strip()]
+    elif args.generate:
+        payloads = generate_payloads(args.generate, args.accounts, args.events_per_payload)
+    else:
+        parser.error('нужен --file или --generate')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(payloads) + '\n')
+        print(f"Saved {len(payloads)} payloads to {args.output}")
+        return 0
+
+    if args.local:
+        send = local_sender()
+    elif args.url:
+        send = http_sender(args.url)
+    else:
+        parser.error('нужен --url или --local')
+
+    report = run_load(send, payloads * args.repeat, args.concurrency)
+    print(format_report('webhook ingest', report))
+
+    if args.process:
+        drained, batches, elapsed = drain_queue(args.url if not args.local else None)
+        print(f"queue drain: {drained} events in {batches} batches, {elapsed:.2f}s "
+              f"({drained / elapsed if elapsed else 0:.0f} events/s)")
+
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Нагрузочный прогон amocrm-integration и amocrm-oauth против локальной заглушки amoCRM (fake_amocrm.py).
+
+Обработчики вызываются в текущем процессе, запросы к amoCRM уходят на заглушку через AMOCRM_BASE_URL.
+Нужен DATABASE_URL с примененными миграциями: скрипт создает подключение bench.amocrm.ru (виджет glass)
+и перед прогоном очищает его очередь, кэш сделок и карту каталога.
+
+Сценарии: обмен кода и обновление токена (amocrm-oauth), выгрузка каталога, чтение сделки
+без кэша и из кэша, постановка расчета в очередь и доставка очереди.
+В конце проверяется, что заглушка не зафиксировала нарушений формы запросов.
+
+Примеры:
+  DATABASE_URL=postgresql://... python bench_amocrm.py
+  DATABASE_URL=postgresql://... python bench_amocrm.py -n 500 -c 16 --latency-ms 80 --error-rate 0.02 --rate-limit 50
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.request
+from typing import Any, Dict, List
+
+import psycopg2
+
+from benchlib import FakeContext, format_report, load_function_module, run_load
+from fake_amocrm import FakeAmoCRMState, start_server
+
+BENCH_DOMAIN = 'bench.amocrm.ru'
+BENCH_WIDGET = 'glass'
+BENCH_TOKEN = 'bench-access-token'
+
+# sync_catalog и process_outbox - служебные действия
+os.environ.setdefault('INTERNAL_API_TOKEN', 'bench-amocrm')
+INTERNAL_HEADERS = {'X-Internal-Token': os.environ['INTERNAL_API_TOKEN']}
+
+
+def seed_integration(database_url: str) -> None:
+    """Создать подключение для прогона и убрать следы предыдущих запусков"""
+    conn = psycopg2.connect(database_url)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """INSERT INTO amocrm_integrations
+                   (widget_type, domain, client_id, client_secret, access_token, refresh_token, token_expires_at, is_active)
+               VALUES (%s, %s, 'bench-client', 'bench-secret', %s, 'bench-refresh', CURRENT_TIMESTAMP + INTERVAL '1 day', true)
+               ON CONFLICT (widget_type, domain) DO UPDATE
+               SET access_token = EXCLUDED.access_token, refresh_token = EXCLUDED.refresh_token,
+                   token_expires_at = EXCLUDED.token_expires_at, is_active = true, updated_at = CURRENT_TIMESTAMP""",
+            (BENCH_WIDGET, BENCH_DOMAIN, BENCH_TOKEN)
+        )
+        cursor.execute("DELETE FROM amocrm_outbox WHERE account_domain = %s", (BENCH_DOMAIN,))
+        cursor.execute("DELETE FROM amocrm_entity_cache WHERE account_domain = %s", (BENCH_DOMAIN,))
+        cursor.execute("DELETE FROM amocrm_catalog_map WHERE account_domain = %s", (BENCH_DOMAIN,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def mapped_component_ids(database_url: str, limit: int) -> List[int]:
+    """Компоненты, выгруженные в каталог заглушки (для товаров в расчете)"""
+    conn = psycopg2.connect(database_url)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT source_id FROM amocrm_catalog_map
+               WHERE account_domain = %s AND source_type = 'component'
+               ORDER BY source_id LIMIT %s""",
+            (BENCH_DOMAIN, limit)
+        )
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def post_event(body: Dict[str, Any], headers: Dict[str, str] = None) -> Dict[str, Any]:
+    return {
+        'httpMethod': 'POST',
+        'headers': dict({'Content-Type': 'application/json'}, **(headers or {})),
+        'queryStringParameters': {},
+        'body': json.dumps(body)
+    }
+
+
+def call_json(handler, event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    response = handler(event, context)
+    if response['statusCode'] != 200:
+        return {'error': f"HTTP {response['statusCode']}"}
+    return json.loads(response['body'])
+
+
+def fetch_stats(base_url: str) -> Dict[str, Any]:
+    with urllib.request.urlopen(f"{base_url}/__stats", timeout=10) as response:
+        return json.loads(response.read())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark amoCRM functions against a local fake amoCRM')
+    parser.add_argument('-n', '--requests', type=int, default=200, help='запросов на сценарий')
+    parser.add_argument('-c', '--concurrency', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--rate-limit', type=float, default=0, help='лимит заглушки, запросов в секунду (0 - без лимита)')
+    parser.add_argument('--fake-url', help='использовать уже запущенную заглушку вместо встроенной')
+    args = parser.parse_args()
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        sys.exit('DATABASE_URL is required')
+
+    if args.fake_url:
+        base_url = args.fake_url.rstrip('/')
+    else:
+        state = FakeAmoCRMState(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit)
+        server = start_server(state)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ['AMOCRM_BASE_URL'] = base_url
+    print(f"fake amoCRM: {base_url}")
+
+    seed_integration(database_url)
+    oauth = load_function_module('amocrm-oauth').handler
+    integration = load_function_module('amocrm-integration')
+    handler = integration.handler
+    context = FakeContext('amocrm-integration', timeout_ms=600000)
+    n, c = args.requests, args.concurrency
+
+    report = run_load(
+        lambda i: call_json(oauth, post_event({
+            'action': 'exchange_code', 'code': f'code-{i}', 'widget_type': BENCH_WIDGET, 'domain': BENCH_DOMAIN
+        }), context).get('success') is True,
+        range(n), c
+    )
+    print(format_report('oauth exchange_code', report))
+
+    report = run_load(
+        lambda i: call_json(oauth, post_event({
+            'action': 'refresh_token', 'widget_type': BENCH_WIDGET, 'domain': BENCH_DOMAIN
+        }), context).get('success') is True,
+        range(n), c
+    )
+    print(format_report('oauth refresh_token', report))
+
+    for force in (False, True):
+        started = time.perf_counter()
+        result = call_json(handler, post_event({'action': 'sync_catalog', 'domain': BENCH_DOMAIN, 'force': force},
+                                                 INTERNAL_HEADERS), context)
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"sync_catalog force={force}: {elapsed:.1f}ms created={result.get('created')} "
+              f"updated={result.get('updated')} unchanged={result.get('unchanged')} failed={result.get('failed')}")
+
+    lead_headers = lambda i: {'X-Lead-Id': str(100 + i), 'X-Account-Domain': BENCH_DOMAIN}
+    for label in ('get_lead (miss)', 'get_lead (cached)'):
+        report = run_load(
+            lambda i: 'error' not in call_json(handler, {
+                'httpMethod': 'GET',
+                'headers': lead_headers(i),
+                'queryStringParameters': {'action': 'get_lead'},
+                'body': ''
+            }, context),
+            range(n), c
+        )
+        print(format_report(label, report))
+
+    component_ids = mapped_component_ids(database_url, 5)
+    calculation = {
+        'package_name': 'Душевая перегородка',
+        'width': 1200, 'height': 2000, 'square_meters': 2.4,
+        'total_price': 48500, 'components_total': 38500, 'services_total': 10000,
+        'products': [{'component_id': cid, 'quantity': 2} for cid in component_ids]
+    }
+    report = run_load(
+        lambda i: call_json(handler, post_event(
+            {'action': 'save_calculation', 'calculation': calculation},
+            dict(lead_headers(i), **{'X-Idempotency-Key': f'bench-{i}'})
+        ), context).get('queued') is True,
+        range(n), c
+    )
+    print(format_report('save_calculation (enqueue)', report))
+
+    started = time.perf_counter()
+    totals = {'processed': 0, 'sent': 0, 'retry': 0, 'dead': 0}
+    while True:
+        result = call_json(handler, post_event({'action': 'process_outbox'}, INTERNAL_HEADERS), context)
+        if not result.get('processed'):
+            break
+        for key in totals:
+            totals[key] += result.get(key, 0)
+    elapsed = time.perf_counter() - started
+    rate = totals['sent'] / elapsed if elapsed else 0
+    print(f"process_outbox: {totals} in {elapsed:.2f}s ({rate:.1f} deliveries/s)")
+
+    stats = fetch_stats(base_url)
+    print(f"fake amoCRM requests: {stats['requests']}")
+    print(f"fake amoCRM statuses: {stats['statuses']}")
+    if stats['violations']:
+        print(f"contract violations: {stats['violations']}")
+        for sample in stats['violation_samples']:
+            print(f"  {sample['route']}: {sample['error']} ({sample['body']})")
+        sys.exit(1)
+    print('contract violations: 0')
+
+
+if __name__ == '__main__':
+    main()
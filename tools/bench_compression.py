@@ -0,0 +1,108 @@
+"""
+Бенчмарк сжатия ответов clinic-api и glass-api (backend/*/compression.py).
+
+На синтетическом каталоге комплектов и списке записей (те же данные, что в bench_json.py)
+меряет для gzip и brotli: время сжатия на каждый запрос, время первого сжатия запоминаемого
+ответа (уровень выше) и повторного запроса из памяти, размер тела в base64 относительно исходного.
+Каждое тело распаковывается и сверяется с исходным; проверяется выбор кодировки по Accept-Encoding
+и то, что тела меньше порога не сжимаются. Завершается с кодом 1 при расхождениях.
+
+  python bench_compression.py --rows 2000 --repeat 20
+"""
+
+import argparse
+import base64
+import gzip
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from bench_json import make_appointments, make_catalog
+from benchlib import BACKEND_DIR, percentile
+
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'clinic-api'))
+import compression  # noqa: E402
+from serialization import dumps  # noqa: E402
+
+NEGOTIATION_CASES = {
+    'gzip, deflate, br': 'br' if compression.BROTLI_AVAILABLE else 'gzip',
+    'gzip;q=1, br;q=0.5': 'gzip',
+    'br;q=0, gzip;q=0': None,
+    'identity': None,
+    '': None,
+    'deflate, *;q=0.1': 'br' if compression.BROTLI_AVAILABLE else 'gzip'
+}
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return compression.brotli.decompress(data)
+    return gzip.decompress(data)
+
+
+def time_ms(call: Callable[[], Any], repeat: int) -> float:
+    samples: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return percentile(samples, 50)
+
+
+def response(body: str) -> Dict[str, Any]:
+    return {'statusCode': 200, 'headers': {'Content-Type': 'application/json'}, 'isBase64Encoded': False, 'body': body}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark negotiated response compression')
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    problems = []
+    for accept, expected in NEGOTIATION_CASES.items():
+        if compression.negotiate(accept) != expected:
+            problems.append(f'Accept-Encoding {accept!r}: got {compression.negotiate(accept)}, expected {expected}')
+
+    small = compression.compress_response(response('{"services": []}'), 'gzip')
+    if small['isBase64Encoded']:
+        problems.append('body below COMPRESS_MIN_BYTES was compressed')
+
+    if not compression.BROTLI_AVAILABLE:
+        print('brotli is not installed, measuring gzip only')
+
+    for name, payload in (('catalog', make_catalog(args.rows)), ('appointments', make_appointments(args.rows))):
+        body = dumps(payload)
+        size = len(body.encode('utf-8'))
+        print(f'{name}: {args.rows} rows, {size / 1024:.0f}KB JSON')
+
+        for encoding in compression.SUPPORTED_ENCODINGS:
+            per_request = time_ms(lambda: compression.compress_response(response(body), encoding), args.repeat)
+            compressed = compression.compress_response(response(body), encoding)
+
+            compression._memo.clear()
+            compression._memo_bytes = 0
+            first = time_ms(lambda: compression.compress_response(response(body), encoding, cacheable=True), 1)
+            hit = time_ms(lambda: compression.compress_response(response(body), encoding, cacheable=True), args.repeat)
+            memoized = compression.compress_response(response(body), encoding, cacheable=True)
+
+            for title, result in (('per-request', compressed), ('memoized', memoized)):
+                restored = decompress(base64.b64decode(result['body']), encoding)
+                if restored != body.encode('utf-8') or result['headers'].get('Content-Encoding') != encoding:
+                    problems.append(f'{name} {encoding} {title}: body or headers do not round-trip')
+
+            print(f'  {encoding:4} per request: {per_request:7.2f}ms -> {len(compressed["body"]) / size:5.1%} of JSON (base64) | '
+                  f'memoized: first {first:7.2f}ms -> {len(memoized["body"]) / size:5.1%}, hit {hit:5.2f}ms')
+
+    if problems:
+        print(f'problems: {len(problems)}')
+        for problem in problems:
+            print(f'  {problem}')
+        sys.exit(1)
+    print('problems: 0')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+Бенчмарк и проверка учета SQL-запросов (backend/*/db_trace.py).
+
+Меряет накладные расходы трассы на одно выражение: SELECT 1 через обычный курсор RealDictCursor
+и через соединение db_trace.connect() внутри трассы. Проверяет нормализацию SQL, строку slow_query
+для выражения дольше порога и сквозной путь через glass-api: package_components комплекта
+с несколькими компонентами дает строку sql_trace с выражением альтернатив в repeated (N+1)
+и заголовок Server-Timing. Завершается с кодом 1 при расхождениях или превышении бюджета.
+
+  DATABASE_URL=postgresql://... python bench_db_trace.py -n 5000 --budget-us 30
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from typing import Any, Callable, Dict, List, Tuple
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from benchlib import BACKEND_DIR, load_function_module, percentile
+
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'clinic-api'))
+import db_trace  # noqa: E402
+
+NORMALIZE_CASES = {
+    "SELECT * FROM t_p56372141_online_booking_integ.appointments WHERE appointment_id = %s":
+        'SELECT * FROM appointments WHERE appointment_id = ?',
+    "SELECT COUNT(*) AS total FROM appointments\n   WHERE status = 'active' AND id > 10":
+        'SELECT COUNT(*) AS total FROM appointments WHERE status = ? AND id > ?',
+    "DELETE FROM glass_components WHERE component_id IN (%s, %s, %s)":
+        'DELETE FROM glass_components WHERE component_id IN (?)',
+    "UPDATE rate_limits SET hits = %(hits)s WHERE key = 'it''s'":
+        'UPDATE rate_limits SET hits = ? WHERE key = ?'
+}
+
+
+def time_statements(cursor, n: int) -> List[float]:
+    samples = []
+    for _ in range(n):
+        started = time.perf_counter_ns()
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+        samples.append((time.perf_counter_ns() - started) / 1000)
+    samples.sort()
+    return samples
+
+
+def captured(call: Callable[[], Any]) -> Tuple[Any, List[Dict[str, Any]]]:
+    """Результат вызова и JSON-строки, напечатанные за время вызова"""
+    output = io.StringIO()
+    with redirect_stdout(output):
+        result = call()
+    lines = []
+    for line in output.getvalue().splitlines():
+        try:
+            lines.append(json.loads(line))
+        except ValueError:
+            pass
+    return result, lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark per-request SQL tracing')
+    parser.add_argument('-n', '--statements', type=int, default=5000)
+    parser.add_argument('--budget-us', type=float, default=30.0, help='допустимая добавка p50 на выражение')
+    args = parser.parse_args()
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        sys.exit('DATABASE_URL is required')
+
+    problems: List[str] = []
+    for query, expected in NORMALIZE_CASES.items():
+        if db_trace.normalize_sql(query) != expected:
+            problems.append(f'normalize {query!r}: got {db_trace.normalize_sql(query)!r}')
+
+    plain = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    baseline = time_statements(plain.cursor(), args.statements)
+    plain.close()
+
+    trace = db_trace.start_trace()
+    traced = db_trace.connect(database_url, cursor_factory=RealDictCursor)
+    with_trace = time_statements(traced.cursor(), args.statements)
+    traced.close()
+    _, lines = captured(lambda: db_trace.finish_trace(trace, 'bench', {'statusCode': 200}))
+
+    overhead = percentile(with_trace, 50) - percentile(baseline, 50)
+    print(f'SELECT 1 x{args.statements} (us): plain p50={percentile(baseline, 50):.1f} '
+          f'traced p50={percentile(with_trace, 50):.1f} p99={percentile(with_trace, 99):.1f} '
+          f'-> overhead {overhead:+.1f}us per statement')
+    if overhead > args.budget_us:
+        problems.append(f'tracing overhead {overhead:.1f}us exceeds {args.budget_us}us')
+    summary = lines[-1] if lines else {}
+    if summary.get('queries') != args.statements or not summary.get('repeated'):
+        problems.append(f'SELECT 1 loop: expected {args.statements} queries flagged as repeated, got {summary}')
+
+    slow_threshold = db_trace.SQL_SLOW_QUERY_MS
+    db_trace.SQL_SLOW_QUERY_MS = 20
+    trace = db_trace.start_trace()
+    conn = db_trace.connect(database_url)
+    _, lines = captured(lambda: conn.cursor().execute('SELECT pg_sleep(0.03)'))
+    conn.close()
+    captured(lambda: db_trace.finish_trace(trace, 'bench', None))
+    db_trace.SQL_SLOW_QUERY_MS = slow_threshold
+    if not any(line.get('event') == 'slow_query' and line['sql'] == 'SELECT pg_sleep(?)' for line in lines):
+        problems.append(f'no slow_query line for pg_sleep(0.03) above 20ms: {lines}')
+
+    # сквозной путь: package_components с N+1 по альтернативам
+    os.environ['SQL_SERVER_TIMING'] = 'true'
+    glass = load_function_module('glass-api')
+    conn = psycopg2.connect(database_url)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT package_id, COUNT(*) FROM t_p56372141_online_booking_integ.package_components
+        GROUP BY package_id HAVING COUNT(*) >= %s ORDER BY COUNT(*) DESC LIMIT 1
+    """, (glass.db_trace.SQL_REPEAT_THRESHOLD,))
+    row = cursor.fetchone()
+    conn.close()
+    if row is None:
+        problems.append('no package with enough components to check N+1 detection')
+    else:
+        package_id, components = row
+        event = {'httpMethod': 'GET', 'headers': {},
+                 'queryStringParameters': {'action': 'package_components', 'package_id': str(package_id)}}
+        response, lines = captured(lambda: glass.handler(event, None))
+        traces = [line for line in lines if line.get('event') == 'sql_trace']
+        if not traces:
+            problems.append('glass-api package_components: no sql_trace line')
+        else:
+            line = traces[0]
+            print(f"glass-api package_components ({components} components): {line['queries']} queries, "
+                  f"db {line['db_ms']}ms, connect {line['connect_ms']}ms, repeated {[r['count'] for r in line['repeated']]}")
+            if line['queries'] != components + 1:
+                problems.append(f"package_components: {line['queries']} queries, expected {components + 1}")
+            if not any(r['count'] == components and 'component_alternatives' in r['sql'] for r in line['repeated']):
+                problems.append(f"package_components: alternatives lookup not flagged as repeated: {line['repeated']}")
+        if 'Server-Timing' not in response['headers']:
+            problems.append('package_components: Server-Timing header missing')
+        else:
+            print(f"  Server-Timing: {response['headers']['Server-Timing']}")
+
+        _, lines = captured(lambda: glass.handler({'httpMethod': 'GET', 'queryStringParameters': {}}, None))
+        if any(line.get('event') == 'sql_trace' for line in lines):
+            problems.append('request without database access produced a sql_trace line')
+
+    if problems:
+        print(f'problems: {len(problems)}')
+        for problem in problems:
+            print(f'  {problem}')
+        sys.exit(1)
+    print('problems: 0')
+
+
+if __name__ == '__main__':
+    main()
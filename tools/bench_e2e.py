@@ -0,0 +1,365 @@
+"""
+Сквозной бенчмарк горячих путей clinic-api и glass-api на реальной схеме и объеме данных.
+
+Создает отдельную базу (--database) на сервере из DATABASE_URL, применяет все миграции
+db_migrations/ по порядку и заполняет ее: 100k+ записей на прием с журналом, тысячи компонентов
+с альтернативами и сотни комплектов. Затем вызывает handler функций в пуле потоков по сценариям:
+слоты на загруженный день, статистика и список записей в админке, каталог
+glass_packages?with_components=true, состав комплекта и импорт компонентов пачкой.
+Для каждого сценария - пропускная способность, перцентили задержек и число SQL-запросов на запрос
+(курсор с подсчетом execute подставляется в маршрутизатор функции).
+
+Результаты сохраняются в JSON (--save) и сравниваются с сохраненным прогоном (--baseline):
+рост p95 больше --tolerance, падение пропускной способности или рост числа запросов - регрессия.
+Завершается с кодом 1 при ошибках ответов или регрессиях.
+
+  DATABASE_URL=postgresql://... python bench_e2e.py --save baseline.json
+  DATABASE_URL=postgresql://... python bench_e2e.py --reuse --baseline baseline.json -c 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import date
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import psycopg2
+from psycopg2.extensions import make_dsn
+from psycopg2.extras import RealDictCursor
+
+from benchlib import MIGRATIONS_DIR, format_report, load_function_module, run_load
+
+SCHEMA = 't_p56372141_online_booking_integ'
+
+_queries = threading.local()
+
+
+class CountingCursor(RealDictCursor):
+    """Курсор функции, считающий выполненные запросы в текущем потоке"""
+
+    def execute(self, query, vars=None):
+        _queries.count = getattr(_queries, 'count', 0) + 1
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        _queries.count = getattr(_queries, 'count', 0) + 1
+        return super().executemany(query, vars_list)
+
+
+def create_database(server_url: str, database: str) -> str:
+    """Пересоздать базу, применить миграции; возвращает DSN новой базы"""
+    admin = psycopg2.connect(make_dsn(server_url, dbname='postgres'))
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute(f'DROP DATABASE IF EXISTS "{database}"')
+        cursor.execute(f"CREATE DATABASE \"{database}\" ENCODING 'UTF8' TEMPLATE template0")
+    admin.close()
+
+    database_url = make_dsn(server_url, dbname=database)
+    conn = psycopg2.connect(database_url)
+    with conn.cursor() as cursor:
+        # миграции пишут таблицы и с префиксом схемы, и без него - как на платформе
+        cursor.execute(f'CREATE SCHEMA {SCHEMA}')
+        cursor.execute(f'ALTER DATABASE "{database}" SET search_path TO {SCHEMA}, public')
+    conn.commit()
+    conn.close()
+
+    conn = psycopg2.connect(database_url)
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        if filename.endswith('.sql'):
+            with open(os.path.join(MIGRATIONS_DIR, filename), encoding='utf-8') as migration:
+                with conn.cursor() as cursor:
+                    cursor.execute(migration.read())
+            conn.commit()
+    conn.close()
+    return database_url
+
+
+def seed(database_url: str, appointments: int, components: int, packages: int, per_package: int,
+         alternatives: int) -> None:
+    """Заполнить базу синтетическими данными (generate_series, без обхода в Python)"""
+    conn = psycopg2.connect(database_url)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        INSERT INTO {SCHEMA}.appointments
+        (appointment_id, service_id, service_name, service_price, doctor_id, doctor_name,
+         appointment_date, appointment_time, patient_name, patient_phone, patient_email, status, created_at)
+        SELECT 'BENCH' || g, (g %% 6 + 1)::text,
+               (ARRAY['Терапевт', 'Кардиолог', 'Невролог', 'Офтальмолог', 'Дерматолог', 'Эндокринолог'])[g %% 6 + 1],
+               2500 + g %% 6 * 500, (g %% 4 + 1)::text,
+               (ARRAY['Иванов Иван Петрович', 'Петрова Мария Сергеевна', 'Сидоров Алексей Владимирович',
+                      'Смирнова Елена Александровна'])[g %% 4 + 1],
+               CURRENT_DATE + (g / 72 %% 366 - 183), to_char(time '09:00' + (g / 4 %% 18) * interval '30 minutes', 'HH24:MI'),
+               'Пациент ' || g, '+7999' || lpad(g::text, 7, '0'), 'patient' || g || '@example.com',
+               CASE WHEN g %% 20 = 0 THEN 'completed' WHEN g %% 20 < 4 THEN 'cancelled' ELSE 'active' END,
+               now() - (g %% 100000) * interval '1 minute'
+        FROM generate_series(1, %s) AS g
+    """, (appointments,))
+    cursor.execute(f"""
+        INSERT INTO {SCHEMA}.appointment_logs (appointment_id, action, new_data, user_ip, created_at)
+        SELECT 'BENCH' || g, 'created', jsonb_build_object('appointmentId', 'BENCH' || g), '203.0.113.1',
+               now() - (g %% 100000) * interval '1 minute'
+        FROM generate_series(1, %s, 2) AS g
+    """, (appointments,))
+
+    cursor.execute(f"""
+        INSERT INTO {SCHEMA}.glass_components
+        (component_name, component_type, article, characteristics, unit, price_per_unit, image_url)
+        SELECT 'Компонент ' || g, (ARRAY['profile', 'hinge', 'lock', 'handle', 'glass', 'service'])[g %% 6 + 1],
+               'BENCH-' || g, 'Нержавеющая сталь, матовая, до ' || (g %% 100 + 20) || ' кг',
+               (ARRAY['шт', 'погм', 'м²'])[g %% 3 + 1], 100 + g %% 5000,
+               'https://cdn.example.com/glass-components/' || md5(g::text) || '.webp'
+        FROM generate_series(1, %s) AS g
+    """, (components,))
+    cursor.execute(f"SELECT min(component_id) AS first FROM {SCHEMA}.glass_components WHERE article LIKE 'BENCH-%'")
+    first = cursor.fetchone()[0]
+
+    cursor.execute(f"""
+        INSERT INTO {SCHEMA}.component_alternatives (component_id, alternative_component_id, priority)
+        SELECT %(first)s + g, %(first)s + (g + a * 7919) %% %(n)s, a
+        FROM generate_series(0, %(n)s - 1) AS g, generate_series(1, %(alternatives)s) AS a
+    """, {'first': first, 'n': components, 'alternatives': alternatives})
+
+    cursor.execute(f"""
+        INSERT INTO {SCHEMA}.glass_packages
+        (package_name, package_article, product_type, glass_type, glass_thickness, glass_price_per_sqm,
+         hardware_set, hardware_price, markup_percent, installation_price, description)
+        SELECT 'Перегородка цельностеклянная ' || g, 'PKG-BENCH-' || g, 'partition', 'Прозрачное закаленное', 10,
+               7300, 'Комплект фурнитуры', 9000, 25, 3000, 'Синтетический комплект для бенчмарка'
+        FROM generate_series(1, %s) AS g
+    """, (packages,))
+    cursor.execute(f"""
+        INSERT INTO {SCHEMA}.package_components (package_id, component_id, quantity, is_required)
+        SELECT p.package_id, %(first)s + (p.package_id * 31 + c * 97) %% %(n)s, 1 + c %% 3, c %% 4 <> 0
+        FROM {SCHEMA}.glass_packages p, generate_series(1, %(per_package)s) AS c
+        WHERE p.package_article LIKE 'PKG-BENCH-%%'
+    """, {'first': first, 'n': components, 'per_package': per_package})
+    conn.commit()
+
+    conn.autocommit = True
+    cursor.execute('ANALYZE')
+    conn.close()
+
+
+def dataset(database_url: str) -> Dict[str, Any]:
+    """Размеры таблиц и параметры, от которых зависят сценарии"""
+    conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+    cursor = conn.cursor()
+    sizes = {}
+    for table in ('appointments', 'appointment_logs', 'glass_components', 'component_alternatives',
+                  'glass_packages', 'package_components'):
+        cursor.execute(f'SELECT COUNT(*) AS n FROM {SCHEMA}.{table}')
+        sizes[table] = cursor.fetchone()['n']
+    cursor.execute(f"""
+        SELECT doctor_id, appointment_date FROM {SCHEMA}.appointments WHERE status = 'active'
+        GROUP BY doctor_id, appointment_date ORDER BY COUNT(*) DESC, appointment_date LIMIT 1
+    """)
+    busiest = cursor.fetchone()
+    cursor.execute(f"SELECT package_id FROM {SCHEMA}.glass_packages WHERE package_article LIKE 'PKG-BENCH-%' ORDER BY package_id")
+    package_ids = [row['package_id'] for row in cursor.fetchall()]
+    conn.close()
+    return {
+        'sizes': sizes,
+        'busiest_doctor': busiest['doctor_id'] if busiest else '1',
+        'busiest_date': str(busiest['appointment_date']) if busiest else str(date.today()),
+        'package_ids': package_ids or [1]
+    }
+
+
+class Scenario(NamedTuple):
+    name: str
+    function_name: str
+    requests: int
+    make_event: Callable[[int], Dict[str, Any]]
+
+
+def make_event(method: str, params: Dict[str, str], body: Optional[Dict[str, Any]] = None,
+               token: str = '') -> Dict[str, Any]:
+    headers = {'Accept-Encoding': 'gzip, deflate, br', 'User-Agent': 'bench-e2e'}
+    if token:
+        headers['X-Admin-Key'] = token
+    return {
+        'httpMethod': method,
+        'headers': headers,
+        'queryStringParameters': params,
+        'body': json.dumps(body, ensure_ascii=False) if body is not None else '',
+        'isBase64Encoded': False,
+        'requestContext': {'requestId': uuid.uuid4().hex, 'identity': {'sourceIp': '203.0.113.10'}}
+    }
+
+
+def import_batch(i: int, size: int, components: int) -> List[Dict[str, Any]]:
+    """Пачка компонентов как из файла поставщика: существующие артикулы с новыми ценами (import_mode=update)"""
+    start = i * size % components
+    return [
+        {
+            'component_name': f'Компонент {n}',
+            'component_type': ('profile', 'hinge', 'lock', 'handle', 'glass', 'service')[n % 6],
+            'article': f'BENCH-{n}',
+            'characteristics': 'Обновлено импортом',
+            'unit': 'шт',
+            'price_per_unit': 100 + (n + i) % 5000,
+            'is_active': True
+        }
+        for n in ((start + k) % components + 1 for k in range(size))
+    ]
+
+
+def build_scenarios(data: Dict[str, Any], token: str, scale: float, components: int,
+                    import_size: int) -> List[Scenario]:
+    package_ids = data['package_ids']
+    slots_params = {'action': 'slots', 'doctorId': data['busiest_doctor'], 'date': data['busiest_date']}
+
+    def scaled(n: int) -> int:
+        return max(1, int(n * scale))
+
+    return [
+        Scenario('slots', 'clinic-api', scaled(300), lambda i: make_event('GET', dict(slots_params))),
+        Scenario('stats', 'clinic-api', scaled(100), lambda i: make_event('GET', {'action': 'stats'}, token=token)),
+        Scenario('appointments', 'clinic-api', scaled(200),
+                 lambda i: make_event('GET', {'action': 'appointments', 'status': 'active', 'limit': '200'}, token=token)),
+        Scenario('glass_packages+components', 'glass-api', scaled(8),
+                 lambda i: make_event('GET', {'action': 'glass_packages', 'with_components': 'true'})),
+        Scenario('package_components', 'glass-api', scaled(300),
+                 lambda i: make_event('GET', {'action': 'package_components',
+                                              'package_id': str(package_ids[i % len(package_ids)])})),
+        Scenario('import_components', 'glass-api', scaled(20),
+                 lambda i: make_event('POST', {}, {'action': 'glass_component', 'action_type': 'import',
+                                                   'import_mode': 'update',
+                                                   'components': import_batch(i, import_size, components)},
+                                      token=token))
+    ]
+
+
+def run_scenario(module, scenario: Scenario, concurrency: int) -> Dict[str, Any]:
+    counts: List[int] = []
+    statuses: Dict[int, int] = {}
+    lock = threading.Lock()
+
+    def call(i: int) -> bool:
+        _queries.count = 0
+        response = module.handler(scenario.make_event(i), None)
+        status = response['statusCode']
+        with lock:
+            counts.append(_queries.count)
+            statuses[status] = statuses.get(status, 0) + 1
+        return status == 200
+
+    call(0)
+    counts.clear()
+    statuses.clear()
+    report = run_load(call, range(scenario.requests), concurrency)
+    report['queries_per_request'] = round(sum(counts) / len(counts), 1) if counts else 0.0
+    report['statuses'] = statuses
+    print(f"{format_report(scenario.name, report)} sql/req={report['queries_per_request']}")
+    return report
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Регрессии относительно сохраненного прогона"""
+    regressions = []
+    print(f'compared to baseline (tolerance {tolerance:.0%}):')
+    for name, base in baseline['scenarios'].items():
+        current = results['scenarios'].get(name)
+        if current is None:
+            continue
+        p95_change = current['p95_ms'] / base['p95_ms'] - 1 if base['p95_ms'] else 0.0
+        rps_change = current['throughput_rps'] / base['throughput_rps'] - 1 if base['throughput_rps'] else 0.0
+        print(f"  {name:28} p95 {base['p95_ms']:9.2f} -> {current['p95_ms']:9.2f}ms ({p95_change:+.0%}) "
+              f"rps {base['throughput_rps']:8.1f} -> {current['throughput_rps']:8.1f} ({rps_change:+.0%}) "
+              f"sql/req {base['queries_per_request']} -> {current['queries_per_request']}")
+        if p95_change > tolerance:
+            regressions.append(f'{name}: p95 {base["p95_ms"]}ms -> {current["p95_ms"]}ms')
+        if rps_change < -tolerance:
+            regressions.append(f'{name}: throughput {base["throughput_rps"]} -> {current["throughput_rps"]} rps')
+        if current['queries_per_request'] > base['queries_per_request']:
+            regressions.append(f'{name}: sql/req {base["queries_per_request"]} -> {current["queries_per_request"]}')
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='End-to-end benchmark of clinic-api and glass-api hot paths')
+    parser.add_argument('--database', default='booking_bench', help='имя базы для бенчмарка (пересоздается)')
+    parser.add_argument('--reuse', action='store_true', help='не пересоздавать базу, взять заполненную ранее')
+    parser.add_argument('--appointments', type=int, default=120000)
+    parser.add_argument('--components', type=int, default=5000)
+    parser.add_argument('--packages', type=int, default=300)
+    parser.add_argument('--per-package', type=int, default=12, help='компонентов в комплекте')
+    parser.add_argument('--alternatives', type=int, default=2, help='альтернатив у компонента')
+    parser.add_argument('--import-size', type=int, default=200, help='компонентов в пачке импорта')
+    parser.add_argument('-c', '--concurrency', type=int, default=4)
+    parser.add_argument('--scale', type=float, default=1.0, help='множитель числа запросов в сценариях')
+    parser.add_argument('--only', help='сценарии через запятую')
+    parser.add_argument('--save', help='сохранить результаты в JSON')
+    parser.add_argument('--baseline', help='сравнить с сохраненным прогоном')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='допустимое ухудшение p95 и rps')
+    args = parser.parse_args()
+
+    server_url = os.environ.get('DATABASE_URL')
+    if not server_url:
+        sys.exit('DATABASE_URL is required (the benchmark database is created on the same server)')
+
+    database_url = make_dsn(server_url, dbname=args.database)
+    if not args.reuse:
+        started = time.perf_counter()
+        create_database(server_url, args.database)
+        print(f'migrations applied to {args.database} in {time.perf_counter() - started:.1f}s')
+        started = time.perf_counter()
+        seed(database_url, args.appointments, args.components, args.packages, args.per_package, args.alternatives)
+        print(f'seeded in {time.perf_counter() - started:.1f}s')
+    data = dataset(database_url)
+    print('dataset: ' + ', '.join(f'{table}={count}' for table, count in data['sizes'].items()))
+
+    os.environ['DATABASE_URL'] = database_url
+    os.environ['RATE_LIMIT_ENABLED'] = 'false'
+    os.environ.setdefault('ADMIN_TOKEN_SECRET', 'bench-e2e')
+    modules = {}
+    for function_name in ('clinic-api', 'glass-api'):
+        module = modules[function_name] = load_function_module(function_name)
+        module.router.connect = lambda: psycopg2.connect(database_url, cursor_factory=CountingCursor)
+    token = modules['clinic-api'].is_admin_request.__globals__['issue_token']()[0]
+
+    scenarios = build_scenarios(data, token, args.scale, args.components, args.import_size)
+    if args.only:
+        selected = set(args.only.split(','))
+        scenarios = [scenario for scenario in scenarios if scenario.name in selected]
+
+    results: Dict[str, Any] = {
+        'date': str(date.today()),
+        'concurrency': args.concurrency,
+        'dataset': data['sizes'],
+        'scenarios': {}
+    }
+    problems: List[str] = []
+    for scenario in scenarios:
+        report = run_scenario(modules[scenario.function_name], scenario, args.concurrency)
+        results['scenarios'][scenario.name] = report
+        if report['errors']:
+            problems.append(f"{scenario.name}: {report['errors']} failed requests, statuses {report['statuses']}")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as output:
+            json.dump(results, output, ensure_ascii=False, indent=2)
+        print(f'results saved to {args.save}')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('dataset') != results['dataset']:
+            print('warning: baseline was recorded on a different dataset')
+        problems.extend(compare(results, baseline, args.tolerance))
+
+    if problems:
+        print(f'problems: {len(problems)}')
+        for problem in problems:
+            print(f'  {problem}')
+        sys.exit(1)
+    print('problems: 0')
+
+
+if __name__ == '__main__':
+    main()
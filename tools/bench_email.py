@@ -0,0 +1,180 @@
+"""
+Нагрузочный прогон send-email против локального SMTP-приемника (smtp_sink.py).
+
+Каждый поток работает со своей копией функции (отдельный теплый экземпляр со своим
+SMTP-соединением). Прогоняются одиночные письма и пакетный режим (messages) на нескольких
+уровнях параллельности; после каждого прогона принятые письма сверяются с ожидаемыми:
+получатель, отправитель, тема, multipart/alternative с текстовой и HTML-частью.
+
+Примеры:
+  python bench_email.py
+  python bench_email.py -n 2000 --levels 1,4,16 --batch-size 50 --latency-ms 5 --fail-rate 0.01
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+from typing import Any, Dict, List
+
+from benchlib import FakeContext, format_report, load_function_module, run_load
+from smtp_sink import SMTPSink
+
+SMTP_USER = 'clinic@example.com'
+EMAIL_TYPES = ['created', 'rescheduled', 'cancelled', 'reminder']
+EXPECTED_SUBJECTS = {
+    'created': 'Запись в клинику подтверждена',
+    'rescheduled': 'Запись перенесена',
+    'cancelled': 'Запись отменена',
+    'reminder': 'Напоминание о записи в клинику',
+}
+
+
+def make_message(run: str, i: int) -> Dict[str, Any]:
+    return {
+        'type': EMAIL_TYPES[i % len(EMAIL_TYPES)],
+        'appointmentData': {
+            'patientEmail': f'{run}-{i}@example.com',
+            'patientName': f'Пациент {i}',
+            'appointmentId': f'APP{run}{i}',
+            'serviceName': 'Терапевт',
+            'doctorName': 'Иванов И.И.',
+            'date': '2026-11-20',
+            'time': '10:00',
+            'servicePrice': 2500
+        }
+    }
+
+
+class InstancePool:
+    """По одной копии функции на поток - как отдельные теплые экземпляры"""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.instances: List[Any] = []
+        self.lock = threading.Lock()
+
+    def handler(self):
+        module = getattr(self.local, 'module', None)
+        if module is None:
+            # загрузка трогает sys.path и sys.modules - только по одной
+            with self.lock:
+                module = load_function_module('send-email')
+                self.instances.append(module)
+            self.local.module = module
+        return module.handler
+
+    def close(self) -> None:
+        for module in self.instances:
+            module.transport.close()
+
+
+def verify(sink: SMTPSink, expected: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Сверить принятые приемником письма с отправленными"""
+    problems = []
+    seen = set()
+    for record in sink.messages:
+        msg = record['message']
+        to = str(msg['To'])
+        source = expected.get(to)
+        if not source:
+            problems.append(f'unexpected recipient {to}')
+            continue
+        if to in seen:
+            problems.append(f'duplicate message to {to}')
+        seen.add(to)
+
+        data = source['appointmentData']
+        if record['rcpt_tos'] != [to]:
+            problems.append(f'{to}: envelope recipients {record["rcpt_tos"]}')
+        if str(msg['From']) != SMTP_USER:
+            problems.append(f'{to}: From {msg["From"]}')
+        if str(msg['Subject']) != EXPECTED_SUBJECTS[source['type']]:
+            problems.append(f'{to}: Subject {msg["Subject"]}')
+        if msg.get_content_type() != 'multipart/alternative':
+            problems.append(f'{to}: content type {msg.get_content_type()}')
+            continue
+
+        parts = {part.get_content_type(): part.get_content() for part in msg.iter_parts()}
+        text, html = parts.get('text/plain', ''), parts.get('text/html', '')
+        if data['appointmentId'] not in text or data['appointmentId'] not in html:
+            problems.append(f'{to}: appointment id missing from body')
+        if data['patientName'] not in text or f"{data['patientName']}!" not in html:
+            problems.append(f'{to}: patient name missing from body')
+        if '<html>' not in html or '<' in text:
+            problems.append(f'{to}: HTML and text parts are mixed up')
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark send-email against a local SMTP sink')
+    parser.add_argument('-n', '--messages', type=int, default=1000, help='писем на прогон')
+    parser.add_argument('--levels', default='1,4,16', help='уровни параллельности через запятую')
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--latency-ms', type=float, default=2)
+    parser.add_argument('--jitter-ms', type=float, default=1)
+    parser.add_argument('--fail-rate', type=float, default=0)
+    parser.add_argument('--reject-rate', type=float, default=0)
+    parser.add_argument('--drop-rate', type=float, default=0)
+    args = parser.parse_args()
+
+    sink = SMTPSink('127.0.0.1', args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                    fail_rate=args.fail_rate, reject_rate=args.reject_rate, drop_rate=args.drop_rate).start()
+    os.environ.update({
+        'SMTP_HOST': '127.0.0.1', 'SMTP_PORT': str(args.port),
+        'SMTP_USER': SMTP_USER, 'SMTP_PASSWORD': 'bench', 'SMTP_STARTTLS': 'false',
+        'INTERNAL_API_TOKEN': 'bench-email'
+    })
+    context = FakeContext('send-email')
+    injected = args.fail_rate + args.reject_rate + args.drop_rate
+    all_problems = []
+
+    for level in [int(value) for value in args.levels.split(',')]:
+        for mode in ('single', 'batch'):
+            run = f'{mode[0]}{level}'
+            messages = [make_message(run, i) for i in range(args.messages)]
+            expected = {m['appointmentData']['patientEmail']: m for m in messages}
+            pool = InstancePool()
+            sink.reset()
+
+            if mode == 'single':
+                def call(message: Dict[str, Any]) -> bool:
+                    response = pool.handler()({'httpMethod': 'POST', 'body': json.dumps(message)}, context)
+                    return json.loads(response['body']).get('message') == 'Email sent'
+                items = messages
+            else:
+                def call(batch: List[Dict[str, Any]]) -> bool:
+                    response = pool.handler()({'httpMethod': 'POST', 'headers': {'X-Internal-Token': 'bench-email'},
+                                                   'body': json.dumps({'messages': batch})}, context)
+                    return json.loads(response['body']).get('failed') == 0
+                items = [messages[i:i + args.batch_size] for i in range(0, len(messages), args.batch_size)]
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                report = run_load(call, items, level)
+            pool.close()
+            accepted = sink.counters['accepted']
+            report['msgs_per_s'] = round(accepted / report['elapsed_s'], 1) if report['elapsed_s'] else 0.0
+
+            unit = 'msg' if mode == 'single' else f'batch of {args.batch_size}'
+            print(format_report(f'{mode} ({unit})', report) + f", {report['msgs_per_s']} msgs/s, sink={sink.counters}")
+
+            problems = verify(sink, expected)
+            if not injected and accepted != len(messages):
+                problems.append(f'{mode} c={level}: sink accepted {accepted} of {len(messages)}')
+            all_problems += problems
+
+    sink.stop()
+    if all_problems:
+        print(f'correctness problems: {len(all_problems)}')
+        for problem in all_problems[:20]:
+            print(f'  {problem}')
+        sys.exit(1)
+    print('correctness problems: 0')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Микробенчмарк рендера писем send-email: стоимость одного письма в пачке из N получателей.
+
+Этапы: нормализация данных записи, рендер HTML и текстовой части, сборка MIME-письма.
+
+Пример:
+  python bench_email_render.py -n 10000
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from benchlib import BACKEND_DIR
+
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'send-email'))
+from email_templates import TEMPLATES, normalize_appointment, render_email  # noqa: E402
+from mail_transport import build_message  # noqa: E402
+
+
+def make_payloads(count: int) -> List[Dict[str, Any]]:
+    """Данные записей в обоих форматах, которые присылают клиенты (camelCase и snake_case)"""
+    payloads = []
+    for i in range(count):
+        if i % 2:
+            payloads.append({
+                'patientEmail': f'patient{i}@example.com', 'patientName': f'Пациент <{i}>',
+                'appointmentId': f'APP{10000 + i}', 'serviceName': 'Терапевт', 'doctorName': 'Иванов И.И.',
+                'date': '2026-11-20', 'time': '10:00', 'servicePrice': 2500
+            })
+        else:
+            payloads.append({
+                'patient_email': f'patient{i}@example.com', 'patient_name': f'Пациент {i}',
+                'appointment_id': f'APP{10000 + i}', 'service_name': 'Кардиолог', 'doctor_name': 'Петров П.П.',
+                'appointment_date': '2026-11-21', 'appointment_time': '15:30', 'service_price': 3200
+            })
+    return payloads
+
+
+def measure(title: str, count: int, step: Callable[[int], Any]) -> None:
+    started = time.perf_counter()
+    for i in range(count):
+        step(i)
+    elapsed = time.perf_counter() - started
+    print(f"{title}: {count} msgs in {elapsed * 1000:.1f}ms, {elapsed / count * 1e6:.1f}us/msg, {count / elapsed:.0f} msgs/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Email template render micro-benchmark')
+    parser.add_argument('-n', '--count', type=int, default=10000)
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.count)
+    types = list(TEMPLATES)
+    normalized = [normalize_appointment(payload) for payload in payloads]
+    rendered = [render_email(types[i % len(types)], normalized[i]) for i in range(args.count)]
+
+    sample = rendered[1]
+    assert '&lt;1&gt;' in sample.html and '<1>' in sample.text, 'HTML part must be escaped, text part must not'
+    assert all(r.text and r.html and r.subject for r in rendered), 'every message needs subject, HTML and text'
+    assert 'None' not in rendered[0].html, 'missing fields must render empty'
+
+    measure('normalize', args.count, lambda i: normalize_appointment(payloads[i]))
+    measure('render (html+text)', args.count, lambda i: render_email(types[i % len(types)], normalized[i]))
+    measure('normalize+render', args.count,
+            lambda i: render_email(types[i % len(types)], normalize_appointment(payloads[i])))
+    measure('MIME build', args.count, lambda i: build_message(
+        'clinic@example.com', normalized[i]['patient_email'], rendered[i].subject, rendered[i].html, rendered[i].text
+    ).as_bytes())
+
+
+if __name__ == '__main__':
+    main()
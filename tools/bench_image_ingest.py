@@ -0,0 +1,249 @@
+"""
+Прогон массовой загрузки изображений s3-upload (action=ingest) на локальном окружении:
+HTTP-сервер с картинками поставщика, S3-заглушка moto и база из DATABASE_URL.
+
+Сервер отдает изображения с повторами (одни и те же байты по разным ссылкам), битые файлы,
+404 и медленные ответы. После прогона проверяются результаты по каждой позиции,
+image_url компонентов в базе и число объектов в бакете (каждый уникальный файл - один раз);
+повторный прогон должен целиком попасть в дедупликацию. Отдельно проверяется, что без токена
+админа ingest отвечает 401, а ссылки на внутренние адреса и цепочки редиректов отклоняются.
+При расхождениях - код 1.
+
+Нужны moto[server] и Pillow:
+  DATABASE_URL=postgresql://... python bench_image_ingest.py -n 200 --unique 50 --latency-ms 30
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+from urllib.parse import quote, unquote
+
+import psycopg2
+from moto.server import ThreadedMotoServer
+from PIL import Image
+
+from benchlib import FakeContext, load_function_module
+
+BUCKET = 'bench-images'
+SUPPLIER_HOST = '127.0.0.1'
+
+os.environ.setdefault('ADMIN_TOKEN_SECRET', 'bench-image-ingest')
+# сервер поставщика локальный: внутренний адрес разрешен только ему, localhost по имени - нет
+os.environ['S3_INGEST_TRUSTED_HOSTS'] = SUPPLIER_HOST
+
+# moto пишет строку лога werkzeug на каждый запрос к S3
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+
+def make_image(index: int) -> bytes:
+    """Уникальная картинка: цвет и размер зависят от номера"""
+    buffer = io.BytesIO()
+    size = (800 + index % 7 * 100, 600 + index % 5 * 100)
+    Image.new('RGB', size, (index * 37 % 256, index * 91 % 256, index * 53 % 256)).save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+class SupplierServer:
+    """Локальный сервер картинок поставщика в фоновом потоке"""
+
+    def __init__(self, images: Dict[str, bytes], latency_ms: float):
+        self.images = images
+        self.latency_ms = latency_ms
+        self.requests = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server.lock:
+                    server.requests += 1
+                time.sleep(server.latency_ms / 1000)
+                if self.path.startswith('/redirect/'):
+                    # /redirect/<n>[?to=<url>]: n переходов, затем на to или на первую картинку
+                    hops, _, target = self.path[len('/redirect/'):].partition('?to=')
+                    self.send_response(302)
+                    self.send_header('Location', f'/redirect/{int(hops) - 1}' if int(hops) > 0
+                                     else unquote(target) or '/img/0.jpg')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = server.images.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((SUPPLIER_HOST, 0), Handler)
+        self.port = self.httpd.server_address[1]
+        self.url = f'http://{SUPPLIER_HOST}:{self.port}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+
+
+def seed_components(conn, count: int) -> List[int]:
+    cursor = conn.cursor()
+    cursor.execute(
+        """INSERT INTO t_p56372141_online_booking_integ.glass_components (component_name, component_type, price_per_unit)
+           SELECT 'bench-ingest-' || n, 'hardware', 100 FROM generate_series(1, %s) AS n
+           RETURNING component_id""",
+        (count,)
+    )
+    ids = [row[0] for row in cursor.fetchall()]
+    conn.commit()
+    return ids
+
+
+def check_rejections(module, supplier: SupplierServer, component_id: int, headers: Dict[str, str],
+                     problems: List[str]) -> None:
+    """Без токена - 401; внутренние адреса и длинные цепочки редиректов - ошибка позиции без записи в базу"""
+    item = {'component_id': component_id, 'source_url': f'{supplier.url}/img/0.jpg'}
+    response = module.handler({'httpMethod': 'POST', 'body': json.dumps({'action': 'ingest', 'items': [item]})},
+                              FakeContext('s3-upload'))
+    if response['statusCode'] != 401:
+        problems.append(f'ingest without admin token: HTTP {response["statusCode"]}, expected 401')
+
+    internal = f'http://localhost:{supplier.port}/img/0.jpg'
+    rejected = {
+        internal: 'public address',
+        'http://169.254.169.254/latest/meta-data/': 'public address',
+        f'{supplier.url}/redirect/0?to={quote(internal, safe="")}': 'public address',
+        f'{supplier.url}/redirect/{module.INGEST_MAX_REDIRECTS}': 'redirects',
+    }
+    items = [{'component_id': component_id, 'source_url': url} for url in rejected]
+    items.append({'component_id': component_id, 'source_url': f'{supplier.url}/redirect/0'})
+    response = module.handler({'httpMethod': 'POST', 'headers': headers,
+                               'body': json.dumps({'action': 'ingest', 'items': items})}, FakeContext('s3-upload'))
+    results = json.loads(response['body']).get('results', [])
+    for result in results[:len(rejected)]:
+        expected = rejected[result['source_url']]
+        if result['status'] != 'error' or expected not in result.get('error', ''):
+            problems.append(f'{result["source_url"]}: expected a "{expected}" error, got {result}')
+    if len(results) != len(items) or results[-1]['status'] != 'ok':
+        problems.append(f'single redirect to the supplier should succeed: {results[-1:] or response}')
+    print(f'rejections: {len(rejected)} unsafe sources checked, 1 redirect followed')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark s3-upload bulk image ingestion')
+    parser.add_argument('-n', '--items', type=int, default=200)
+    parser.add_argument('--unique', type=int, default=50, help='различных картинок среди позиций')
+    parser.add_argument('--broken', type=int, default=5, help='позиций с 404 и с файлом не-картинкой')
+    parser.add_argument('--latency-ms', type=float, default=30)
+    parser.add_argument('--s3-port', type=int, default=5055)
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        sys.exit('DATABASE_URL is required')
+
+    images = {f'/img/{i}.jpg': make_image(i % args.unique) for i in range(args.items)}
+    for i in range(args.broken):
+        images[f'/broken/{i}.jpg'] = b'not an image'
+    supplier = SupplierServer(images, args.latency_ms)
+
+    s3 = ThreadedMotoServer(port=args.s3_port, verbose=False)
+    s3.start()
+    os.environ.update({
+        'S3_ENDPOINT_URL': f'http://127.0.0.1:{args.s3_port}',
+        'BEGET_S3_ACCESS_KEY': 'bench', 'BEGET_S3_SECRET_KEY': 'bench', 'BEGET_S3_BUCKET_NAME': BUCKET,
+        'S3_INGEST_MAX_WORKERS': str(args.workers)
+    })
+    module = load_function_module('s3-upload')
+    module.storage.client.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={'LocationConstraint': 'ru-1'})
+
+    conn = psycopg2.connect(database_url)
+    component_ids = seed_components(conn, args.items + 2 * args.broken)
+    items = [{'component_id': component_ids[i], 'source_url': f'{supplier.url}/img/{i}.jpg'} for i in range(args.items)]
+    items += [{'component_id': component_ids[args.items + i], 'source_url': f'{supplier.url}/broken/{i}.jpg'}
+              for i in range(args.broken)]
+    items += [{'component_id': component_ids[args.items + args.broken + i], 'source_url': f'{supplier.url}/missing/{i}.jpg'}
+              for i in range(args.broken)]
+    expected_failures = 2 * args.broken
+
+    problems = []
+    context = FakeContext('s3-upload')
+    headers = {'X-Admin-Key': module.is_admin_request.__globals__['issue_token']()[0]}
+    for run in ('first', 'repeat'):
+        started = time.perf_counter()
+        response = module.handler({'httpMethod': 'POST', 'headers': headers,
+                                   'body': json.dumps({'action': 'ingest', 'items': items})}, context)
+        elapsed = time.perf_counter() - started
+        report = json.loads(response['body'])
+        if response['statusCode'] != 200:
+            problems.append(f'{run}: HTTP {response["statusCode"]} {report}')
+            break
+
+        results = report['results']
+        deduplicated = sum(1 for r in results if r.get('deduplicated'))
+        print(f"{run}: {len(items)} items in {elapsed:.2f}s, ok={report['succeeded']} failed={report['failed']} "
+              f"deduplicated={deduplicated}, {response['headers'].get('Server-Timing')}")
+
+        if report['failed'] != expected_failures:
+            problems.append(f'{run}: expected {expected_failures} failures, got {report["failed"]}')
+        for result in results:
+            broken = '/img/' not in result['source_url']
+            if broken and result['status'] != 'error':
+                problems.append(f'{run}: {result["source_url"]} should have failed')
+            if not broken and result['status'] != 'ok':
+                problems.append(f'{run}: {result["source_url"]} failed: {result.get("error")}')
+        hashes = {r['hash'] for r in results if r['status'] == 'ok'}
+        if len(hashes) != args.unique:
+            problems.append(f'{run}: {len(hashes)} distinct hashes, expected {args.unique}')
+        if run == 'repeat' and deduplicated != args.items:
+            problems.append(f'repeat: only {deduplicated} of {args.items} items deduplicated')
+
+    check_rejections(module, supplier, component_ids[0], headers, problems)
+
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT component_id, image_url FROM t_p56372141_online_booking_integ.glass_components WHERE component_id = ANY(%s)",
+        (component_ids,)
+    )
+    stored = dict(cursor.fetchall())
+    for i, item in enumerate(items):
+        url = stored.get(item['component_id'])
+        if i < args.items and not (url and url.endswith('/card.webp')):
+            problems.append(f'component {item["component_id"]}: image_url {url}')
+        if i >= args.items and url:
+            problems.append(f'component {item["component_id"]} got an image from a broken source')
+
+    objects = module.storage.client.list_objects_v2(Bucket=BUCKET).get('KeyCount', 0)
+    expected_objects = args.unique * (len(module.IMAGE_VARIANTS) + 1)
+    print(f'bucket objects: {objects} (expected {expected_objects}), supplier requests: {supplier.requests}')
+    if objects != expected_objects:
+        problems.append(f'bucket has {objects} objects, expected {expected_objects}')
+
+    cursor.execute("DELETE FROM t_p56372141_online_booking_integ.glass_components WHERE component_id = ANY(%s)", (component_ids,))
+    conn.commit()
+    conn.close()
+    supplier.stop()
+    s3.stop()
+
+    if problems:
+        print(f'correctness problems: {len(problems)}')
+        for problem in problems[:20]:
+            print(f'  {problem}')
+        sys.exit(1)
+    print('correctness problems: 0')
+
+
+if __name__ == '__main__':
+    main()
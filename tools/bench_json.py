@@ -0,0 +1,157 @@
+"""
+Бенчмарк сериализации ответов clinic-api и glass-api (backend/*/serialization.py).
+
+Сравнивает прежний путь (рекурсивный convert_decimals с копией каждой строки, затем json.dumps)
+с однопроходным кодировщиком на стандартном json и на orjson (если установлен).
+Данные - синтетические строки как из RealDictCursor: список записей на прием (date, datetime,
+Decimal, кириллица) и каталог комплектов с вложенными компонентами. Для каждого варианта
+печатаются перцентили времени и пик выделенной памяти (tracemalloc); результаты всех вариантов
+разбираются обратно и сверяются. Завершается с кодом 1 при расхождении.
+
+  python bench_json.py --rows 10000 --repeat 20
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List
+
+from benchlib import BACKEND_DIR, percentile
+
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'clinic-api'))
+import serialization  # noqa: E402
+
+
+def convert_decimals(obj):
+    """Прежнее преобразование перед json.dumps - для сравнения"""
+    if isinstance(obj, list):
+        return [convert_decimals(item) for item in obj]
+    elif isinstance(obj, dict):
+        return {key: convert_decimals(value) for key, value in obj.items()}
+    elif isinstance(obj, Decimal):
+        return float(obj)
+    elif isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return obj
+
+
+def make_appointments(rows: int) -> Dict[str, Any]:
+    created = datetime(2025, 1, 1, 9, 0)
+    return {'appointments': [
+        {
+            'id': i,
+            'appointment_id': f'APP{10000 + i}',
+            'service_id': str(i % 5 + 1),
+            'service_name': 'Кардиолог',
+            'service_price': Decimal('3500.00'),
+            'doctor_id': str(i % 4 + 1),
+            'doctor_name': 'Петрова Мария Сергеевна',
+            'appointment_date': date(2025, 1, 1) + timedelta(days=i % 365),
+            'appointment_time': f'{9 + i % 9:02d}:{i % 2 * 30:02d}',
+            'patient_name': f'Пациент {i}',
+            'patient_phone': f'+7999{i:07d}',
+            'patient_email': f'patient{i}@example.com',
+            'status': 'active',
+            'created_at': created + timedelta(minutes=i),
+            'updated_at': created + timedelta(minutes=i, seconds=30),
+            'reminder_queued_at': None
+        }
+        for i in range(rows)
+    ]}
+
+
+def make_catalog(rows: int) -> Dict[str, Any]:
+    # rows компонентов всего: по 10 в комплекте, у каждого 2 альтернативы
+    def component(i: int) -> Dict[str, Any]:
+        return {
+            'component_id': i,
+            'component_name': f'Петля стекло-стекло 180° №{i}',
+            'component_type': 'hardware',
+            'article': f'ART-{i}',
+            'characteristics': 'Нержавеющая сталь, матовая',
+            'unit': 'шт',
+            'price_per_unit': Decimal(f'{1000 + i % 500}.50'),
+            'is_active': True,
+            'image_url': f'https://cdn.example.com/glass-components/{i:064x}/card.webp',
+            'image_variants': {'thumb': f'https://cdn.example.com/{i}/thumb.webp'},
+            'created_at': datetime(2025, 1, 1) + timedelta(hours=i)
+        }
+
+    packages = []
+    for p in range(max(1, rows // 10)):
+        components = []
+        for c in range(10):
+            comp = component(p * 10 + c)
+            comp.update(quantity=Decimal('2'), is_required=True,
+                        alternatives=[component(100000 + p * 20 + c * 2 + a) for a in range(2)])
+            components.append(comp)
+        packages.append({
+            'package_id': p,
+            'package_name': f'Перегородка цельностеклянная {p}',
+            'glass_price_per_sqm': Decimal('7300.00'),
+            'markup_percent': Decimal('20'),
+            'is_active': True,
+            'updated_at': datetime(2025, 2, 1),
+            'components': components
+        })
+    return {'packages': packages}
+
+
+def measure(title: str, encode: Callable[[Any], str], payload: Any, repeat: int) -> str:
+    samples: List[float] = []
+    body = ''
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = encode(payload)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+
+    tracemalloc.start()
+    encode(payload)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print(f'  {title:16} p50={percentile(samples, 50):8.2f}ms p95={percentile(samples, 95):8.2f}ms '
+          f'peak={peak / 1024 / 1024:6.1f}MB body={len(body.encode("utf-8")) / 1024:8.0f}KB')
+    return body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark response JSON serialization')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    variants: Dict[str, Callable[[Any], str]] = {
+        'convert+dumps': lambda payload: json.dumps(convert_decimals(payload)),
+        'stdlib 1-pass': serialization._encoder.encode
+    }
+    if serialization.ORJSON_AVAILABLE:
+        variants['orjson 1-pass'] = serialization.dumps
+    else:
+        print('orjson is not installed, measuring the standard json path only')
+
+    problems = []
+    for name, payload in (('appointments', make_appointments(args.rows)), ('catalog', make_catalog(args.rows))):
+        print(f'{name}: {args.rows} rows')
+        decoded = {title: json.loads(measure(title, encode, payload, args.repeat)) for title, encode in variants.items()}
+        reference = decoded.pop('convert+dumps')
+        for title, value in decoded.items():
+            if value != reference:
+                problems.append(f'{name}: {title} output differs from convert+dumps')
+
+    if problems:
+        print(f'problems: {len(problems)}')
+        for problem in problems:
+            print(f'  {problem}')
+        sys.exit(1)
+    print('problems: 0')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""
+Стоимость записи метрик и проверка выгрузки в формате Prometheus (backend/*/metrics.py).
+
+Меряет observe_request (с трассой SQL) и observe_upstream в одном потоке и в --threads потоках,
+затем полный handler справочника clinic-api с метриками и с подмененной пустой записью.
+Выгрузка GET ?action=metrics проверяется разбором текстового формата: HELP/TYPE перед рядами,
+без повторов рядов, корзины гистограмм не убывают и +Inf равна _count. Число запросов маршрута
+в выгрузке должно совпасть с числом вызовов, присланный неизвестный action не должен попасть в метки,
+без токена - 401. Завершается с кодом 1 при расхождениях или превышении бюджета.
+
+  python bench_metrics.py -n 200000 --budget-us 3
+"""
+
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+from typing import Callable, Dict, List
+
+os.environ['RATE_LIMIT_ENABLED'] = 'false'
+os.environ['SQL_TRACE_ENABLED'] = 'false'
+os.environ.setdefault('ADMIN_TOKEN_SECRET', 'bench-metrics')
+os.environ['METRICS_TOKEN'] = 'bench-metrics-token'
+
+from benchlib import load_function_module, percentile  # noqa: E402
+
+SAMPLE_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})? (\S+)$')
+LABEL_PAIR = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+class FakeTrace:
+    queries = 4
+    db_ms = 3.2
+    connect_ms = 0.0
+
+
+def time_per_call(call: Callable[[], None], n: int, batch: int = 100) -> List[float]:
+    """Время вызова в мкс по пачкам из batch вызовов (без накладных расходов таймера на каждый вызов)"""
+    samples = []
+    for _ in range(n // batch):
+        started = time.perf_counter_ns()
+        for _ in range(batch):
+            call()
+        samples.append((time.perf_counter_ns() - started) / batch / 1000)
+    samples.sort()
+    return samples
+
+
+def threaded_per_call(call: Callable[[], None], n: int, threads: int) -> float:
+    """Среднее время вызова в мкс, когда threads потоков записывают одновременно"""
+    def worker():
+        for _ in range(n // threads):
+            call()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter_ns()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return (time.perf_counter_ns() - started) / n / 1000
+
+
+def parse_exposition(text: str, problems: List[str]) -> Dict[str, Dict[str, float]]:
+    """Разбор текстового формата: семейство -> {ряд: значение}; нарушения - в problems"""
+    families: Dict[str, Dict[str, float]] = {}
+    types: Dict[str, str] = {}
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            continue
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ', 3)
+            if name in types:
+                problems.append(f'exposition: family {name} declared twice')
+            types[name] = kind
+            families[name] = {}
+            continue
+        match = SAMPLE_LINE.match(line)
+        if not match:
+            problems.append(f'exposition: malformed line {line!r}')
+            continue
+        name, labels, value = match.groups()
+        family = next((f for f in (name, re.sub(r'_(bucket|sum|count)$', '', name)) if f in types), None)
+        if family is None:
+            problems.append(f'exposition: sample {name} without TYPE')
+            continue
+        if labels and ''.join(f'{k}="{v}",' for k, v in LABEL_PAIR.findall(labels)).rstrip(',') != labels[1:-1]:
+            problems.append(f'exposition: malformed labels {labels}')
+        series = f'{name}{labels or ""}'
+        if series in families[family]:
+            problems.append(f'exposition: duplicate series {series}')
+        families[family][series] = float(value)
+
+    for family, kind in types.items():
+        if kind != 'histogram':
+            continue
+        buckets: Dict[str, List[float]] = {}
+        for series, value in families[family].items():
+            if series.startswith(f'{family}_bucket'):
+                key = re.sub(r',?le="[^"]*"', '', series[len(family) + len('_bucket'):])
+                buckets.setdefault(key, []).append(value)
+        for key, values in buckets.items():
+            count = families[family].get(f'{family}_count{key}')
+            if values != sorted(values) or values[-1] != count:
+                problems.append(f'exposition: {family}{key} buckets {values} inconsistent with _count {count}')
+    return families
+
+
+def bench_recording(metrics, n: int, threads: int, budget_us: float, problems: List[str]) -> None:
+    trace = FakeTrace()
+    calls = {
+        'observe_request': lambda: metrics.observe_request('GET bench', 200, 0.0123, trace),
+        'observe_request (no db)': lambda: metrics.observe_request('GET bench', 200, 0.0004),
+        'observe_upstream': lambda: metrics.observe_upstream('amocrm', 'GET /api/v4/leads/:id', 0.18),
+    }
+    for name, call in calls.items():
+        samples = time_per_call(call, n)
+        p50, p99 = percentile(samples, 50), percentile(samples, 99)
+        contended = threaded_per_call(call, n, threads)
+        print(f'{name:24} p50={p50:5.2f}us p99={p99:5.2f}us, {threads} threads: {contended:5.2f}us per call')
+        if p50 > budget_us:
+            problems.append(f'{name}: p50 {p50:.2f}us exceeds {budget_us}us')
+
+
+def bench_handler(module, n: int) -> None:
+    """Полный вызов справочника с записью метрик и без нее"""
+    dispatch_globals = type(module.router).dispatch.__globals__
+    observe = dispatch_globals['observe_request']
+    event = {'httpMethod': 'GET', 'queryStringParameters': {'action': 'services'}}
+    call = lambda: module.handler(event, None)  # noqa: E731
+
+    with_metrics = time_per_call(call, n // 10)
+    dispatch_globals['observe_request'] = lambda *args: None
+    try:
+        without = time_per_call(call, n // 10)
+    finally:
+        dispatch_globals['observe_request'] = observe
+    delta = percentile(with_metrics, 50) - percentile(without, 50)
+    print(f'clinic-api services full handler: p50={percentile(with_metrics, 50):.2f}us with metrics, '
+          f'{percentile(without, 50):.2f}us without ({delta:+.2f}us)')
+
+
+def check_exposition(module, problems: List[str]) -> None:
+    metrics = module.metrics
+    metrics.reset()
+
+    calls = 25
+    for _ in range(calls):
+        module.handler({'httpMethod': 'GET', 'queryStringParameters': {'action': 'services'}}, None)
+    module.handler({'httpMethod': 'GET', 'queryStringParameters': {'action': 'no_such_action_42'}}, None)
+    metrics.observe_upstream('smtp', 'send', 0.004)
+    metrics.observe_upstream('smtp', 'send', 12.0, 'error')
+    metrics.observe_cache('amocrm_lead', True)
+
+    denied = module.handler({'httpMethod': 'GET', 'queryStringParameters': {'action': 'metrics'}}, None)
+    if denied['statusCode'] != 401:
+        problems.append(f'metrics without a token: HTTP {denied["statusCode"]}, expected 401')
+
+    event = {'httpMethod': 'GET', 'headers': {'Authorization': f'Bearer {metrics.METRICS_TOKEN}'},
+             'queryStringParameters': {'action': 'metrics'}}
+    response = module.handler(event, None)
+    if response['statusCode'] != 200 or not response['headers']['Content-Type'].startswith('text/plain; version=0.0.4'):
+        problems.append(f'metrics with METRICS_TOKEN: HTTP {response["statusCode"]} {response["headers"]}')
+        return
+    body = response['body']
+    families = parse_exposition(body, problems)
+    print(f'exposition: {len(body.splitlines())} lines, {len(families)} families, {len(body)} bytes')
+
+    instance = metrics.INSTANCE
+    expected = {
+        f'http_requests_total{{function="clinic-api",instance="{instance}",route="GET services",status="200"}}': calls,
+        f'http_requests_total{{function="clinic-api",instance="{instance}",route="GET unmatched",status="405"}}': 1,
+        f'upstream_request_duration_seconds_count{{function="clinic-api",instance="{instance}",upstream="smtp",'
+        f'operation="send",outcome="error"}}': 1,
+        f'cache_requests_total{{function="clinic-api",instance="{instance}",cache="amocrm_lead",result="hit"}}': 1,
+    }
+    for series, value in expected.items():
+        family = re.sub(r'_count$', '', series.split('{')[0])
+        if families.get(family, {}).get(series) != value:
+            problems.append(f'exposition: expected {series} {value}, got {families.get(family, {}).get(series)}')
+    if 'no_such_action_42' in body:
+        problems.append('exposition: unknown action leaked into route labels')
+    for family in ('response_cache_requests_total', 'rate_limiter_events_total', 'function_instance_start_time_seconds'):
+        if family not in families:
+            problems.append(f'exposition: {family} missing')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark metrics recording and check the Prometheus exposition')
+    parser.add_argument('-n', '--calls', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--budget-us', type=float, default=3.0, help='допустимый p50 записи, мкс')
+    args = parser.parse_args()
+
+    problems: List[str] = []
+    module = load_function_module('clinic-api')
+    bench_recording(module.metrics, args.calls, args.threads, args.budget_us, problems)
+    bench_handler(module, args.calls)
+    check_exposition(module, problems)
+
+    if problems:
+        print(f'problems: {len(problems)}')
+        for problem in problems:
+            print(f'  {problem}')
+        sys.exit(1)
+    print('problems: 0')
+
+
+if __name__ == '__main__':
+    main()
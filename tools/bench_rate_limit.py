@@ -0,0 +1,120 @@
+"""
+Бенчмарк ограничителя частоты запросов (backend/*/rate_limiter.py).
+
+Меряет накладные расходы check() на запрос в трех режимах: только локальный счетчик,
+локальный + общий счетчик в Postgres (разрешенные запросы) и отказ на локальном пути.
+Проверяет, что два экземпляра ограничителя с общей базой вместе пропускают ровно лимит,
+и прогоняет clinic-api: запись с одного IP сверх лимита получает 429 до открытия соединения.
+Завершается с кодом 1, если p50 с базой превышает бюджет или счетчики расходятся.
+
+  DATABASE_URL=postgresql://... python bench_rate_limit.py -n 20000 --budget-ms 1
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from typing import Any, Callable, Dict, List
+
+import psycopg2
+
+from benchlib import BACKEND_DIR, format_report, load_function_module, run_load
+
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'clinic-api'))
+from rate_limiter import Rule, RateLimiter  # noqa: E402
+
+
+def measure(title: str, call: Callable[[int], bool], n: int, concurrency: int) -> Dict[str, Any]:
+    report = run_load(call, range(n), concurrency)
+    print(format_report(title, report))
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the sliding-window rate limiter')
+    parser.add_argument('-n', '--requests', type=int, default=20000)
+    parser.add_argument('-c', '--concurrency', type=int, default=1)
+    parser.add_argument('--budget-ms', type=float, default=1.0, help='допустимый p50 на запрос с базой')
+    args = parser.parse_args()
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        sys.exit('DATABASE_URL is required')
+
+    run = uuid.uuid4().hex[:8]
+    problems: List[str] = []
+    rule = Rule(f'bench-{run}', 1000000, 60)
+
+    local = RateLimiter(database_url='')
+    measure('local only', lambda i: local.check([(rule, f'ip-{i}')]).allowed, args.requests, args.concurrency)
+
+    shared = RateLimiter(database_url=database_url)
+    shared.check([(rule, 'warmup')])
+    report = measure('local + postgres', lambda i: shared.check([(rule, f'ip-{i}')]).allowed,
+                     args.requests, args.concurrency)
+    if report['p50_ms'] > args.budget_ms:
+        problems.append(f"p50 with postgres {report['p50_ms']}ms exceeds {args.budget_ms}ms")
+    if shared.stats['db_errors']:
+        problems.append(f"postgres errors: {shared.stats['db_errors']}")
+
+    tight = Rule(f'bench-tight-{run}', 5, 60)
+    for _ in range(10):
+        shared.check([(tight, 'hot')])
+    measure('rejected locally', lambda i: not shared.check([(tight, 'hot')]).allowed, args.requests, args.concurrency)
+
+    # два теплых экземпляра одной функции: лимит общий
+    limit = 50
+    shared_rule = Rule(f'bench-shared-{run}', limit, 3600)
+    instances = [RateLimiter(database_url=database_url), RateLimiter(database_url=database_url)]
+    allowed = sum(instances[i % 2].check([(shared_rule, 'same-ip')]).allowed for i in range(limit * 3))
+    print(f'two instances, limit {limit}: allowed {allowed} of {limit * 3}')
+    if allowed != limit:
+        problems.append(f'two instances allowed {allowed} requests, expected {limit}')
+
+    # clinic-api: 30 записей за 10 минут с одного IP, дальше 429 без похода в базу за записью
+    clinic = load_function_module('clinic-api')
+    ip = f'203.0.113.{int(run, 16) % 250}'
+    statuses = []
+    started = time.perf_counter()
+    for i in range(40):
+        event = {
+            'httpMethod': 'POST',
+            'queryStringParameters': {'action': 'appointment'},
+            'requestContext': {'identity': {'sourceIp': ip}},
+            # один и тот же слот: первая запись создается, следующие получают 409 до срабатывания лимита
+            'body': json.dumps({'patientPhone': f'+7999{run[:4]}{i:03d}', 'serviceId': '1', 'doctorId': 'bench',
+                                'date': '2000-01-01', 'time': '10:00', 'patientName': f'bench-{run}'})
+        }
+        response = clinic.handler(event, None)
+        statuses.append(response['statusCode'])
+        if response['statusCode'] == 429 and 'Retry-After' not in response['headers']:
+            problems.append('429 without Retry-After')
+    elapsed = time.perf_counter() - started
+    rejected = statuses.count(429)
+    print(f'clinic-api: 40 bookings from one IP -> {rejected} rejected with 429 ({elapsed:.2f}s)')
+    if rejected != 10:
+        problems.append(f'clinic-api rejected {rejected} of 40 bookings, expected 10')
+
+    conn = psycopg2.connect(database_url)
+    cursor = conn.cursor()
+    cursor.execute(
+        """DELETE FROM t_p56372141_online_booking_integ.email_outbox WHERE appointment_id IN (
+               SELECT appointment_id FROM t_p56372141_online_booking_integ.appointments WHERE patient_name = %s)""",
+        (f'bench-{run}',)
+    )
+    cursor.execute("DELETE FROM t_p56372141_online_booking_integ.appointments WHERE patient_name = %s", (f'bench-{run}',))
+    conn.commit()
+    conn.close()
+
+    if problems:
+        print(f'problems: {len(problems)}')
+        for problem in problems:
+            print(f'  {problem}')
+        sys.exit(1)
+    print('problems: 0')
+
+
+if __name__ == '__main__':
+    main()
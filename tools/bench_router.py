@@ -0,0 +1,127 @@
+"""
+Накладные расходы маршрутизации clinic-api и glass-api (backend/*/router.py).
+
+Для каждого маршрута из таблицы обработчик временно подменяется пустым, и меряется полный
+вызов handler(event): разбор события, поиск маршрута, проверки маршрута (токен админа,
+ограничитель частоты выключен) и построение ответа. Затем настоящие справочники clinic-api
+(services, doctors, slots без даты) вызываются с подсчетом соединений с базой - их не должно быть.
+Если задан DATABASE_URL, маршрут каталога должен открыть ровно одно соединение.
+Завершается с кодом 1, если p99 маршрутизации превышает бюджет или соединения открываются зря.
+
+  python bench_router.py -n 20000 --budget-us 50
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+os.environ['RATE_LIMIT_ENABLED'] = 'false'
+os.environ.setdefault('ADMIN_TOKEN_SECRET', 'bench-router')
+
+from benchlib import load_function_module, percentile  # noqa: E402
+
+
+def make_event(function_name: str, method: str, action: str, token: str) -> Dict[str, Any]:
+    event: Dict[str, Any] = {
+        'httpMethod': method,
+        'headers': {'X-Admin-Key': token},
+        'requestContext': {'identity': {'sourceIp': '127.0.0.1'}},
+        'queryStringParameters': {},
+        'body': '{}'
+    }
+    if action == '*':
+        return event
+    # glass-api берет action записи из тела, clinic-api - всегда из строки запроса
+    if function_name == 'glass-api' and method != 'GET':
+        event['body'] = json.dumps({'action': action})
+    else:
+        event['queryStringParameters']['action'] = action
+    return event
+
+
+def time_calls(call, event: Dict[str, Any], n: int) -> List[float]:
+    samples = []
+    for _ in range(n):
+        started = time.perf_counter_ns()
+        call(event, None)
+        samples.append((time.perf_counter_ns() - started) / 1000)
+    samples.sort()
+    return samples
+
+
+def bench_dispatch(function_name: str, n: int, budget_us: float, problems: List[str]) -> None:
+    module = load_function_module(function_name)
+    router = module.router
+    token = module.is_admin_request.__globals__['issue_token']()[0]
+    noop_response = {'statusCode': 200, 'headers': {}, 'isBase64Encoded': False, 'body': ''}
+
+    print(f'{function_name}: {len(router.routes)} routes, dispatch with an empty endpoint (us)')
+    for key, route in sorted(router.routes.items()):
+        router.routes[key] = route._replace(endpoint=lambda request: noop_response)
+        try:
+            event = make_event(function_name, key[0], key[1], token)
+            response = module.handler(event, None)
+            if response is not noop_response:
+                problems.append(f'{function_name} {key}: routed elsewhere, HTTP {response["statusCode"]}')
+                continue
+            samples = time_calls(module.handler, event, n)
+        finally:
+            router.routes[key] = route
+        p50, p99 = percentile(samples, 50), percentile(samples, 99)
+        guards = ','.join(guard.__name__ for guard in route.guards) or '-'
+        print(f'  {key[0]:6} {key[1]:24} guards={guards:14} p50={p50:6.2f} p99={p99:6.2f}')
+        if p99 > budget_us:
+            problems.append(f'{function_name} {key}: p99 {p99:.1f}us exceeds {budget_us}us')
+
+
+def bench_lazy_connection(n: int, problems: List[str]) -> None:
+    module = load_function_module('clinic-api')
+    router = module.router
+    opened = []
+    connect = router.connect
+
+    def counting_connect():
+        opened.append(1)
+        return connect()
+
+    router.connect = counting_connect
+    for action, params in (('services', {}), ('doctors', {}), ('slots', {'doctorId': '1'})):
+        event = {'httpMethod': 'GET', 'queryStringParameters': dict(params, action=action)}
+        samples = time_calls(module.handler, event, n)
+        print(f'clinic-api {action:9} full handler: p50={percentile(samples, 50):6.2f}us '
+              f'p99={percentile(samples, 99):6.2f}us, connections opened: {len(opened)}')
+        if opened:
+            problems.append(f'clinic-api {action} opened {len(opened)} database connections')
+            opened.clear()
+
+    if os.environ.get('DATABASE_URL'):
+        response = module.handler({'httpMethod': 'GET', 'queryStringParameters': {'action': 'glass_components'}}, None)
+        print(f'clinic-api glass_components: HTTP {response["statusCode"]}, connections opened: {len(opened)}')
+        if response['statusCode'] != 200 or len(opened) != 1:
+            problems.append(f'glass_components: HTTP {response["statusCode"]} with {len(opened)} connections, expected 200 with 1')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark table-driven routing in clinic-api and glass-api')
+    parser.add_argument('-n', '--requests', type=int, default=20000, help='вызовов на маршрут')
+    parser.add_argument('--budget-us', type=float, default=50.0, help='допустимый p99 маршрутизации, мкс')
+    args = parser.parse_args()
+
+    problems: List[str] = []
+    for function_name in ('clinic-api', 'glass-api'):
+        bench_dispatch(function_name, args.requests, args.budget_us, problems)
+    bench_lazy_connection(args.requests, problems)
+
+    if problems:
+        print(f'problems: {len(problems)}')
+        for problem in problems:
+            print(f'  {problem}')
+        sys.exit(1)
+    print('problems: 0')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Общие утилиты для локальных инструментов: загрузка обработчиков функций из backend/,
+конкурентный прогон нагрузки и расчет перцентилей задержек
+"""
+
+import importlib.util
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT_DIR, 'backend')
+MIGRATIONS_DIR = os.path.join(ROOT_DIR, 'db_migrations')
+
+
+def list_functions() -> List[str]:
+    """Список облачных функций (каталоги backend/* с index.py)"""
+    return sorted(
+        name for name in os.listdir(BACKEND_DIR)
+        if os.path.isfile(os.path.join(BACKEND_DIR, name, 'index.py'))
+    )
+
+
+def load_function_module(function_name: str):
+    """
+    Импортировать backend/<function_name>/index.py как отдельный модуль.
+    Локальные модули функции (router.py, transport.py и т.п.) изолируются,
+    чтобы одноименные файлы разных функций не перемешивались в sys.modules.
+    """
+    function_dir = os.path.join(BACKEND_DIR, function_name)
+    local_modules = [
+        filename[:-3] for filename in os.listdir(function_dir)
+        if filename.endswith('.py') and filename != 'index.py'
+    ]
+
+    for name in local_modules:
+        sys.modules.pop(name, None)
+
+    sys.path.insert(0, function_dir)
+    try:
+        module_name = 'fn_' + function_name.replace('-', '_')
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(function_dir, 'index.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    finally:
+        sys.path.remove(function_dir)
+        for name in local_modules:
+            sys.modules.pop(name, None)
+
+
+def load_handler(function_name: str) -> Callable[[Dict[str, Any], Any], Dict[str, Any]]:
+    """Получить handler(event, context) функции"""
+    return load_function_module(function_name).handler
+
+
+class FakeContext:
+    """Минимальный аналог context облачной функции"""
+
+    def __init__(self, function_name: str, request_id: str = 'local', timeout_ms: int = 30000):
+        self.function_name = function_name
+        self.function_version = 'local'
+        self.request_id = request_id
+        self.memory_limit_in_mb = 128
+        self._deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self) -> int:
+        return max(0, int((self._deadline - time.monotonic()) * 1000))
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Перцентиль по отсортированному списку (линейная интерполяция)"""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def run_load(call: Callable[[Any], bool], items: Iterable[Any], concurrency: int) -> Dict[str, Any]:
+    """
+    Выполнить call(item) для всех items в пуле потоков.
+    call возвращает True при успехе. Результат: количество, ошибки, пропускная способность, перцентили (мс).
+    """
+    def timed(item: Any) -> Tuple[float, bool]:
+        started = time.perf_counter()
+        try:
+            ok = call(item)
+        except Exception:
+            ok = False
+        return (time.perf_counter() - started) * 1000, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, items))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+    return {
+        'requests': len(results),
+        'errors': errors,
+        'concurrency': concurrency,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(results) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'max_ms': round(latencies[-1], 2) if latencies else 0.0
+    }
+
+
+def format_report(title: str, report: Dict[str, Any]) -> str:
+    """Однострочный отчет о прогоне"""
+    return (
+        f"{title}: {report['requests']} req, {report['errors']} err, c={report['concurrency']}, "
+        f"{report['throughput_rps']} rps, p50={report['p50_ms']}ms p95={report['p95_ms']}ms "
+        f"p99={report['p99_ms']}ms max={report['max_ms']}ms"
+    )
@@ -0,0 +1,263 @@
+"""
+Локальный шлюз для всех функций из backend/: каждая функция доступна по пути /<имя> и по пути
+/<uuid> из backend/func2url.json, HTTP-запрос переводится в event платформы, ответ handler - обратно в HTTP.
+
+Обработчики выполняются в пуле из --workers исполнителей:
+  --mode process - каждый исполнитель отдельный процесс со своими копиями функций, как отдельный
+                   теплый экземпляр в облаке (модульные синглтоны, соединения и кэши не общие);
+  --mode thread  - потоки одного процесса, у каждого потока свои копии функций.
+Функция загружается в исполнителе при первом вызове (холодный старт) - время загрузки
+выводится в лог. Запросы сверх пула ждут свободного исполнителя; ответ дольше --timeout-ms - 504.
+GET /__stats - число вызовов, ошибок, холодных стартов и перцентили по функциям.
+
+  DATABASE_URL=postgresql://... python dev_gateway.py --port 8000 --mode process --workers 8
+  curl 'http://127.0.0.1:8000/clinic-api?action=services'
+"""
+
+import argparse
+import base64
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from benchlib import BACKEND_DIR, FakeContext, list_functions, load_function_module, percentile
+
+# загрузка функций меняет sys.path и sys.modules - в потоках только по очереди
+_load_lock = threading.Lock()
+_worker_state = threading.local()
+
+
+def load_env_file(path: str) -> None:
+    """Переменные окружения из файла KEY=VALUE (пустые строки и # пропускаются)"""
+    with open(path, encoding='utf-8') as env_file:
+        for line in env_file:
+            line = line.strip()
+            if line and not line.startswith('#') and '=' in line:
+                key, value = line.split('=', 1)
+                os.environ.setdefault(key.strip(), value.strip().strip('"\''))
+
+
+def function_routes() -> Dict[str, str]:
+    """Первый сегмент пути -> имя функции: по имени и по uuid из func2url.json"""
+    routes = {name: name for name in list_functions()}
+    func2url_path = os.path.join(BACKEND_DIR, 'func2url.json')
+    if os.path.exists(func2url_path):
+        with open(func2url_path, encoding='utf-8') as func2url_file:
+            for name, url in json.load(func2url_file).items():
+                if name in routes:
+                    routes[url.rstrip('/').rsplit('/', 1)[-1]] = name
+    return routes
+
+
+def invoke(function_name: str, event: Dict[str, Any], timeout_ms: int) -> Tuple[Dict[str, Any], float, float]:
+    """Вызвать handler функции в текущем исполнителе: (ответ, загрузка в мс или 0, выполнение в мс)"""
+    modules = getattr(_worker_state, 'modules', None)
+    if modules is None:
+        modules = _worker_state.modules = {}
+
+    load_ms = 0.0
+    module = modules.get(function_name)
+    if module is None:
+        started = time.perf_counter()
+        with _load_lock:
+            module = modules[function_name] = load_function_module(function_name)
+        load_ms = (time.perf_counter() - started) * 1000
+
+    context = FakeContext(function_name, event['requestContext']['requestId'], timeout_ms)
+    started = time.perf_counter()
+    try:
+        response = module.handler(event, context)
+    except Exception as e:
+        response = {
+            'statusCode': 502,
+            'headers': {'Content-Type': 'application/json'},
+            'body': json.dumps({'error': f'{type(e).__name__}: {e}'})
+        }
+    return response, load_ms, (time.perf_counter() - started) * 1000
+
+
+class GatewayStats:
+    """Счетчики и задержки по функциям"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.cold_starts: Dict[str, int] = {}
+
+    def record(self, function_name: str, status: int, total_ms: float, cold: bool) -> None:
+        with self.lock:
+            self.calls.setdefault(function_name, []).append(total_ms)
+            if status >= 500:
+                self.errors[function_name] = self.errors.get(function_name, 0) + 1
+            if cold:
+                self.cold_starts[function_name] = self.cold_starts.get(function_name, 0) + 1
+
+    def report(self) -> Dict[str, Any]:
+        with self.lock:
+            report = {}
+            for name, latencies in self.calls.items():
+                ordered = sorted(latencies)
+                report[name] = {
+                    'calls': len(ordered),
+                    'errors': self.errors.get(name, 0),
+                    'cold_starts': self.cold_starts.get(name, 0),
+                    'p50_ms': round(percentile(ordered, 50), 2),
+                    'p95_ms': round(percentile(ordered, 95), 2),
+                    'p99_ms': round(percentile(ordered, 99), 2)
+                }
+            return report
+
+
+def build_event(method: str, target: str, headers: Dict[str, str], body: bytes, client_ip: str) -> Dict[str, Any]:
+    """HTTP-запрос в event платформы"""
+    url = urlsplit(target)
+    try:
+        text, is_base64 = body.decode('utf-8'), False
+    except UnicodeDecodeError:
+        text, is_base64 = base64.b64encode(body).decode('ascii'), True
+
+    return {
+        'httpMethod': method,
+        'path': url.path,
+        'headers': headers,
+        'queryStringParameters': dict(parse_qsl(url.query, keep_blank_values=True)),
+        'body': text,
+        'isBase64Encoded': is_base64,
+        'requestContext': {
+            'requestId': uuid.uuid4().hex,
+            'identity': {'sourceIp': client_ip, 'userAgent': headers.get('User-Agent', '')}
+        }
+    }
+
+
+def make_handler(pool: Executor, routes: Dict[str, str], stats: GatewayStats, timeout_ms: int, quiet: bool):
+    class GatewayHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def handle_request(self) -> None:
+            segments = urlsplit(self.path).path.strip('/').split('/')
+            if self.command == 'GET' and segments[0] == '__stats':
+                self.send_body(200, {'Content-Type': 'application/json'}, json.dumps(stats.report(), indent=2).encode())
+                return
+
+            function_name = routes.get(segments[0])
+            if function_name is None:
+                self.send_body(404, {'Content-Type': 'application/json'},
+                               json.dumps({'error': f'Unknown function, mounted: {sorted(set(routes.values()))}'}).encode())
+                return
+
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+            # X-Forwarded-For - чтобы нагрузочный скрипт мог изображать разных клиентов
+            client_ip = self.headers.get('X-Forwarded-For', self.client_address[0]).split(',')[0].strip()
+            event = build_event(self.command, self.path, dict(self.headers.items()), body, client_ip)
+
+            started = time.perf_counter()
+            future = pool.submit(invoke, function_name, event, timeout_ms)
+            try:
+                response, load_ms, run_ms = future.result(timeout=timeout_ms / 1000)
+            except FutureTimeoutError:
+                stats.record(function_name, 504, (time.perf_counter() - started) * 1000, False)
+                self.send_body(504, {'Content-Type': 'application/json'}, b'{"error": "Function timed out"}')
+                return
+            total_ms = (time.perf_counter() - started) * 1000
+
+            status = int(response.get('statusCode', 200))
+            stats.record(function_name, status, total_ms, load_ms > 0)
+            if load_ms and not quiet:
+                print(f'cold start {function_name}: loaded in {load_ms:.0f}ms', flush=True)
+
+            payload = response.get('body') or ''
+            if response.get('isBase64Encoded'):
+                data = base64.b64decode(payload)
+            else:
+                data = payload.encode('utf-8') if isinstance(payload, str) else json.dumps(payload).encode('utf-8')
+            headers = dict(response.get('headers') or {})
+            headers['X-Gateway-Timing'] = f'queue+run={total_ms:.1f}ms, handler={run_ms:.1f}ms'
+            self.send_body(status, headers, data)
+
+        def send_body(self, status: int, headers: Dict[str, str], data: bytes) -> None:
+            self.send_response(status)
+            for name, value in headers.items():
+                if name.lower() not in ('content-length', 'connection'):
+                    self.send_header(name, str(value))
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            if self.command != 'HEAD':
+                self.wfile.write(data)
+
+        do_GET = do_POST = do_PUT = do_DELETE = do_PATCH = do_OPTIONS = do_HEAD = handle_request
+
+        def log_message(self, format: str, *args: Any) -> None:
+            if not quiet:
+                sys.stderr.write(f'{self.command} {self.path} -> {args[1] if len(args) > 1 else ""}\n')
+
+    return GatewayHandler
+
+
+class GatewayServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # очередь соединений по умолчанию (5) при нагрузке дает повторные SYN и секундные выбросы
+    request_queue_size = 256
+
+
+def create_pool(mode: str, workers: int) -> Executor:
+    if mode == 'process':
+        # spawn: исполнители не наследуют слушающий сокет и состояние шлюза
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fn')
+
+
+def serve(host: str, port: int, mode: str, workers: int, timeout_ms: int, quiet: bool) -> GatewayServer:
+    """Запустить шлюз; возвращает сервер (serve_forever уже идет в фоновом потоке)"""
+    routes = function_routes()
+    pool = create_pool(mode, workers)
+    stats = GatewayStats()
+    server = GatewayServer((host, port), make_handler(pool, routes, stats, timeout_ms, quiet))
+    server.pool = pool
+    server.stats = stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Local HTTP gateway for all backend functions')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--mode', choices=('process', 'thread'), default='process')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='исполнителей в пуле')
+    parser.add_argument('--timeout-ms', type=int, default=30000)
+    parser.add_argument('--env-file', help='файл с переменными окружения KEY=VALUE')
+    parser.add_argument('--quiet', action='store_true', help='не писать строку на каждый запрос')
+    args = parser.parse_args()
+
+    if args.env_file:
+        load_env_file(args.env_file)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    if not os.environ.get('DATABASE_URL'):
+        print('DATABASE_URL is not set: functions will answer without a database', file=sys.stderr)
+
+    server = serve(args.host, args.port, args.mode, args.workers, args.timeout_ms, args.quiet)
+    names = sorted(set(function_routes().values()))
+    print(f'gateway on http://{args.host}:{args.port}, {args.mode} pool x{args.workers}: {", ".join(names)}', flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        server.pool.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == '__main__':
+    main()
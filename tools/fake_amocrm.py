@@ -0,0 +1,347 @@
+"""
+Локальная заглушка API amoCRM для нагрузочных тестов amocrm-integration и amocrm-oauth.
+
+Покрывает /oauth2/access_token, /api/v4/leads, /contacts, /notes, /links и каталоги.
+Умеет добавлять задержку, случайные ошибки 5xx и ограничение частоты (429),
+проверяет форму входящих запросов и копит нарушения контракта в /__stats.
+
+Функции направляются на заглушку переменной окружения AMOCRM_BASE_URL:
+  python tools/fake_amocrm.py --port 8765 --latency-ms 80 --error-rate 0.02 --rate-limit 7
+  AMOCRM_BASE_URL=http://127.0.0.1:8765 ...
+"""
+
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+PRODUCTS_CATALOG_ID = 1001
+MAX_BATCH_SIZE = 250
+
+
+class FakeAmoCRMState:
+    """Состояние заглушки: данные, счетчики и параметры деградации"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0, rate_limit: float = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.ids = itertools.count(100000)
+            self.notes: Dict[int, List[Dict[str, Any]]] = {}
+            self.links: Dict[int, List[Dict[str, Any]]] = {}
+            self.elements: Dict[int, Dict[str, Any]] = {}
+            self.requests: Dict[str, int] = {}
+            self.statuses: Dict[int, int] = {}
+            self.violations: List[Dict[str, Any]] = []
+            self.tokens = {'bench-access-token'}
+            self.bucket = self.rate_limit
+            self.bucket_at = time.monotonic()
+
+    def next_id(self) -> int:
+        with self.lock:
+            return next(self.ids)
+
+    def take_rate_token(self) -> bool:
+        """Token bucket на rate_limit запросов в секунду"""
+        if not self.rate_limit:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.bucket = min(self.rate_limit, self.bucket + (now - self.bucket_at) * self.rate_limit)
+            self.bucket_at = now
+            if self.bucket < 1:
+                return False
+            self.bucket -= 1
+            return True
+
+    def record(self, route: str, status: int) -> None:
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def violation(self, route: str, message: str, body: Any) -> None:
+        with self.lock:
+            self.violations.append({'route': route, 'error': message, 'body': str(body)[:300]})
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'requests': dict(self.requests),
+                'statuses': {str(k): v for k, v in self.statuses.items()},
+                'violations': len(self.violations),
+                'violation_samples': self.violations[-20:],
+                'notes': sum(len(v) for v in self.notes.values()),
+                'links': sum(len(v) for v in self.links.values()),
+                'catalog_elements': len(self.elements)
+            }
+
+
+class ContractError(Exception):
+    pass
+
+
+def require(condition: bool, message: str) -> None:
+    if not condition:
+        raise ContractError(message)
+
+
+def validate_token_request(body: Any) -> None:
+    require(isinstance(body, dict), 'body must be a JSON object')
+    for field in ('client_id', 'client_secret', 'grant_type', 'redirect_uri'):
+        require(isinstance(body.get(field), str) and body[field], f'{field} is required')
+    require(body['grant_type'] in ('authorization_code', 'refresh_token'), 'unsupported grant_type')
+    secret_field = 'code' if body['grant_type'] == 'authorization_code' else 'refresh_token'
+    require(isinstance(body.get(secret_field), str) and body[secret_field], f'{secret_field} is required')
+
+
+def validate_notes(body: Any) -> None:
+    require(isinstance(body, list) and body, 'notes body must be a non-empty list')
+    require(len(body) <= MAX_BATCH_SIZE, 'too many notes in one request')
+    for note in body:
+        require(note.get('note_type') == 'common', 'note_type must be common')
+        require(isinstance(note.get('params', {}).get('text'), str), 'params.text must be a string')
+
+
+def validate_links(body: Any) -> None:
+    require(isinstance(body, list) and body, 'links body must be a non-empty list')
+    for link in body:
+        require(isinstance(link.get('to_entity_id'), int), 'to_entity_id must be an integer')
+        require(link.get('to_entity_type') == 'catalog_elements', 'to_entity_type must be catalog_elements')
+        metadata = link.get('metadata', {})
+        require(isinstance(metadata.get('quantity', 1), (int, float)), 'metadata.quantity must be a number')
+
+
+def validate_elements(body: Any, method: str) -> None:
+    require(isinstance(body, list) and body, 'elements body must be a non-empty list')
+    require(len(body) <= MAX_BATCH_SIZE, f'at most {MAX_BATCH_SIZE} elements per request')
+    for element in body:
+        require(isinstance(element.get('name'), str) and element['name'], 'element name is required')
+        if method == 'PATCH':
+            require(isinstance(element.get('id'), int), 'element id is required for PATCH')
+        for field in element.get('custom_fields_values') or []:
+            require('field_code' in field or 'field_id' in field, 'custom field needs field_code or field_id')
+            require(isinstance(field.get('values'), list), 'custom field values must be a list')
+
+
+ROUTES = [
+    ('POST', re.compile(r'^/oauth2/access_token$'), 'token'),
+    ('GET', re.compile(r'^/api/v4/leads/(\d+)/notes$'), 'list_notes'),
+    ('POST', re.compile(r'^/api/v4/leads/(\d+)/notes$'), 'add_notes'),
+    ('POST', re.compile(r'^/api/v4/leads/(\d+)/links$'), 'add_links'),
+    ('GET', re.compile(r'^/api/v4/leads/(\d+)$'), 'get_lead'),
+    ('GET', re.compile(r'^/api/v4/contacts/(\d+)$'), 'get_contact'),
+    ('GET', re.compile(r'^/api/v4/catalogs$'), 'list_catalogs'),
+    ('POST', re.compile(r'^/api/v4/catalogs/(\d+)/elements$'), 'add_elements'),
+    ('PATCH', re.compile(r'^/api/v4/catalogs/(\d+)/elements$'), 'update_elements'),
+]
+
+
+def make_handler(state: FakeAmoCRMState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            self.dispatch('GET')
+
+        def do_POST(self) -> None:
+            self.dispatch('POST')
+
+        def do_PATCH(self) -> None:
+            self.dispatch('PATCH')
+
+        def send_json(self, status: int, data: Any, route: str, headers: Optional[Dict[str, str]] = None) -> None:
+            # у 204 нет тела и Content-Length: иначе клиент с keep-alive прочтет лишние байты как следующий ответ
+            payload = b'' if status == 204 else json.dumps(data, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            if status != 204:
+                self.send_header('Content-Type', 'application/hal+json')
+                self.send_header('Content-Length', str(len(payload)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            if payload:
+                self.wfile.write(payload)
+            state.record(route, status)
+
+        def read_body(self) -> Any:
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            return json.loads(raw) if raw else None
+
+        def dispatch(self, method: str) -> None:
+            parsed = urlparse(self.path)
+
+            if parsed.path == '/__stats':
+                return self.send_json(200, state.stats(), '__stats')
+            if parsed.path == '/__reset' and method == 'POST':
+                state.reset()
+                return self.send_json(200, {'ok': True}, '__reset')
+
+            route, match = None, None
+            for route_method, pattern, name in ROUTES:
+                match = pattern.match(parsed.path)
+                if match and route_method == method:
+                    route = name
+                    break
+            if not route:
+                return self.send_json(404, {'title': 'Not found', 'status': 404}, 'unknown')
+
+            try:
+                body = self.read_body()
+            except ValueError:
+                state.violation(route, 'body is not valid JSON', '')
+                return self.send_json(400, {'title': 'Bad Request', 'status': 400}, route)
+
+            if state.latency_ms or state.jitter_ms:
+                time.sleep(max(0.0, state.latency_ms + random.uniform(-state.jitter_ms, state.jitter_ms)) / 1000)
+
+            if not state.take_rate_token():
+                return self.send_json(429, {'title': 'Too Many Requests', 'status': 429}, route, {'Retry-After': '1'})
+
+            if state.error_rate and random.random() < state.error_rate:
+                return self.send_json(random.choice([500, 502, 503]), {'title': 'Injected error'}, route)
+
+            if route != 'token':
+                auth = self.headers.get('Authorization', '')
+                if not auth.startswith('Bearer ') or auth[7:] not in state.tokens:
+                    state.violation(route, 'missing or unknown bearer token', auth)
+                    return self.send_json(401, {'title': 'Unauthorized', 'status': 401}, route)
+
+            try:
+                status, data = getattr(self, 'route_' + route)(match, body, parse_qs(parsed.query))
+            except ContractError as e:
+                state.violation(route, str(e), body)
+                return self.send_json(400, {'title': 'Bad Request', 'detail': str(e), 'status': 400}, route)
+
+            self.send_json(status, data, route)
+
+        def route_token(self, match, body, query) -> Tuple[int, Any]:
+            validate_token_request(body)
+            access_token = f"access-{state.next_id()}"
+            with state.lock:
+                state.tokens.add(access_token)
+            return 200, {
+                'token_type': 'Bearer',
+                'expires_in': 86400,
+                'access_token': access_token,
+                'refresh_token': f"refresh-{state.next_id()}"
+            }
+
+        def route_get_lead(self, match, body, query) -> Tuple[int, Any]:
+            lead_id = int(match.group(1))
+            return 200, {
+                'id': lead_id,
+                'name': f'Сделка #{lead_id}',
+                'price': 0,
+                '_embedded': {'contacts': [{'id': lead_id + 500000, 'is_main': True}]}
+            }
+
+        def route_get_contact(self, match, body, query) -> Tuple[int, Any]:
+            contact_id = int(match.group(1))
+            return 200, {
+                'id': contact_id,
+                'name': f'Контакт {contact_id}',
+                'custom_fields_values': [
+                    {'field_code': 'PHONE', 'values': [{'value': f'+7900{contact_id % 10000000:07d}'}]},
+                    {'field_code': 'EMAIL', 'values': [{'value': f'contact{contact_id}@example.com'}]}
+                ]
+            }
+
+        def route_list_notes(self, match, body, query) -> Tuple[int, Any]:
+            lead_id = int(match.group(1))
+            limit = int(query.get('limit', ['50'])[0])
+            with state.lock:
+                notes = list(reversed(state.notes.get(lead_id, [])))[:limit]
+            if not notes:
+                return 204, None
+            return 200, {'_embedded': {'notes': notes}}
+
+        def route_add_notes(self, match, body, query) -> Tuple[int, Any]:
+            validate_notes(body)
+            lead_id = int(match.group(1))
+            created = []
+            for note in body:
+                stored = {'id': state.next_id(), 'entity_id': lead_id, 'note_type': note['note_type'], 'params': note['params']}
+                with state.lock:
+                    state.notes.setdefault(lead_id, []).append(stored)
+                created.append({'id': stored['id'], 'entity_id': lead_id, 'request_id': note.get('request_id', '0')})
+            return 200, {'_embedded': {'notes': created}}
+
+        def route_add_links(self, match, body, query) -> Tuple[int, Any]:
+            validate_links(body)
+            lead_id = int(match.group(1))
+            with state.lock:
+                state.links.setdefault(lead_id, []).extend(body)
+            return 200, {'_embedded': {'links': [dict(link, entity_id=lead_id, entity_type='leads') for link in body]}}
+
+        def route_list_catalogs(self, match, body, query) -> Tuple[int, Any]:
+            return 200, {'_embedded': {'catalogs': [
+                {'id': PRODUCTS_CATALOG_ID, 'name': 'Товары', 'type': 'products'},
+                {'id': PRODUCTS_CATALOG_ID + 1, 'name': 'Прочее', 'type': 'regular'}
+            ]}}
+
+        def route_add_elements(self, match, body, query) -> Tuple[int, Any]:
+            validate_elements(body, 'POST')
+            created = []
+            for element in body:
+                element_id = state.next_id()
+                with state.lock:
+                    state.elements[element_id] = element
+                created.append({'id': element_id, 'name': element['name'], 'request_id': element.get('request_id', '0')})
+            return 200, {'_embedded': {'elements': created}}
+
+        def route_update_elements(self, match, body, query) -> Tuple[int, Any]:
+            validate_elements(body, 'PATCH')
+            with state.lock:
+                known = [element for element in body if element['id'] in state.elements]
+                for element in known:
+                    state.elements[element['id']] = element
+            return 200, {'_embedded': {'elements': [{'id': element['id'], 'name': element['name']} for element in known]}}
+
+    return Handler
+
+
+def start_server(state: FakeAmoCRMState, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    """Запустить заглушку в фоновом потоке; фактический порт - server.server_address[1]"""
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Fake amoCRM API server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0, help='доля ответов 5xx (0..1)')
+    parser.add_argument('--rate-limit', type=float, default=0, help='запросов в секунду до ответа 429 (0 - без лимита)')
+    args = parser.parse_args()
+
+    state = FakeAmoCRMState(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"Fake amoCRM listening on http://{args.host}:{args.port} (stats: /__stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Профиль горячих путей clinic-api и glass-api под нагрузкой (backend/*/profiler.py).
+
+Берет базу и сценарии bench_e2e.py (база должна быть уже заполнена: bench_e2e.py без --reuse),
+включает профилирование для доли запросов --rate и прогоняет сценарии в пуле потоков.
+Профили по маршрутам сохраняются в --output: <функция>.collapsed (flamegraph.pl, speedscope),
+<функция>.speedscope.json (открыть на https://www.speedscope.app) и для --mode cprofile
+таблица <функция>.pstats.txt. По каждому маршруту печатаются кадры с наибольшим собственным временем.
+
+  DATABASE_URL=postgresql://... python profile_hot_paths.py --output profiles --scale 0.5
+  DATABASE_URL=postgresql://... python profile_hot_paths.py --mode cprofile --only slots,stats
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Dict
+
+import psycopg2
+from psycopg2.extensions import make_dsn
+
+from bench_e2e import CountingCursor, build_scenarios, dataset, run_scenario
+from benchlib import load_function_module
+
+
+def print_top_frames(module, top: int) -> None:
+    """Собственное время по последнему кадру стека (сэмплирование)"""
+    for route, profile in sorted(module.profiler.selected().items()):
+        self_ms: Dict[str, float] = {}
+        for stack, weight_ms in profile.stacks.items():
+            self_ms[stack[-1]] = self_ms.get(stack[-1], 0.0) + weight_ms
+        sampled = sum(self_ms.values())
+        print(f'  {route}: {profile.requests} profiled requests, {profile.total_ms:.0f}ms, sampled {sampled:.0f}ms')
+        for frame, ms in sorted(self_ms.items(), key=lambda item: item[1], reverse=True)[:top]:
+            print(f'    {ms / sampled if sampled else 0:6.1%}  {frame}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Profile clinic-api and glass-api hot paths under load')
+    parser.add_argument('--database', default='booking_bench', help='база, заполненная bench_e2e.py')
+    parser.add_argument('--mode', choices=('sample', 'cprofile'), default='sample')
+    parser.add_argument('--rate', type=float, default=1.0, help='доля профилируемых запросов')
+    parser.add_argument('--interval-ms', type=float, default=1.0, help='период снимков стека')
+    parser.add_argument('-c', '--concurrency', type=int, default=1)
+    parser.add_argument('--scale', type=float, default=0.5, help='множитель числа запросов в сценариях')
+    parser.add_argument('--only', help='сценарии через запятую')
+    parser.add_argument('--output', default='profiles', help='каталог для профилей')
+    parser.add_argument('--top', type=int, default=5)
+    args = parser.parse_args()
+
+    server_url = os.environ.get('DATABASE_URL')
+    if not server_url:
+        sys.exit('DATABASE_URL is required')
+    database_url = make_dsn(server_url, dbname=args.database)
+    try:
+        data = dataset(database_url)
+    except psycopg2.Error as e:
+        sys.exit(f'database {args.database} is not ready, run bench_e2e.py first: {e}')
+
+    os.environ.update({
+        'DATABASE_URL': database_url,
+        'RATE_LIMIT_ENABLED': 'false',
+        'SQL_TRACE_ENABLED': 'false',
+        'PROFILE_SAMPLE_RATE': str(args.rate),
+        'PROFILE_MODE': args.mode,
+        'PROFILE_INTERVAL_MS': str(args.interval_ms)
+    })
+    os.environ.setdefault('ADMIN_TOKEN_SECRET', 'profile-hot-paths')
+    modules = {name: load_function_module(name) for name in ('clinic-api', 'glass-api')}
+    for module in modules.values():
+        module.router.connect = lambda: psycopg2.connect(database_url, cursor_factory=CountingCursor)
+    token = modules['clinic-api'].is_admin_request.__globals__['issue_token']()[0]
+
+    scenarios = build_scenarios(data, token, args.scale, data['sizes']['glass_components'], 200)
+    if args.only:
+        selected = set(args.only.split(','))
+        scenarios = [scenario for scenario in scenarios if scenario.name in selected]
+    for scenario in scenarios:
+        run_scenario(modules[scenario.function_name], scenario, args.concurrency)
+
+    os.makedirs(args.output, exist_ok=True)
+    for name, module in modules.items():
+        if not module.profiler.profiles:
+            continue
+        print(f'{name}:')
+        if args.mode == 'cprofile':
+            path = os.path.join(args.output, f'{name}.pstats.txt')
+            with open(path, 'w', encoding='utf-8') as output:
+                output.write(module.profiler.export_pstats())
+            print(f'  {path}')
+            continue
+        print_top_frames(module, args.top)
+        with open(os.path.join(args.output, f'{name}.collapsed'), 'w', encoding='utf-8') as output:
+            output.write(module.profiler.export_collapsed())
+        with open(os.path.join(args.output, f'{name}.speedscope.json'), 'w', encoding='utf-8') as output:
+            json.dump(module.profiler.export_speedscope(), output, ensure_ascii=False)
+        print(f'  {args.output}/{name}.collapsed, {args.output}/{name}.speedscope.json')
+
+
+if __name__ == '__main__':
+    main()
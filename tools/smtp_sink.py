@@ -0,0 +1,141 @@
+"""
+Локальный SMTP-приемник для нагрузочных тестов send-email (нужен aiosmtpd).
+
+Принимает любой логин, складывает письма в память, умеет добавлять задержку
+ответа на DATA, временные (451) и постоянные (550) отказы и обрыв сессии (421).
+
+Функция направляется на приемник переменными окружения:
+  python tools/smtp_sink.py --port 8025 --latency-ms 20 --fail-rate 0.01
+  SMTP_HOST=127.0.0.1 SMTP_PORT=8025 SMTP_USER=clinic@example.com SMTP_PASSWORD=x SMTP_STARTTLS=false ...
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import threading
+import time
+from email import message_from_bytes, policy
+from typing import Any, Dict, List
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+# aiosmtpd пишет предупреждение о login_data на каждый AUTH
+logging.getLogger('mail.log').setLevel(logging.ERROR)
+
+
+class SinkHandler:
+    """Обработчик aiosmtpd: деградация по настройкам и запись принятых писем"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, fail_rate: float = 0,
+                 reject_rate: float = 0, drop_rate: float = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.fail_rate = fail_rate
+        self.reject_rate = reject_rate
+        self.drop_rate = drop_rate
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.messages: List[Dict[str, Any]] = []
+            self.counters = {'accepted': 0, 'failed': 0, 'rejected': 0, 'dropped': 0}
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.counters[key] += 1
+
+    async def handle_DATA(self, server, session, envelope) -> str:
+        if self.latency_ms or self.jitter_ms:
+            delay = max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms))
+            await asyncio.sleep(delay / 1000)
+
+        roll = random.random()
+        if roll < self.drop_rate:
+            self.count('dropped')
+            return '421 4.3.2 Injected connection drop'
+        roll -= self.drop_rate
+        if roll < self.reject_rate:
+            self.count('rejected')
+            return '550 5.1.1 Injected permanent rejection'
+        roll -= self.reject_rate
+        if roll < self.fail_rate:
+            self.count('failed')
+            return '451 4.3.0 Injected temporary failure'
+
+        with self.lock:
+            self.messages.append({
+                'mail_from': envelope.mail_from,
+                'rcpt_tos': list(envelope.rcpt_tos),
+                'content': envelope.content,
+                'received_at': time.time()
+            })
+            self.counters['accepted'] += 1
+        return '250 2.0.0 OK'
+
+
+def accept_any_login(server, session, envelope, mechanism, auth_data) -> AuthResult:
+    return AuthResult(success=True)
+
+
+class SMTPSink:
+    """Приемник в фоновом потоке; адрес - host/port"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8025, **options: Any):
+        self.host = host
+        self.port = port
+        self.handler = SinkHandler(**options)
+        self.controller = Controller(
+            self.handler, hostname=host, port=port,
+            authenticator=accept_any_login, auth_require_tls=False
+        )
+
+    def start(self) -> 'SMTPSink':
+        self.controller.start()
+        return self
+
+    def stop(self) -> None:
+        self.controller.stop()
+
+    @property
+    def messages(self) -> List[Dict[str, Any]]:
+        """Принятые письма; разбор MIME - при чтении, чтобы не нагружать приемник во время прогона"""
+        with self.handler.lock:
+            records = list(self.handler.messages)
+        return [dict(record, message=message_from_bytes(record['content'], policy=policy.default)) for record in records]
+
+    @property
+    def counters(self) -> Dict[str, int]:
+        with self.handler.lock:
+            return dict(self.handler.counters)
+
+    def reset(self) -> None:
+        self.handler.reset()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Local SMTP sink with latency and failure injection')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--fail-rate', type=float, default=0, help='доля временных отказов 451')
+    parser.add_argument('--reject-rate', type=float, default=0, help='доля постоянных отказов 550')
+    parser.add_argument('--drop-rate', type=float, default=0, help='доля обрывов сессии 421')
+    args = parser.parse_args()
+
+    sink = SMTPSink(args.host, args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                    fail_rate=args.fail_rate, reject_rate=args.reject_rate, drop_rate=args.drop_rate).start()
+    print(f"SMTP sink listening on {args.host}:{args.port}")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"sink: {sink.counters}")
+    except KeyboardInterrupt:
+        sink.stop()
+
+
+if __name__ == '__main__':
+    main()